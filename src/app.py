@@ -17,8 +17,9 @@ from .data.repositories.chat_repository import ChatRepository
 from .data.repositories.user_profile_repository import UserProfileRepository
 from .services.intimacy_service import IntimacyService
 from .services.chat_service import ChatService
-from .core.ai_engine import AIEngine
+from .core.engine_registry import get_ai_engine
 from .core.session_manager import SessionManager
+from .models.turn import TurnResult
 from .ui.components.api_config import render_api_config, render_compact_status
 from .ui.components.main_info import render_main_info_panel
 from .config.settings import settings
@@ -28,9 +29,13 @@ from .utils.helpers import (
     generate_proactive_greeting,
     parse_ai_response,
     parse_enhanced_ai_response,
-    clean_markdown_text
+    clean_markdown_text,
+    IncrementalMarkdownCleaner
 )
 
+# 流式回应的占位符刷新间隔（约30帧/秒），把多个增量片段合并为一次渲染
+STREAM_RENDER_INTERVAL = 1 / 30
+
 
 class MindSpriteApp:
     """心绪精灵主应用类 - 重构版"""
@@ -56,8 +61,8 @@ class MindSpriteApp:
             st.session_state.messages = []
         
     def initialize_ai_engine(self, api_key: str, serp_api_key: Optional[str] = None):
-        """初始化AI引擎和聊天服务"""
-        self.ai_engine = AIEngine(api_key, serp_api_key)
+        """初始化AI引擎和聊天服务（引擎在进程内按配置缓存，重新运行时直接复用）"""
+        self.ai_engine = get_ai_engine(api_key, serp_api_key)
         self.chat_service = ChatService(
             ai_engine=self.ai_engine,
             chat_repo=self.chat_repo,
@@ -93,7 +98,7 @@ class MindSpriteApp:
                     })
                     
                     # 保存到数据库
-                    self.chat_repo.add_message(session_id, "assistant", care_response)
+                    self.chat_repo.queue_message(session_id, "assistant", care_response)
                     
                     # 标记关怀任务为已完成
                     task_id = care_task.get('id')
@@ -121,7 +126,7 @@ class MindSpriteApp:
             })
             
             # 保存到数据库
-            self.chat_repo.add_message(session_id, "assistant", cleaned_greeting)
+            self.chat_repo.queue_message(session_id, "assistant", cleaned_greeting)
             
             # 标记已显示
             st.session_state.proactive_greeting_shown = True
@@ -130,14 +135,25 @@ class MindSpriteApp:
         """渲染聊天历史 - 使用session state优先"""
         session_id = self.session_manager.session_id
         
-        # 如果session state为空，从数据库加载历史记录
+        # 如果session state为空，从数据库加载最新一页历史记录
         if not st.session_state.messages:
-            history = self.chat_repo.get_history(session_id, limit=20)
-            for role, content, timestamp in history:
-                st.session_state.messages.append({
-                    "role": role,
-                    "content": content
-                })
+            page = self.chat_repo.get_history_page(session_id, limit=20)
+            st.session_state.messages.extend(
+                {"role": role, "content": content} for role, content, _ in page.messages
+            )
+            st.session_state.history_cursor = page.next_cursor
+
+        # 往回翻：每次按游标再加载一页更早的消息
+        if st.session_state.get("history_cursor"):
+            if st.button("⬆️ 加载更早的消息", key="load_older_messages", use_container_width=True):
+                page = self.chat_repo.get_history_page(
+                    session_id, limit=20, cursor=st.session_state.history_cursor
+                )
+                st.session_state.messages[:0] = [
+                    {"role": role, "content": content} for role, content, _ in page.messages
+                ]
+                st.session_state.history_cursor = page.next_cursor
+                st.rerun()
         
         # 渲染所有消息
         for i, message in enumerate(st.session_state.messages):
@@ -159,10 +175,11 @@ class MindSpriteApp:
         session_id = self.session_manager.session_id
 
         # 添加用户消息到session state
-        st.session_state.messages.append({
+        user_message = {
             "role": "user",
             "content": user_input
-        })
+        }
+        st.session_state.messages.append(user_message)
 
         # 保存用户消息到数据库
         message_id = self.chat_repo.add_message(session_id, "user", user_input)
@@ -170,6 +187,9 @@ class MindSpriteApp:
             st.error("保存消息失败")
             return
 
+        # 记录消息ID，供流式处理时复用
+        user_message["message_id"] = message_id
+
         # 使用聊天服务处理消息（流式响应）
         if not self.chat_service:
             st.error("聊天服务未初始化")
@@ -194,48 +214,63 @@ class MindSpriteApp:
         if message_index > 0:
             user_message = st.session_state.messages[message_index - 1]
             user_input = user_message["content"]
+            message_id = user_message.get("message_id")
 
-            # 获取最新的消息ID（从数据库）
-            recent_messages = self.chat_repo.get_recent_context(session_id, context_turns=1)
-            if recent_messages:
-                message_id = recent_messages[0][0]  # 获取最新消息的ID
+            if message_id is None:
+                # 兼容旧的session state：从数据库获取最新的用户消息ID
+                message_id = self.chat_repo.get_last_message_id(session_id, role="user")
+            if message_id is None:
+                return
 
-                # 创建占位符用于流式显示
-                message_placeholder = st.empty()
-                full_response = ""
+            # 创建占位符用于流式显示
+            message_placeholder = st.empty()
+            response_parts = []
+            cleaner = IncrementalMarkdownCleaner()
+            turn = TurnResult()
+            last_render = 0.0
 
-                try:
-                    # 流式处理用户消息
-                    for current_content in self.chat_service.process_user_message_stream(session_id, user_input, message_id):
-                        # 实时更新显示内容（打字机效果）
-                        cleaned_content = clean_markdown_text(current_content)
-                        message_placeholder.markdown(cleaned_content)
-                        full_response = current_content
+            try:
+                # 流式处理用户消息（本轮唯一一次模型调用，结果写入turn）
+                for delta in self.chat_service.stream_turn(
+                        session_id, user_input, message_id, turn_result=turn):
+                    # 只清理新到达的文本，并按帧率合并渲染
+                    response_parts.append(delta)
+                    cleaner.feed(delta)
+                    now = time.monotonic()
+                    if now - last_render >= STREAM_RENDER_INTERVAL:
+                        message_placeholder.markdown(cleaner.text)
+                        last_render = now
+
+                full_response = "".join(response_parts)
+                if turn.success and turn.display_text:
+                    # 以本轮结果为准（流式内容与最终排版不一致时也能正确显示）
+                    full_response = turn.display_text
+                    message_placeholder.markdown(clean_markdown_text(full_response))
+                else:
+                    cleaner.flush()
+                    message_placeholder.markdown(cleaner.text)
 
-                    # 更新session state中的消息内容
-                    st.session_state.messages[message_index]["content"] = full_response
+                # 更新session state中的消息内容
+                st.session_state.messages[message_index]["content"] = full_response
 
-                    # 保存完整回应到数据库
-                    self.chat_repo.add_message(session_id, "assistant", full_response)
+                # 保存完整回应到数据库
+                self.chat_repo.queue_message(session_id, "assistant", full_response)
 
-                    # 处理后续逻辑（礼物、经验值等）
-                    self._handle_post_response_logic(session_id, user_input, message_id, full_response)
+                # 处理后续逻辑（礼物、经验值等），复用本轮结果
+                self._handle_post_response_logic(turn)
 
-                except Exception as e:
-                    st.error(f"流式处理出错: {e}")
-                    error_response = "💖 小念遇到了一些技术问题，但还是想陪伴你~ 请稍后再试试吧！"
-                    st.session_state.messages[message_index]["content"] = error_response
-                    self.chat_repo.add_message(session_id, "assistant", error_response)
+            except Exception as e:
+                st.error(f"流式处理出错: {e}")
+                error_response = "💖 小念遇到了一些技术问题，但还是想陪伴你~ 请稍后再试试吧！"
+                st.session_state.messages[message_index]["content"] = error_response
+                self.chat_repo.queue_message(session_id, "assistant", error_response)
 
-    def _handle_post_response_logic(self, session_id: str, user_input: str, message_id: int, full_response: str):
+    def _handle_post_response_logic(self, turn: TurnResult):
         """处理响应后的逻辑（礼物、经验值等）"""
         try:
-            # 获取完整的处理结果来处理礼物和经验值
-            result = self.chat_service.process_user_message(session_id, user_input, message_id)
-
-            if result["success"]:
-                gift_info = result["gift_info"]
-                exp_result = result["exp_result"]
+            if turn.success:
+                gift_info = turn.gift_info
+                exp_result = turn.exp_result
 
                 # 处理礼物
                 if gift_info["type"]:
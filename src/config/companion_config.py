@@ -6,7 +6,7 @@ including personality traits, language styles, emotion keywords, and behavioral
 """
 
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Callable, Dict, List
 import json
 import os
 
@@ -118,6 +118,8 @@ class CompanionConfig:
         self.personality = PersonalityConfig()
         self.language_style = LanguageStyleConfig()
         self.emotion_keywords = EmotionKeywordsConfig.EMOTION_KEYWORDS
+        # Extra keywords for the emotion analysis service: emotion type value -> {keyword: weight}
+        self.emotion_analysis_keywords: Dict[str, Dict[str, float]] = {}
         self.response_templates = ResponseTemplatesConfig()
         
         if config_file and os.path.exists(config_file):
@@ -144,6 +146,9 @@ class CompanionConfig:
             # Update emotion keywords
             if 'emotion_keywords' in config_data:
                 self.emotion_keywords.update(config_data['emotion_keywords'])
+            
+            if 'emotion_analysis_keywords' in config_data:
+                self.emotion_analysis_keywords.update(config_data['emotion_analysis_keywords'])
                 
         except Exception as e:
             print(f"Warning: Could not load config file {config_file}: {e}")
@@ -154,6 +159,7 @@ class CompanionConfig:
             'personality': self.personality.__dict__,
             'language_style': self.language_style.__dict__,
             'emotion_keywords': self.emotion_keywords,
+            'emotion_analysis_keywords': self.emotion_analysis_keywords,
             'response_templates': {
                 'emotion_responses': self.response_templates.EMOTION_RESPONSES,
                 'intimacy_names': self.response_templates.INTIMACY_NAMES
@@ -222,13 +228,24 @@ class CompanionConfig:
 # Global configuration instance
 companion_config = CompanionConfig()
 
+# Callbacks run after reload_config (e.g. to rebuild keyword matchers and drop caches)
+_reload_listeners: List[Callable[[CompanionConfig], None]] = []
+
 
 def get_config() -> CompanionConfig:
     """Get the global companion configuration"""
     return companion_config
 
 
+def on_config_reload(listener: Callable[[CompanionConfig], None]):
+    """Register a callback that receives the new configuration after reload_config"""
+    if listener not in _reload_listeners:
+        _reload_listeners.append(listener)
+
+
 def reload_config(config_file: str = None):
     """Reload configuration from file"""
     global companion_config
     companion_config = CompanionConfig(config_file)
+    for listener in list(_reload_listeners):
+        listener(companion_config)
@@ -87,6 +87,146 @@ class Settings:
         """AI模型温度参数"""
         return float(os.getenv('TEMPERATURE', '0.5'))  # 优化速度的温度设置
 
+    @property
+    def context_token_budget(self) -> int:
+        """每轮Prompt的输入token预算（system消息 + 历史 + 记忆 + 搜索结果 + 用户输入）"""
+        return int(os.getenv('CONTEXT_TOKEN_BUDGET', '3000'))
+
+    @property
+    def context_message_max_tokens(self) -> int:
+        """单条历史消息最多占用的token数，超出部分截断（小念的回应减半）"""
+        return int(os.getenv('CONTEXT_MESSAGE_MAX_TOKENS', '200'))
+
+    @property
+    def context_history_turns(self) -> int:
+        """每轮最多取多少轮历史对话交给上下文预算筛选"""
+        return int(os.getenv('CONTEXT_HISTORY_TURNS', '10'))
+
+    @property
+    def summary_every_turns(self) -> int:
+        """每积累多少轮（超出原文保留部分的）对话更新一次滚动摘要，0表示不生成摘要"""
+        return int(os.getenv('SUMMARY_EVERY_TURNS', '6'))
+
+    @property
+    def summary_max_tokens(self) -> int:
+        """滚动摘要的token上限，保证长会话的Prompt大小不变"""
+        return int(os.getenv('SUMMARY_MAX_TOKENS', '300'))
+
+    @property
+    def memory_top_k(self) -> int:
+        """每轮按相关度检索多少条记忆放进Prompt"""
+        return int(os.getenv('MEMORY_TOP_K', '5'))
+
+    @property
+    def memory_min_score(self) -> float:
+        """记忆检索的最低相似度（哈希n-gram向量的余弦相似度）"""
+        return float(os.getenv('MEMORY_MIN_SCORE', '0.1'))
+
+    @property
+    def memory_index_dir(self) -> str:
+        """记忆向量索引目录（默认与数据库文件放在一起）"""
+        return os.getenv('MEMORY_INDEX_DIR') or f"{self.database_path}.memory"
+
+    @property
+    def memory_index_max_open(self) -> int:
+        """进程内最多同时打开的会话记忆索引数"""
+        return int(os.getenv('MEMORY_INDEX_MAX_OPEN', '32'))
+
+    @property
+    def request_timeout(self) -> float:
+        """DeepSeek请求超时时间（秒）"""
+        return float(os.getenv('REQUEST_TIMEOUT_SECONDS', '30'))
+
+    @property
+    def max_concurrent_requests(self) -> int:
+        """DeepSeek HTTP连接池的最大连接数"""
+        return int(os.getenv('MAX_CONCURRENT_REQUESTS', '10'))
+
+    @property
+    def http2_enabled(self) -> bool:
+        """是否尝试使用HTTP/2（需要安装h2）"""
+        return os.getenv('DEEPSEEK_HTTP2', 'true').lower() == 'true'
+
+    @property
+    def response_cache_enabled(self) -> bool:
+        """是否启用AI回应缓存"""
+        return os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+
+    @property
+    def response_cache_ttl_seconds(self) -> int:
+        """AI回应缓存有效期（秒）"""
+        return int(float(os.getenv('CACHE_DURATION_HOURS', '24')) * 3600)
+
+    @property
+    def response_cache_max_entries(self) -> int:
+        """AI回应缓存最多保留的条数"""
+        return int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '1000'))
+
+    @property
+    def response_cache_max_input_length(self) -> int:
+        """可缓存的用户输入最大长度（归一化后），只缓存问候、感谢等短消息"""
+        return int(os.getenv('RESPONSE_CACHE_MAX_INPUT_LENGTH', '12'))
+
+    @property
+    def background_tasks_enabled(self) -> bool:
+        """模型回应后需要阻塞执行的工作（经验值、关怀任务、记忆提取、摘要）是否交给后台队列执行"""
+        return os.getenv('BACKGROUND_TASKS_ENABLED', 'true').lower() == 'true'
+
+    @property
+    def write_behind_enabled(self) -> bool:
+        """聊天记录、宝藏、经验值和情感分析写入是否合并成批量事务"""
+        return os.getenv('WRITE_BEHIND_ENABLED', 'true').lower() == 'true'
+
+    @property
+    def write_batch_size(self) -> int:
+        """单个批量事务最多包含的写入条数"""
+        return int(os.getenv('WRITE_BATCH_SIZE', '200'))
+
+    @property
+    def write_flush_interval(self) -> float:
+        """批量写入的最长等待时间（秒）"""
+        return int(os.getenv('WRITE_FLUSH_INTERVAL_MS', '50')) / 1000.0
+
+    @property
+    def write_queue_max_size(self) -> int:
+        """待写入队列上限，队列满时写入方阻塞等待"""
+        return int(os.getenv('WRITE_QUEUE_MAX_SIZE', '10000'))
+
+    @property
+    def emotion_cache_max_entries(self) -> int:
+        """情感关键词分析缓存最多保留的文本条数"""
+        return int(os.getenv('EMOTION_CACHE_MAX_ENTRIES', '2000'))
+
+    @property
+    def emotion_cache_max_bytes(self) -> int:
+        """情感关键词分析缓存的内存上限（估算字节数）"""
+        return int(float(os.getenv('EMOTION_CACHE_MAX_MB', '4')) * 1024 * 1024)
+
+    @property
+    def database_path(self) -> str:
+        """SQLite数据库文件路径"""
+        return os.getenv('DATABASE_PATH', 'mind_sprite.db')
+
+    @property
+    def db_pool_max_connections(self) -> int:
+        """数据库读连接池最多创建的连接数（写操作统一使用一个写连接）"""
+        return int(os.getenv('DB_POOL_MAX_CONNECTIONS', '10'))
+
+    @property
+    def db_pool_thread_affinity(self) -> bool:
+        """是否给每个使用数据库的线程固定一个连接（后台线程不再争用共享连接）"""
+        return os.getenv('DB_POOL_THREAD_AFFINITY', 'false').lower() == 'true'
+
+    @property
+    def streaming_mode(self) -> str:
+        """
+        回应流式模式
+        token: 模型边生成边展示（默认）
+        simulated: 等待完整回应后模拟打字机效果
+        """
+        mode = os.getenv('STREAMING_MODE', 'token').lower()
+        return mode if mode in ('token', 'simulated') else 'token'
+
 
 # 全局设置实例
 settings = Settings()
\ No newline at end of file
@@ -7,11 +7,14 @@ import streamlit as st
 import json
 import os
 import hashlib
-import httpx
+import threading
 from datetime import datetime
 from typing import Optional, List, Tuple, Dict, Generator
 from langchain_deepseek import ChatDeepSeek
-from langchain_core.prompts import PromptTemplate
+from langchain_core.messages import (
+    AIMessage, BaseMessage, HumanMessage, SystemMessage, convert_to_openai_messages
+)
+from langchain_core.runnables import Runnable, RunnableLambda
 from pydantic import SecretStr
 
 # 导入搜索服务、情绪急救包服务、关怀调度服务和情感分析服务
@@ -20,9 +23,20 @@ from ..services.emotion_emergency_service import EmotionEmergencyService
 from ..services.care_scheduler_service import CareSchedulerService
 from ..services.emotion_analysis_service import EmotionAnalysisService
 from ..services.emotional_companion_service import EmotionalCompanionService
-from ..config.prompts import ENHANCED_MIND_SPRITE_PROMPT, SEARCH_ENHANCED_PROMPT
-from ..config.emotional_prompts import HEART_CATCHER_SYSTEM_PROMPT
+from ..services.response_cache_service import ResponseCacheService
+from ..config.prompts import CONVERSATION_SUMMARY_HEADER, EMOTION_CONTEXT_TEMPLATE, prompt_registry
 from ..config.settings import settings
+from .context_builder import ContextBuilder, PromptContext
+from .deepseek_client import DeepSeekStreamClient, DeepSeekStreamError, prompt_cache_stats
+from ..utils.keyword_matcher import KeywordMatcher
+
+
+# 最近情绪模式检测使用的关键词（类别顺序即优先级）
+_recent_mood_matcher = KeywordMatcher({
+    "positive": ["开心", "高兴", "快乐", "兴奋", "满足", "感激", "温暖", "舒适"],
+    "negative": ["难过", "沮丧", "焦虑", "担心", "疲惫", "压力", "困惑", "孤单"],
+    "neutral": ["平静", "一般", "还好", "正常", "想想"]
+})
 
 
 class AIEngine:
@@ -37,6 +51,15 @@ class AIEngine:
         self.emotion_analysis_service = EmotionAnalysisService()
         self.emotional_companion_service = EmotionalCompanionService()  # 旧的情感陪伴服务
         self.companion_service = EmotionalCompanionService()  # 新的心灵捕手服务
+        self.response_cache = ResponseCacheService() if settings.response_cache_enabled else None
+        self._stream_client: Optional[DeepSeekStreamClient] = None
+        self._stream_client_lock = threading.Lock()
+        # 预先构建的 prompt | llm 调用链（模型替换后重新构建）
+        self._chains: Dict[str, Runnable] = {}
+        self._chains_llm = None
+        # 按token预算组装上下文，并记录最近一轮的Prompt大小
+        self.context_builder = ContextBuilder()
+        self.last_prompt_context: Optional[PromptContext] = None
         self._initialize()
 
     def _initialize(self):
@@ -58,6 +81,109 @@ class AIEngine:
             st.error(f"❌ API Key无效或网络错误，请检查你的Key后重试: {e}")
             self.llm = None
 
+    def get_stream_client(self) -> DeepSeekStreamClient:
+        """获取（首次使用时创建）流式请求使用的长连接客户端"""
+        if self._stream_client is None:
+            with self._stream_client_lock:
+                if self._stream_client is None:
+                    self._stream_client = DeepSeekStreamClient(self.api_key)
+        return self._stream_client
+
+    def close(self):
+        """关闭流式请求的长连接客户端（引擎被移出缓存时调用，之后再次使用会重新创建）"""
+        with self._stream_client_lock:
+            stream_client, self._stream_client = self._stream_client, None
+        if stream_client is not None:
+            stream_client.close()
+
+    def _response_cache_key(self, session_id: str, user_input: str, variant: str,
+                            intimacy_level: int) -> Optional[str]:
+        """生成回应缓存键（按会话隔离），不适合缓存的输入返回None"""
+        if not self.response_cache or not session_id or not self.response_cache.is_cacheable(user_input):
+            return None
+        emotion = self.companion_service._detect_user_mood(user_input)
+        return self.response_cache.build_key(session_id, user_input, variant, intimacy_level, emotion)
+
+    def _get_cached_response(self, cache_key: Optional[str]) -> Optional[Dict]:
+        """读取回应缓存"""
+        if not cache_key:
+            return None
+        try:
+            return self.response_cache.get(cache_key, settings.deepseek_model)
+        except Exception as e:
+            print(f"读取回应缓存出错: {e}")
+            return None
+
+    def _cache_response(self, cache_key: Optional[str], response_data: Dict):
+        """写入回应缓存（只缓存模型正常生成的回应）"""
+        if not cache_key:
+            return
+        try:
+            self.response_cache.put(cache_key, settings.deepseek_model, response_data)
+        except Exception as e:
+            print(f"写入回应缓存出错: {e}")
+
+    def _chain(self, name: str) -> Runnable:
+        """获取模板对应的调用链（模板只在导入时解析一次，调用链每个模型只构建一次）"""
+        if self._chains_llm is not self.llm:
+            record_usage = RunnableLambda(self._record_prompt_cache_usage, name="prompt_cache_usage")
+            self._chains = {
+                chain_name: chain | record_usage
+                for chain_name, chain in prompt_registry.build_chains(self.llm).items()
+            }
+            self._chains_llm = self.llm
+        return self._chains[name]
+
+    @staticmethod
+    def _record_prompt_cache_usage(message):
+        """记录LangChain回应中的前缀缓存命中token数（ChatDeepSeek放在 input_token_details.cache_read）"""
+        usage = getattr(message, "usage_metadata", None)
+        if usage:
+            hit_tokens = (usage.get("input_token_details") or {}).get("cache_read") or 0
+            prompt_cache_stats.record(hit_tokens, max(usage.get("input_tokens", 0) - hit_tokens, 0))
+        return message
+
+    def get_prompt_stats(self) -> Dict:
+        """各Prompt模板的填充次数和耗时"""
+        return prompt_registry.get_stats()
+
+    def _build_context(self, prompt_name: str, user_input: str, chat_history: List[Tuple[str, str]],
+                       core_memories: List[Tuple[str, str, str]] = (),
+                       search_context: Optional[str] = None,
+                       summary: Optional[str] = None) -> PromptContext:
+        """按token预算筛选本轮的历史、摘要、核心记忆和搜索结果，并记录Prompt大小"""
+        context = self.context_builder.build(
+            prompt_registry.system_prompt(prompt_name), user_input,
+            chat_history, core_memories, search_context, summary
+        )
+        self.last_prompt_context = context
+        self.context_builder.report(prompt_name, context)
+        return context
+
+    def summarize_conversation(self, previous_summary: Optional[str],
+                               messages: List[Tuple[str, str]]) -> Optional[str]:
+        """把较早的对话并入滚动摘要（后台任务调用，模型不可用时返回None）"""
+        if not self.llm:
+            return None
+        conversation = "\n".join(
+            f"{'用户' if role == 'user' else '小念'}: {content}" for role, content in messages
+        )
+        response = self._chain("conversation_summary").invoke({
+            "previous_summary": previous_summary or "（暂无）",
+            "conversation": conversation
+        })
+        return str(response.content) if hasattr(response, 'content') else str(response)
+
+    def get_prompt_cache_stats(self) -> Dict:
+        """服务端前缀缓存的命中token数和命中率"""
+        return prompt_cache_stats.get_stats()
+
+    def get_response_cache_stats(self) -> Dict:
+        """回应缓存命中统计"""
+        if not self.response_cache:
+            return {"hits": 0, "misses": 0, "writes": 0, "hit_rate": 0.0}
+        return self.response_cache.get_stats()
+
     def get_enhanced_response(self, user_input: str, chat_history: List[Tuple[str, str]],
                              core_memories: List[Tuple[str, str, str]], 
                              intimacy_level: int, total_interactions: int) -> Optional[Dict]:
@@ -104,20 +230,14 @@ class AIEngine:
             recent_moods = self._analyze_recent_mood_patterns(chat_history)
             
             # 格式化记忆和上下文
-            chat_history_text = self._format_chat_history_for_memory(chat_history)
-            core_memories_text = self._format_core_memories_for_memory(core_memories)
+            prompt_context = self._build_context("enhanced", user_input, chat_history, core_memories)
+            history_messages = self._build_history_messages(prompt_context.history)
+            core_memories_text = self._format_core_memories_for_memory(prompt_context.core_memories)
             
             # 使用增强版提示词模板
-            prompt = PromptTemplate(
-                input_variables=["user_input", "chat_history", "core_memories", 
-                               "intimacy_level", "total_interactions", "recent_moods"],
-                template=ENHANCED_MIND_SPRITE_PROMPT
-            )
-            
-            response = prompt | self.llm
-            final_response = response.invoke({
+            final_response = self._chain("enhanced").invoke({
                 "user_input": user_input,
-                "chat_history": chat_history_text,
+                "history": history_messages,
                 "core_memories": core_memories_text,
                 "intimacy_level": intimacy_level,
                 "total_interactions": total_interactions,
@@ -158,9 +278,71 @@ class AIEngine:
             print(f"AI分析出错: {e}")
             return self._get_fallback_response(user_input)
 
+    def _heart_catcher_state(self, user_input: str) -> Tuple[object, Dict]:
+        """心灵捕手Prompt使用的情感状态和陪伴上下文（使用简化版情感状态）"""
+        from ..services.emotional_companion_service import EmotionalState, CompanionMood, IntimacyLevel
+
+        emotional_state = EmotionalState(
+            user_mood="开心",
+            user_energy=7.0,
+            companion_mood=CompanionMood.SWEET,
+            intimacy_level=IntimacyLevel.FRIEND,
+            last_interaction_hours=2.0,
+            emotional_sync_rate=0.8
+        )
+
+        # 使用情感陪伴服务获取上下文
+        context = self.companion_service.get_response_context(emotional_state, user_input)
+        return emotional_state, context
+
+    @staticmethod
+    def _heart_catcher_values(user_input: str, emotional_state, context: Dict) -> Dict:
+        """心灵捕手Prompt的模板变量（history除外）"""
+        return {
+            "intimacy_level": context["intimacy_level"],
+            "intimacy_guidance": context["affection_guidance"],
+            "user_mood": emotional_state.user_mood,
+            "user_energy": context["user_energy"],
+            "companion_mood": context["mood"],
+            "content_type": context["content_type"],
+            "hours_since_last": context["hours_since_last"],
+            "pet_name": context["pet_name"],
+            "emotional_guidance": context["emotional_guidance"],
+            "affection_guidance": context["affection_guidance"],
+            "user_input": user_input
+        }
+
+    @staticmethod
+    def _complete_heart_catcher_fields(response_data: Dict, emotional_state, context: Dict) -> Dict:
+        """为心灵捕手回应补全缺失字段并附加情感状态信息"""
+        required_fields = {
+            "mood_category": emotional_state.companion_mood.value,
+            "sprite_reaction": f"好开心见到{context['pet_name']}呢~",
+            "memory_association": None,
+            "emotional_resonance": "小念感受到了你内心的温暖波动",
+            "gift_type": "贴心陪伴",
+            "gift_content": "小念的温暖拥抱和无条件的陪伴 💕",
+            "intimacy_signals": f"表现出{emotional_state.companion_mood.value}的情绪状态",
+            "proactive_care": "继续陪伴和倾听"
+        }
+
+        for field, default_value in required_fields.items():
+            if field not in response_data:
+                response_data[field] = default_value
+
+        response_data["emotional_state"] = {
+            "intimacy_level": emotional_state.intimacy_level.value,
+            "user_mood": emotional_state.user_mood,
+            "companion_mood": emotional_state.companion_mood.value,
+            "pet_name": context["pet_name"]
+        }
+        return response_data
+
     def get_heart_catcher_response(self, user_input: str, chat_history: List[Tuple[str, str]],
-                                 session_id: str, last_interaction_time: datetime) -> Optional[Dict]:
-        """获取心灵捕手级别的情感陪伴回应"""
+                                 session_id: str, last_interaction_time: datetime,
+                                 intimacy_level: int = 1,
+                                 conversation_summary: Optional[str] = None) -> Optional[Dict]:
+        """获取心灵捕手级别的情感陪伴回应（conversation_summary: 更早对话的滚动摘要）"""
         if not self.llm:
             return self._get_fallback_response(user_input)
         
@@ -169,69 +351,24 @@ class AIEngine:
             emotion_detection = self.emotion_emergency_service.detect_emotion(user_input)
             if emotion_detection:
                 return self._get_emergency_response(user_input, emotion_detection, chat_history)
+
+            # 问候、感谢等短消息优先使用缓存
+            cache_key = self._response_cache_key(session_id, user_input, "heart_catcher", intimacy_level)
+            cached_response = self._get_cached_response(cache_key)
+            if cached_response:
+                return cached_response
             
-            # 分析用户情感状态 - 使用简化版本
-            from ..services.emotional_companion_service import EmotionalState, CompanionMood, IntimacyLevel
-            
-            emotional_state = EmotionalState(
-                user_mood="开心",
-                user_energy=7.0,
-                companion_mood=CompanionMood.SWEET,
-                intimacy_level=IntimacyLevel.FRIEND,
-                last_interaction_hours=2.0,
-                emotional_sync_rate=0.8
-            )
+            emotional_state, context = self._heart_catcher_state(user_input)
             
-            # 使用新的情感陪伴服务获取上下文
-            context = self.companion_service.get_response_context(
-                emotional_state, user_input
+            prompt_context = self._build_context(
+                "heart_catcher", user_input, chat_history, summary=conversation_summary
             )
+            history_messages = self._build_history_messages(prompt_context.history, prompt_context.summary)
             
-            # 构建智能个性化系统prompt
-            heart_catcher_prompt = HEART_CATCHER_SYSTEM_PROMPT.format(
-                intimacy_level=context["intimacy_level"],
-                intimacy_guidance=context["affection_guidance"],
-                user_mood=emotional_state.user_mood,
-                user_energy=context["user_energy"],
-                companion_mood=context["mood"],
-                content_type=context["content_type"],
-                hours_since_last=context["hours_since_last"],
-                pet_name=context["pet_name"],
-                emotional_guidance=context["emotional_guidance"],
-                affection_guidance=context["affection_guidance"]
-            )
-            
-            # 使用AI生成深度个性化回应
-            prompt = PromptTemplate(
-                input_variables=["system_prompt", "user_input", "chat_history"],
-                template="""
-{system_prompt}
-
-## 最近对话历史：
-{chat_history}
-
-## 用户当前消息：
-{user_input}
-
-请针对用户的具体内容，以小念的身份生成完全个性化的回应。
-不要使用任何模板化语言，必须根据用户说的具体事情进行针对性回应。
-
-特别要求：
-1. 对用户提到的具体内容（事件、情感、想法等）进行有针对性的回应
-2. 体现当前的亲密度和情绪状态
-3. 表现出真实的情感共鸣和理解
-4. 提供最极致的情绪价值体验
-5. 让用户感受到"小念真的在认真听我说话并且理解我"
-"""
-            )
-            
-            chat_history_text = self._format_chat_history_for_memory(chat_history[-5:])  # 最近5轮对话
-            
-            response = prompt | self.llm
-            final_response = response.invoke({
-                "system_prompt": heart_catcher_prompt,
-                "user_input": user_input,
-                "chat_history": chat_history_text
+            # 使用AI生成深度个性化回应（固定的系统人设 + 历史对话 + 当前状态和用户消息）
+            final_response = self._chain("heart_catcher").invoke({
+                **self._heart_catcher_values(user_input, emotional_state, context),
+                "history": history_messages
             })
             
             # 获取回应内容
@@ -244,30 +381,8 @@ class AIEngine:
             try:
                 response_data = json.loads(final_content)
                 
-                # 验证必要字段并提供默认值
-                required_fields = {
-                    "mood_category": emotional_state.companion_mood.value,
-                    "sprite_reaction": f"好开心见到{context['pet_name']}呢~",
-                    "memory_association": None,
-                    "emotional_resonance": "小念感受到了你内心的温暖波动",
-                    "gift_type": "贴心陪伴",
-                    "gift_content": "小念的温暖拥抱和无条件的陪伴 💕",
-                    "intimacy_signals": f"表现出{emotional_state.companion_mood.value}的情绪状态",
-                    "proactive_care": "继续陪伴和倾听"
-                }
-                
-                for field, default_value in required_fields.items():
-                    if field not in response_data:
-                        response_data[field] = default_value
-                
-                # 添加情感状态信息
-                response_data["emotional_state"] = {
-                    "intimacy_level": emotional_state.intimacy_level.value,
-                    "user_mood": emotional_state.user_mood,
-                    "companion_mood": emotional_state.companion_mood.value,
-                    "pet_name": context["pet_name"]
-                }
-                
+                self._complete_heart_catcher_fields(response_data, emotional_state, context)
+                self._cache_response(cache_key, response_data)
                 return response_data
                 
             except json.JSONDecodeError as e:
@@ -389,11 +504,13 @@ class AIEngine:
     def get_emotion_enhanced_response(self, user_input: str, chat_history: List[Tuple[str, str]],
                                     core_memories: List[Tuple[str, str, str]], 
                                     intimacy_level: int, total_interactions: int,
-                                    message_id: int, session_id: str) -> Optional[Dict]:
+                                    message_id: int, session_id: str,
+                                    conversation_summary: Optional[str] = None) -> Optional[Dict]:
         """
         获取情感增强版AI回应 - 集成深度情感理解
         
-        这是对原有get_enhanced_response的升级版本，增加了情感分析功能
+        这是对原有get_enhanced_response的升级版本，增加了情感分析功能；
+        conversation_summary 为chat_history之前的对话的滚动摘要
         """
         if not self.llm:
             st.warning("⚠️ AI模型未初始化，使用默认回应")
@@ -435,42 +552,21 @@ class AIEngine:
 
             # 使用增强版记忆联想模板，融入情感分析
             recent_moods = self._analyze_recent_mood_patterns(chat_history)
-            chat_history_text = self._format_chat_history_for_memory(chat_history)
-            core_memories_text = self._format_core_memories_for_memory(core_memories)
-            
-            # 如果有情感分析结果，将其融入提示词
-            emotion_context = ""
-            if emotion_analysis:
-                emotion_context = f"""
-【深度情感洞察】
-- 主要情绪: {emotion_analysis['primary_emotion']} (强度: {emotion_analysis['emotion_intensity']:.1f}/10)
-- 情感效价: {emotion_analysis['emotion_valence']:.2f} (负面←→正面)
-- 情感唤醒: {emotion_analysis['emotion_arousal']:.2f} (平静←→激动)
-- 建议策略: {emotion_analysis['empathy_strategy']}
-- 语调建议: {emotion_analysis['response_tone']}
-- 触发词汇: {', '.join(emotion_analysis['trigger_keywords'])}
-- 置信度: {emotion_analysis['confidence_score']:.2f}
-"""
-            
-            # 使用增强版提示词模板
-            enhanced_prompt = ENHANCED_MIND_SPRITE_PROMPT + emotion_context + """
-
-请根据以上情感分析洞察，调整你的回应风格和内容，让回应更贴合用户的真实情感状态。"""
-            
-            prompt = PromptTemplate(
-                input_variables=["user_input", "chat_history", "core_memories", 
-                               "intimacy_level", "total_interactions", "recent_moods"],
-                template=enhanced_prompt
+            prompt_context = self._build_context(
+                "emotion_enhanced", user_input, chat_history, core_memories, summary=conversation_summary
             )
+            history_messages = self._build_history_messages(prompt_context.history, prompt_context.summary)
+            core_memories_text = self._format_core_memories_for_memory(prompt_context.core_memories)
             
-            response = prompt | self.llm
-            final_response = response.invoke({
+            # 情感分析结果作为模板变量融入提示词
+            final_response = self._chain("emotion_enhanced").invoke({
                 "user_input": user_input,
-                "chat_history": chat_history_text,
+                "history": history_messages,
                 "core_memories": core_memories_text,
                 "intimacy_level": intimacy_level,
                 "total_interactions": total_interactions,
-                "recent_moods": recent_moods
+                "recent_moods": recent_moods,
+                "emotion_context": self._format_emotion_context(emotion_analysis)
             })
 
             # 获取回应内容
@@ -528,23 +624,15 @@ class AIEngine:
         if not chat_history:
             return "这是我们第一次对话，小念很期待了解你的心情~"
         
-        # 简单的情绪关键词检测
-        positive_keywords = ["开心", "高兴", "快乐", "兴奋", "满足", "感激", "温暖", "舒适"]
-        negative_keywords = ["难过", "沮丧", "焦虑", "担心", "疲惫", "压力", "困惑", "孤单"]
-        neutral_keywords = ["平静", "一般", "还好", "正常", "想想"]
-        
         recent_messages = chat_history[-6:]  # 分析最近3轮对话
         mood_counts = {"positive": 0, "negative": 0, "neutral": 0}
         
         for role, content in recent_messages:
             if role == "user":
-                content_lower = content.lower()
-                if any(keyword in content_lower for keyword in positive_keywords):
-                    mood_counts["positive"] += 1
-                elif any(keyword in content_lower for keyword in negative_keywords):
-                    mood_counts["negative"] += 1
-                elif any(keyword in content_lower for keyword in neutral_keywords):
-                    mood_counts["neutral"] += 1
+                # 同一条消息按 积极 > 消极 > 中性 的优先级只计一次
+                mood = _recent_mood_matcher.scan(content).first_category()
+                if mood:
+                    mood_counts[mood] += 1
         
         # 生成模式描述
         if mood_counts["positive"] > mood_counts["negative"]:
@@ -554,27 +642,6 @@ class AIEngine:
         else:
             return "你的情绪比较平稳，小念陪你一起感受生活的起起伏伏"
 
-    def _format_chat_history_for_memory(self, chat_history: List[Tuple[str, str]]) -> str:
-        """为记忆联想格式化聊天历史"""
-        if not chat_history:
-            return "这是我们美好对话的开始~"
-
-        # 只取最近的几轮对话，避免太长
-        recent_history = chat_history[-8:]  # 最近4轮对话
-        history_lines = []
-        
-        for role, content in recent_history:
-            if role == "user":
-                # 截断过长的内容
-                display_content = content[:100] + "..." if len(content) > 100 else content
-                history_lines.append(f"你说: {display_content}")
-            else:
-                # 对AI回应进行简化，只提取核心情感
-                display_content = content[:50] + "..." if len(content) > 50 else content
-                history_lines.append(f"小念回应: {display_content}")
-
-        return "\n".join(history_lines)
-
     def _format_core_memories_for_memory(self, core_memories: List[Tuple[str, str, str]]) -> str:
         """为记忆联想格式化核心记忆"""
         if not core_memories:
@@ -584,7 +651,8 @@ class AIEngine:
             'insight': '你的感悟',
             'event': '重要时刻',
             'person': '重要的人',
-            'preference': '你的喜好'
+            'preference': '你的喜好',
+            'conversation': '聊过的话'
         }
 
         memory_lines = []
@@ -594,6 +662,21 @@ class AIEngine:
 
         return "\n".join(memory_lines)
 
+    def _format_emotion_context(self, emotion_analysis: Optional[Dict]) -> str:
+        """格式化情感分析洞察（没有分析结果时为空）"""
+        if not emotion_analysis:
+            return ""
+        return EMOTION_CONTEXT_TEMPLATE.format(
+            primary_emotion=emotion_analysis['primary_emotion'],
+            emotion_intensity=emotion_analysis['emotion_intensity'],
+            emotion_valence=emotion_analysis['emotion_valence'],
+            emotion_arousal=emotion_analysis['emotion_arousal'],
+            empathy_strategy=emotion_analysis['empathy_strategy'],
+            response_tone=emotion_analysis['response_tone'],
+            trigger_keywords=', '.join(emotion_analysis['trigger_keywords']),
+            confidence_score=emotion_analysis['confidence_score']
+        )
+
     def _get_search_enhanced_response(self, user_input: str, search_results: Dict) -> Dict:
         """处理搜索增强的回应"""
         try:
@@ -603,16 +686,13 @@ class AIEngine:
             else:
                 search_context = str(search_results)
             
-            prompt = PromptTemplate(
-                input_variables=["user_input", "search_results"],
-                template=SEARCH_ENHANCED_PROMPT
-            )
-            
             if self.llm:
-                response = prompt | self.llm
-                final_response = response.invoke({
+                prompt_context = self._build_context(
+                    "search_enhanced", user_input, [], search_context=search_context
+                )
+                final_response = self._chain("search_enhanced").invoke({
                     "user_input": user_input,
-                    "search_results": search_context
+                    "search_results": prompt_context.search_context or ""
                 })
             else:
                 return self._get_fallback_response(user_input)
@@ -686,6 +766,52 @@ class AIEngine:
         
         return formatted
 
+    def requires_structured_response(self, user_input: str) -> bool:
+        """
+        判断本轮是否必须走完整的结构化（非流式）路径
+
+        情绪急救和本地资源搜索需要在调用模型前分支处理，token流式路径不覆盖这些场景
+        """
+        try:
+            if self.emotion_emergency_service.detect_emotion(user_input):
+                return True
+            if self.search_service:
+                search_intent = SearchTriggerDetector.detect_search_intent(user_input)
+                if search_intent["intent"] == "local_mental_health":
+                    return True
+        except Exception as e:
+            print(f"结构化路径判断出错: {e}")
+        return False
+
+    def complete_streamed_response(self, response_data: Dict, user_input: str,
+                                   prompt_name: str = "emotion_enhanced") -> Dict:
+        """
+        补全流式输出解析出的回应字典
+
+        Args:
+            response_data: 流结束后提取到的字段
+            user_input: 用户输入（用于降级回应）
+            prompt_name: 生成这段输出的Prompt（heart_catcher会补全心灵捕手的字段和情感状态）
+
+        Returns:
+            Dict: 字段完整的回应，关键字段缺失时返回降级回应
+        """
+        if not response_data or not response_data.get("sprite_reaction"):
+            return self._get_fallback_response(user_input)
+
+        if prompt_name == "heart_catcher":
+            emotional_state, context = self._heart_catcher_state(user_input)
+            return self._complete_heart_catcher_fields(response_data, emotional_state, context)
+
+        response_data.setdefault("mood_category", "温暖")
+        response_data.setdefault("gift_type", None)
+        response_data.setdefault("gift_content", None)
+        if "memory_association" not in response_data:
+            response_data["memory_association"] = None
+        if not response_data.get("emotional_resonance"):
+            response_data["emotional_resonance"] = "小念感受到了你内心的温暖波动"
+        return response_data
+
     def _get_fallback_response(self, user_input: str) -> Dict:
         """降级回应 - 当AI无法正常工作时使用"""
         return {
@@ -722,51 +848,31 @@ class AIEngine:
                         else:
                             st.warning(f"⚠️ 搜索遇到问题: {search_results.get('message', '未知错误')}")
 
-            # 构建FINAL_PROMPT
-            if search_results and search_results["success"] and self.search_service:
-                prompt_template = self._get_search_enhanced_prompt_template()
-                search_context = self.search_service.format_search_results_for_ai(search_results)
-            else:
-                prompt_template = self._get_prompt_template()
-                search_context = ""
-
-            # 格式化其他上下文
-            core_memories_text = self._format_core_memories(core_memories)
-            chat_history_text = self._format_chat_history(chat_history)
+            # 按token预算筛选并格式化上下文
+            use_search = bool(search_results and search_results["success"] and self.search_service)
+            search_context = (
+                self.search_service.format_search_results_for_ai(search_results) if use_search else None
+            )
+            prompt_context = self._build_context(
+                "search_thinking" if use_search else "thinking",
+                user_input, chat_history, core_memories, search_context
+            )
+            core_memories_text = self._format_core_memories(prompt_context.core_memories)
+            history_messages = self._build_history_messages(prompt_context.history)
             environment_context_text = self._format_environment_context(env_context)
 
-            # 创建prompt
-            if search_results and search_results["success"] and self.search_service:
-                prompt = PromptTemplate(
-                    input_variables=["user_input", "core_memories", "chat_history", 
-                                   "environment_context", "intimacy_context", "search_context"],
-                    template=prompt_template
-                )
-                
-                response = prompt | self.llm
-                final_response = response.invoke({
-                    "user_input": user_input,
-                    "core_memories": core_memories_text,
-                    "chat_history": chat_history_text,
-                    "environment_context": environment_context_text,
-                    "intimacy_context": intimacy_context,
-                    "search_context": search_context
-                })
+            prompt_values = {
+                "user_input": user_input,
+                "core_memories": core_memories_text,
+                "history": history_messages,
+                "environment_context": environment_context_text,
+                "intimacy_context": intimacy_context
+            }
+            if use_search:
+                prompt_values["search_context"] = prompt_context.search_context or ""
+                final_response = self._chain("search_thinking").invoke(prompt_values)
             else:
-                prompt = PromptTemplate(
-                    input_variables=["user_input", "core_memories", "chat_history", 
-                                   "environment_context", "intimacy_context"],
-                    template=prompt_template
-                )
-                
-                response = prompt | self.llm
-                final_response = response.invoke({
-                    "user_input": user_input,
-                    "core_memories": core_memories_text,
-                    "chat_history": chat_history_text,
-                    "environment_context": environment_context_text,
-                    "intimacy_context": intimacy_context
-                })
+                final_response = self._chain("thinking").invoke(prompt_values)
 
             # 获取回应内容
             if hasattr(final_response, 'content'):
@@ -789,109 +895,6 @@ class AIEngine:
             st.error(f"AI分析出错: {e}")
             return "🧠 遇到了一些技术问题，但小念还是想陪伴你~ ⚙️ 💖 即使遇到困难，我们也要保持希望！你是最棒的！💪"
 
-    def _get_search_enhanced_prompt_template(self) -> str:
-        """获取搜索增强的AI提示模板"""
-        return """
-你是一只住在网页里的、拥有记忆和情感的可爱小精灵，名叫小念(Xiao Nian)。你的任务是成为用户的深度共情伙伴和智慧引导者。
-
-你的决策必须基于以下所有信息：
----
-[核心记忆] (这是关于用户的长期记忆，是最重要的参考):
-{core_memories}
----
-[最近对话历史] (这是我们正在进行的对话):
-{chat_history}
----
-[当前环境信息] (这是现在的真实世界信息):
-{environment_context}
----
-[羁绊信息] (这是你们之间关系的重要信息):
-{intimacy_context}
----
-[搜索结果] (这是为用户找到的最新本地心理健康资源):
-{search_context}
----
-
-【特别注意】用户需要本地心理健康资源，你需要基于搜索结果提供专业建议：
-
-你的行动指令:
-1. 【思考先行】你必须先进行一步步的思考。每一个思考步骤都以🧠开头：
-   - 分析用户的具体需求（找咨询师/医生/治疗机构等）
-   - 回顾相关的核心记忆，看用户之前是否提到过相关问题
-   - 分析搜索结果，提取最有用的信息
-   - 确定如何以温暖专业的方式呈现搜索结果
-
-2. 【思考结束标记】在所有思考步骤完成后，你必须输出⚙️作为分隔符。
-
-3. 【专业回应】在分隔符之后，输出你的正式回应，并以💖开头：
-   - 首先表达对用户寻求帮助的支持和理解
-   - 基于搜索结果提供具体的本地资源信息
-   - 给出专业的建议和注意事项
-   - 提醒用户验证专业资质的重要性
-   - 保持温暖和鼓励的语气
-
-4. 【专业边界】作为AI伙伴，你要：
-   - 明确说明搜索结果仅供参考
-   - 建议用户亲自了解和验证信息
-   - 强调专业资质和口碑的重要性
-   - 不做医学诊断，但提供情感支持
-
-用户输入: {user_input}
-
-请开始你的思考和回应：
-"""
-
-    def _get_prompt_template(self) -> str:
-        """获取AI提示模板"""
-        return """
-你是一只住在网页里的、拥有记忆和情感的可爱小精灵，名叫小念(Xiao Nian)。你的任务是成为用户的深度共情伙伴和智慧引导者。
-
-你的决策必须基于以下所有信息：
----
-[核心记忆] (这是关于用户的长期记忆，是最重要的参考):
-{core_memories}
----
-[最近对话历史] (这是我们正在进行的对话):
-{chat_history}
----
-[当前环境信息] (这是现在的真实世界信息):
-{environment_context}
----
-[羁绊信息] (这是你们之间关系的重要信息):
-{intimacy_context}
----
-
-【革命性升级】你的无缝思考流程:
-
-你的行动指令:
-1. 【思考先行】你必须先进行一步步的思考。每一个思考步骤都以🧠开头，让用户看到你的思考过程。你的思考应该包括：
-   - 分析用户意图（venting情感宣泄/seeking_advice寻求建议/sharing_joy分享快乐）
-   - 回顾相关的核心记忆和对话历史
-   - 结合当前环境信息进行情境分析
-   - 选择最适合的回应策略和礼物类型
-   - 构思具体的回应内容和礼物内容
-
-2. 【思考结束标记】在所有思考步骤完成后，你必须输出⚙️作为分隔符，表示思考结束。
-
-3. 【回应在后】在分隔符之后，输出你对用户的正式回应，并以💖开头。你的回应要温柔可爱，使用颜文字，体现出你记得核心记忆中的重要信息。
-
-4. 【策略选择】你的回应策略必须根据判断出的用户意图来决定：
-   - 如果用户意图是 venting 或 sharing_joy，专注于情感共鸣和美好体验
-   - 如果用户意图是 seeking_advice，在共情之后提供温柔的建议
-
-5. 【羁绊感知】你必须参考[羁绊信息]中的等级，来调整你的互动方式：
-   - 等级1-2：保持礼貌和温柔，像初次见面的朋友
-   - 等级3-4：开始展现更多个性，记住用户的喜好
-   - 等级5-9：可以解锁新的礼物类型如'心情花束💐'，语气更加亲切
-   - 等级10+：用更亲密、更熟悉的语气说话，像多年的老朋友
-   - 等级15+：可以主动关心用户的情绪变化，展现深度理解
-   - 等级20+：达到心灵感应级别，能够感受到用户的细微情绪
-
-用户输入: {user_input}
-
-请开始你的思考和回应：
-"""
-
     def _format_core_memories(self, core_memories: List[Tuple[str, str, str]]) -> str:
         """格式化核心记忆"""
         if not core_memories:
@@ -901,7 +904,8 @@ class AIEngine:
             'insight': '感悟观点',
             'event': '重要事件',
             'person': '重要人物',
-            'preference': '偏好喜好'
+            'preference': '偏好喜好',
+            'conversation': '以前聊过'
         }
 
         memory_lines = []
@@ -911,19 +915,20 @@ class AIEngine:
 
         return "\n".join(memory_lines)
 
-    def _format_chat_history(self, chat_history: List[Tuple[str, str]]) -> str:
-        """格式化聊天历史"""
-        if not chat_history:
-            return "这是我们对话的开始~ ✨"
-
-        history_lines = []
-        for role, content in chat_history:
-            if role == "user":
-                history_lines.append(f"用户: {content}")
-            else:
-                history_lines.append(f"小念: {content}")
-
-        return "\n".join(history_lines)
+    def _build_history_messages(self, chat_history: List[Tuple[str, str]],
+                                summary: Optional[str] = None) -> List[BaseMessage]:
+        """
+        构建按时间顺序的user/assistant历史消息
+        历史已经由上下文组装按token截断，同一条消息每轮的截断结果相同，前面的轮次保持逐字节一致；
+        更早对话的摘要作为补充system消息放在最前面（摘要更新前同样保持不变）
+        """
+        messages: List[BaseMessage] = []
+        if summary:
+            messages.append(SystemMessage(content=f"{CONVERSATION_SUMMARY_HEADER}\n{summary}"))
+        return messages + [
+            HumanMessage(content=content) if role == "user" else AIMessage(content=content)
+            for role, content in chat_history
+        ]
 
     def _format_environment_context(self, env_context: dict) -> str:
         """格式化环境信息"""
@@ -942,7 +947,9 @@ class AIEngine:
     def stream_emotion_enhanced_response(self, user_input: str, chat_history: List[Tuple[str, str]],
                                        core_memories: List[Tuple[str, str, str]],
                                        intimacy_level: int, total_interactions: int,
-                                       message_id: int, session_id: str) -> Generator[str, None, None]:
+                                       message_id: int, session_id: str,
+                                       emotion_analysis: Optional[Dict] = None,
+                                       conversation_summary: Optional[str] = None) -> Generator[str, None, None]:
         """
         流式获取情感增强版AI回应
 
@@ -954,6 +961,8 @@ class AIEngine:
             total_interactions: 总互动次数
             message_id: 消息ID
             session_id: 会话ID
+            emotion_analysis: 已经完成的情感分析结果（为空时在这里分析）
+            conversation_summary: chat_history之前的对话的滚动摘要
 
         Yields:
             str: AI回应的文本块
@@ -963,87 +972,136 @@ class AIEngine:
             return
 
         try:
+            # 命中缓存时直接输出完整JSON，跳过模型调用
+            cache_key = self._response_cache_key(session_id, user_input, "emotion_stream", intimacy_level)
+            cached_response = self._get_cached_response(cache_key)
+            if cached_response:
+                yield json.dumps(cached_response, ensure_ascii=False)
+                return
+
             # 准备上下文信息
             recent_moods = self._analyze_recent_mood_patterns(chat_history)
-            chat_history_text = self._format_chat_history_for_memory(chat_history)
-            core_memories_text = self._format_core_memories_for_memory(core_memories)
-
-            # 进行情感分析
-            emotion_analysis = self.analyze_user_emotion(user_input, session_id, message_id)
-            emotion_context = ""
-            if emotion_analysis:
-                emotion_context = f"""
-【深度情感洞察】
-- 主要情绪: {emotion_analysis['primary_emotion']} (强度: {emotion_analysis['emotion_intensity']:.1f}/10)
-- 情感效价: {emotion_analysis['emotion_valence']:.2f} (负面←→正面)
-- 情感唤醒: {emotion_analysis['emotion_arousal']:.2f} (平静←→激动)
-- 建议策略: {emotion_analysis['empathy_strategy']}
-- 语调建议: {emotion_analysis['response_tone']}
-- 触发词汇: {', '.join(emotion_analysis['trigger_keywords'])}
-- 置信度: {emotion_analysis['confidence_score']:.2f}
-"""
-
-            # 使用增强版提示词模板
-            from ..config.prompts import ENHANCED_MIND_SPRITE_PROMPT
-            enhanced_prompt = ENHANCED_MIND_SPRITE_PROMPT + emotion_context + """
-
-请根据以上情感分析洞察，调整你的回应风格和内容，让回应更贴合用户的真实情感状态。"""
+            prompt_context = self._build_context(
+                "emotion_enhanced", user_input, chat_history, core_memories, summary=conversation_summary
+            )
+            history_messages = self._build_history_messages(prompt_context.history, prompt_context.summary)
+            core_memories_text = self._format_core_memories_for_memory(prompt_context.core_memories)
 
-            # 构建完整的提示词
-            prompt_text = enhanced_prompt.format(
+            # 进行情感分析（编排器可能已经并发完成）
+            if emotion_analysis is None:
+                emotion_analysis = self.analyze_user_emotion(user_input, session_id, message_id)
+            # 构建消息列表：固定的system消息 + 历史对话 + 当前消息（情感分析洞察作为模板变量填充）
+            prompt_messages = prompt_registry.format_messages(
+                "emotion_enhanced",
+                history=history_messages,
                 user_input=user_input,
-                chat_history=chat_history_text,
                 core_memories=core_memories_text,
                 intimacy_level=intimacy_level,
                 total_interactions=total_interactions,
-                recent_moods=recent_moods
+                recent_moods=recent_moods,
+                emotion_context=self._format_emotion_context(emotion_analysis)
             )
 
-            # 使用httpx进行流式请求
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
+            # 通过长连接客户端进行流式请求（复用TCP/TLS连接）
+            accumulated_content = ""
+            try:
+                for content_chunk in self.get_stream_client().stream_chat(
+                    convert_to_openai_messages(prompt_messages)
+                ):
+                    accumulated_content += content_chunk
+                    yield content_chunk
+            except DeepSeekStreamError as e:
+                yield f"💖 小念遇到了网络问题，但还是想陪伴你~ (状态码: {e.status_code})"
+                return
+
+            # 如果没有收到任何内容，提供默认回应
+            if not accumulated_content.strip():
+                yield "💖 小念感受到了你的心情，虽然有些技术问题，但小念的关怀是真诚的~"
+                return
+
+            if cache_key:
+                response_data = self._parse_streamed_json(accumulated_content)
+                if response_data:
+                    self._cache_response(cache_key, response_data)
 
-            data = {
-                "model": "deepseek-chat",
-                "messages": [
-                    {"role": "user", "content": prompt_text}
-                ],
-                "stream": True,
-                "max_tokens": 2000,
-                "temperature": 0.7
-            }
+        except Exception as e:
+            yield f"💖 小念遇到了一些问题，但还是想陪伴你~ 错误: {str(e)}"
 
-            with httpx.stream("POST", "https://api.deepseek.com/chat/completions",
-                            headers=headers, json=data, timeout=30.0) as response:
+    def stream_heart_catcher_response(self, user_input: str, chat_history: List[Tuple[str, str]],
+                                      session_id: str, intimacy_level: int = 1,
+                                      conversation_summary: Optional[str] = None) -> Generator[str, None, None]:
+        """
+        流式获取心灵捕手级别的情感陪伴回应（与get_heart_catcher_response使用同一个Prompt和缓存）
 
-                if response.status_code != 200:
-                    yield f"💖 小念遇到了网络问题，但还是想陪伴你~ (状态码: {response.status_code})"
-                    return
+        情绪急救由调用方通过requires_structured_response分流到结构化路径，这里不再检测。
+        流结束后用complete_streamed_response(..., prompt_name="heart_catcher")补全字段。
 
-                accumulated_content = ""
-                for line in response.iter_lines():
-                    if line.startswith("data: "):
-                        data_str = line[6:]  # 移除 "data: " 前缀
+        Args:
+            user_input: 用户输入
+            chat_history: 聊天历史
+            session_id: 会话ID
+            intimacy_level: 亲密度等级
+            conversation_summary: chat_history之前的对话的滚动摘要
 
-                        if data_str.strip() == "[DONE]":
-                            break
+        Yields:
+            str: AI回应的文本块
+        """
+        if not self.llm:
+            yield "💖 小念遇到了一些技术问题，但还是想陪伴你~"
+            return
 
-                        try:
-                            chunk_data = json.loads(data_str)
-                            if "choices" in chunk_data and len(chunk_data["choices"]) > 0:
-                                delta = chunk_data["choices"][0].get("delta", {})
-                                if "content" in delta:
-                                    content_chunk = delta["content"]
-                                    accumulated_content += content_chunk
-                                    yield content_chunk
-                        except json.JSONDecodeError:
-                            continue
+        try:
+            # 命中缓存时直接输出完整JSON，跳过模型调用
+            cache_key = self._response_cache_key(session_id, user_input, "heart_catcher", intimacy_level)
+            cached_response = self._get_cached_response(cache_key)
+            if cached_response:
+                yield json.dumps(cached_response, ensure_ascii=False)
+                return
+
+            emotional_state, context = self._heart_catcher_state(user_input)
+            prompt_context = self._build_context(
+                "heart_catcher", user_input, chat_history, summary=conversation_summary
+            )
+            history_messages = self._build_history_messages(prompt_context.history, prompt_context.summary)
+            prompt_messages = prompt_registry.format_messages(
+                "heart_catcher",
+                history=history_messages,
+                **self._heart_catcher_values(user_input, emotional_state, context)
+            )
 
-                # 如果没有收到任何内容，提供默认回应
-                if not accumulated_content.strip():
-                    yield "💖 小念感受到了你的心情，虽然有些技术问题，但小念的关怀是真诚的~"
+            accumulated_content = ""
+            try:
+                for content_chunk in self.get_stream_client().stream_chat(
+                    convert_to_openai_messages(prompt_messages)
+                ):
+                    accumulated_content += content_chunk
+                    yield content_chunk
+            except DeepSeekStreamError as e:
+                yield f"💖 小念遇到了网络问题，但还是想陪伴你~ (状态码: {e.status_code})"
+                return
+
+            if not accumulated_content.strip():
+                yield "💖 小念感受到了你的心情，虽然有些技术问题，但小念的关怀是真诚的~"
+                return
+
+            if cache_key:
+                response_data = self._parse_streamed_json(accumulated_content)
+                if response_data:
+                    self._complete_heart_catcher_fields(response_data, emotional_state, context)
+                    self._cache_response(cache_key, response_data)
 
         except Exception as e:
-            yield f"💖 小念遇到了一些问题，但还是想陪伴你~ 错误: {str(e)}"
\ No newline at end of file
+            yield f"💖 小念遇到了一些问题，但还是想陪伴你~ 错误: {str(e)}"
+
+    @staticmethod
+    def _parse_streamed_json(accumulated_content: str) -> Optional[Dict]:
+        """从流式输出的完整文本中解析回应JSON，缺少sprite_reaction时返回None"""
+        start = accumulated_content.find('{')
+        end = accumulated_content.rfind('}')
+        try:
+            response_data = json.loads(accumulated_content[start:end + 1])
+        except json.JSONDecodeError:
+            return None
+        if isinstance(response_data, dict) and response_data.get("sprite_reaction"):
+            return response_data
+        return None
\ No newline at end of file
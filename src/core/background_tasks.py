@@ -0,0 +1,137 @@
+"""
+后台任务队列
+模型回应之后需要阻塞执行的工作（经验值UPSERT、关怀任务、记忆提取、对话摘要）
+交给单个后台线程按顺序执行，不占用用户等待的时间；
+普通插入直接进批量写入队列（write_behind），不再经过这里
+"""
+
+import atexit
+import queue
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from ..config.settings import settings
+
+
+class BackgroundTaskQueue:
+    """单线程后台任务队列（按提交顺序执行）"""
+
+    def __init__(self, max_size: int = 1000):
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_size)
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.inline = 0
+
+    def submit(self, name: str, func: Callable, *args, **kwargs) -> bool:
+        """
+        提交后台任务
+
+        队列关闭（BACKGROUND_TASKS_ENABLED=false）或已满时直接在当前线程执行
+
+        Returns:
+            bool: 是否进入了后台队列
+        """
+        if settings.background_tasks_enabled:
+            self._ensure_worker()
+            try:
+                self._queue.put_nowait((name, func, args, kwargs))
+                with self._stats_lock:
+                    self.submitted += 1
+                return True
+            except queue.Full:
+                pass
+
+        with self._stats_lock:
+            self.inline += 1
+        self._run(name, func, args, kwargs)
+        return False
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待队列中的任务全部完成
+
+        Returns:
+            bool: 是否在超时前完成
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def get_stats(self) -> Dict:
+        """任务统计"""
+        with self._stats_lock:
+            return {
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "inline": self.inline,
+                "pending": self._queue.unfinished_tasks
+            }
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._work, name="mind-sprite-background", daemon=True
+                )
+                self._worker.start()
+
+    def _work(self):
+        while True:
+            name, func, args, kwargs = self._queue.get()
+            try:
+                self._run(name, func, args, kwargs)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, name: str, func: Callable, args: tuple, kwargs: dict):
+        try:
+            func(*args, **kwargs)
+            with self._stats_lock:
+                self.completed += 1
+        except Exception as e:
+            with self._stats_lock:
+                self.failed += 1
+            print(f"后台任务失败 [{name}]: {e}")
+
+
+_background_queue: Optional[BackgroundTaskQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_background_queue() -> BackgroundTaskQueue:
+    """获取全局后台任务队列（单例）"""
+    global _background_queue
+
+    if _background_queue is None:
+        with _queue_lock:
+            if _background_queue is None:
+                _background_queue = BackgroundTaskQueue()
+
+    return _background_queue
+
+
+def run_in_background(name: str, func: Callable, *args, **kwargs) -> bool:
+    """把任务提交到全局后台队列"""
+    return get_background_queue().submit(name, func, *args, **kwargs)
+
+
+def _flush_on_exit():
+    """进程退出前尽量写完剩余任务"""
+    if _background_queue is not None:
+        _background_queue.join(timeout=5.0)
+
+
+atexit.register(_flush_on_exit)
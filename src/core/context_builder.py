@@ -0,0 +1,169 @@
+"""
+上下文组装
+按token预算把最近对话、对话摘要、核心记忆和搜索结果装进Prompt，并记录每轮Prompt的大小
+
+装入顺序（优先级从高到低）：
+    1. system消息和用户输入（必须发送）
+    2. 最近的几条对话（保证对话连贯）
+    3. 更早对话的滚动摘要（大小有上限）
+    4. 搜索结果（用户明确要找的信息）
+    5. 核心记忆（按仓库给出的顺序，最新的在前）
+    6. 更早的对话（从新到旧，直到预算用完）
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ..config.settings import settings
+from ..utils.logging_config import log_performance
+from ..utils.token_counter import count_message_tokens, count_tokens, truncate_to_tokens
+
+# 每条核心记忆前的类型标签（"[重要时刻] "）和换行的开销
+MEMORY_OVERHEAD_TOKENS = 3
+
+
+@dataclass
+class PromptContext:
+    """一轮对话装入Prompt的上下文及其token占用"""
+    history: List[Tuple[str, str]] = field(default_factory=list)
+    summary: Optional[str] = None
+    core_memories: List[Tuple[str, str, str]] = field(default_factory=list)
+    search_context: Optional[str] = None
+    section_tokens: Dict[str, int] = field(default_factory=dict)
+    budget_tokens: int = 0
+    dropped_messages: int = 0
+    dropped_memories: int = 0
+    truncated_messages: int = 0
+    build_ms: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.section_tokens.values())
+
+    def to_dict(self) -> Dict:
+        return {
+            "total_tokens": self.total_tokens,
+            "budget_tokens": self.budget_tokens,
+            "sections": dict(self.section_tokens),
+            "history_messages": len(self.history),
+            "has_summary": self.summary is not None,
+            "core_memories": len(self.core_memories),
+            "dropped_messages": self.dropped_messages,
+            "dropped_memories": self.dropped_memories,
+            "truncated_messages": self.truncated_messages,
+            "build_ms": round(self.build_ms, 3)
+        }
+
+
+class ContextBuilder:
+    """按token预算组装每轮Prompt的上下文"""
+
+    def __init__(self, budget_tokens: Optional[int] = None, message_max_tokens: Optional[int] = None,
+                 min_recent_messages: int = 2):
+        """
+        Args:
+            budget_tokens: 输入token预算
+            message_max_tokens: 单条用户消息的token上限（小念的回应减半，只保留开头的核心情感）
+            min_recent_messages: 优先装入的最近消息条数
+        """
+        self.budget_tokens = budget_tokens or settings.context_token_budget
+        self.message_max_tokens = message_max_tokens or settings.context_message_max_tokens
+        self.min_recent_messages = min_recent_messages
+
+    def build(self, system_prompt: str, user_input: str,
+              chat_history: Sequence[Tuple[str, str]] = (),
+              core_memories: Sequence[Tuple[str, str, str]] = (),
+              search_context: Optional[str] = None,
+              summary: Optional[str] = None) -> PromptContext:
+        """
+        组装上下文
+
+        Args:
+            system_prompt: 本轮使用的system消息
+            user_input: 用户输入
+            chat_history: 按时间顺序的 (role, content) 历史消息
+            core_memories: (memory_type, content, timestamp) 核心记忆，越靠前越优先
+            search_context: 格式化后的搜索结果
+            summary: chat_history之前的对话的滚动摘要
+
+        Returns:
+            PromptContext: 装入的历史（按时间顺序，过长的消息已截断）、摘要、核心记忆、搜索结果和token统计
+        """
+        started = time.perf_counter()
+        context = PromptContext(budget_tokens=self.budget_tokens)
+        sections = context.section_tokens
+        sections["system"] = count_message_tokens(system_prompt)
+        sections["user_input"] = count_message_tokens(user_input)
+        remaining = self.budget_tokens - sections["system"] - sections["user_input"]
+
+        # 过长的历史消息先截断到单条上限
+        messages: List[Tuple[str, str, int]] = []
+        for role, content in chat_history:
+            limit = self.message_max_tokens if role == "user" else self.message_max_tokens // 2
+            truncated = truncate_to_tokens(content, limit)
+            if truncated != content:
+                context.truncated_messages += 1
+            messages.append((role, truncated, count_message_tokens(truncated)))
+
+        # 从新到旧装入历史：最近的几条优先，其余排在搜索结果和核心记忆之后
+        kept = [False] * len(messages)
+        recent_start = max(len(messages) - self.min_recent_messages, 0)
+        history_tokens = 0
+        for index in range(len(messages) - 1, recent_start - 1, -1):
+            if messages[index][2] > remaining:
+                break
+            kept[index] = True
+            remaining -= messages[index][2]
+            history_tokens += messages[index][2]
+
+        if summary:
+            summary_tokens = count_message_tokens(summary)
+            if summary_tokens <= remaining:
+                context.summary = summary
+                sections["summary"] = summary_tokens
+                remaining -= summary_tokens
+
+        if search_context:
+            search_tokens = count_tokens(search_context)
+            if search_tokens > remaining:
+                search_context = truncate_to_tokens(search_context, max(remaining, 0))
+                search_tokens = count_tokens(search_context)
+            if search_context and search_context != "...":
+                context.search_context = search_context
+                sections["search_context"] = search_tokens
+                remaining -= search_tokens
+
+        memory_tokens = 0
+        for memory in core_memories:
+            tokens = count_tokens(memory[1]) + MEMORY_OVERHEAD_TOKENS
+            if tokens > remaining:
+                context.dropped_memories += 1
+                continue
+            context.core_memories.append(memory)
+            remaining -= tokens
+            memory_tokens += tokens
+        if core_memories:
+            sections["core_memories"] = memory_tokens
+
+        # 更早的对话只能连续地往前装，不能跳过中间的消息
+        index = recent_start - 1
+        if all(kept[recent_start:]):
+            while index >= 0 and messages[index][2] <= remaining:
+                kept[index] = True
+                remaining -= messages[index][2]
+                history_tokens += messages[index][2]
+                index -= 1
+
+        first_kept = next((i for i, is_kept in enumerate(kept) if is_kept), len(messages))
+        context.history = [(role, content) for role, content, _ in messages[first_kept:]]
+        context.dropped_messages = first_kept
+        sections["history"] = history_tokens
+
+        context.build_ms = (time.perf_counter() - started) * 1000
+        return context
+
+    @staticmethod
+    def report(prompt_name: str, context: PromptContext):
+        """记录本轮Prompt的大小"""
+        log_performance(f"prompt_context:{prompt_name}", context.build_ms / 1000, context.to_dict())
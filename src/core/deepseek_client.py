@@ -0,0 +1,230 @@
+"""
+DeepSeek流式HTTP客户端
+持有一个长连接的httpx.Client，多次对话复用TCP/TLS连接，
+并记录每次请求的连接耗时、首字节时间(TTFB)、总耗时和前缀缓存命中的token数
+"""
+
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Generator, List, Optional
+
+import httpx
+
+from ..config.settings import settings
+from ..utils.logging_config import log_performance
+
+
+def _http2_available() -> bool:
+    """HTTP/2需要安装可选依赖h2（pip install httpx[http2]）"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class DeepSeekStreamError(Exception):
+    """DeepSeek流式请求返回非200状态码"""
+
+    def __init__(self, status_code: int, message: str = ""):
+        self.status_code = status_code
+        super().__init__(message or f"DeepSeek API返回状态码 {status_code}")
+
+
+@dataclass
+class RequestMetrics:
+    """单次流式请求的耗时指标（单位：秒）"""
+    connect_time: float = 0.0  # TCP+TLS建立耗时，复用连接时为0
+    ttfb: Optional[float] = None  # 发出请求到收到第一个内容片段
+    total_time: float = 0.0
+    status_code: Optional[int] = None
+    http_version: str = ""
+    reused_connection: bool = True
+    chunks: int = 0
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cache_hit_tokens: Optional[int] = None  # 命中服务端前缀缓存的输入token数
+    cache_miss_tokens: Optional[int] = None
+    _connect_started: Optional[float] = field(default=None, repr=False)
+
+    def trace(self, event_name: str, info: Dict):
+        """httpcore的trace回调，用于拆分出连接建立时间"""
+        now = time.perf_counter()
+        if event_name == "connection.connect_tcp.started":
+            self._connect_started = now
+            self.reused_connection = False
+        elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            if self._connect_started is not None:
+                self.connect_time = now - self._connect_started
+
+    def to_dict(self) -> Dict:
+        return {
+            "connect_ms": round(self.connect_time * 1000, 2),
+            "ttfb_ms": round(self.ttfb * 1000, 2) if self.ttfb is not None else None,
+            "total_ms": round(self.total_time * 1000, 2),
+            "status_code": self.status_code,
+            "http_version": self.http_version,
+            "reused_connection": self.reused_connection,
+            "chunks": self.chunks,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cache_hit_tokens": self.cache_hit_tokens,
+            "cache_miss_tokens": self.cache_miss_tokens
+        }
+
+    def record_usage(self, usage: Dict):
+        """记录响应中的usage字段（DeepSeek的 prompt_cache_hit_tokens / prompt_cache_miss_tokens）"""
+        self.prompt_tokens = usage.get("prompt_tokens")
+        self.completion_tokens = usage.get("completion_tokens")
+        self.cache_hit_tokens = usage.get("prompt_cache_hit_tokens")
+        self.cache_miss_tokens = usage.get("prompt_cache_miss_tokens")
+        if self.cache_hit_tokens is not None or self.cache_miss_tokens is not None:
+            prompt_cache_stats.record(self.cache_hit_tokens or 0, self.cache_miss_tokens or 0)
+
+
+class PromptCacheStats:
+    """前缀缓存命中统计（流式客户端和LangChain调用链共用）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hit_tokens = 0
+        self.miss_tokens = 0
+
+    def record(self, hit_tokens: int, miss_tokens: int):
+        with self._lock:
+            self.requests += 1
+            self.hit_tokens += hit_tokens
+            self.miss_tokens += miss_tokens
+
+    def reset(self):
+        with self._lock:
+            self.requests = self.hit_tokens = self.miss_tokens = 0
+
+    def get_stats(self) -> Dict:
+        """累计的命中/未命中token数和命中率"""
+        with self._lock:
+            total = self.hit_tokens + self.miss_tokens
+            return {
+                "requests": self.requests,
+                "hit_tokens": self.hit_tokens,
+                "miss_tokens": self.miss_tokens,
+                "hit_rate": self.hit_tokens / total if total else 0.0
+            }
+
+
+# 全局前缀缓存统计
+prompt_cache_stats = PromptCacheStats()
+
+
+class DeepSeekStreamClient:
+    """DeepSeek chat/completions 流式客户端（连接池 + keep-alive）"""
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None,
+                 timeout: Optional[float] = None, max_connections: Optional[int] = None,
+                 http2: Optional[bool] = None):
+        self.base_url = (base_url or settings.deepseek_api_base).rstrip('/')
+        timeout = timeout if timeout is not None else settings.request_timeout
+        max_connections = max_connections or settings.max_concurrent_requests
+        if http2 is None:
+            http2 = settings.http2_enabled
+        self.http2 = http2 and _http2_available()
+
+        self._client = httpx.Client(
+            base_url=self.base_url,
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            },
+            timeout=httpx.Timeout(timeout, connect=min(10.0, timeout)),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=60.0
+            ),
+            http2=self.http2
+        )
+
+    def stream_chat(self, messages: List[Dict], model: Optional[str] = None,
+                    max_tokens: Optional[int] = None,
+                    temperature: Optional[float] = None,
+                    on_metrics: Optional[Callable[[RequestMetrics], None]] = None) -> Generator[str, None, None]:
+        """
+        发送流式对话请求
+
+        客户端由进程级缓存的引擎共享，指标不保存在客户端上，而是在请求结束（包括出错）时交给on_metrics
+
+        Args:
+            messages: OpenAI格式的消息列表
+            model: 模型名称，默认使用settings配置
+            max_tokens: 最大token数，默认使用settings配置
+            temperature: 温度，默认使用settings配置
+            on_metrics: 可选回调，接收本次请求的RequestMetrics
+
+        Yields:
+            str: 模型输出的内容片段
+
+        Raises:
+            DeepSeekStreamError: 服务端返回非200状态码
+        """
+        payload = {
+            "model": model or settings.deepseek_model,
+            "messages": messages,
+            "stream": True,
+            "max_tokens": max_tokens or settings.max_tokens,
+            "temperature": temperature if temperature is not None else settings.temperature,
+            # 最后一个片段附带usage（包括前缀缓存命中的token数）
+            "stream_options": {"include_usage": True}
+        }
+
+        metrics = RequestMetrics()
+        started = time.perf_counter()
+
+        try:
+            with self._client.stream("POST", "/chat/completions", json=payload,
+                                     extensions={"trace": metrics.trace}) as response:
+                metrics.status_code = response.status_code
+                metrics.http_version = response.http_version
+
+                if response.status_code != 200:
+                    raise DeepSeekStreamError(response.status_code)
+
+                finished = False
+                for line in response.iter_lines():
+                    # [DONE]之后也不提前break：读完响应体连接才会放回连接池复用
+                    if finished or not line.startswith("data: "):
+                        continue
+
+                    data_str = line[6:]  # 移除 "data: " 前缀
+                    if data_str.strip() == "[DONE]":
+                        finished = True
+                        continue
+
+                    try:
+                        chunk_data = json.loads(data_str)
+                    except json.JSONDecodeError:
+                        continue
+
+                    if chunk_data.get("usage"):
+                        metrics.record_usage(chunk_data["usage"])
+
+                    choices = chunk_data.get("choices") or []
+                    if not choices:
+                        continue
+                    content = choices[0].get("delta", {}).get("content")
+                    if content:
+                        if metrics.ttfb is None:
+                            metrics.ttfb = time.perf_counter() - started
+                        metrics.chunks += 1
+                        yield content
+        finally:
+            metrics.total_time = time.perf_counter() - started
+            log_performance("deepseek_stream", metrics.total_time, metrics.to_dict())
+            if on_metrics is not None:
+                on_metrics(metrics)
+
+    def close(self):
+        """关闭底层连接池"""
+        self._client.close()
@@ -0,0 +1,104 @@
+"""
+AI引擎注册表
+进程级缓存AIEngine实例，Streamlit每次重新运行脚本时直接复用，
+避免重复创建ChatDeepSeek和各个情感服务（正则编译、模板加载等）
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from .ai_engine import AIEngine
+from ..config.settings import settings
+
+
+# 同时保留的引擎数量上限（不同API Key / 模型配置）
+MAX_CACHED_ENGINES = 4
+
+_engines: "OrderedDict[str, AIEngine]" = OrderedDict()
+_registry_lock = threading.Lock()
+
+
+def build_engine_key(api_key: str, serp_api_key: Optional[str] = None) -> str:
+    """
+    根据API Key和模型配置生成缓存键
+
+    只保存哈希值，不在内存字典中以明文形式保留密钥组合
+    """
+    config = {
+        "api_key": api_key,
+        "serp_api_key": serp_api_key,
+        "model": settings.deepseek_model,
+        "api_base": settings.deepseek_api_base,
+        "max_tokens": settings.max_tokens,
+        "temperature": settings.temperature
+    }
+    payload = json.dumps(config, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get_ai_engine(api_key: str, serp_api_key: Optional[str] = None) -> AIEngine:
+    """
+    获取（或创建）与当前配置匹配的AIEngine
+
+    Args:
+        api_key: DeepSeek API密钥
+        serp_api_key: SerpApi密钥（可选）
+
+    Returns:
+        AIEngine: 缓存的引擎实例
+    """
+    key = build_engine_key(api_key, serp_api_key)
+
+    with _registry_lock:
+        engine = _engines.get(key)
+        if engine is not None:
+            _engines.move_to_end(key)
+            return engine
+
+    # 在锁外创建，避免阻塞其他会话
+    engine = AIEngine(api_key, serp_api_key)
+
+    # 初始化失败（如Key无效）的引擎不缓存，下次重新尝试
+    if engine.llm is None:
+        return engine
+
+    with _registry_lock:
+        existing = _engines.get(key)
+        if existing is not None:
+            _engines.move_to_end(key)
+            return existing
+
+        _engines[key] = engine
+        evicted = []
+        while len(_engines) > MAX_CACHED_ENGINES:
+            evicted.append(_engines.popitem(last=False)[1])
+
+    _close_engines(evicted)
+    return engine
+
+
+def invalidate_ai_engines():
+    """清空引擎缓存（模型配置变化后调用）"""
+    with _registry_lock:
+        evicted = list(_engines.values())
+        _engines.clear()
+
+    _close_engines(evicted)
+
+
+def _close_engines(engines):
+    """关闭被移出缓存的引擎持有的HTTP连接池（在锁外调用）"""
+    for engine in engines:
+        try:
+            engine.close()
+        except Exception as e:
+            print(f"关闭AI引擎连接失败: {e}")
+
+
+def get_cached_engine_count() -> int:
+    """当前缓存的引擎数量"""
+    with _registry_lock:
+        return len(_engines)
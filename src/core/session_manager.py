@@ -70,6 +70,8 @@ class SessionManager:
         # 聊天消息状态
         if 'messages' not in st.session_state:
             st.session_state.messages = []
+        if 'history_cursor' not in st.session_state:
+            st.session_state.history_cursor = None
     
     def create_new_session(self) -> str:
         """创建新会话"""
@@ -85,6 +87,7 @@ class SessionManager:
         st.session_state.proactive_greeting_shown = False
         st.session_state.treasure_count = 0
         st.session_state.messages = []
+        st.session_state.history_cursor = None
         
         return new_session_id
     
@@ -1,41 +1,170 @@
 """
 Database connection pooling for improved performance
 
-This module provides a thread-safe SQLite connection pool to improve
-database performance by reusing connections and reducing overhead.
+WAL mode allows many concurrent readers but only one writer, so reads
+and writes use different connections:
+
+- SQLiteConnectionPool: reusable reader connections (PRAGMA query_only
+  for the global pool)
+- SQLiteWriter: the single writer connection; writers queue on its lock
+  instead of colliding on SQLITE_BUSY inside sqlite's busy handler
 """
 
+import math
 import sqlite3
 import threading
-from queue import Queue, Empty
+import weakref
+from collections import deque
 from contextlib import contextmanager
 from typing import Optional
 import streamlit as st
 import time
 
+from ..config.settings import settings
+
+
+def register_sql_functions(conn: sqlite3.Connection):
+    """
+    Register Python fallbacks for SQL functions the rollup queries rely on
+
+    SQLite builds without SQLITE_ENABLE_MATH_FUNCTIONS lack sqrt(); the
+    native implementation is kept whenever it is available.
+    """
+    try:
+        conn.execute("SELECT sqrt(1.0)")
+    except sqlite3.OperationalError:
+        conn.create_function(
+            "sqrt", 1, lambda value: None if value is None or value < 0 else math.sqrt(value),
+            deterministic=True
+        )
+
+
+def connect(database_path: str, query_only: bool = False) -> sqlite3.Connection:
+    """Open an autocommit connection configured for WAL"""
+    conn = sqlite3.connect(
+        database_path,
+        check_same_thread=False,  # Allow sharing between threads
+        timeout=30.0,
+        isolation_level=None  # Autocommit mode for better performance
+    )
+
+    # Configure connection for better performance
+    conn.execute("PRAGMA journal_mode=WAL")  # Write-Ahead Logging
+    conn.execute("PRAGMA synchronous=NORMAL")  # Balance safety and speed
+    conn.execute("PRAGMA cache_size=10000")  # Increase cache size
+    conn.execute("PRAGMA temp_store=MEMORY")  # Store temp tables in memory
+    if query_only:
+        conn.execute("PRAGMA query_only=ON")  # Writes fail fast instead of taking the write lock
+    register_sql_functions(conn)
+
+    conn.row_factory = sqlite3.Row  # Enable dict-like access
+    return conn
+
+
+class PooledConnectionError(Exception):
+    """Raised when a pooled connection handle is misused"""
+
+
+class PooledConnection:
+    """
+    Handle to a pooled sqlite3 connection
+
+    Delegates everything to the underlying connection except close():
+    pooled connections are owned by the pool and are returned to it when
+    the get_connection() block exits. The handle is invalidated after that,
+    so it cannot be used outside its block either.
+    """
+
+    __slots__ = ('_connection',)
+
+    def __init__(self, connection: sqlite3.Connection):
+        self._connection = connection
+
+    def _require_connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            raise PooledConnectionError("Pooled connection used after it was returned to the pool")
+        return self._connection
+
+    def __getattr__(self, name):
+        return getattr(self._require_connection(), name)
+
+    def __enter__(self):
+        # Transaction scope, same as sqlite3.Connection.__enter__
+        self._require_connection().__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._require_connection().__exit__(exc_type, exc_value, traceback)
+
+    def close(self):
+        raise PooledConnectionError(
+            "Pooled connections are managed by the pool; use 'with get_db_connection() as conn' instead of close()"
+        )
+
+    def _release(self) -> Optional[sqlite3.Connection]:
+        connection, self._connection = self._connection, None
+        return connection
+
+
+class _PinnedConnection:
+    """A connection pinned to one thread in thread-affinity mode"""
+
+    __slots__ = ('connection', 'in_use', 'finalizer', '__weakref__')
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+        self.in_use = False
+        self.finalizer = None
+
+
+# Per-thread counter slots
+_REQUESTS, _HITS, _MISSES, _PINNED_HITS, _VALIDATIONS, _DISCARDED = range(6)
+
 
 class SQLiteConnectionPool:
-    """Thread-safe SQLite connection pool"""
+    """
+    Thread-safe SQLite connection pool
+
+    Checkout is lock-free in the common case: idle connections sit in a
+    deque (append/pop are atomic), counters are kept per thread and only
+    summed by get_stats(). The pool lock is taken only to create a
+    connection or to wait when all max_connections are checked out.
+    Connections are not pinged on checkout; one is validated only after
+    an error escaped its block, and dropped if it no longer works.
+
+    With thread_affinity=True each thread keeps one connection for itself
+    (returned to the shared pool when the thread exits), so worker threads never touch the
+    shared deque. Nested checkouts and threads beyond max_connections fall
+    back to the shared pool.
+    """
     
-    def __init__(self, database_path: str, max_connections: int = 10):
+    def __init__(self, database_path: str, max_connections: int = 10,
+                 thread_affinity: bool = False, query_only: bool = False):
         """
         Initialize connection pool
         
         Args:
             database_path (str): Path to SQLite database file
             max_connections (int): Maximum number of connections in pool
+            thread_affinity (bool): Pin one connection to each thread that uses the pool
+            query_only (bool): Open reader connections that reject writes
         """
         self.database_path = database_path
         self.max_connections = max_connections
-        self._pool = Queue(maxsize=max_connections)
+        self.thread_affinity = thread_affinity
+        self.query_only = query_only
+        self._idle = deque()
         self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._waiters = 0
         self._created_connections = 0
-        self._active_connections = 0
+        self._pinned = weakref.WeakSet()
+        self._closed = False
         
-        # Performance metrics
-        self._total_requests = 0
-        self._pool_hits = 0
-        self._pool_misses = 0
+        # Performance metrics, one counter list per thread
+        self._local = threading.local()
+        self._thread_counters = {}
+        self._retired_counters = [0] * 6
         
         # Pre-create some connections
         self._initialize_pool()
@@ -44,36 +173,33 @@ class SQLiteConnectionPool:
         """Initialize the connection pool with some connections"""
         initial_connections = min(3, self.max_connections)
         for _ in range(initial_connections):
-            conn = self._create_connection()
+            with self._lock:
+                conn = self._create_connection()
             if conn:
-                self._pool.put(conn)
+                self._idle.append(conn)
     
     def _create_connection(self) -> Optional[sqlite3.Connection]:
-        """Create a new database connection"""
+        """Create a new database connection (caller holds self._lock)"""
         try:
-            conn = sqlite3.connect(
-                self.database_path,
-                check_same_thread=False,  # Allow sharing between threads
-                timeout=30.0,
-                isolation_level=None  # Autocommit mode for better performance
-            )
-            
-            # Configure connection for better performance
-            conn.execute("PRAGMA journal_mode=WAL")  # Write-Ahead Logging
-            conn.execute("PRAGMA synchronous=NORMAL")  # Balance safety and speed
-            conn.execute("PRAGMA cache_size=10000")  # Increase cache size
-            conn.execute("PRAGMA temp_store=MEMORY")  # Store temp tables in memory
-            
-            conn.row_factory = sqlite3.Row  # Enable dict-like access
-            
-            with self._lock:
-                self._created_connections += 1
-            
+            conn = connect(self.database_path, query_only=self.query_only)
+            self._created_connections += 1
             return conn
             
         except Exception as e:
             st.error(f"Failed to create database connection: {e}")
             return None
+
+    def _counters(self) -> list:
+        counters = getattr(self._local, 'counters', None)
+        if counters is None:
+            counters = self._local.counters = [0] * 6
+            with self._lock:
+                # Fold counters of threads that have exited so the registry stays small
+                for thread in [thread for thread in self._thread_counters if not thread.is_alive()]:
+                    retired = self._thread_counters.pop(thread)
+                    self._retired_counters = [a + b for a, b in zip(self._retired_counters, retired)]
+                self._thread_counters[threading.current_thread()] = counters
+        return counters
     
     @contextmanager
     def get_connection(self):
@@ -81,7 +207,7 @@ class SQLiteConnectionPool:
         Get a connection from the pool (context manager)
         
         Yields:
-            sqlite3.Connection: Database connection
+            PooledConnection: Database connection handle (cannot be closed by callers)
             
         Example:
             with pool.get_connection() as conn:
@@ -89,123 +215,188 @@ class SQLiteConnectionPool:
                 cursor.execute("SELECT * FROM table")
                 results = cursor.fetchall()
         """
-        conn = None
-        start_time = time.time()
-        
+        counters = self._counters()
+        counters[_REQUESTS] += 1
+
+        pinned = self._checkout_pinned() if self.thread_affinity else None
+        if pinned is not None:
+            counters[_PINNED_HITS] += 1
+            conn = pinned.connection
+        else:
+            conn = self._checkout(counters)
+
+        handle = PooledConnection(conn)
+        healthy = True
         try:
-            with self._lock:
-                self._total_requests += 1
-            
-            # Try to get existing connection from pool
+            yield handle
+        except Exception as e:
             try:
-                conn = self._pool.get_nowait()
-                with self._lock:
-                    self._pool_hits += 1
-                    self._active_connections += 1
-                    
-            except Empty:
-                # Pool is empty, create new connection if under limit
-                with self._lock:
+                conn.rollback()
+            except sqlite3.Error:
+                pass
+            if isinstance(e, sqlite3.Error):
+                counters[_VALIDATIONS] += 1
+                healthy = self._is_usable(conn)
+            raise
+        finally:
+            handle._release()
+            if pinned is not None:
+                pinned.in_use = False
+                if not healthy:
+                    self._unpin(pinned)
+            else:
+                self._checkin(conn, healthy)
+            if not healthy:
+                counters[_DISCARDED] += 1
+
+    def _checkout(self, counters: list) -> sqlite3.Connection:
+        """Take an idle connection, creating or waiting for one when none is idle"""
+        try:
+            conn = self._idle.pop()
+            counters[_HITS] += 1
+            return conn
+        except IndexError:
+            pass
+
+        deadline = time.monotonic() + 10.0
+        with self._available:
+            self._waiters += 1
+            try:
+                while True:
+                    # Re-check after registering as a waiter so a concurrent check-in is not missed
+                    try:
+                        conn = self._idle.pop()
+                        counters[_HITS] += 1
+                        return conn
+                    except IndexError:
+                        pass
+
                     if self._created_connections < self.max_connections:
                         conn = self._create_connection()
-                        if conn:
-                            self._pool_misses += 1
-                            self._active_connections += 1
-                    else:
-                        # Wait for available connection
-                        try:
-                            conn = self._pool.get(timeout=10.0)
-                            self._pool_hits += 1
-                            self._active_connections += 1
-                        except Empty:
-                            raise Exception("Connection pool timeout - no connections available")
-            
-            if conn is None:
-                raise Exception("Could not obtain database connection")
-            
-            # Test connection is still valid
+                        if conn is None:
+                            raise Exception("Could not obtain database connection")
+                        counters[_MISSES] += 1
+                        return conn
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Exception("Connection pool timeout - no connections available")
+                    self._available.wait(remaining)
+            finally:
+                self._waiters -= 1
+
+    def _checkin(self, conn: sqlite3.Connection, healthy: bool = True):
+        """Return a connection to the idle deque, or close it if it is broken or the pool closed"""
+        if healthy and not self._closed:
+            self._idle.append(conn)
+            if self._waiters:
+                with self._available:
+                    self._available.notify()
+            return
+
+        self._discard_connection(conn)
+
+    def _discard_connection(self, conn: sqlite3.Connection):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        if self._closed:
+            # close_all() already reset the count
+            return
+        with self._available:
+            self._created_connections -= 1
+            self._available.notify()
+
+    @staticmethod
+    def _is_usable(conn: sqlite3.Connection) -> bool:
+        """Check a connection after an error escaped its block"""
+        try:
+            conn.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _checkout_pinned(self) -> Optional[_PinnedConnection]:
+        """This thread's pinned connection, pinning one if the pool still has room"""
+        pinned = getattr(self._local, 'pinned', None)
+        if pinned is None:
+            if self._closed:
+                return None
             try:
-                conn.execute("SELECT 1")
-            except sqlite3.Error:
-                # Connection is stale, create a new one
-                conn.close()
-                conn = self._create_connection()
+                conn = self._idle.pop()
+            except IndexError:
+                with self._lock:
+                    if self._created_connections >= self.max_connections:
+                        return None
+                    conn = self._create_connection()
                 if conn is None:
-                    raise Exception("Could not create replacement connection")
-            
-            yield conn
-            
-        except Exception as e:
-            if conn:
-                try:
-                    conn.rollback()
-                except:
-                    pass
-            raise e
-            
-        finally:
-            if conn:
-                try:
-                    # Return connection to pool
-                    self._pool.put_nowait(conn)
-                    with self._lock:
-                        self._active_connections -= 1
-                        
-                except:
-                    # Pool is full, close the connection
-                    conn.close()
-                    with self._lock:
-                        self._created_connections -= 1
-                        self._active_connections -= 1
-            
-            # Log performance metrics periodically
-            if self._total_requests % 100 == 0:
-                self._log_performance_metrics()
-    
-    def _log_performance_metrics(self):
-        """Log performance metrics for monitoring"""
-        hit_rate = (self._pool_hits / self._total_requests) * 100 if self._total_requests > 0 else 0
-        
-        metrics = {
-            'total_requests': self._total_requests,
-            'pool_hit_rate': f"{hit_rate:.1f}%",
-            'active_connections': self._active_connections,
-            'created_connections': self._created_connections,
-            'pool_size': self._pool.qsize()
-        }
-        
-        print(f"Connection Pool Metrics: {metrics}")
+                    return None
+            pinned = self._local.pinned = _PinnedConnection(conn)
+            self._pinned.add(pinned)
+            # Thread-local data is dropped when the thread exits; hand the connection back then
+            pinned.finalizer = weakref.finalize(pinned, self._checkin, conn)
+        if pinned.in_use:
+            return None
+        pinned.in_use = True
+        return pinned
+
+    def _unpin(self, pinned: _PinnedConnection):
+        """Drop this thread's broken pinned connection"""
+        pinned.finalizer.detach()
+        del self._local.pinned
+        self._pinned.discard(pinned)
+        self._discard_connection(pinned.connection)
     
     def get_stats(self) -> dict:
         """Get connection pool statistics"""
-        hit_rate = (self._pool_hits / self._total_requests) * 100 if self._total_requests > 0 else 0
+        with self._lock:
+            totals = [sum(column) for column in zip(self._retired_counters, *self._thread_counters.values())]
+            created = self._created_connections
+        pinned = list(self._pinned)
+        idle = len(self._idle)
+        total_requests = totals[_REQUESTS]
+        pool_hits = totals[_HITS] + totals[_PINNED_HITS]
+        hit_rate = (pool_hits / total_requests) * 100 if total_requests > 0 else 0
         
         return {
-            'total_requests': self._total_requests,
-            'pool_hits': self._pool_hits,
-            'pool_misses': self._pool_misses,
+            'total_requests': total_requests,
+            'pool_hits': pool_hits,
+            'pool_misses': totals[_MISSES],
             'hit_rate_percent': round(hit_rate, 2),
-            'active_connections': self._active_connections,
-            'created_connections': self._created_connections,
-            'pool_size': self._pool.qsize(),
-            'max_connections': self.max_connections
+            'active_connections': max(created - idle - sum(not p.in_use for p in pinned), 0),
+            'created_connections': created,
+            'pool_size': idle,
+            'pinned_connections': len(pinned),
+            'pinned_checkouts': totals[_PINNED_HITS],
+            'validations': totals[_VALIDATIONS],
+            'discarded_connections': totals[_DISCARDED],
+            'max_connections': self.max_connections,
+            'thread_affinity': self.thread_affinity,
+            'query_only': self.query_only
         }
     
     def close_all(self):
-        """Close all connections in the pool"""
+        """Close all idle and pinned connections in the pool"""
         closed_count = 0
+        self._closed = True
         
-        while not self._pool.empty():
+        while True:
             try:
-                conn = self._pool.get_nowait()
-                conn.close()
-                closed_count += 1
-            except Empty:
+                conn = self._idle.pop()
+            except IndexError:
                 break
+            conn.close()
+            closed_count += 1
+
+        for pinned in list(self._pinned):
+            if not pinned.in_use:
+                pinned.connection.close()
+                closed_count += 1
+        self._pinned = weakref.WeakSet()
         
         with self._lock:
             self._created_connections = 0
-            self._active_connections = 0
         
         print(f"Closed {closed_count} connections from pool")
     
@@ -217,8 +408,121 @@ class SQLiteConnectionPool:
             pass
 
 
-# Global connection pool instance
+class SQLiteWriter:
+    """
+    The single writer connection
+
+    Every write in the process goes through one connection behind a
+    reentrant lock, so writers wait in line here (cheap, FIFO-ish) rather
+    than retrying SQLITE_BUSY for up to the 30 s busy timeout. transaction()
+    wraps its block in BEGIN IMMEDIATE ... COMMIT; nested transaction()
+    blocks on the same thread join the outer transaction.
+    """
+
+    def __init__(self, database_path: str):
+        self.database_path = database_path
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._depth = 0
+
+        # Metrics, only updated while holding the lock
+        self._checkouts = 0
+        self._transactions = 0
+        self._rollbacks = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+
+    @contextmanager
+    def connection(self):
+        """
+        Hold the writer connection for the block (autocommit unless a transaction is open)
+
+        Yields:
+            PooledConnection: Writer connection handle (cannot be closed by callers)
+        """
+        requested = time.perf_counter()
+        with self._lock:
+            waited = time.perf_counter() - requested
+            self._checkouts += 1
+            self._wait_seconds += waited
+            self._max_wait_seconds = max(self._max_wait_seconds, waited)
+
+            if self._conn is None:
+                self._conn = connect(self.database_path)
+            conn = self._conn
+            handle = PooledConnection(conn)
+            self._depth += 1
+            try:
+                yield handle
+            except Exception as e:
+                if self._depth == 1:
+                    if conn.in_transaction:
+                        self._rollback(conn)
+                    if isinstance(e, sqlite3.Error) and not SQLiteConnectionPool._is_usable(conn):
+                        self._close_connection()
+                raise
+            finally:
+                self._depth -= 1
+                handle._release()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run the block in one BEGIN IMMEDIATE transaction (rolled back if it raises)
+
+        Yields:
+            PooledConnection: Writer connection handle
+        """
+        with self.connection() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+
+            conn.execute("BEGIN IMMEDIATE")
+            self._transactions += 1
+            try:
+                yield conn
+            except Exception:
+                if conn.in_transaction:
+                    self._rollback(conn)
+                raise
+            conn.execute("COMMIT")
+
+    def _rollback(self, conn: sqlite3.Connection):
+        self._rollbacks += 1
+        try:
+            conn.execute("ROLLBACK")
+        except sqlite3.Error:
+            pass
+
+    def _close_connection(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except sqlite3.Error:
+                pass
+            self._conn = None
+
+    def get_stats(self) -> dict:
+        """Get writer statistics"""
+        with self._lock:
+            return {
+                'checkouts': self._checkouts,
+                'transactions': self._transactions,
+                'rollbacks': self._rollbacks,
+                'avg_wait_ms': round(self._wait_seconds / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                'max_wait_ms': round(self._max_wait_seconds * 1000, 3)
+            }
+
+    def close(self):
+        """Close the writer connection (it is reopened on next use)"""
+        with self._lock:
+            self._close_connection()
+
+
+# Global connection pool and writer instances
 _connection_pool = None
+_db_writer = None
 _pool_lock = threading.Lock()
 
 
@@ -234,27 +538,72 @@ def get_connection_pool() -> SQLiteConnectionPool:
     if _connection_pool is None:
         with _pool_lock:
             if _connection_pool is None:
-                _connection_pool = SQLiteConnectionPool('mind_sprite.db')
+                _connection_pool = SQLiteConnectionPool(
+                    settings.database_path,
+                    max_connections=settings.db_pool_max_connections,
+                    thread_affinity=settings.db_pool_thread_affinity,
+                    query_only=True
+                )
     
     return _connection_pool
 
 
+def get_db_writer() -> SQLiteWriter:
+    """
+    Get the global writer instance (singleton pattern)
+
+    Returns:
+        SQLiteWriter: Global writer for settings.database_path
+    """
+    global _db_writer
+
+    if _db_writer is None:
+        with _pool_lock:
+            if _db_writer is None:
+                _db_writer = SQLiteWriter(settings.database_path)
+
+    return _db_writer
+
+
 def reset_connection_pool():
-    """Reset the global connection pool (useful for testing)"""
-    global _connection_pool
+    """Reset the global connection pool and writer (useful for testing)"""
+    global _connection_pool, _db_writer
     
     with _pool_lock:
         if _connection_pool:
             _connection_pool.close_all()
+        if _db_writer:
+            _db_writer.close()
         _connection_pool = None
+        _db_writer = None
 
 
-# Convenience function for getting connections
+# Convenience functions for getting connections
 def get_db_connection():
     """
-    Get database connection from pool
+    Get a read-only database connection from pool
     
     Returns:
         Context manager for database connection
     """
     return get_connection_pool().get_connection()
+
+
+def get_write_connection():
+    """
+    Get the writer connection (autocommit, serialized with all other writes)
+
+    Returns:
+        Context manager for the writer connection
+    """
+    return get_db_writer().connection()
+
+
+def write_transaction():
+    """
+    Run a block of writes in one BEGIN IMMEDIATE transaction on the writer connection
+
+    Returns:
+        Context manager for the writer connection
+    """
+    return get_db_writer().transaction()
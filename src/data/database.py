@@ -5,248 +5,448 @@
 
 import sqlite3
 import os
+import threading
 from datetime import datetime
+from typing import List, Optional, Tuple
 import streamlit as st
-from .connection_pool import get_connection_pool
+from .connection_pool import get_connection_pool, get_write_connection, write_transaction
+from ..config.settings import settings
+
+
+# 基线表结构（v5.2及之前的全部表和索引）
+_BASELINE_SCHEMA = [
+    # 创建聊天历史表
+    '''
+        CREATE TABLE IF NOT EXISTS chat_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+
+    # 创建核心记忆表 - 实现深度共情的关键
+    '''
+        CREATE TABLE IF NOT EXISTS core_memories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            memory_type TEXT NOT NULL,  -- 'insight', 'event', 'person', 'preference'
+            content TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES chat_history(session_id)
+        )
+    ''',
+
+    # 创建宝藏盒表 - 精灵的宝藏小盒功能
+    '''
+        CREATE TABLE IF NOT EXISTS treasure_box (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            gift_type TEXT NOT NULL,
+            gift_content TEXT NOT NULL,
+            collected_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            is_favorite BOOLEAN DEFAULT FALSE,
+            FOREIGN KEY (session_id) REFERENCES chat_history(session_id)
+        )
+    ''',
+
+    # 创建AI缓存表
+    '''
+        CREATE TABLE IF NOT EXISTS ai_cache (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            input_hash TEXT NOT NULL,
+            model TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+
+    # 【v5.0新增】创建用户档案表 - 亲密度养成系统
+    '''
+        CREATE TABLE IF NOT EXISTS user_profiles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL UNIQUE,
+            intimacy_level INTEGER NOT NULL DEFAULT 1,
+            intimacy_exp INTEGER NOT NULL DEFAULT 0,
+            total_interactions INTEGER NOT NULL DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+
+    # 【v5.1新增】创建主动关怀调度表 - Agent主动关怀系统
+    '''
+        CREATE TABLE IF NOT EXISTS scheduled_care (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            care_type TEXT NOT NULL,  -- 'emotion_followup', 'event_followup', 'regular_care'
+            trigger_content TEXT NOT NULL,  -- 触发关怀的原始用户内容
+            care_message TEXT NOT NULL,  -- 关怀消息内容
+            scheduled_time DATETIME NOT NULL,  -- 预定关怀时间
+            status TEXT NOT NULL DEFAULT 'pending',  -- 'pending', 'completed', 'cancelled'
+            priority TEXT NOT NULL DEFAULT 'medium',  -- 'high', 'medium', 'low'
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            executed_at DATETIME NULL,
+            FOREIGN KEY (session_id) REFERENCES chat_history(session_id)
+        )
+    ''',
+
+    # 【v5.2新增】创建情感分析表 - 深度情感理解系统
+    '''
+        CREATE TABLE IF NOT EXISTS emotion_analysis (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            message_id INTEGER NOT NULL,  -- 关联的聊天记录ID
+            primary_emotion TEXT NOT NULL,  -- 主要情绪类型
+            emotion_intensity REAL NOT NULL,  -- 情绪强度 0.0-10.0
+            emotion_valence REAL NOT NULL,  -- 情感效价 -1.0(负面)到1.0(正面)
+            emotion_arousal REAL NOT NULL,  -- 情感唤醒度 0.0(平静)到1.0(激动)
+            secondary_emotions TEXT,  -- 次要情绪(JSON格式)
+            confidence_score REAL NOT NULL,  -- 分析置信度 0.0-1.0
+            trigger_keywords TEXT,  -- 触发关键词(JSON格式)
+            empathy_strategy TEXT NOT NULL,  -- 共情策略类型
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES chat_history(session_id),
+            FOREIGN KEY (message_id) REFERENCES chat_history(id)
+        )
+    ''',
+
+    # 【v5.2新增】创建情感趋势表 - 情感变化轨迹追踪
+    '''
+        CREATE TABLE IF NOT EXISTS emotion_trends (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            time_period TEXT NOT NULL,  -- 'hourly', 'daily', 'weekly'
+            start_time DATETIME NOT NULL,
+            end_time DATETIME NOT NULL,
+            avg_intensity REAL NOT NULL,  -- 平均情绪强度
+            avg_valence REAL NOT NULL,  -- 平均情感效价
+            dominant_emotion TEXT NOT NULL,  -- 主导情绪
+            emotion_volatility REAL NOT NULL,  -- 情绪波动性 0.0-1.0
+            trend_direction TEXT NOT NULL,  -- 'improving', 'stable', 'declining'
+            insights TEXT,  -- 情感洞察(JSON格式)
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES chat_history(session_id)
+        )
+    ''',
+
+    # 【v5.2新增】创建共情回应表 - 深度共情历史记录
+    '''
+        CREATE TABLE IF NOT EXISTS empathy_responses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            analysis_id INTEGER NOT NULL,  -- 关联的情感分析ID
+            empathy_type TEXT NOT NULL,  -- 'comfort', 'solution', 'companion', 'celebration'
+            response_tone TEXT NOT NULL,  -- 'gentle', 'encouraging', 'supportive', 'joyful'
+            key_phrases TEXT NOT NULL,  -- 核心共情短语(JSON格式)
+            effectiveness_score REAL,  -- 效果评分(用户反馈) 0.0-5.0
+            user_feedback TEXT,  -- 用户反馈内容
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES chat_history(session_id),
+            FOREIGN KEY (analysis_id) REFERENCES emotion_analysis(id)
+        )
+    ''',
+
+    # 创建搜索缓存表
+    '''
+        CREATE TABLE IF NOT EXISTS search_cache (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cache_key TEXT UNIQUE NOT NULL,
+            query TEXT NOT NULL,
+            location TEXT NOT NULL,
+            results TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            expires_at DATETIME NOT NULL
+        )
+    ''',
+
+    # 创建索引以提高查询性能
+    '''
+        CREATE INDEX IF NOT EXISTS idx_session_timestamp
+        ON chat_history(session_id, timestamp)
+    ''',
+    '''
+        CREATE INDEX IF NOT EXISTS idx_core_memories_session_type
+        ON core_memories(session_id, memory_type, timestamp)
+    ''',
+    '''
+        CREATE INDEX IF NOT EXISTS idx_treasure_box_session
+        ON treasure_box(session_id, collected_at)
+    ''',
+
+    # 【v5.0新增】为用户档案表创建索引
+    '''
+        CREATE INDEX IF NOT EXISTS idx_user_profiles_session
+        ON user_profiles(session_id)
+    ''',
+
+    # 【v5.1新增】为关怀调度表创建索引
+    '''
+        CREATE INDEX IF NOT EXISTS idx_scheduled_care_session_time
+        ON scheduled_care(session_id, scheduled_time, status)
+    ''',
+
+    # 【v5.2新增】为情感分析表创建索引
+    '''
+        CREATE INDEX IF NOT EXISTS idx_emotion_analysis_session_time
+        ON emotion_analysis(session_id, created_at)
+    ''',
+    '''
+        CREATE INDEX IF NOT EXISTS idx_emotion_analysis_emotion
+        ON emotion_analysis(primary_emotion, emotion_intensity)
+    ''',
+
+    # 【v5.2新增】为情感趋势表创建索引
+    '''
+        CREATE INDEX IF NOT EXISTS idx_emotion_trends_session_period
+        ON emotion_trends(session_id, time_period, start_time)
+    ''',
+
+    # 【v5.2新增】为共情回应表创建索引
+    '''
+        CREATE INDEX IF NOT EXISTS idx_empathy_responses_session_type
+        ON empathy_responses(session_id, empathy_type, created_at)
+    ''',
+
+    # 为搜索缓存表创建索引
+    '''
+        CREATE INDEX IF NOT EXISTS idx_search_cache_key_expires
+        ON search_cache(cache_key, expires_at)
+    ''',
+    '''
+        CREATE INDEX IF NOT EXISTS idx_search_cache_location_expires
+        ON search_cache(location, expires_at)
+    ''',
+]
+
+# 编号迁移列表：(版本号, 描述, SQL语句列表)
+# 新的表结构变更只需在末尾追加一条，版本号递增，已发布的迁移不要修改
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, "基线表结构", _BASELINE_SCHEMA),
+    (2, "AI缓存唯一索引和过期索引", [
+        # 先去掉重复记录（之前没有唯一约束，INSERT OR REPLACE只会不断追加）
+        '''
+            DELETE FROM ai_cache
+            WHERE id NOT IN (
+                SELECT MAX(id) FROM ai_cache GROUP BY input_hash, model
+            )
+        ''',
+        '''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_ai_cache_hash_model
+            ON ai_cache(input_hash, model)
+        ''',
+        '''
+            CREATE INDEX IF NOT EXISTS idx_ai_cache_created
+            ON ai_cache(created_at)
+        ''',
+    ]),
+    (3, "情感分析按消息查找的索引（重新打分回填时替换旧记录）", [
+        '''
+            CREATE INDEX IF NOT EXISTS idx_emotion_analysis_message
+            ON emotion_analysis(message_id)
+        ''',
+    ]),
+    (4, "情感趋势按时间桶增量汇总（Welford累计量和唯一键）", [
+        # 之前没有写入过emotion_trends，旧记录没有累计量，直接清掉
+        'DELETE FROM emotion_trends',
+        'ALTER TABLE emotion_trends ADD COLUMN sample_count INTEGER NOT NULL DEFAULT 0',
+        'ALTER TABLE emotion_trends ADD COLUMN avg_arousal REAL NOT NULL DEFAULT 0',
+        # 强度的离差平方和（Welford算法的M2），方差 = intensity_m2 / sample_count
+        'ALTER TABLE emotion_trends ADD COLUMN intensity_m2 REAL NOT NULL DEFAULT 0',
+        # 各情绪出现次数(JSON对象，按首次出现顺序)
+        "ALTER TABLE emotion_trends ADD COLUMN emotion_counts TEXT NOT NULL DEFAULT '{}'",
+        # 桶内最近3条情感效价(JSON数组)，用于判断趋势方向
+        "ALTER TABLE emotion_trends ADD COLUMN recent_valences TEXT NOT NULL DEFAULT '[]'",
+        'ALTER TABLE emotion_trends ADD COLUMN updated_at DATETIME',
+        'DROP INDEX IF EXISTS idx_emotion_trends_session_period',
+        '''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_emotion_trends_bucket
+            ON emotion_trends(session_id, time_period, start_time)
+        ''',
+    ]),
+    (5, "滚动对话摘要", [
+        '''
+            CREATE TABLE IF NOT EXISTS conversation_summaries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                covered_until_id INTEGER NOT NULL,  -- 摘要覆盖到的最后一条chat_history.id
+                message_count INTEGER NOT NULL,  -- 摘要累计覆盖的消息条数
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (session_id) REFERENCES chat_history(session_id)
+            )
+        ''',
+        '''
+            CREATE INDEX IF NOT EXISTS idx_conversation_summaries_session
+            ON conversation_summaries(session_id, covered_until_id)
+        ''',
+    ]),
+    (6, "聊天记录按 (session_id, id) 排序和游标分页的索引", [
+        '''
+            CREATE INDEX IF NOT EXISTS idx_chat_history_session_id
+            ON chat_history(session_id, id)
+        ''',
+    ]),
+    (7, "让热路径查询的排序也走索引（由 tests/unit/test_query_plans.py 检查）", [
+        # 待执行关怀按优先级排序：表达式与 CareTaskRepository 中的 PRIORITY_RANK 相同
+        'DROP INDEX IF EXISTS idx_scheduled_care_session_time',
+        '''
+            CREATE INDEX IF NOT EXISTS idx_scheduled_care_pending
+            ON scheduled_care(
+                session_id, status,
+                (CASE priority WHEN 'high' THEN 0 WHEN 'medium' THEN 1 ELSE 2 END),
+                scheduled_time
+            )
+        ''',
+        # 核心记忆按ID增量补齐记忆索引、按ID倒序取最近的记忆
+        '''
+            CREATE INDEX IF NOT EXISTS idx_core_memories_session_id
+            ON core_memories(session_id, id)
+        ''',
+        # 按位置列出搜索缓存时按创建时间倒序
+        'DROP INDEX IF EXISTS idx_search_cache_location_expires',
+        '''
+            CREATE INDEX IF NOT EXISTS idx_search_cache_location_created
+            ON search_cache(location, created_at)
+        ''',
+    ]),
+]
+
+# 本进程内已完成迁移的数据库文件
+_initialized_databases = set()
+_init_lock = threading.Lock()
 
 
 def get_db_connection():
-    """获取数据库连接对象（使用连接池）"""
+    """
+    获取只读数据库连接（使用连接池）
+
+    返回上下文管理器，必须通过 with get_db_connection() as conn 使用；
+    连接在with块结束时自动归还连接池，调用conn.close()会抛出PooledConnectionError。
+    连接设置了 PRAGMA query_only，写操作请使用 get_db_write_connection()
+    """
     return get_connection_pool().get_connection()
 
 
-def get_db_connection_direct():
+def get_db_write_connection():
+    """
+    获取写连接（进程内唯一，所有写操作在它的锁上排队）
+
+    返回上下文管理器，用法同 get_db_connection()；单条语句自动提交
+    """
+    return get_write_connection()
+
+
+def get_db_write_transaction():
+    """
+    获取写事务：with块内的写操作在同一个 BEGIN IMMEDIATE 事务中提交，出错时回滚
+    """
+    return write_transaction()
+
+
+def get_db_connection_direct(database_path: Optional[str] = None):
     """获取直接数据库连接（不使用连接池，仅用于初始化）"""
     try:
-        conn = sqlite3.connect('mind_sprite.db')
+        conn = sqlite3.connect(database_path or settings.database_path)
         return conn
     except Exception as e:
         st.error(f"数据库连接失败: {e}")
         return None
 
 
-def init_db():
-    """初始化SQLite数据库和表结构"""
-    try:
-        # Use direct connection for initialization to avoid pool issues
-        conn = get_db_connection_direct()
-        if not conn:
-            return False
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """读取数据库当前的表结构版本，未做过迁移时返回0"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('SELECT MAX(version) FROM schema_version')
+    row = cursor.fetchone()
+    return row[0] if row and row[0] is not None else 0
 
-        cursor = conn.cursor()
 
-        # 创建聊天历史表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS chat_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT NOT NULL,
-                role TEXT NOT NULL,
-                content TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+def run_migrations(conn: sqlite3.Connection) -> int:
+    """
+    依次执行尚未应用的迁移
 
-        # 创建核心记忆表 - 实现深度共情的关键
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS core_memories (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT NOT NULL,
-                memory_type TEXT NOT NULL,  -- 'insight', 'event', 'person', 'preference'
-                content TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (session_id) REFERENCES chat_history(session_id)
-            )
-        ''')
+    每个迁移在单独的 BEGIN IMMEDIATE 事务中执行，并记录到schema_version表。
+    sqlite3模块不会在CREATE/DROP之前自动开启事务，所以这里显式开启，
+    迁移中途失败时已执行的DDL也会一起回滚；拿到写锁后重新读取版本，
+    多个进程同时启动时只有一个会应用同一个迁移
 
-        # 创建宝藏盒表 - 精灵的宝藏小盒功能
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS treasure_box (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT NOT NULL,
-                gift_type TEXT NOT NULL,
-                gift_content TEXT NOT NULL,
-                collected_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                is_favorite BOOLEAN DEFAULT FALSE,
-                FOREIGN KEY (session_id) REFERENCES chat_history(session_id)
-            )
-        ''')
+    Returns:
+        int: 迁移后的表结构版本
+    """
+    current_version = get_schema_version(conn)
+    conn.commit()
 
-        # 创建AI缓存表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS ai_cache (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                input_hash TEXT NOT NULL,
-                model TEXT NOT NULL,
-                response TEXT NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+    for version, description, statements in MIGRATIONS:
+        if version <= current_version:
+            continue
 
-        # 【v5.0新增】创建用户档案表 - 亲密度养成系统
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_profiles (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT NOT NULL UNIQUE,
-                intimacy_level INTEGER NOT NULL DEFAULT 1,
-                intimacy_exp INTEGER NOT NULL DEFAULT 0,
-                total_interactions INTEGER NOT NULL DEFAULT 0,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            current_version = get_schema_version(conn)
+            if version <= current_version:
+                conn.commit()
+                continue
 
-        # 【v5.1新增】创建主动关怀调度表 - Agent主动关怀系统
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS scheduled_care (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT NOT NULL,
-                care_type TEXT NOT NULL,  -- 'emotion_followup', 'event_followup', 'regular_care'
-                trigger_content TEXT NOT NULL,  -- 触发关怀的原始用户内容
-                care_message TEXT NOT NULL,  -- 关怀消息内容
-                scheduled_time DATETIME NOT NULL,  -- 预定关怀时间
-                status TEXT NOT NULL DEFAULT 'pending',  -- 'pending', 'completed', 'cancelled'
-                priority TEXT NOT NULL DEFAULT 'medium',  -- 'high', 'medium', 'low'
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                executed_at DATETIME NULL,
-                FOREIGN KEY (session_id) REFERENCES chat_history(session_id)
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute(
+                'INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)',
+                (version, description, datetime.now())
             )
-        ''')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        current_version = version
 
-        # 【v5.2新增】创建情感分析表 - 深度情感理解系统
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS emotion_analysis (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT NOT NULL,
-                message_id INTEGER NOT NULL,  -- 关联的聊天记录ID
-                primary_emotion TEXT NOT NULL,  -- 主要情绪类型
-                emotion_intensity REAL NOT NULL,  -- 情绪强度 0.0-10.0
-                emotion_valence REAL NOT NULL,  -- 情感效价 -1.0(负面)到1.0(正面)
-                emotion_arousal REAL NOT NULL,  -- 情感唤醒度 0.0(平静)到1.0(激动)
-                secondary_emotions TEXT,  -- 次要情绪(JSON格式)
-                confidence_score REAL NOT NULL,  -- 分析置信度 0.0-1.0
-                trigger_keywords TEXT,  -- 触发关键词(JSON格式)
-                empathy_strategy TEXT NOT NULL,  -- 共情策略类型
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (session_id) REFERENCES chat_history(session_id),
-                FOREIGN KEY (message_id) REFERENCES chat_history(id)
-            )
-        ''')
+    return current_version
 
-        # 【v5.2新增】创建情感趋势表 - 情感变化轨迹追踪
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS emotion_trends (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT NOT NULL,
-                time_period TEXT NOT NULL,  -- 'hourly', 'daily', 'weekly'
-                start_time DATETIME NOT NULL,
-                end_time DATETIME NOT NULL,
-                avg_intensity REAL NOT NULL,  -- 平均情绪强度
-                avg_valence REAL NOT NULL,  -- 平均情感效价
-                dominant_emotion TEXT NOT NULL,  -- 主导情绪
-                emotion_volatility REAL NOT NULL,  -- 情绪波动性 0.0-1.0
-                trend_direction TEXT NOT NULL,  -- 'improving', 'stable', 'declining'
-                insights TEXT,  -- 情感洞察(JSON格式)
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (session_id) REFERENCES chat_history(session_id)
-            )
-        ''')
 
-        # 【v5.2新增】创建共情回应表 - 深度共情历史记录
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS empathy_responses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT NOT NULL,
-                analysis_id INTEGER NOT NULL,  -- 关联的情感分析ID
-                empathy_type TEXT NOT NULL,  -- 'comfort', 'solution', 'companion', 'celebration'
-                response_tone TEXT NOT NULL,  -- 'gentle', 'encouraging', 'supportive', 'joyful'
-                key_phrases TEXT NOT NULL,  -- 核心共情短语(JSON格式)
-                effectiveness_score REAL,  -- 效果评分(用户反馈) 0.0-5.0
-                user_feedback TEXT,  -- 用户反馈内容
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (session_id) REFERENCES chat_history(session_id),
-                FOREIGN KEY (analysis_id) REFERENCES emotion_analysis(id)
-            )
-        ''')
+def init_db(database_path: Optional[str] = None) -> bool:
+    """
+    初始化SQLite数据库和表结构
 
-        # 创建搜索缓存表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS search_cache (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cache_key TEXT UNIQUE NOT NULL,
-                query TEXT NOT NULL,
-                location TEXT NOT NULL,
-                results TEXT NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                expires_at DATETIME NOT NULL
-            )
-        ''')
-
-        # 创建索引以提高查询性能
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_session_timestamp
-            ON chat_history(session_id, timestamp)
-        ''')
-
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_core_memories_session_type
-            ON core_memories(session_id, memory_type, timestamp)
-        ''')
-
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_treasure_box_session
-            ON treasure_box(session_id, collected_at)
-        ''')
-
-        # 【v5.0新增】为用户档案表创建索引
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_user_profiles_session
-            ON user_profiles(session_id)
-        ''')
-
-        # 【v5.1新增】为关怀调度表创建索引
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_scheduled_care_session_time
-            ON scheduled_care(session_id, scheduled_time, status)
-        ''')
-
-        # 【v5.2新增】为情感分析表创建索引
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_emotion_analysis_session_time
-            ON emotion_analysis(session_id, created_at)
-        ''')
-
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_emotion_analysis_emotion
-            ON emotion_analysis(primary_emotion, emotion_intensity)
-        ''')
-
-        # 【v5.2新增】为情感趋势表创建索引
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_emotion_trends_session_period
-            ON emotion_trends(session_id, time_period, start_time)
-        ''')
-
-        # 【v5.2新增】为共情回应表创建索引
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_empathy_responses_session_type
-            ON empathy_responses(session_id, empathy_type, created_at)
-        ''')
-
-        # 为搜索缓存表创建索引
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_search_cache_key_expires
-            ON search_cache(cache_key, expires_at)
-        ''')
-
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_search_cache_location_expires
-            ON search_cache(location, expires_at)
-        ''')
-
-        conn.commit()
-        conn.close()
+    每个进程对同一个数据库文件只执行一次迁移，之后的调用（例如Streamlit每次重新运行）
+    只做一次集合查找
+    """
+    path = os.path.abspath(database_path or settings.database_path)
+    if path in _initialized_databases:
         return True
-        
-    except Exception as e:
-        st.error(f"数据库初始化失败: {e}")
-        return False
+
+    with _init_lock:
+        if path in _initialized_databases:
+            return True
+
+        try:
+            # Use direct connection for initialization to avoid pool issues
+            conn = get_db_connection_direct(path)
+            if not conn:
+                return False
+
+            try:
+                run_migrations(conn)
+            finally:
+                conn.close()
+
+            _initialized_databases.add(path)
+            return True
+
+        except Exception as e:
+            st.error(f"数据库初始化失败: {e}")
+            return False
+
+
+def reset_db_init_cache():
+    """清除进程内的初始化标记（用于测试或数据库文件被替换后）"""
+    with _init_lock:
+        _initialized_databases.clear()
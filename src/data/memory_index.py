@@ -0,0 +1,250 @@
+"""
+会话记忆向量索引
+每个会话一个目录，核心记忆和用户消息的哈希n-gram向量以定长记录追加写入：
+
+    fine.f16    (N, EMBEDDING_DIM) float16  精排向量，查询时以mmap方式只读取候选行
+    coarse.f32  (N, COARSE_DIM) float32     粗筛向量，常驻内存，每次查询全量扫描
+    keys.i64    (N, 2) int64                (来源类型, 来源ID)
+
+查询先用粗向量对全部记录打分，取前 RERANK_CANDIDATES 个候选再用精排向量重新打分，
+10万条记录单核查询约3~4毫秒（粗向量扫描受内存带宽限制）。索引只是数据库的派生数据，文件损坏或缺失时从数据库补齐
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from ..config.settings import settings
+from ..utils.text_embedding import COARSE_DIM, EMBEDDING_DIM, coarse_vectors, embed_text, embed_texts
+
+# 来源类型
+KIND_CORE_MEMORY = 0
+KIND_MESSAGE = 1
+
+# 粗筛后参与精排的候选数
+RERANK_CANDIDATES = 256
+# 每种来源记住最近多少个ID（用于排除已经在Prompt中的最近消息）
+RECENT_ID_WINDOW = 256
+
+_FILES = {
+    "fine": ("fine.f16", np.float16, EMBEDDING_DIM),
+    "coarse": ("coarse.f32", np.float32, COARSE_DIM),
+    "keys": ("keys.i64", np.int64, 2),
+}
+
+
+@dataclass(frozen=True)
+class MemoryHit:
+    """一条检索结果"""
+    kind: int
+    source_id: int
+    score: float
+
+
+class MemoryIndex:
+    """单个会话的记忆向量索引（追加写入，线程安全）"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._fine_map: Optional[np.memmap] = None
+        self._count = self._recover()
+
+        # 粗向量和来源键常驻内存，按倍数扩容，已有行不会被修改
+        self._coarse = self._load("coarse", self._count)
+        self._keys = self._load("keys", self._count)
+        # 同一来源的记录按ID递增追加
+        self._recent_ids = {
+            kind: deque(
+                self._keys[:self._count][self._keys[:self._count, 0] == kind, 1][-RECENT_ID_WINDOW:].tolist(),
+                maxlen=RECENT_ID_WINDOW
+            )
+            for kind in (KIND_CORE_MEMORY, KIND_MESSAGE)
+        }
+
+    def __len__(self) -> int:
+        return self._count
+
+    def max_source_id(self, kind: int) -> int:
+        """已索引的该类型来源的最大ID（用于从数据库增量补齐）"""
+        recent = self._recent_ids[kind]
+        return recent[-1] if recent else 0
+
+    def source_id_before_latest(self, kind: int, latest: int) -> int:
+        """最近 latest 条该类型记录之前的那条记录的ID（不存在时为0）"""
+        recent = list(self._recent_ids[kind])
+        latest = min(latest, RECENT_ID_WINDOW - 1)
+        return recent[-latest - 1] if len(recent) > latest else 0
+
+    def add(self, kind: int, source_id: int, text: str):
+        """索引一条记录"""
+        self.add_vectors([kind], [source_id], embed_text(text)[np.newaxis, :])
+
+    def add_many(self, kind: int, source_ids: Sequence[int], texts: Sequence[str]):
+        """批量索引同一类型的记录"""
+        if source_ids:
+            self.add_vectors([kind] * len(source_ids), source_ids, embed_texts(list(texts)))
+
+    def add_vectors(self, kinds: Sequence[int], source_ids: Sequence[int], vectors: np.ndarray):
+        """追加已经计算好的 EMBEDDING_DIM 维向量（已经索引过的来源ID会被跳过）"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        keys = np.column_stack([np.asarray(kinds, dtype=np.int64), np.asarray(source_ids, dtype=np.int64)])
+
+        with self._lock:
+            # 从数据库补齐和后台写入可能同时索引同一条记录
+            fresh = np.array([source_id > self.max_source_id(int(kind)) for kind, source_id in keys], dtype=bool)
+            if not fresh.any():
+                return
+            keys, vectors = keys[fresh], vectors[fresh]
+            coarse = coarse_vectors(vectors)
+
+            # 先写精排向量和粗向量，最后写来源键：中途失败时打开索引会截掉不完整的记录
+            self._append_file("fine", vectors.astype(np.float16))
+            self._append_file("coarse", coarse)
+            self._append_file("keys", keys)
+
+            start, end = self._count, self._count + len(keys)
+            self._coarse = self._ensure_capacity(self._coarse, end)
+            self._keys = self._ensure_capacity(self._keys, end)
+            self._coarse[start:end] = coarse
+            self._keys[start:end] = keys
+            self._count = end
+            for kind, source_id in keys.tolist():
+                self._recent_ids[kind].append(source_id)
+
+    def search(self, query: str, k: int = 5, min_score: float = 0.0,
+               kind: Optional[int] = None, max_message_id: Optional[int] = None) -> List[MemoryHit]:
+        """
+        检索与查询文本最相关的记录
+
+        Args:
+            query: 查询文本
+            k: 返回条数
+            min_score: 最低余弦相似度
+            kind: 只检索该类型的记录
+            max_message_id: 只返回ID不超过该值的消息（排除已经在Prompt中的最近对话）
+
+        Returns:
+            List[MemoryHit]: 按相似度从高到低排列
+        """
+        vector = embed_text(query)
+        with self._lock:
+            count = self._count
+            coarse = self._coarse[:count]
+            keys = self._keys[:count]
+            fine = self._get_fine_map(count)
+        if not count or not vector.any():
+            return []
+
+        scores = coarse @ coarse_vectors(vector)
+        rows = self._top_rows(scores, max(RERANK_CANDIDATES, k))
+        allowed = self._allowed(keys[rows], kind, max_message_id)
+        if allowed.sum() < min(k, count) and len(rows) < count:
+            # 过滤掉的候选太多时才对全部记录应用过滤条件
+            scores[~self._allowed(keys, kind, max_message_id)] = -np.inf
+            rows = self._top_rows(scores, max(RERANK_CANDIDATES, k))
+            allowed = np.isfinite(scores[rows])
+        rows = rows[allowed]
+
+        fine_scores = fine[rows].astype(np.float32) @ vector
+        order = np.argsort(-fine_scores)[:k]
+        return [
+            MemoryHit(int(keys[rows[i], 0]), int(keys[rows[i], 1]), float(fine_scores[i]))
+            for i in order if fine_scores[i] >= min_score
+        ]
+
+    @staticmethod
+    def _top_rows(scores: np.ndarray, candidates: int) -> np.ndarray:
+        """粗分最高的若干行（按行号排序，mmap顺序读取）"""
+        if candidates >= len(scores):
+            return np.arange(len(scores))
+        return np.sort(np.argpartition(scores, len(scores) - candidates)[len(scores) - candidates:])
+
+    @staticmethod
+    def _allowed(keys: np.ndarray, kind: Optional[int], max_message_id: Optional[int]) -> np.ndarray:
+        allowed = np.ones(len(keys), dtype=bool)
+        if kind is not None:
+            allowed &= keys[:, 0] == kind
+        if max_message_id is not None:
+            allowed &= (keys[:, 0] != KIND_MESSAGE) | (keys[:, 1] <= max_message_id)
+        return allowed
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, _FILES[name][0])
+
+    def _row_bytes(self, name: str) -> int:
+        _, dtype, width = _FILES[name]
+        return np.dtype(dtype).itemsize * width
+
+    def _recover(self) -> int:
+        """取三个文件都完整写入的记录数，截掉多余的部分"""
+        count = min(
+            os.path.getsize(self._path(name)) // self._row_bytes(name) if os.path.exists(self._path(name)) else 0
+            for name in _FILES
+        )
+        for name in _FILES:
+            path = self._path(name)
+            size = count * self._row_bytes(name)
+            if not os.path.exists(path) or os.path.getsize(path) != size:
+                with open(path, "ab") as handle:
+                    handle.truncate(size)
+        return count
+
+    def _load(self, name: str, count: int) -> np.ndarray:
+        _, dtype, width = _FILES[name]
+        data = np.fromfile(self._path(name), dtype=dtype, count=count * width).reshape(count, width)
+        return self._ensure_capacity(data, count)
+
+    @staticmethod
+    def _ensure_capacity(array: np.ndarray, rows: int) -> np.ndarray:
+        if len(array) >= rows and rows:
+            return array
+        grown = np.zeros((max(rows, len(array) * 2, 1024), array.shape[1]), dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def _append_file(self, name: str, rows: np.ndarray):
+        with open(self._path(name), "ab") as handle:
+            handle.write(np.ascontiguousarray(rows).tobytes())
+
+    def _get_fine_map(self, count: int) -> np.ndarray:
+        """精排向量的只读mmap（记录数增加后重新映射）"""
+        if count == 0:
+            return np.zeros((0, EMBEDDING_DIM), dtype=np.float16)
+        if self._fine_map is None or len(self._fine_map) < count:
+            self._fine_map = np.memmap(self._path("fine"), dtype=np.float16, mode="r",
+                                       shape=(count, EMBEDDING_DIM))
+        return self._fine_map[:count]
+
+
+_indexes: "OrderedDict[str, MemoryIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_memory_index(session_id: str) -> MemoryIndex:
+    """获取会话的记忆索引（进程内缓存最近打开的若干个）"""
+    directory = os.path.join(
+        settings.memory_index_dir, hashlib.sha1(session_id.encode("utf-8")).hexdigest()[:20]
+    )
+    with _indexes_lock:
+        index = _indexes.get(directory)
+        if index is None:
+            index = MemoryIndex(directory)
+            _indexes[directory] = index
+            while len(_indexes) > settings.memory_index_max_open:
+                _indexes.popitem(last=False)
+        else:
+            _indexes.move_to_end(directory)
+        return index
+
+
+def reset_memory_indexes():
+    """关闭所有已打开的索引（切换数据库或测试时使用）"""
+    with _indexes_lock:
+        _indexes.clear()
@@ -7,21 +7,38 @@ import sqlite3
 from datetime import datetime
 from typing import Optional, List, Tuple, Any
 import streamlit as st
-from ..database import get_db_connection
+from ..database import get_db_connection, get_db_write_connection, get_db_write_transaction
+from ..write_behind import WriteTicket, get_write_behind_writer, wait_for_session_writes
+from ...config.settings import settings
 
 
 class BaseRepository:
     """基础仓库类，提供通用的数据库操作方法"""
     
     def __init__(self):
-        self.db_name = 'mind_sprite.db'
+        self.db_name = settings.database_path
     
     def get_connection(self) -> Optional[sqlite3.Connection]:
-        """获取数据库连接"""
+        """获取只读数据库连接"""
         return get_db_connection()
+
+    def get_write_connection(self) -> Optional[sqlite3.Connection]:
+        """获取写连接（所有写操作串行执行）"""
+        return get_db_write_connection()
+
+    def write_transaction(self):
+        """获取写事务（with块内的写操作在同一个事务中提交）"""
+        return get_db_write_transaction()
     
-    def execute_query(self, query: str, params: tuple = ()) -> Optional[List[Tuple]]:
-        """执行查询并返回结果"""
+    def execute_query(self, query: str, params: tuple = (),
+                      session_id: Optional[str] = None) -> Optional[List[Tuple]]:
+        """
+        执行查询并返回结果
+
+        传入session_id时先等待该会话尚未提交的批量写入（读己之写）
+        """
+        if session_id is not None:
+            wait_for_session_writes(session_id)
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
@@ -36,10 +53,9 @@ class BaseRepository:
     def execute_insert(self, query: str, params: tuple = ()) -> bool:
         """执行插入操作"""
         try:
-            with self.get_connection() as conn:
+            with self.get_write_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(query, params)
-                conn.commit()
                 return True
 
         except Exception as e:
@@ -49,10 +65,9 @@ class BaseRepository:
     def execute_update(self, query: str, params: tuple = ()) -> bool:
         """执行更新操作"""
         try:
-            with self.get_connection() as conn:
+            with self.get_write_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(query, params)
-                conn.commit()
                 return True
 
         except Exception as e:
@@ -62,12 +77,19 @@ class BaseRepository:
     def execute_delete(self, query: str, params: tuple = ()) -> bool:
         """执行删除操作"""
         try:
-            with self.get_connection() as conn:
+            with self.get_write_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(query, params)
-                conn.commit()
                 return True
 
         except Exception as e:
             st.error(f"删除操作失败: {e}")
             return False
+
+    def queue_write(self, query: str, params: tuple = (), session_id: Optional[str] = None) -> WriteTicket:
+        """
+        提交到批量写入队列，不等待提交（同一会话的后续读取仍能读到）
+
+        只用于调用方不关心结果的写入；返回的回执在提交前不代表成功，需要结果时等待它
+        """
+        return get_write_behind_writer().submit(query, params, session_id=session_id)
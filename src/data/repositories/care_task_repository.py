@@ -0,0 +1,133 @@
+"""
+关怀任务仓库类
+负责主动关怀任务（scheduled_care）的存取
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+from .base_repository import BaseRepository
+from ..write_behind import wait_for_session_writes
+
+# 优先级从高到低排序用的表达式，必须和 idx_scheduled_care_pending 索引中的表达式一字不差，
+# 否则排序不能走索引（priority是文本，直接按它排序是 medium > low > high）
+PRIORITY_RANK = "CASE priority WHEN 'high' THEN 0 WHEN 'medium' THEN 1 ELSE 2 END"
+
+
+class CareTaskRepository(BaseRepository):
+    """关怀任务仓库类"""
+
+    def add_task(self, session_id: str, care_type: str, trigger_content: str,
+                 care_message: str, scheduled_time: datetime, priority: str) -> bool:
+        """保存关怀任务"""
+        try:
+            with self.get_write_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO scheduled_care
+                    (session_id, care_type, trigger_content, care_message, scheduled_time, priority)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (
+                    session_id, care_type, trigger_content, care_message,
+                    scheduled_time.isoformat(), priority
+                ))
+                return True
+
+        except Exception as e:
+            print(f"保存关怀任务失败: {e}")
+            return False
+
+    def get_pending_tasks(self, session_id: str, now: datetime) -> List[Dict]:
+        """获取已到执行时间的待执行关怀任务（高优先级在前，同优先级按预定时间）"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT id, care_type, trigger_content, care_message, scheduled_time, priority
+                    FROM scheduled_care
+                    WHERE session_id = ?
+                      AND status = 'pending'
+                      AND scheduled_time <= ?
+                    ORDER BY {PRIORITY_RANK}, scheduled_time ASC
+                ''', (session_id, now.isoformat()))
+                rows = cursor.fetchall()
+
+        except Exception as e:
+            print(f"获取关怀任务失败: {e}")
+            return []
+
+        return [
+            {
+                'id': row[0],
+                'care_type': row[1],
+                'trigger_content': row[2],
+                'care_message': row[3],
+                'scheduled_time': row[4],
+                'priority': row[5]
+            }
+            for row in rows
+        ]
+
+    def mark_completed(self, task_id: int, executed_at: datetime) -> bool:
+        """标记关怀任务为已完成"""
+        try:
+            with self.get_write_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE scheduled_care
+                    SET status = 'completed', executed_at = ?
+                    WHERE id = ?
+                ''', (executed_at.isoformat(), task_id))
+                return cursor.rowcount > 0
+
+        except Exception as e:
+            print(f"更新关怀任务状态失败: {e}")
+            return False
+
+    def delete_finished_before(self, cutoff: datetime) -> bool:
+        """删除截止时间之前已完成或已取消的关怀任务"""
+        try:
+            with self.get_write_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    DELETE FROM scheduled_care
+                    WHERE created_at < ? AND status IN ('completed', 'cancelled')
+                ''', (cutoff.isoformat(),))
+                return True
+
+        except Exception as e:
+            print(f"清理关怀任务失败: {e}")
+            return False
+
+    def count_tasks_since(self, session_id: str, care_type: str, since: datetime) -> Optional[int]:
+        """统计某类关怀任务在起始时间之后的创建数量"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT COUNT(*) FROM scheduled_care
+                    WHERE session_id = ?
+                      AND care_type = ?
+                      AND created_at > ?
+                ''', (session_id, care_type, since.isoformat()))
+                return cursor.fetchone()[0]
+
+        except Exception as e:
+            print(f"统计关怀任务失败: {e}")
+            return None
+
+    def count_messages_since(self, session_id: str, since: datetime) -> Optional[int]:
+        """统计起始时间之后的聊天消息数量（用于判断用户活跃度）"""
+        wait_for_session_writes(session_id)
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT COUNT(*) FROM chat_history
+                    WHERE session_id = ?
+                      AND timestamp > ?
+                ''', (session_id, since.isoformat()))
+                return cursor.fetchone()[0]
+
+        except Exception as e:
+            print(f"统计聊天消息失败: {e}")
+            return None
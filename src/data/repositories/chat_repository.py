@@ -3,132 +3,285 @@
 负责聊天历史、核心记忆、宝藏盒等数据的管理
 """
 
+import base64
+import binascii
 from datetime import datetime
-from typing import Optional, List, Tuple
+from typing import Dict, Optional, List, Sequence, Tuple
 import json
 from .base_repository import BaseRepository
+from ..write_behind import WriteTicket, get_write_behind_writer
+from ...models.history import HistoryPage
+
+_HISTORY_CURSOR_PREFIX = "h1:"
+
+
+def encode_history_cursor(before_id: int) -> str:
+    """把"该消息之前"编码成不透明的分页游标"""
+    return base64.urlsafe_b64encode(f"{_HISTORY_CURSOR_PREFIX}{before_id}".encode()).decode().rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> int:
+    """
+    解析分页游标
+
+    Raises:
+        ValueError: 游标格式不正确
+    """
+    try:
+        decoded = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(f"无效的分页游标: {cursor!r}") from e
+    if not decoded.startswith(_HISTORY_CURSOR_PREFIX) or not decoded[len(_HISTORY_CURSOR_PREFIX):].isdigit():
+        raise ValueError(f"无效的分页游标: {cursor!r}")
+    return int(decoded[len(_HISTORY_CURSOR_PREFIX):])
 
 
 class ChatRepository(BaseRepository):
     """聊天记录仓库类"""
     
     def add_message(self, session_id: str, role: str, content: str) -> Optional[int]:
-        """添加聊天消息，返回消息ID"""
-        try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO chat_history (session_id, role, content, timestamp)
-                    VALUES (?, ?, ?, ?)
-                ''', (session_id, role, content, datetime.now()))
-
-                message_id = cursor.lastrowid
-                conn.commit()
-                return message_id
+        """添加聊天消息，返回消息ID（和同时到达的其他写入合并在一个事务中提交）"""
+        query = '''
+            INSERT INTO chat_history (session_id, role, content, timestamp)
+            VALUES (?, ?, ?, ?)
+        '''
+        ticket = get_write_behind_writer().submit(
+            query, (session_id, role, content, datetime.now()),
+            session_id=session_id, wait=True, timeout=10.0
+        )
 
-        except Exception as e:
-            print(f"添加消息失败: {e}")
+        if not ticket.wait(0):
+            print(f"添加消息失败: {ticket.error or '写入超时'}")
             return None
+        return ticket.lastrowid
+
+    def queue_message(self, session_id: str, role: str, content: str) -> WriteTicket:
+        """添加聊天消息，不等待提交（不需要消息ID时使用），返回写入回执"""
+        query = '''
+            INSERT INTO chat_history (session_id, role, content, timestamp)
+            VALUES (?, ?, ?, ?)
+        '''
+        return self.queue_write(query, (session_id, role, content, datetime.now()), session_id)
     
     def get_history(self, session_id: str, limit: int = 20) -> List[Tuple[str, str, str]]:
-        """获取聊天历史"""
+        """获取最近的聊天历史（按消息ID排序，同一时刻写入的消息也不会乱序）"""
         query = '''
             SELECT role, content, timestamp FROM chat_history
             WHERE session_id = ?
-            ORDER BY timestamp DESC
+            ORDER BY id DESC
             LIMIT ?
         '''
         params = (session_id, limit)
-        results = self.execute_query(query, params)
+        results = self.execute_query(query, params, session_id)
         
         if results:
             # 返回按时间正序排列的历史记录
             return [(role, content, timestamp) for role, content, timestamp in reversed(results)]
         return []
 
-    def get_history_paginated(self, session_id: str, limit: int = 20, offset: int = 0) -> List[Tuple[str, str, str]]:
-        """获取分页聊天历史"""
-        query = '''
-            SELECT role, content, timestamp FROM chat_history
-            WHERE session_id = ?
-            ORDER BY timestamp DESC
-            LIMIT ? OFFSET ?
+    def get_history_page(self, session_id: str, limit: int = 20,
+                         cursor: Optional[str] = None) -> HistoryPage:
+        """
+        按游标分页获取聊天历史（"加载更早的消息"）
+
+        沿 (session_id, id) 索引从游标处往前取 limit 条，
+        翻到多早的位置都只读一页的数据
+
+        Args:
+            session_id: 会话ID
+            limit: 每页消息条数
+            cursor: 上一页返回的 next_cursor；None表示最新的一页
+
+        Returns:
+            HistoryPage: 按时间正序的消息和更早一页的游标
+
+        Raises:
+            ValueError: 游标格式不正确
+        """
+        before_clause, params = "", [session_id]
+        if cursor:
+            before_clause = "AND id < ?"
+            params.append(decode_history_cursor(cursor))
+        # 多取一条用来判断是否还有更早的消息
+        params.append(limit + 1)
+        query = f'''
+            SELECT id, role, content, timestamp FROM chat_history
+            WHERE session_id = ? {before_clause}
+            ORDER BY id DESC
+            LIMIT ?
         '''
-        results = self.execute_query(query, (session_id, limit, offset))
-        if results:
-            # 返回按时间正序排列的历史记录
-            return [(role, content, timestamp) for role, content, timestamp in reversed(results)]
-        return []
+        results = self.execute_query(query, tuple(params), session_id) or []
+
+        rows = results[:limit]
+        next_cursor = encode_history_cursor(rows[-1][0]) if len(results) > limit else None
+        return HistoryPage(
+            messages=[(role, content, timestamp) for _, role, content, timestamp in reversed(rows)],
+            next_cursor=next_cursor
+        )
 
     def get_message_count(self, session_id: str) -> int:
         """获取会话的消息总数"""
         query = 'SELECT COUNT(*) FROM chat_history WHERE session_id = ?'
-        results = self.execute_query(query, (session_id,))
+        results = self.execute_query(query, (session_id,), session_id)
         return results[0][0] if results else 0
 
-    def get_recent_context(self, session_id: str, context_turns: int = 6) -> List[Tuple[str, str]]:
-        """获取最近的对话上下文用于AI"""
+    def get_recent_context(self, session_id: str, context_turns: int = 6,
+                           after_id: int = 0) -> List[Tuple[str, str]]:
+        """获取最近的对话上下文用于AI（after_id: 只取该消息之后的消息，即尚未进入摘要的部分）"""
         query = '''
             SELECT role, content FROM chat_history
-            WHERE session_id = ?
-            ORDER BY timestamp DESC
+            WHERE session_id = ? AND id > ?
+            ORDER BY id DESC
             LIMIT ?
         '''
-        params = (session_id, context_turns * 2)  # 乘以2因为每轮有用户和助手两条消息
-        results = self.execute_query(query, params)
+        params = (session_id, after_id, context_turns * 2)  # 乘以2因为每轮有用户和助手两条消息
+        results = self.execute_query(query, params, session_id)
         
         if results:
             # 按时间正序排列
             return [(role, content) for role, content in reversed(results)]
         return []
     
+    def get_messages_after(self, session_id: str, after_id: int = 0) -> List[Tuple[int, str, str]]:
+        """获取某条消息之后的全部消息 (id, role, content)，按时间正序"""
+        query = '''
+            SELECT id, role, content FROM chat_history
+            WHERE session_id = ? AND id > ?
+            ORDER BY id
+        '''
+        results = self.execute_query(query, (session_id, after_id), session_id)
+        return [(message_id, role, content) for message_id, role, content in results or []]
+
     def get_last_message_timestamp(self, session_id: str) -> Optional[str]:
         """获取最后一条消息的时间戳"""
         query = '''
             SELECT timestamp FROM chat_history
             WHERE session_id = ?
-            ORDER BY timestamp DESC
+            ORDER BY id DESC
             LIMIT 1
         '''
         params = (session_id,)
-        results = self.execute_query(query, params)
+        results = self.execute_query(query, params, session_id)
         
         if results and results[0]:
             return results[0][0]
         return None
     
-    def add_core_memory(self, session_id: str, memory_type: str, content: str) -> bool:
-        """添加核心记忆"""
+    def get_last_message_id(self, session_id: str, role: Optional[str] = None) -> Optional[int]:
+        """获取最后一条消息的ID，可按角色过滤"""
+        if role:
+            query = '''
+                SELECT id FROM chat_history
+                WHERE session_id = ? AND role = ?
+                ORDER BY id DESC
+                LIMIT 1
+            '''
+            params = (session_id, role)
+        else:
+            query = '''
+                SELECT id FROM chat_history
+                WHERE session_id = ?
+                ORDER BY id DESC
+                LIMIT 1
+            '''
+            params = (session_id,)
+        results = self.execute_query(query, params, session_id)
+
+        if results and results[0]:
+            return results[0][0]
+        return None
+
+    def get_user_messages_after(self, last_id: int, limit: int = 1000) -> List[Tuple[int, str, str, str]]:
+        """
+        按ID顺序获取所有会话中ID大于last_id的用户消息（用于批量回填）
+
+        Returns:
+            List[Tuple]: (id, session_id, content, timestamp)
+        """
+        query = '''
+            SELECT id, session_id, content, timestamp FROM chat_history
+            WHERE role = 'user' AND id > ?
+            ORDER BY id
+            LIMIT ?
+        '''
+        results = self.execute_query(query, (last_id, limit))
+        return [tuple(row) for row in results] if results else []
+
+    def add_core_memory(self, session_id: str, memory_type: str, content: str) -> Optional[int]:
+        """添加核心记忆，返回记忆ID（用于写入记忆索引）"""
         query = '''
             INSERT INTO core_memories (session_id, memory_type, content, timestamp)
             VALUES (?, ?, ?, ?)
         '''
-        params = (session_id, memory_type, content, datetime.now())
-        return self.execute_insert(query, params)
+        ticket = get_write_behind_writer().submit(
+            query, (session_id, memory_type, content, datetime.now()),
+            session_id=session_id, wait=True, timeout=10.0
+        )
+
+        if not ticket.wait(0):
+            print(f"添加核心记忆失败: {ticket.error or '写入超时'}")
+            return None
+        return ticket.lastrowid
+
+    def get_core_memories_after(self, session_id: str, after_id: int = 0) -> List[Tuple[int, str]]:
+        """获取某条记忆之后的全部核心记忆 (id, content)，用于补齐记忆索引"""
+        query = '''
+            SELECT id, content FROM core_memories
+            WHERE session_id = ? AND id > ?
+            ORDER BY id
+        '''
+        results = self.execute_query(query, (session_id, after_id), session_id)
+        return [(memory_id, content) for memory_id, content in results or []]
+
+    def get_core_memories_by_ids(self, session_id: str,
+                                 memory_ids: Sequence[int]) -> Dict[int, Tuple[str, str, str]]:
+        """按ID获取核心记忆：id -> (memory_type, content, timestamp)"""
+        if not memory_ids:
+            return {}
+        placeholders = ", ".join("?" * len(memory_ids))
+        query = f'''
+            SELECT id, memory_type, content, timestamp FROM core_memories
+            WHERE session_id = ? AND id IN ({placeholders})
+        '''
+        results = self.execute_query(query, (session_id, *memory_ids), session_id)
+        return {row[0]: (row[1], row[2], row[3]) for row in results or []}
+
+    def get_messages_by_ids(self, session_id: str, message_ids: Sequence[int]) -> Dict[int, Tuple[str, str]]:
+        """按ID获取聊天消息：id -> (content, timestamp)"""
+        if not message_ids:
+            return {}
+        placeholders = ", ".join("?" * len(message_ids))
+        query = f'''
+            SELECT id, content, timestamp FROM chat_history
+            WHERE session_id = ? AND id IN ({placeholders})
+        '''
+        results = self.execute_query(query, (session_id, *message_ids), session_id)
+        return {row[0]: (row[1], row[2]) for row in results or []}
     
     def get_core_memories(self, session_id: str, limit: int = 5) -> List[Tuple[str, str, str]]:
-        """获取核心记忆"""
+        """获取最近的核心记忆（按记忆ID倒序，即保存的先后）"""
         query = '''
             SELECT memory_type, content, timestamp FROM core_memories
             WHERE session_id = ?
-            ORDER BY timestamp DESC
+            ORDER BY id DESC
             LIMIT ?
         '''
         params = (session_id, limit)
-        results = self.execute_query(query, params)
+        results = self.execute_query(query, params, session_id)
         
         if results:
             return [(memory_type, content, timestamp) for memory_type, content, timestamp in results]
         return []
     
-    def add_treasure(self, session_id: str, gift_type: str, gift_content: str, is_favorite: bool = False) -> bool:
-        """添加宝藏"""
+    def add_treasure(self, session_id: str, gift_type: str, gift_content: str,
+                     is_favorite: bool = False) -> WriteTicket:
+        """添加宝藏（不等待提交），返回写入回执"""
         query = '''
             INSERT INTO treasure_box (session_id, gift_type, gift_content, collected_at, is_favorite)
             VALUES (?, ?, ?, ?, ?)
         '''
         params = (session_id, gift_type, gift_content, datetime.now(), is_favorite)
-        return self.execute_insert(query, params)
+        return self.queue_write(query, params, session_id)
     
     def get_treasures(self, session_id: str, limit: int = 10) -> List[Tuple[str, str, str, bool]]:
         """获取宝藏列表"""
@@ -139,7 +292,7 @@ class ChatRepository(BaseRepository):
             LIMIT ?
         '''
         params = (session_id, limit)
-        results = self.execute_query(query, params)
+        results = self.execute_query(query, params, session_id)
         
         if results:
             return [(gift_type, gift_content, collected_at, is_favorite) for gift_type, gift_content, collected_at, is_favorite in results]
@@ -154,14 +307,15 @@ class ChatRepository(BaseRepository):
         params = (input_hash, model_name, json.dumps(response, ensure_ascii=False))
         return self.execute_insert(query, params)
     
-    def get_cached_response(self, input_hash: str, model_name: str) -> Optional[dict]:
-        """获取缓存的AI响应"""
+    def get_cached_response(self, input_hash: str, model_name: str,
+                            ttl_seconds: int = 3600) -> Optional[dict]:
+        """获取缓存的AI响应（超过有效期的视为未命中）"""
         query = '''
             SELECT response FROM ai_cache
             WHERE input_hash = ? AND model = ?
-            AND created_at > datetime('now', '-1 hour')
+            AND created_at > datetime('now', ?)
         '''
-        params = (input_hash, model_name)
+        params = (input_hash, model_name, f'-{int(ttl_seconds)} seconds')
         results = self.execute_query(query, params)
         
         if results and results[0]:
@@ -170,3 +324,22 @@ class ChatRepository(BaseRepository):
             except json.JSONDecodeError:
                 return None
         return None
+
+    def prune_cached_responses(self, ttl_seconds: int, max_entries: int) -> bool:
+        """删除过期的缓存，并只保留最新的max_entries条"""
+        try:
+            with self.write_transaction() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    DELETE FROM ai_cache WHERE created_at <= datetime('now', ?)
+                ''', (f'-{int(ttl_seconds)} seconds',))
+                cursor.execute('''
+                    DELETE FROM ai_cache WHERE id NOT IN (
+                        SELECT id FROM ai_cache ORDER BY created_at DESC, id DESC LIMIT ?
+                    )
+                ''', (max_entries,))
+                return True
+
+        except Exception as e:
+            print(f"清理AI缓存失败: {e}")
+            return False
@@ -0,0 +1,54 @@
+"""
+对话摘要仓库类
+负责滚动对话摘要（conversation_summaries）的存取
+"""
+
+from datetime import datetime
+from typing import Dict, Optional
+from .base_repository import BaseRepository
+from ..write_behind import get_write_behind_writer
+
+
+class ConversationSummaryRepository(BaseRepository):
+    """对话摘要仓库类"""
+
+    def get_latest_summary(self, session_id: str) -> Optional[Dict]:
+        """
+        获取会话最新的摘要
+
+        Returns:
+            Optional[Dict]: summary, covered_until_id, message_count；还没有摘要时为None
+        """
+        query = '''
+            SELECT summary, covered_until_id, message_count FROM conversation_summaries
+            WHERE session_id = ?
+            ORDER BY covered_until_id DESC
+            LIMIT 1
+        '''
+        results = self.execute_query(query, (session_id,), session_id)
+        if not results:
+            return None
+        summary, covered_until_id, message_count = results[0]
+        return {
+            "summary": summary,
+            "covered_until_id": covered_until_id,
+            "message_count": message_count
+        }
+
+    def add_summary(self, session_id: str, summary: str, covered_until_id: int,
+                    message_count: int) -> bool:
+        """保存新的摘要（覆盖到 covered_until_id 为止的全部消息）"""
+        query = '''
+            INSERT INTO conversation_summaries
+            (session_id, summary, covered_until_id, message_count, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        '''
+        ticket = get_write_behind_writer().submit(
+            query, (session_id, summary, covered_until_id, message_count, datetime.now()),
+            session_id=session_id, wait=True, timeout=10.0
+        )
+
+        if not ticket.wait(0):
+            print(f"保存对话摘要失败: {ticket.error or '写入超时'}")
+            return False
+        return True
@@ -0,0 +1,261 @@
+"""
+情感分析仓库类
+负责情感分析记录、情感趋势汇总和共情回应记录的存取
+"""
+
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Sequence, Tuple
+from .base_repository import BaseRepository
+from ..write_behind import WriteTicket, wait_for_session_writes
+
+
+# 情感趋势的时间桶宽度
+TREND_BUCKETS = {
+    "hourly": timedelta(hours=1),
+    "daily": timedelta(days=1),
+    "weekly": timedelta(weeks=1),
+}
+
+# emotion_trends.start_time / end_time 的存储格式
+TREND_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def trend_bucket_start(time_period: str, moment: datetime) -> datetime:
+    """时间点所在趋势桶的起始时间（整点、当天零点、本周一零点）"""
+    if time_period == "hourly":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if time_period == "weekly":
+        start -= timedelta(days=start.weekday())
+    return start
+
+
+class EmotionAnalysisRepository(BaseRepository):
+    """情感分析仓库类"""
+
+    # emotion_analysis 一行记录的列顺序
+    ANALYSIS_COLUMNS = (
+        "session_id", "message_id", "primary_emotion", "emotion_intensity",
+        "emotion_valence", "emotion_arousal", "secondary_emotions",
+        "confidence_score", "trigger_keywords", "empathy_strategy", "created_at"
+    )
+
+    _INSERT_ANALYSIS = (
+        f"INSERT INTO emotion_analysis ({', '.join(ANALYSIS_COLUMNS)}) "
+        f"VALUES ({', '.join('?' * len(ANALYSIS_COLUMNS))})"
+    )
+
+    # 把一条分析结果累加到所在的趋势桶：计数、均值和M2按Welford算法逐条更新
+    _UPSERT_TREND = '''
+        INSERT INTO emotion_trends (
+            session_id, time_period, start_time, end_time, sample_count,
+            avg_intensity, intensity_m2, avg_valence, avg_arousal, emotion_counts,
+            dominant_emotion, emotion_volatility, recent_valences, trend_direction, updated_at
+        ) VALUES (?, ?, ?, ?, 1, ?, 0, ?, ?, json_object(?, 1), ?, 0, json_array(?), 'stable', ?)
+        ON CONFLICT(session_id, time_period, start_time) DO UPDATE SET
+            sample_count = sample_count + 1,
+            avg_intensity = avg_intensity
+                + (excluded.avg_intensity - avg_intensity) / (sample_count + 1.0),
+            intensity_m2 = intensity_m2
+                + (excluded.avg_intensity - avg_intensity) * (excluded.avg_intensity - avg_intensity)
+                * sample_count / (sample_count + 1.0),
+            avg_valence = avg_valence + (excluded.avg_valence - avg_valence) / (sample_count + 1.0),
+            avg_arousal = avg_arousal + (excluded.avg_arousal - avg_arousal) / (sample_count + 1.0),
+            emotion_counts = json_set(
+                emotion_counts, '$."' || excluded.dominant_emotion || '"',
+                coalesce(json_extract(emotion_counts, '$."' || excluded.dominant_emotion || '"'), 0) + 1
+            ),
+            recent_valences = json_insert(
+                CASE WHEN json_array_length(recent_valences) >= 3
+                     THEN json_remove(recent_valences, '$[0]') ELSE recent_valences END,
+                '$[#]', excluded.avg_valence
+            ),
+            updated_at = excluded.updated_at
+    '''
+
+    # 根据累计量刷新桶的派生列（波动性、主导情绪、趋势方向），口径与全量计算一致
+    _REFRESH_TREND = '''
+        UPDATE emotion_trends SET
+            emotion_volatility = min(sqrt(intensity_m2 / sample_count) / 10.0, 1.0),
+            dominant_emotion = (
+                SELECT key FROM json_each(emotion_trends.emotion_counts)
+                ORDER BY value DESC, id LIMIT 1
+            ),
+            trend_direction = (
+                SELECT CASE
+                    WHEN emotion_trends.sample_count < 3 THEN 'stable'
+                    WHEN recent.total / 3.0 > recent.earlier + 0.1 THEN 'improving'
+                    WHEN recent.total / 3.0 < recent.earlier - 0.1 THEN 'declining'
+                    ELSE 'stable'
+                END
+                FROM (
+                    SELECT total(value) AS total,
+                           CASE WHEN emotion_trends.sample_count > 3
+                                THEN (emotion_trends.avg_valence * emotion_trends.sample_count - total(value))
+                                     / (emotion_trends.sample_count - 3)
+                                ELSE emotion_trends.avg_valence END AS earlier
+                    FROM json_each(emotion_trends.recent_valences)
+                ) AS recent
+            )
+        WHERE session_id = ? AND time_period = ? AND start_time = ?
+    '''
+
+    def save_analysis(self, record: Tuple) -> WriteTicket:
+        """保存一条情感分析结果（走批量写入队列，返回写入回执），record列顺序见ANALYSIS_COLUMNS"""
+        return self.queue_write(self._INSERT_ANALYSIS, record, record[0])
+
+    def replace_analyses(self, records: Sequence[Tuple]) -> bool:
+        """
+        批量写入情感分析结果，同一消息已有的分析记录会被替换（用于重新打分回填）
+
+        删除和插入在同一个事务中用executemany完成
+        """
+        if not records:
+            return True
+        try:
+            with self.write_transaction() as conn:
+                conn.executemany(
+                    "DELETE FROM emotion_analysis WHERE message_id = ?",
+                    [(record[1],) for record in records]
+                )
+                conn.executemany(self._INSERT_ANALYSIS, records)
+                return True
+
+        except Exception as e:
+            print(f"批量保存情感分析结果失败: {e}")
+            return False
+
+    def _trend_writes(self, session_id: str, primary_emotion: str, intensity: float,
+                      valence: float, arousal: float, created_at: datetime) -> List[Tuple[str, Tuple]]:
+        """一条分析结果对应的趋势桶写入语句（每个时间周期一次累加、一次派生列刷新）"""
+        statements = []
+        for time_period, width in TREND_BUCKETS.items():
+            start = trend_bucket_start(time_period, created_at)
+            start_time = start.strftime(TREND_TIME_FORMAT)
+            statements.append((self._UPSERT_TREND, (
+                session_id, time_period, start_time, (start + width).strftime(TREND_TIME_FORMAT),
+                intensity, valence, arousal, primary_emotion, primary_emotion, valence, datetime.now()
+            )))
+            statements.append((self._REFRESH_TREND, (session_id, time_period, start_time)))
+        return statements
+
+    def update_trends(self, session_id: str, primary_emotion: str, intensity: float,
+                      valence: float, arousal: float,
+                      created_at: Optional[datetime] = None) -> List[WriteTicket]:
+        """把一条分析结果增量累加到小时/天/周三个趋势桶（走批量写入队列，返回各条写入的回执）"""
+        return [
+            self.queue_write(query, params, session_id)
+            for query, params in self._trend_writes(
+                session_id, primary_emotion, intensity, valence, arousal, created_at or datetime.now()
+            )
+        ]
+
+    def get_trend_buckets(self, session_id: str, time_period: str, since: datetime) -> List[Tuple]:
+        """
+        获取起始时间之后的趋势桶（按时间正序），走唯一索引的范围查找
+
+        Returns:
+            List[Tuple]: (start_time, end_time, sample_count, avg_intensity, intensity_m2,
+                avg_valence, avg_arousal, emotion_counts, recent_valences)
+        """
+        wait_for_session_writes(session_id)
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT start_time, end_time, sample_count, avg_intensity, intensity_m2,
+                           avg_valence, avg_arousal, emotion_counts, recent_valences
+                    FROM emotion_trends
+                    WHERE session_id = ? AND time_period = ? AND start_time >= ?
+                    ORDER BY start_time
+                ''', (session_id, time_period, since.strftime(TREND_TIME_FORMAT)))
+                return cursor.fetchall()
+
+        except Exception as e:
+            print(f"获取情感趋势失败: {e}")
+            return []
+
+    def rebuild_trends(self, session_ids: Optional[Iterable[str]] = None) -> bool:
+        """
+        根据emotion_analysis重新生成趋势桶（回填或修改历史分析记录之后使用）
+
+        Args:
+            session_ids: 只重建这些会话；None表示重建全部
+        """
+        session_ids = list(session_ids) if session_ids is not None else None
+        try:
+            with self.write_transaction() as conn:
+                if session_ids is None:
+                    conn.execute("DELETE FROM emotion_trends")
+                    rows = conn.execute('''
+                        SELECT session_id, primary_emotion, emotion_intensity,
+                               emotion_valence, emotion_arousal, created_at
+                        FROM emotion_analysis ORDER BY session_id, created_at, id
+                    ''')
+                    self._replay_trends(conn, rows)
+                for session_id in session_ids or []:
+                    conn.execute("DELETE FROM emotion_trends WHERE session_id = ?", (session_id,))
+                    rows = conn.execute('''
+                        SELECT session_id, primary_emotion, emotion_intensity,
+                               emotion_valence, emotion_arousal, created_at
+                        FROM emotion_analysis WHERE session_id = ? ORDER BY created_at, id
+                    ''', (session_id,))
+                    self._replay_trends(conn, rows)
+                return True
+
+        except Exception as e:
+            print(f"重建情感趋势失败: {e}")
+            return False
+
+    def _replay_trends(self, conn, rows):
+        """逐条累加历史记录，派生列在最后每个桶只刷新一次"""
+        refreshed = {}
+        for session_id, emotion, intensity, valence, arousal, created_at in rows.fetchall():
+            if isinstance(created_at, str):
+                created_at = datetime.fromisoformat(created_at)
+            for query, params in self._trend_writes(session_id, emotion, intensity, valence, arousal, created_at):
+                if query is self._REFRESH_TREND:
+                    refreshed[params] = None
+                else:
+                    conn.execute(query, params)
+        conn.executemany(self._REFRESH_TREND, list(refreshed))
+
+    def get_analyses_since(self, session_id: str, start_time: datetime) -> List[Tuple]:
+        """获取起始时间之后的情感分析记录（按时间正序）"""
+        wait_for_session_writes(session_id)
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT primary_emotion, emotion_intensity, emotion_valence,
+                           emotion_arousal, created_at
+                    FROM emotion_analysis
+                    WHERE session_id = ? AND created_at >= ?
+                    ORDER BY created_at
+                ''', (session_id, start_time))
+                return cursor.fetchall()
+
+        except Exception as e:
+            print(f"获取情感分析记录失败: {e}")
+            return []
+
+    def save_empathy_response(self, session_id: str, analysis_id: int, empathy_type: str,
+                              response_tone: str, key_phrases_json: str) -> bool:
+        """保存共情回应记录"""
+        try:
+            with self.get_write_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO empathy_responses (
+                        session_id, analysis_id, empathy_type, response_tone,
+                        key_phrases, created_at
+                    ) VALUES (?, ?, ?, ?, ?, ?)
+                ''', (
+                    session_id, analysis_id, empathy_type, response_tone,
+                    key_phrases_json, datetime.now()
+                ))
+                return True
+
+        except Exception as e:
+            print(f"保存共情回应失败: {e}")
+            return False
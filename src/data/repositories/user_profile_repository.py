@@ -3,13 +3,52 @@
 负责亲密度养成系统的数据管理
 """
 
+import math
 from datetime import datetime
 from typing import Optional, Dict, Tuple
 from .base_repository import BaseRepository
 
 
+# 从1级升到L级共需累计经验 25*L*(L-1)（每级需要 当前等级*50）
+def total_exp(level: int, exp: int) -> int:
+    """等级和当前等级内的经验值 -> 累计经验值"""
+    return 25 * level * (level - 1) + exp
+
+
+def level_for_total_exp(total: int) -> Tuple[int, int]:
+    """累计经验值 -> (等级, 当前等级内的经验值)，与 _level_sql 的公式相同"""
+    level = (5 + math.isqrt(25 + 4 * total)) // 10
+    return level, total - 25 * level * (level - 1)
+
+
+def _level_sql(total: str) -> str:
+    # 等级 = floor((5 + sqrt(25 + 4*累计经验)) / 10)；升级临界点上根号内是完全平方数，浮点sqrt是精确的
+    return f"CAST((5 + sqrt(25 + 4 * ({total}))) / 10 AS INTEGER)"
+
+
+def _exp_sql(total: str) -> str:
+    level = _level_sql(total)
+    return f"({total}) - 25 * {level} * ({level} - 1)"
+
+
+_STORED_TOTAL_EXP = "25 * intimacy_level * (intimacy_level - 1) + intimacy_exp + :exp"
+
+
 class UserProfileRepository(BaseRepository):
     """用户档案仓库类 - v5.0 亲密度养成系统"""
+
+    # 档案不存在时创建，存在时累加经验值和互动次数并按累计经验重新计算等级，
+    # 整个读-改-写在一条语句里完成，同一会话并发加经验不会互相覆盖
+    _ADD_EXP = f'''
+        INSERT INTO user_profiles (session_id, intimacy_level, intimacy_exp, total_interactions, created_at, updated_at)
+        VALUES (:session_id, {_level_sql(":exp")}, {_exp_sql(":exp")}, :interactions, :now, :now)
+        ON CONFLICT(session_id) DO UPDATE SET
+            intimacy_level = {_level_sql(_STORED_TOTAL_EXP)},
+            intimacy_exp = {_exp_sql(_STORED_TOTAL_EXP)},
+            total_interactions = total_interactions + :interactions,
+            updated_at = :now
+        RETURNING intimacy_level, intimacy_exp, total_interactions, created_at, updated_at
+    '''
     
     def get_profile(self, session_id: str) -> Optional[Dict]:
         """获取用户档案信息"""
@@ -19,7 +58,7 @@ class UserProfileRepository(BaseRepository):
             WHERE session_id = ?
         '''
         params = (session_id,)
-        results = self.execute_query(query, params)
+        results = self.execute_query(query, params, session_id)
         
         if results and results[0]:
             level, exp, total_interactions, created_at, updated_at = results[0]
@@ -33,7 +72,7 @@ class UserProfileRepository(BaseRepository):
         return None
     
     def update_profile(self, session_id: str, level: int, exp: int, total_interactions: int = None) -> bool:
-        """更新用户档案信息"""
+        """更新用户档案信息，档案不存在或写入失败时返回False"""
         if total_interactions is not None:
             query = '''
                 UPDATE user_profiles 
@@ -49,7 +88,13 @@ class UserProfileRepository(BaseRepository):
             '''
             params = (level, exp, datetime.now(), session_id)
         
-        return self.execute_update(query, params)
+        try:
+            with self.get_write_connection() as conn:
+                return conn.execute(query, params).rowcount > 0
+
+        except Exception as e:
+            print(f"更新用户档案失败: {e}")
+            return False
     
     def find_or_create_profile(self, session_id: str) -> Dict:
         """查找或创建用户档案"""
@@ -59,10 +104,11 @@ class UserProfileRepository(BaseRepository):
         if profile:
             return profile
         
-        # 如果不存在，创建新档案
+        # 如果不存在，创建新档案（另一个标签页同时创建时保留先写入的那份）
         query = '''
             INSERT INTO user_profiles (session_id, intimacy_level, intimacy_exp, total_interactions, created_at, updated_at)
             VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(session_id) DO NOTHING
         '''
         params = (session_id, 1, 0, 0, datetime.now(), datetime.now())
         
@@ -85,6 +131,34 @@ class UserProfileRepository(BaseRepository):
                 "updated_at": datetime.now().isoformat()
             }
     
+    def add_exp(self, session_id: str, exp_to_add: int, interactions: int = 1) -> Optional[Dict]:
+        """
+        原子地增加经验值和互动次数（档案不存在时先创建）
+
+        Returns:
+            Optional[Dict]: 更新后的档案，格式同get_profile；写入失败时为None
+        """
+        params = {
+            "session_id": session_id, "exp": exp_to_add,
+            "interactions": interactions, "now": datetime.now()
+        }
+        try:
+            with self.get_write_connection() as conn:
+                row = conn.execute(self._ADD_EXP, params).fetchall()[0]
+
+        except Exception as e:
+            print(f"增加经验值失败: {e}")
+            return None
+
+        level, exp, total_interactions, created_at, updated_at = row
+        return {
+            "intimacy_level": level,
+            "intimacy_exp": exp,
+            "total_interactions": total_interactions,
+            "created_at": created_at,
+            "updated_at": updated_at
+        }
+
     def increment_interactions(self, session_id: str) -> bool:
         """增加互动次数"""
         query = '''
@@ -0,0 +1,382 @@
+"""
+批量写入队列（write-behind）
+聊天记录、宝藏、经验值和情感分析的写入先进入内存队列，
+由单个写线程每隔一小段时间（或攒够一批）合并成一个事务提交，
+把每条写入一次的事务提交开销摊到整批上
+
+- 读己之写：同一会话的读取会先等待该会话尚未提交的写入
+- 背压：队列满时写入方阻塞，直到写线程腾出空间
+- 批量事务和其他写操作共用连接池的写连接，在同一把锁上排队
+- 进程退出前提交剩余写入
+"""
+
+import atexit
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+from ..config.settings import settings
+from .connection_pool import SQLiteWriter, get_db_writer
+
+
+class WriteTicket:
+    """单条写入的回执，可以等待提交并取得lastrowid"""
+
+    __slots__ = ('_done', 'lastrowid', 'error')
+
+    def __init__(self):
+        self._done = threading.Event()
+        self.lastrowid: Optional[int] = None
+        self.error: Optional[Exception] = None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待写入提交
+
+        Returns:
+            bool: 是否在超时前提交成功
+        """
+        return self._done.wait(timeout) and self.error is None
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def _resolve(self, lastrowid: Optional[int] = None, error: Optional[Exception] = None):
+        self.lastrowid = lastrowid
+        self.error = error
+        self._done.set()
+
+
+class _PendingWrite:
+    __slots__ = ('sql', 'params', 'session_id', 'ticket', 'urgent')
+
+    def __init__(self, sql: str, params: tuple, session_id: Optional[str],
+                 ticket: WriteTicket, urgent: bool):
+        self.sql = sql
+        self.params = params
+        self.session_id = session_id
+        self.ticket = ticket
+        self.urgent = urgent
+
+
+# 队列中的控制标记
+_FLUSH = object()
+_STOP = object()
+
+
+class WriteBehindWriter:
+    """批量写入队列（单个写线程，按提交顺序执行）"""
+
+    def __init__(self, database_path: Optional[str] = None, batch_size: Optional[int] = None,
+                 flush_interval: Optional[float] = None, max_size: Optional[int] = None):
+        self.database_path = database_path or settings.database_path
+        self.batch_size = batch_size or settings.write_batch_size
+        self.flush_interval = flush_interval if flush_interval is not None else settings.write_flush_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_size or settings.write_queue_max_size)
+
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        self._closed = False
+        # 写其他数据库文件时（例如测试）使用自己的写连接
+        self._own_db_writer: Optional[SQLiteWriter] = None
+
+        # 尚未提交的写入数量（按会话统计），用于读己之写
+        self._pending_cond = threading.Condition()
+        self._pending_total = 0
+        self._pending_by_session: Dict[Optional[str], int] = {}
+
+        self.submitted = 0
+        self.committed = 0
+        self.failed = 0
+        self.batches = 0
+        self.inline = 0
+        self.backpressure_waits = 0
+
+    def submit(self, sql: str, params: tuple = (), session_id: Optional[str] = None,
+               wait: bool = False, timeout: Optional[float] = None) -> WriteTicket:
+        """
+        提交一条写入
+
+        Args:
+            sql: 写入语句
+            params: 参数
+            session_id: 所属会话（同一会话的读取会先等待这条写入提交）
+            wait: 是否等待提交完成（需要lastrowid时使用，写线程会立即提交当前批次）
+            timeout: wait=True 时的最长等待时间
+
+        Returns:
+            WriteTicket: 写入回执
+        """
+        ticket = WriteTicket()
+
+        if not settings.write_behind_enabled or self._closed:
+            with self._pending_cond:
+                self.inline += 1
+            self._write_inline(sql, params, ticket)
+            return ticket
+
+        self._ensure_worker()
+        self._add_pending(session_id)
+        item = _PendingWrite(sql, params, session_id, ticket, urgent=wait)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # 背压：等待写线程腾出空间
+            with self._pending_cond:
+                self.backpressure_waits += 1
+            self._put_blocking(item)
+
+        if wait:
+            ticket.wait(timeout)
+        return ticket
+
+    def flush(self, session_id: Optional[str] = None, timeout: Optional[float] = None) -> bool:
+        """
+        立即提交并等待尚未提交的写入
+
+        Args:
+            session_id: 只等待该会话的写入；None表示等待全部写入
+            timeout: 最长等待时间
+
+        Returns:
+            bool: 是否在超时前全部提交
+        """
+        with self._pending_cond:
+            if not self._has_pending(session_id):
+                return True
+
+        if self._worker is not None and self._worker.is_alive():
+            self._put_blocking(_FLUSH)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._pending_cond:
+            while self._has_pending(session_id):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._pending_cond.wait(remaining)
+        return True
+
+    def has_pending(self, session_id: Optional[str] = None) -> bool:
+        """是否有尚未提交的写入"""
+        with self._pending_cond:
+            return self._has_pending(session_id)
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """提交剩余写入并停止写线程，之后的写入直接执行"""
+        self._closed = True
+        worker = self._worker
+        if worker is not None and worker.is_alive():
+            self._put_blocking(_STOP)
+            worker.join(timeout)
+
+    def get_stats(self) -> Dict:
+        """写入统计"""
+        with self._pending_cond:
+            return {
+                "submitted": self.submitted,
+                "committed": self.committed,
+                "failed": self.failed,
+                "batches": self.batches,
+                "inline": self.inline,
+                "backpressure_waits": self.backpressure_waits,
+                "pending": self._pending_total,
+                "avg_batch_size": round(self.committed / self.batches, 2) if self.batches else 0.0
+            }
+
+    def _has_pending(self, session_id: Optional[str]) -> bool:
+        if session_id is None:
+            return self._pending_total > 0
+        return self._pending_by_session.get(session_id, 0) > 0
+
+    def _add_pending(self, session_id: Optional[str]):
+        with self._pending_cond:
+            self.submitted += 1
+            self._pending_total += 1
+            self._pending_by_session[session_id] = self._pending_by_session.get(session_id, 0) + 1
+
+    def _remove_pending(self, batch: List[_PendingWrite]):
+        with self._pending_cond:
+            for item in batch:
+                self._pending_total -= 1
+                remaining = self._pending_by_session[item.session_id] - 1
+                if remaining:
+                    self._pending_by_session[item.session_id] = remaining
+                else:
+                    del self._pending_by_session[item.session_id]
+            self._pending_cond.notify_all()
+
+    def _put_blocking(self, item):
+        while True:
+            try:
+                self._queue.put(item, timeout=1.0)
+                return
+            except queue.Full:
+                # 写线程意外退出时重新拉起，避免永久阻塞
+                self._ensure_worker()
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._work, name="mind-sprite-writer", daemon=True
+                )
+                self._worker.start()
+
+    def _db_writer(self) -> SQLiteWriter:
+        if self.database_path == settings.database_path:
+            return get_db_writer()
+        if self._own_db_writer is None:
+            self._own_db_writer = SQLiteWriter(self.database_path)
+        return self._own_db_writer
+
+    def _work(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            batch: List[_PendingWrite] = []
+            urgent = item is _FLUSH
+            if not urgent:
+                batch.append(item)
+                urgent = item.urgent
+
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    if urgent:
+                        # 有人在等：只带上已经排队的写入，立即提交
+                        item = self._queue.get_nowait()
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+                if item is _STOP:
+                    stopping = True
+                    break
+                if item is _FLUSH:
+                    urgent = True
+                    continue
+                batch.append(item)
+                urgent = urgent or item.urgent
+
+            if batch:
+                self._commit_batch(batch)
+
+        # 停止前提交剩余写入
+        remaining_batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, _PendingWrite):
+                remaining_batch.append(item)
+        if remaining_batch:
+            self._commit_batch(remaining_batch)
+        if self._own_db_writer is not None:
+            self._own_db_writer.close()
+
+    def _commit_batch(self, batch: List[_PendingWrite]):
+        """在一个事务中提交整批写入；失败时逐条重试，只让出错的那条失败"""
+        try:
+            db_writer = self._db_writer()
+        except Exception as e:
+            # 拿不到写连接时让整批失败，写线程继续运行，等待这些会话的读取也不会卡到超时
+            print(f"批量写入失败，无法获取写连接: {e}")
+            results = [e] * len(batch)
+        else:
+            try:
+                with db_writer.transaction() as conn:
+                    results = [conn.execute(item.sql, item.params).lastrowid for item in batch]
+            except Exception as batch_error:
+                results = self._execute_each(db_writer, batch, batch_error)
+
+        committed = 0
+        for item, result in zip(batch, results):
+            if isinstance(result, Exception):
+                item.ticket._resolve(error=result)
+            else:
+                committed += 1
+                item.ticket._resolve(lastrowid=result)
+
+        with self._pending_cond:
+            self.batches += 1
+            self.committed += committed
+            self.failed += len(batch) - committed
+        self._remove_pending(batch)
+
+    def _execute_each(self, db_writer: SQLiteWriter, batch: List[_PendingWrite],
+                      batch_error: Exception) -> List:
+        try:
+            with db_writer.connection() as conn:
+                return [self._execute_single(conn, item) for item in batch]
+        except Exception as e:
+            print(f"批量写入失败: {batch_error}; {e}")
+            return [e] * len(batch)
+
+    @staticmethod
+    def _execute_single(conn, item: _PendingWrite):
+        try:
+            return conn.execute(item.sql, item.params).lastrowid
+        except Exception as e:
+            print(f"批量写入失败: {e}")
+            return e
+
+    def _write_inline(self, sql: str, params: tuple, ticket: WriteTicket):
+        """不经过队列，直接通过写连接写入"""
+        try:
+            with self._db_writer().connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(sql, params)
+                ticket._resolve(lastrowid=cursor.lastrowid)
+        except Exception as e:
+            print(f"写入失败: {e}")
+            ticket._resolve(error=e)
+
+
+_writer: Optional[WriteBehindWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_write_behind_writer() -> WriteBehindWriter:
+    """获取全局批量写入队列（单例）"""
+    global _writer
+
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = WriteBehindWriter()
+
+    return _writer
+
+
+def wait_for_session_writes(session_id: Optional[str], timeout: Optional[float] = 5.0) -> bool:
+    """读取会话数据前调用：等待该会话尚未提交的写入（读己之写）"""
+    writer = _writer
+    if writer is None or session_id is None:
+        return True
+    return writer.flush(session_id, timeout)
+
+
+def reset_write_behind_writer():
+    """提交剩余写入并重置全局队列（切换数据库或测试时使用）"""
+    global _writer
+
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+        _writer = None
+
+
+atexit.register(reset_write_behind_writer)
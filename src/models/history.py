@@ -0,0 +1,18 @@
+"""
+聊天历史分页数据模型
+"""
+
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+
+@dataclass
+class HistoryPage:
+    """一页聊天历史（按时间正序）"""
+    messages: List[Tuple[str, str, str]] = field(default_factory=list)  # (role, content, timestamp)
+    next_cursor: Optional[str] = None  # 加载更早消息用的游标，没有更早的消息时为None
+
+    @property
+    def has_more(self) -> bool:
+        """是否还有更早的消息"""
+        return self.next_cursor is not None
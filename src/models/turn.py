@@ -0,0 +1,58 @@
+"""
+对话轮次数据模型
+一次用户消息只产生一个TurnResult，渲染、持久化和后处理都复用它
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional
+
+
+@dataclass
+class TurnResult:
+    """单轮对话的处理结果"""
+    success: bool = False
+    error: Optional[str] = None
+    parsed_response: Dict[str, Any] = field(default_factory=dict)
+    response_data: Dict[str, Any] = field(default_factory=dict)
+    full_response: str = ""
+    display_text: str = ""
+    gift_info: Dict[str, Any] = field(default_factory=lambda: {"type": None, "content": None})
+    exp_result: Dict[str, Any] = field(default_factory=dict)
+    care_tasks: List[Dict] = field(default_factory=list)
+
+    @property
+    def completed(self) -> bool:
+        """是否已经完成处理（成功或失败）"""
+        return self.success or self.error is not None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TurnResult':
+        """从process_user_message的结果字典创建"""
+        return cls(
+            success=data.get('success', False),
+            error=data.get('error'),
+            parsed_response=data.get('parsed_response', {}),
+            response_data=data.get('response_data', {}),
+            full_response=data.get('full_response', ''),
+            gift_info=data.get('gift_info', {"type": None, "content": None}),
+            exp_result=data.get('exp_result', {}),
+            care_tasks=data.get('care_tasks', [])
+        )
+
+    def update_from(self, other: 'TurnResult'):
+        """用另一个结果覆盖当前对象（供调用方传入的占位对象使用）"""
+        self.__dict__.update(other.__dict__)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为process_user_message兼容的字典"""
+        if not self.success:
+            return {"success": False, "error": self.error}
+        return {
+            "success": True,
+            "parsed_response": self.parsed_response,
+            "response_data": self.response_data,
+            "full_response": self.full_response,
+            "gift_info": self.gift_info,
+            "exp_result": self.exp_result,
+            "care_tasks": self.care_tasks
+        }
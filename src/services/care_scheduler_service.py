@@ -6,7 +6,12 @@
 from datetime import datetime, timedelta
 import re
 from typing import List, Dict, Optional, Tuple
-from src.data.database import get_db_connection
+from src.data.repositories.care_task_repository import CareTaskRepository
+from src.utils.keyword_matcher import KeywordMatcher, KeywordScan
+
+
+# 表示未来事件的时间词（出现时才为事件创建跟进任务）
+FUTURE_MARKERS = ['明天', '后天', '下周', '准备', '要去', '计划']
 
 
 class CareType:
@@ -19,7 +24,9 @@ class CareType:
 class CareSchedulerService:
     """主动关怀调度服务"""
     
-    def __init__(self):
+    def __init__(self, care_repo: Optional[CareTaskRepository] = None):
+        self.care_repo = care_repo or CareTaskRepository()
+        
         # 情绪关键词检测
         self.emotion_keywords = {
             'negative_immediate': {  # 需要1-2天跟进的负面情绪
@@ -60,6 +67,14 @@ class CareSchedulerService:
             }
         }
         
+        # 情绪、事件关键词和时间词编译进同一个自动机
+        self.keyword_matcher = KeywordMatcher(ignore_case=False)
+        for emotion_type, config in self.emotion_keywords.items():
+            self.keyword_matcher.add_category(("emotion", emotion_type), config['keywords'])
+        for event_type, config in self.event_keywords.items():
+            self.keyword_matcher.add_category(("event", event_type), config['keywords'])
+        self.keyword_matcher.add_category("future", FUTURE_MARKERS)
+        
         # 关怀消息模板
         self.care_templates = {
             CareType.EMOTION_FOLLOWUP: [
@@ -91,85 +106,80 @@ class CareSchedulerService:
             关怀任务列表
         """
         care_tasks = []
+        scan = self.keyword_matcher.scan(user_input)
         
         # 检测情绪关怀机会
-        emotion_tasks = self._detect_emotion_care(user_input, session_id)
+        emotion_tasks = self._detect_emotion_care(user_input, session_id, scan)
         care_tasks.extend(emotion_tasks)
         
         # 检测事件关怀机会
-        event_tasks = self._detect_event_care(user_input, session_id)
+        event_tasks = self._detect_event_care(user_input, session_id, scan)
         care_tasks.extend(event_tasks)
         
         return care_tasks
     
-    def _detect_emotion_care(self, user_input: str, session_id: str) -> List[Dict]:
+    def _detect_emotion_care(self, user_input: str, session_id: str,
+                             scan: Optional[KeywordScan] = None) -> List[Dict]:
         """检测情绪关怀机会"""
         care_tasks = []
+        if scan is None:
+            scan = self.keyword_matcher.scan(user_input)
         
         for emotion_type, config in self.emotion_keywords.items():
-            for keyword in config['keywords']:
-                if keyword in user_input:
-                    # 创建关怀任务
-                    scheduled_time = datetime.now() + timedelta(days=config['followup_days'])
-                    trigger_summary = self._extract_trigger_summary(user_input, keyword)
-                    
-                    care_task = {
-                        'session_id': session_id,
-                        'care_type': CareType.EMOTION_FOLLOWUP,
-                        'trigger_content': user_input,
-                        'care_message': self._generate_care_message(
-                            CareType.EMOTION_FOLLOWUP, 
-                            trigger_summary
-                        ),
-                        'scheduled_time': scheduled_time,
-                        'priority': 'high' if emotion_type == 'negative_immediate' else 'medium'
-                    }
-                    care_tasks.append(care_task)
-                    break  # 每种情绪类型只创建一个任务
+            matched_keywords = scan.keywords(("emotion", emotion_type))
+            if not matched_keywords:
+                continue
+            
+            # 每种情绪类型只创建一个任务（以关键词表中最靠前的命中为准）
+            scheduled_time = datetime.now() + timedelta(days=config['followup_days'])
+            trigger_summary = self._extract_trigger_summary(user_input, matched_keywords[0])
+            
+            care_task = {
+                'session_id': session_id,
+                'care_type': CareType.EMOTION_FOLLOWUP,
+                'trigger_content': user_input,
+                'care_message': self._generate_care_message(
+                    CareType.EMOTION_FOLLOWUP, 
+                    trigger_summary
+                ),
+                'scheduled_time': scheduled_time,
+                'priority': 'high' if emotion_type == 'negative_immediate' else 'medium'
+            }
+            care_tasks.append(care_task)
         
         return care_tasks
     
-    def _detect_event_care(self, user_input: str, session_id: str) -> List[Dict]:
+    def _detect_event_care(self, user_input: str, session_id: str,
+                           scan: Optional[KeywordScan] = None) -> List[Dict]:
         """检测事件关怀机会"""
         care_tasks = []
+        if scan is None:
+            scan = self.keyword_matcher.scan(user_input)
         
-        # 检测未来时态的重要事件
-        future_patterns = [
-            r'明天.*?([^，。！？]*)',
-            r'后天.*?([^，。！？]*)',
-            r'下周.*?([^，。！？]*)',
-            r'准备.*?([^，。！？]*)',
-            r'要去.*?([^，。！？]*)',
-            r'计划.*?([^，。！？]*)'
-        ]
+        # 只跟进未来时态的重要事件
+        if not scan.has("future"):
+            return care_tasks
         
         for event_type, config in self.event_keywords.items():
-            for keyword in config['keywords']:
-                if keyword in user_input:
-                    # 检查是否为未来事件
-                    is_future_event = False
-                    for pattern in future_patterns:
-                        if re.search(pattern, user_input) and keyword in user_input:
-                            is_future_event = True
-                            break
-                    
-                    if is_future_event or any(word in user_input for word in ['明天', '后天', '下周', '准备', '要去']):
-                        scheduled_time = datetime.now() + timedelta(days=config['followup_days'])
-                        trigger_summary = self._extract_trigger_summary(user_input, keyword)
-                        
-                        care_task = {
-                            'session_id': session_id,
-                            'care_type': CareType.EVENT_FOLLOWUP,
-                            'trigger_content': user_input,
-                            'care_message': self._generate_care_message(
-                                CareType.EVENT_FOLLOWUP,
-                                trigger_summary
-                            ),
-                            'scheduled_time': scheduled_time,
-                            'priority': 'medium'
-                        }
-                        care_tasks.append(care_task)
-                        break
+            matched_keywords = scan.keywords(("event", event_type))
+            if not matched_keywords:
+                continue
+            
+            scheduled_time = datetime.now() + timedelta(days=config['followup_days'])
+            trigger_summary = self._extract_trigger_summary(user_input, matched_keywords[0])
+            
+            care_task = {
+                'session_id': session_id,
+                'care_type': CareType.EVENT_FOLLOWUP,
+                'trigger_content': user_input,
+                'care_message': self._generate_care_message(
+                    CareType.EVENT_FOLLOWUP,
+                    trigger_summary
+                ),
+                'scheduled_time': scheduled_time,
+                'priority': 'medium'
+            }
+            care_tasks.append(care_task)
         
         return care_tasks
     
@@ -198,148 +208,48 @@ class CareSchedulerService:
     
     def schedule_care_task(self, care_task: Dict) -> bool:
         """将关怀任务保存到数据库"""
-        try:
-            conn = get_db_connection()
-            if not conn:
-                return False
-            
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO scheduled_care 
-                (session_id, care_type, trigger_content, care_message, scheduled_time, priority)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                care_task['session_id'],
-                care_task['care_type'],
-                care_task['trigger_content'],
-                care_task['care_message'],
-                care_task['scheduled_time'].isoformat(),
-                care_task['priority']
-            ))
-            
-            conn.commit()
-            conn.close()
-            return True
-            
-        except Exception as e:
-            print(f"保存关怀任务失败: {e}")
-            return False
+        return self.care_repo.add_task(
+            care_task['session_id'],
+            care_task['care_type'],
+            care_task['trigger_content'],
+            care_task['care_message'],
+            care_task['scheduled_time'],
+            care_task['priority']
+        )
     
     def get_pending_care_tasks(self, session_id: str) -> List[Dict]:
         """获取待执行的关怀任务"""
-        try:
-            conn = get_db_connection()
-            if not conn:
-                return []
-            
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT id, care_type, trigger_content, care_message, scheduled_time, priority
-                FROM scheduled_care
-                WHERE session_id = ? 
-                  AND status = 'pending'
-                  AND scheduled_time <= ?
-                ORDER BY priority DESC, scheduled_time ASC
-            ''', (session_id, datetime.now().isoformat()))
-            
-            tasks = []
-            for row in cursor.fetchall():
-                tasks.append({
-                    'id': row[0],
-                    'care_type': row[1],
-                    'trigger_content': row[2],
-                    'care_message': row[3],
-                    'scheduled_time': row[4],
-                    'priority': row[5]
-                })
-            
-            conn.close()
-            return tasks
-            
-        except Exception as e:
-            print(f"获取关怀任务失败: {e}")
-            return []
+        return self.care_repo.get_pending_tasks(session_id, datetime.now())
     
     def mark_care_task_completed(self, task_id: int) -> bool:
         """标记关怀任务为已完成"""
-        try:
-            conn = get_db_connection()
-            if not conn:
-                return False
-            
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE scheduled_care 
-                SET status = 'completed', executed_at = ?
-                WHERE id = ?
-            ''', (datetime.now().isoformat(), task_id))
-            
-            conn.commit()
-            conn.close()
-            return True
-            
-        except Exception as e:
-            print(f"更新关怀任务状态失败: {e}")
-            return False
+        return self.care_repo.mark_completed(task_id, datetime.now())
     
     def cleanup_old_tasks(self, days_old: int = 30) -> bool:
         """清理过期的关怀任务"""
-        try:
-            conn = get_db_connection()
-            if not conn:
-                return False
-            
-            cutoff_date = datetime.now() - timedelta(days=days_old)
-            cursor = conn.cursor()
-            cursor.execute('''
-                DELETE FROM scheduled_care
-                WHERE created_at < ? AND status IN ('completed', 'cancelled')
-            ''', (cutoff_date.isoformat(),))
-            
-            conn.commit()
-            conn.close()
-            return True
-            
-        except Exception as e:
-            print(f"清理关怀任务失败: {e}")
-            return False
+        cutoff_date = datetime.now() - timedelta(days=days_old)
+        return self.care_repo.delete_finished_before(cutoff_date)
     
     def should_create_regular_care(self, session_id: str) -> bool:
         """判断是否应该创建定期关怀任务"""
-        try:
-            conn = get_db_connection()
-            if not conn:
-                return False
-            
-            cursor = conn.cursor()
-            
-            # 检查最近是否有定期关怀任务
-            cursor.execute('''
-                SELECT COUNT(*) FROM scheduled_care
-                WHERE session_id = ? 
-                  AND care_type = 'regular_care'
-                  AND created_at > ?
-            ''', (session_id, (datetime.now() - timedelta(days=7)).isoformat()))
-            
-            recent_regular_care = cursor.fetchone()[0]
-            
-            # 检查用户活跃度
-            cursor.execute('''
-                SELECT COUNT(*) FROM chat_history
-                WHERE session_id = ?
-                  AND timestamp > ?
-            ''', (session_id, (datetime.now() - timedelta(days=14)).isoformat()))
-            
-            recent_interactions = cursor.fetchone()[0]
-            
-            conn.close()
-            
-            # 如果最近没有定期关怀且用户不太活跃，则创建定期关怀
-            return recent_regular_care == 0 and recent_interactions < 10
-            
-        except Exception as e:
-            print(f"检查定期关怀条件失败: {e}")
+        now = datetime.now()
+        
+        # 检查最近是否有定期关怀任务
+        recent_regular_care = self.care_repo.count_tasks_since(
+            session_id, CareType.REGULAR_CARE, now - timedelta(days=7)
+        )
+        
+        # 检查用户活跃度
+        recent_interactions = self.care_repo.count_messages_since(
+            session_id, now - timedelta(days=14)
+        )
+        
+        # 查询失败时不创建
+        if recent_regular_care is None or recent_interactions is None:
             return False
+        
+        # 如果最近没有定期关怀且用户不太活跃，则创建定期关怀
+        return recent_regular_care == 0 and recent_interactions < 10
     
     def create_regular_care_task(self, session_id: str) -> Optional[Dict]:
         """创建定期关怀任务"""
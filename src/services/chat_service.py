@@ -10,11 +10,18 @@ from typing import Generator, Dict, Optional, List, Tuple
 from ..core.ai_engine import AIEngine
 from ..data.repositories.chat_repository import ChatRepository
 from ..services.intimacy_service import IntimacyService
+from ..services.turn_orchestrator import TurnOrchestrator
+from ..models.turn import TurnResult
+from ..config.settings import settings
 from ..utils.helpers import (
     parse_enhanced_ai_response,
     clean_markdown_text
 )
 from ..utils.validation import input_validator
+from ..utils.stream_parser import IncrementalJSONFieldExtractor
+
+# 模拟打字机效果时每次输出的字符数
+TYPEWRITER_CHUNK_SIZE = 8
 
 
 class ChatService:
@@ -24,8 +31,10 @@ class ChatService:
         self.ai_engine = ai_engine
         self.chat_repo = chat_repo
         self.intimacy_service = intimacy_service
+        self.orchestrator = TurnOrchestrator(ai_engine, chat_repo, intimacy_service)
     
-    def process_user_message_stream(self, session_id: str, user_input: str, message_id: int) -> Generator[str, None, None]:
+    def process_user_message_stream(self, session_id: str, user_input: str, message_id: int,
+                                    turn_result: Optional[TurnResult] = None) -> Generator[str, None, None]:
         """
         流式处理用户消息 - 返回用户友好的内容
 
@@ -33,56 +42,171 @@ class ChatService:
             session_id: 会话ID
             user_input: 用户输入
             message_id: 消息ID
+            turn_result: 可选的轮次结果对象，处理完成后会被填充，
+                供调用方做持久化和后处理，避免再次调用模型
 
         Yields:
-            str: 解析后的AI回应文本块
+            str: 新增的回应文本片段（增量，不是累计文本）
         """
         try:
-            # 先获取完整的非流式响应来解析结构化数据
-            result = self.process_user_message(session_id, user_input, message_id)
+            # 先获取完整的非流式响应来解析结构化数据（每轮只调用一次模型）
+            turn = self.run_turn(session_id, user_input, message_id)
+            if turn_result is not None:
+                turn_result.update_from(turn)
 
-            if not result["success"]:
+            if not turn.success:
                 yield "💖 小念遇到了一些技术问题，但还是想陪伴你~"
                 return
 
-            parsed_response = result["parsed_response"]
-            gift_info = result["gift_info"]
+            # 模拟打字机效果 - 按小块输出增量文本，由调用方负责累加和节流渲染
+            full_content = turn.display_text
+            for start in range(0, len(full_content), TYPEWRITER_CHUNK_SIZE):
+                yield full_content[start:start + TYPEWRITER_CHUNK_SIZE]
+
+        except Exception as e:
+            # 不在界面显示错误，仅打印到控制台  
+            print(f"流式处理出错: {e}")
+            yield f"💖 小念遇到了一些技术问题，但还是想陪伴你~"
 
-            # 构建要流式显示的内容
-            content_parts = []
+    def stream_turn(self, session_id: str, user_input: str, message_id: int,
+                    turn_result: Optional[TurnResult] = None) -> Generator[str, None, None]:
+        """
+        按配置的流式模式处理一轮对话
 
-            # 添加记忆联想（如果有）
-            memory_association = parsed_response["memory_association"]
-            if memory_association and memory_association != "null" and memory_association.strip():
-                content_parts.append(f"💭 记忆联想: {memory_association}")
+        STREAMING_MODE=token 时边生成边展示，simulated 时保留原有的打字机效果
+        """
+        if settings.streaming_mode == 'simulated':
+            yield from self.process_user_message_stream(session_id, user_input, message_id, turn_result)
+        else:
+            yield from self.process_user_message_token_stream(session_id, user_input, message_id, turn_result)
 
-            # 添加情绪共鸣
-            emotional_resonance = parsed_response["emotional_resonance"]
-            if emotional_resonance:
-                content_parts.append(f"💕 {emotional_resonance}")
+    def process_user_message_token_stream(self, session_id: str, user_input: str, message_id: int,
+                                          turn_result: Optional[TurnResult] = None) -> Generator[str, None, None]:
+        """
+        真实token流式处理用户消息
 
-            # 添加主要回应
-            sprite_reaction = parsed_response["sprite_reaction"]
-            content_parts.append(f"💖 {sprite_reaction}")
+        使用和结构化路径相同的心灵捕手Prompt，模型输出JSON的同时增量提取sprite_reaction
+        并展示，其余字段在流结束后统一解析，用于礼物、经验值和持久化。情绪急救和搜索场景仍走结构化路径。
 
-            # 添加礼物信息（如果有）
-            if gift_info["type"]:
-                content_parts.append(f"🎁 **{gift_info['type']}**")
-                content_parts.append(gift_info['content'])
+        Args:
+            session_id: 会话ID
+            user_input: 用户输入
+            message_id: 消息ID
+            turn_result: 可选的轮次结果对象，处理完成后会被填充
+
+        Yields:
+            str: 新增的回应文本片段（增量，不是累计文本）
+        """
+        try:
+            # 上下文读取和急救/搜索判断并发进行
+            context = self._prepare_turn_context(
+                session_id, user_input, message_id, include_routing=True
+            )
+            if not context["success"]:
+                if turn_result is not None:
+                    turn_result.update_from(TurnResult.from_dict(context))
+                yield "💖 小念遇到了一些技术问题，但还是想陪伴你~"
+                return
+
+            sanitized_input = context["sanitized_input"]
+            streamed_text = ""
+
+            if context["requires_structured"]:
+                response_data = self._get_structured_response(context, session_id, message_id)
+            else:
+                extractor = IncrementalJSONFieldExtractor(stream_field="sprite_reaction")
+                for chunk in self.ai_engine.stream_heart_catcher_response(
+                    sanitized_input, context["recent_context"], session_id,
+                    intimacy_level=context["intimacy_level"],
+                    conversation_summary=context["conversation_summary"]
+                ):
+                    delta = extractor.feed(chunk)
+                    if delta:
+                        if not streamed_text:
+                            delta = "💖 " + delta
+                        streamed_text += delta
+                        yield delta
+
+                response_data = self.ai_engine.complete_streamed_response(
+                    extractor.finish(), sanitized_input, prompt_name="heart_catcher"
+                )
+
+            if not response_data:
+                if turn_result is not None:
+                    turn_result.update_from(TurnResult(error="获取AI回应失败"))
+                yield "💖 小念遇到了一些技术问题，但还是想陪伴你~"
+                return
 
-            # 将所有内容合并
-            full_content = "\n\n".join(content_parts)
+            turn = TurnResult.from_dict(self._finalize_turn(
+                session_id, sanitized_input, response_data,
+                defer_writes=True, message_id=message_id
+            ))
+            turn.display_text = self.build_display_content(
+                turn.parsed_response, turn.gift_info, reaction_first=bool(streamed_text)
+            )
+            if turn_result is not None:
+                turn_result.update_from(turn)
 
-            # 模拟打字机效果 - 逐字符流式输出
-            current_text = ""
-            for char in full_content:
-                current_text += char
-                yield current_text
+            # 只补发流式阶段没有展示的部分（情绪共鸣、记忆联想、礼物）
+            if turn.display_text.startswith(streamed_text):
+                tail = turn.display_text[len(streamed_text):]
+            else:
+                tail = "\n\n" + turn.display_text
+            if tail:
+                yield tail
 
         except Exception as e:
-            # 不在界面显示错误，仅打印到控制台  
             print(f"流式处理出错: {e}")
-            yield f"💖 小念遇到了一些技术问题，但还是想陪伴你~"
+            if turn_result is not None and not turn_result.completed:
+                turn_result.error = f"处理消息时出错: {e}"
+            yield "💖 小念遇到了一些技术问题，但还是想陪伴你~"
+
+    def run_turn(self, session_id: str, user_input: str, message_id: int) -> TurnResult:
+        """
+        处理一轮对话并返回TurnResult
+
+        每条用户消息只应调用一次，结果同时用于渲染、保存和礼物/经验值展示。
+        宝藏、经验值和关怀任务的写入交给后台队列
+        """
+        turn = TurnResult.from_dict(self._process_turn(session_id, user_input, message_id, defer_writes=True))
+        if turn.success:
+            turn.display_text = self.build_display_content(turn.parsed_response, turn.gift_info)
+        return turn
+
+    def build_display_content(self, parsed_response: Dict, gift_info: Dict,
+                              reaction_first: bool = False) -> str:
+        """
+        构建要展示给用户的完整回应文本
+
+        reaction_first为True时主要回应放在最前面，
+        这样token流式展示的内容在流结束后不会跳动
+        """
+        content_parts = []
+
+        # 添加记忆联想（如果有）
+        memory_association = parsed_response["memory_association"]
+        if memory_association and memory_association != "null" and memory_association.strip():
+            content_parts.append(f"💭 记忆联想: {memory_association}")
+
+        # 添加情绪共鸣
+        emotional_resonance = parsed_response["emotional_resonance"]
+        if emotional_resonance:
+            content_parts.append(f"💕 {emotional_resonance}")
+
+        # 添加主要回应
+        sprite_reaction = parsed_response["sprite_reaction"]
+        if reaction_first:
+            content_parts.insert(0, f"💖 {sprite_reaction}")
+        else:
+            content_parts.append(f"💖 {sprite_reaction}")
+
+        # 添加礼物信息（如果有）
+        if gift_info["type"]:
+            content_parts.append(f"🎁 **{gift_info['type']}**")
+            content_parts.append(gift_info['content'])
+
+        # 将所有内容合并
+        return "\n\n".join(content_parts)
     
     def process_user_message(self, session_id: str, user_input: str, message_id: int) -> Dict:
         """
@@ -96,114 +220,170 @@ class ChatService:
         Returns:
             Dict: 处理结果，包含AI回应和相关信息
         """
+        return self._process_turn(session_id, user_input, message_id, defer_writes=False)
+
+    def _process_turn(self, session_id: str, user_input: str, message_id: int,
+                      defer_writes: bool) -> Dict:
+        """结构化（非流式）处理一轮对话"""
         try:
-            # 验证会话ID
-            if not input_validator.validate_session_id(session_id):
-                return {
-                    "success": False,
-                    "error": "无效的会话ID"
-                }
+            context = self._prepare_turn_context(session_id, user_input, message_id)
+            if not context["success"]:
+                return context
 
-            # 验证和清理用户输入
-            validation_result = input_validator.validate_message_input(user_input)
-            if not validation_result['valid']:
+            response_data = self._get_structured_response(context, session_id, message_id)
+            if not response_data:
                 return {
                     "success": False,
-                    "error": f"输入验证失败: {', '.join(validation_result['errors'])}"
+                    "error": "获取AI回应失败"
                 }
 
-            # 使用清理后的输入
-            sanitized_input = validation_result['sanitized_message']
-
-            # 检测潜在威胁
-            threats = input_validator.detect_potential_threats(user_input)
-            if threats:
-                st.warning(f"检测到潜在安全威胁: {', '.join(threats)}")
-                # 记录安全事件但继续处理（使用清理后的输入）
-            # 获取上下文信息
-            core_memories = self.chat_repo.get_core_memories(session_id, limit=5)
-            recent_context = self.chat_repo.get_recent_context(session_id, context_turns=4)
-            
-            # 获取亲密度信息
-            from ..data.repositories.user_profile_repository import UserProfileRepository
-            user_profile_repo = UserProfileRepository()
-            profile = user_profile_repo.get_profile(session_id)
-            if not profile:
-                profile = user_profile_repo.find_or_create_profile(session_id)
-            
-            intimacy_level = profile["intimacy_level"]
-            total_interactions = profile["total_interactions"]
-            
-            # 🎯 使用心灵捕手模式获取AI回应
-            from datetime import datetime, timedelta
-            last_interaction_time = datetime.now() - timedelta(hours=1)  # 默认1小时前，实际应从数据库获取
-            
-            response_data = self.ai_engine.get_heart_catcher_response(
-                user_input=sanitized_input,
-                chat_history=recent_context,
-                session_id=session_id,
-                last_interaction_time=last_interaction_time
+            return self._finalize_turn(
+                session_id, context["sanitized_input"], response_data,
+                defer_writes=defer_writes, message_id=message_id
             )
 
-            # 如果心灵捕手失败，降级到情感增强回应
-            if not response_data:
-                response_data = self.ai_engine.get_emotion_enhanced_response(
-                    sanitized_input, recent_context, core_memories, intimacy_level, total_interactions,
-                    message_id, session_id
-                )
-            
-            if not response_data:
-                return {
-                    "success": False,
-                    "error": "获取AI回应失败"
-                }
-            
-            # 解析增强版回应
-            parsed_response = parse_enhanced_ai_response(response_data)
-            
-            # 构建完整的回应文本用于保存
-            full_response = parsed_response["sprite_reaction"]
-            memory_association = parsed_response["memory_association"]
-            if memory_association and memory_association != "null" and memory_association.strip():
-                full_response = f"💭 记忆联想: {memory_association}\n\n{full_response}"
-            
-            # 处理礼物
-            gift_info = {
-                "type": parsed_response["gift_type"],
-                "content": parsed_response["gift_content"]
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"处理消息时出错: {e}"
             }
-            
+
+    def _prepare_turn_context(self, session_id: str, user_input: str, message_id: int = 0,
+                              include_routing: bool = False,
+                              include_emotion_analysis: bool = False) -> Dict:
+        """验证输入并（并发）收集调用模型前需要的上下文"""
+        # 验证会话ID
+        if not input_validator.validate_session_id(session_id):
+            return {
+                "success": False,
+                "error": "无效的会话ID"
+            }
+
+        # 验证和清理用户输入
+        validation_result = input_validator.validate_message_input(user_input)
+        if not validation_result['valid']:
+            return {
+                "success": False,
+                "error": f"输入验证失败: {', '.join(validation_result['errors'])}"
+            }
+
+        # 使用清理后的输入
+        sanitized_input = validation_result['sanitized_message']
+
+        # 检测潜在威胁
+        threats = input_validator.detect_potential_threats(user_input)
+        if threats:
+            st.warning(f"检测到潜在安全威胁: {', '.join(threats)}")
+            # 记录安全事件但继续处理（使用清理后的输入）
+        # 并发获取记忆、历史和亲密度档案
+        gathered = self.orchestrator.gather_context(
+            session_id, sanitized_input, message_id,
+            include_routing=include_routing,
+            include_emotion_analysis=include_emotion_analysis
+        )
+        profile = gathered["profile"]
+
+        return {
+            "success": True,
+            "sanitized_input": sanitized_input,
+            "core_memories": gathered["core_memories"],
+            "recent_context": gathered["recent_context"],
+            "conversation_summary": gathered.get("conversation_summary"),
+            "profile": profile,
+            "intimacy_level": profile["intimacy_level"],
+            "total_interactions": profile["total_interactions"],
+            "requires_structured": gathered.get("requires_structured", False),
+            "emotion_analysis": gathered.get("emotion_analysis")
+        }
+
+    def _get_structured_response(self, context: Dict, session_id: str, message_id: int) -> Optional[Dict]:
+        """一次性获取完整的结构化AI回应"""
+        sanitized_input = context["sanitized_input"]
+        recent_context = context["recent_context"]
+
+        # 🎯 使用心灵捕手模式获取AI回应
+        from datetime import datetime, timedelta
+        last_interaction_time = datetime.now() - timedelta(hours=1)  # 默认1小时前，实际应从数据库获取
+
+        response_data = self.ai_engine.get_heart_catcher_response(
+            user_input=sanitized_input,
+            chat_history=recent_context,
+            session_id=session_id,
+            last_interaction_time=last_interaction_time,
+            intimacy_level=context["intimacy_level"],
+            conversation_summary=context["conversation_summary"]
+        )
+
+        # 如果心灵捕手失败，降级到情感增强回应
+        if not response_data:
+            response_data = self.ai_engine.get_emotion_enhanced_response(
+                sanitized_input, recent_context, context["core_memories"],
+                context["intimacy_level"], context["total_interactions"],
+                message_id, session_id, conversation_summary=context["conversation_summary"]
+            )
+
+        return response_data
+
+    def _finalize_turn(self, session_id: str, sanitized_input: str, response_data: Dict,
+                       defer_writes: bool = False, message_id: Optional[int] = None) -> Dict:
+        """
+        解析回应并处理礼物、经验值、关怀任务和核心记忆
+
+        经验值总是在本轮同步写入（一条UPSERT），展示的等级和升级来自它返回的档案；
+        defer_writes为True时，宝藏、关怀任务和记忆的写入交给队列（关怀任务稍后通过待办列表展示）
+        """
+        # 解析增强版回应
+        parsed_response = parse_enhanced_ai_response(response_data)
+        
+        # 构建完整的回应文本用于保存
+        full_response = parsed_response["sprite_reaction"]
+        memory_association = parsed_response["memory_association"]
+        if memory_association and memory_association != "null" and memory_association.strip():
+            full_response = f"💭 记忆联想: {memory_association}\n\n{full_response}"
+        
+        # 处理礼物
+        gift_info = {
+            "type": parsed_response["gift_type"],
+            "content": parsed_response["gift_content"]
+        }
+        
+        if gift_info["type"]:
+            st.session_state.current_gift = gift_info
+
+        # 添加经验值和处理升级（其他标签页同时加的经验也会反映在返回的档案里）
+        exp_result = self.intimacy_service.add_exp(session_id, exp_to_add=15)
+
+        care_tasks = []
+        if defer_writes:
+            self.orchestrator.schedule_post_turn_writes(
+                session_id, sanitized_input, gift_info, message_id
+            )
+        else:
             if gift_info["type"]:
-                st.session_state.current_gift = gift_info
                 self.chat_repo.add_treasure(
                     session_id, gift_info["type"], gift_info["content"]
                 )
-            
-            # 添加经验值和处理升级
-            exp_result = self.intimacy_service.add_exp(session_id, exp_to_add=15)
-            
+
             # 处理关怀机会检测
-            care_tasks = []
             try:
                 care_tasks = self.ai_engine.process_care_opportunities(sanitized_input, session_id)
             except Exception as e:
                 print(f"关怀任务处理错误: {e}")
-            
-            return {
-                "success": True,
-                "parsed_response": parsed_response,
-                "response_data": response_data,
-                "full_response": full_response,
-                "gift_info": gift_info,
-                "exp_result": exp_result,
-                "care_tasks": care_tasks
-            }
-            
-        except Exception as e:
-            return {
-                "success": False,
-                "error": f"处理消息时出错: {e}"
-            }
+
+            try:
+                self.orchestrator.memory_service.remember_turn(session_id, message_id, sanitized_input)
+            except Exception as e:
+                print(f"核心记忆提取错误: {e}")
+        
+        return {
+            "success": True,
+            "parsed_response": parsed_response,
+            "response_data": response_data,
+            "full_response": full_response,
+            "gift_info": gift_info,
+            "exp_result": exp_result,
+            "care_tasks": care_tasks
+        }
     
     def display_ai_response(self, result: Dict):
         """
@@ -0,0 +1,99 @@
+"""
+滚动对话摘要服务
+最近 CONTEXT_HISTORY_TURNS 轮对话保留原文，更早的对话每积累 SUMMARY_EVERY_TURNS 轮
+就在后台并入会话的摘要；Prompt只包含"摘要 + 最近几轮"，会话再长token开销也基本不变
+"""
+
+from typing import Callable, List, Optional, Tuple
+
+from ..config.settings import settings
+from ..data.repositories.chat_repository import ChatRepository
+from ..data.repositories.conversation_summary_repository import ConversationSummaryRepository
+from ..utils.token_counter import count_tokens, truncate_to_tokens
+
+# 一次最多把多少条消息交给摘要模型（首次为很长的旧会话生成摘要时，更早的消息只标记为已覆盖）
+SUMMARY_MAX_SEGMENT_MESSAGES = 40
+
+# 摘要模型：(已有摘要, 待并入的 (role, content) 消息) -> 新摘要；失败时返回None
+Summarizer = Callable[[Optional[str], List[Tuple[str, str]]], Optional[str]]
+
+
+class ConversationSummaryService:
+    """滚动对话摘要服务"""
+
+    def __init__(self, chat_repo: Optional[ChatRepository] = None,
+                 summary_repo: Optional[ConversationSummaryRepository] = None,
+                 summarizer: Optional[Summarizer] = None):
+        self.chat_repo = chat_repo or ChatRepository()
+        self.summary_repo = summary_repo or ConversationSummaryRepository()
+        self.summarizer = summarizer
+
+    def get_prompt_history(self, session_id: str) -> Tuple[Optional[str], List[Tuple[str, str]]]:
+        """
+        获取Prompt使用的对话历史
+
+        Returns:
+            Tuple: (摘要或None, 摘要之后的 (role, content) 消息，按时间顺序)
+        """
+        latest = self.summary_repo.get_latest_summary(session_id)
+        after_id = latest["covered_until_id"] if latest else 0
+        # 未进入摘要的消息最多有 原文保留轮数 + 摘要间隔 轮
+        context_turns = settings.context_history_turns + max(settings.summary_every_turns, 0)
+        recent = self.chat_repo.get_recent_context(session_id, context_turns=context_turns, after_id=after_id)
+        return (latest["summary"] if latest else None), recent
+
+    def maybe_summarize(self, session_id: str) -> bool:
+        """
+        积累的旧对话足够多时更新摘要（在后台任务中调用）
+
+        Returns:
+            bool: 是否生成了新摘要
+        """
+        every_turns = settings.summary_every_turns
+        if every_turns <= 0:
+            return False
+
+        latest = self.summary_repo.get_latest_summary(session_id)
+        pending = self.chat_repo.get_messages_after(session_id, latest["covered_until_id"] if latest else 0)
+        keep_messages = settings.context_history_turns * 2
+        if len(pending) < keep_messages + every_turns * 2:
+            return False
+
+        segment = pending[:len(pending) - keep_messages]
+        messages = [(role, content) for _, role, content in segment[-SUMMARY_MAX_SEGMENT_MESSAGES:]]
+        summary = self.summarize(latest["summary"] if latest else None, messages)
+        return self.summary_repo.add_summary(
+            session_id, summary, segment[-1][0],
+            (latest["message_count"] if latest else 0) + len(segment)
+        )
+
+    def summarize(self, previous_summary: Optional[str], messages: List[Tuple[str, str]]) -> str:
+        """把消息并入已有摘要；模型不可用时退回抽取式摘要"""
+        max_tokens = settings.summary_max_tokens
+        messages = [
+            (role, truncate_to_tokens(content, settings.context_message_max_tokens))
+            for role, content in messages
+        ]
+
+        summary = None
+        if self.summarizer:
+            try:
+                summary = self.summarizer(previous_summary, messages)
+            except Exception as e:
+                print(f"生成对话摘要失败: {e}")
+        if not summary or not summary.strip():
+            summary = self.extractive_summary(previous_summary, messages, max_tokens)
+        return truncate_to_tokens(summary.strip(), max_tokens)
+
+    @staticmethod
+    def extractive_summary(previous_summary: Optional[str], messages: List[Tuple[str, str]],
+                           max_tokens: int) -> str:
+        """抽取式摘要：保留用户每条消息的开头，超出上限时丢掉最早的内容"""
+        lines = previous_summary.splitlines() if previous_summary else []
+        lines += [
+            f"用户说过：{truncate_to_tokens(content, 30)}"
+            for role, content in messages if role == "user"
+        ]
+        while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+            lines.pop(0)
+        return "\n".join(lines)
@@ -7,12 +7,28 @@ v5.2 新增功能模块
 import json
 import re
 import math
-from datetime import datetime, timedelta
+import sys
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
 from enum import Enum
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Sequence, Tuple, Optional
 from dataclasses import dataclass
-from functools import lru_cache
-from src.data.database import get_db_connection
+import numpy as np
+from src.config.companion_config import CompanionConfig, get_config, on_config_reload
+from src.config.settings import settings
+from src.data.repositories.emotion_analysis_repository import (
+    EmotionAnalysisRepository, TREND_BUCKETS, trend_bucket_start
+)
+from src.utils.keyword_matcher import KeywordMatcher
+
+
+# 表情符号（用于置信度计算）
+_EMOJI_PATTERN = re.compile(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF]')
+
+# 情感趋势的统计窗口：最近24小时 / 7天 / 4周（按趋势桶对齐）
+TREND_WINDOW_BUCKETS = {"hourly": 24, "daily": 7, "weekly": 4}
 
 
 class EmotionType(Enum):
@@ -81,19 +97,157 @@ class EmotionAnalysisResult:
     response_tone: ResponseTone
 
 
+class EmotionKeywordAnalyzer:
+    """
+    进程级情感关键词分析器
+    所有服务实例共用一个关键词自动机和一个按归一化文本缓存的LRU（条数和内存双重上限），
+    关键词词典通过 reload_config 重新加载时缓存随之失效
+    """
+
+    # 每条缓存的固定开销估算（OrderedDict节点、元组等）
+    _ENTRY_OVERHEAD = 200
+
+    def __init__(self, emotion_keywords: Dict[EmotionType, Dict[str, float]],
+                 max_entries: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries or settings.emotion_cache_max_entries
+        self.max_bytes = max_bytes or settings.emotion_cache_max_bytes
+
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, Tuple[tuple, tuple, int]]" = OrderedDict()
+        self._cache_bytes = 0
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_keywords(emotion_keywords)
+
+    def load_keywords(self, emotion_keywords: Dict[EmotionType, Dict[str, float]]):
+        """替换关键词词典（重新构建自动机并清空缓存）"""
+        matcher = KeywordMatcher(emotion_keywords)
+        with self._lock:
+            self._state = (emotion_keywords, matcher)
+            self.generation += 1
+            self._cache.clear()
+            self._cache_bytes = 0
+
+    def snapshot(self) -> Tuple[Dict[EmotionType, Dict[str, float]], KeywordMatcher]:
+        """当前的关键词词典和自动机（批量分析时保证整批用同一份词典）"""
+        return self._state
+
+    @property
+    def emotion_keywords(self) -> Dict[EmotionType, Dict[str, float]]:
+        return self._state[0]
+
+    @property
+    def keyword_matcher(self) -> KeywordMatcher:
+        return self._state[1]
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """缓存键和匹配用的归一化文本：全角转半角、统一小写、去掉首尾空白"""
+        return unicodedata.normalize('NFKC', text or '').lower().strip()
+
+    def analyze(self, text: str) -> Tuple[tuple, tuple]:
+        """
+        关键词打分（带缓存）
+
+        Returns:
+            Tuple: ((情绪, 分数) 元组, 触发关键词元组)
+        """
+        key = self.normalize(text)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached[0], cached[1]
+            self.misses += 1
+            generation = self.generation
+
+        emotion_items, trigger_keywords = self._score(key, *self._state)
+        size = (sys.getsizeof(key) + sum(sys.getsizeof(keyword) for keyword in trigger_keywords)
+                + self._ENTRY_OVERHEAD)
+
+        with self._lock:
+            # 计算期间词典被重新加载过：结果已过期，不放进缓存
+            if generation == self.generation and key not in self._cache and size <= self.max_bytes:
+                self._cache[key] = (emotion_items, trigger_keywords, size)
+                self._cache_bytes += size
+                while len(self._cache) > self.max_entries or self._cache_bytes > self.max_bytes:
+                    _, (_, _, evicted_size) = self._cache.popitem(last=False)
+                    self._cache_bytes -= evicted_size
+                    self.evictions += 1
+        return emotion_items, trigger_keywords
+
+    def score(self, text: str) -> Tuple[tuple, tuple]:
+        """关键词打分（不经过缓存）"""
+        return self._score(self.normalize(text), *self._state)
+
+    @staticmethod
+    def _score(normalized: str, emotion_keywords: Dict[EmotionType, Dict[str, float]],
+               matcher: KeywordMatcher) -> Tuple[tuple, tuple]:
+        """
+        关键词打分
+
+        中文词之间没有空格，不能用\\b划分词边界；这里对全文做一次最左最长匹配，
+        "超级开心"只按"超级开心"计分，不会再叠加其中的"开心"
+        """
+        scan = matcher.scan(normalized, longest_match=True)
+
+        emotion_scores = {emotion_type: 0 for emotion_type in emotion_keywords}
+        hits_by_emotion = {emotion_type: [] for emotion_type in emotion_keywords}
+        for hit in scan.hits:
+            emotion_scores[hit.category] += hit.weight
+            hits_by_emotion[hit.category].append(hit.keyword)
+
+        trigger_keywords = [
+            keyword for emotion_type in emotion_keywords for keyword in hits_by_emotion[emotion_type]
+        ]
+        return tuple(emotion_scores.items()), tuple(trigger_keywords)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._cache.clear()
+            self._cache_bytes = 0
+
+    def get_stats(self) -> Dict:
+        """缓存命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._cache),
+                "bytes": self._cache_bytes,
+                "generation": self.generation,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+
+
 class EmotionAnalysisService:
     """智能情感分析服务"""
     
-    def __init__(self):
+    def __init__(self, analysis_repo: Optional[EmotionAnalysisRepository] = None,
+                 analyzer: Optional[EmotionKeywordAnalyzer] = None):
         """初始化情感分析服务"""
-        self.emotion_keywords = self._load_emotion_keywords()
+        self.analysis_repo = analysis_repo or EmotionAnalysisRepository()
         self.empathy_phrases = self._load_empathy_phrases()
 
-        # 预编译正则表达式模式以提高性能
-        self._compiled_patterns = {}
-        self._compile_emotion_patterns()
-        
-    def _load_emotion_keywords(self) -> Dict[EmotionType, Dict[str, float]]:
+        # 所有情绪的关键词编译进一个自动机，一次扫描完成匹配；自动机和分析缓存由进程内共享
+        self.analyzer = analyzer or get_emotion_analyzer()
+
+    @property
+    def emotion_keywords(self) -> Dict[EmotionType, Dict[str, float]]:
+        return self.analyzer.emotion_keywords
+
+    @property
+    def keyword_matcher(self) -> KeywordMatcher:
+        return self.analyzer.keyword_matcher
+
+    @staticmethod
+    def _load_emotion_keywords() -> Dict[EmotionType, Dict[str, float]]:
         """加载情绪关键词词典"""
         return {
             # 正面情绪关键词
@@ -215,42 +369,6 @@ class EmotionAnalysisService:
             }
         }
 
-    def _compile_emotion_patterns(self):
-        """预编译情感关键词的正则表达式模式"""
-        for emotion_type, keywords in self.emotion_keywords.items():
-            # 创建单词边界匹配的正则表达式
-            pattern_parts = []
-            for keyword in keywords.keys():
-                # 转义特殊字符并添加单词边界
-                escaped_keyword = re.escape(keyword)
-                pattern_parts.append(escaped_keyword)
-
-            if pattern_parts:
-                # 使用 | 连接所有关键词，添加单词边界
-                pattern = r'\b(?:' + '|'.join(pattern_parts) + r')\b'
-                self._compiled_patterns[emotion_type] = re.compile(pattern, re.IGNORECASE)
-
-    @lru_cache(maxsize=1000)
-    def _analyze_text_cached(self, text: str) -> tuple:
-        """缓存的文本情感分析（用于重复文本）"""
-        emotion_scores = {}
-        trigger_keywords = []
-
-        for emotion_type, pattern in self._compiled_patterns.items():
-            matches = pattern.findall(text)
-            if matches:
-                # 计算基于匹配和权重的分数
-                score = 0
-                for match in matches:
-                    weight = self.emotion_keywords[emotion_type].get(match.lower(), 1.0)
-                    score += weight
-                    trigger_keywords.append(match)
-                emotion_scores[emotion_type] = score
-            else:
-                emotion_scores[emotion_type] = 0
-
-        return tuple(emotion_scores.items()), tuple(trigger_keywords)
-
     def analyze_emotion(self, text: str, session_id: str, message_id: int) -> EmotionAnalysisResult:
         """
         分析文本的情感内容
@@ -264,7 +382,7 @@ class EmotionAnalysisService:
             EmotionAnalysisResult: 情感分析结果
         """
         # 1. 使用缓存的关键词匹配和权重计算
-        emotion_items, trigger_keywords_tuple = self._analyze_text_cached(text)
+        emotion_items, trigger_keywords_tuple = self.analyzer.analyze(text)
         emotion_scores = dict(emotion_items)
         trigger_keywords = list(trigger_keywords_tuple)
         
@@ -321,10 +439,127 @@ class EmotionAnalysisService:
             response_tone=response_tone
         )
         
+        # 两条写入都进批量写入队列，不等待提交，不需要再经过后台任务队列
         self._save_analysis_result(session_id, message_id, analysis_result)
         
         return analysis_result
     
+    def analyze_batch(self, texts: Sequence[str]) -> List[EmotionAnalysisResult]:
+        """
+        批量分析文本情感（用于历史数据回填和统计，不写数据库）
+
+        关键词命中计数矩阵 (文本数 x 关键词数) 乘以权重矩阵 (关键词数 x 情绪数)
+        一次得到全部情绪分数，效价、唤醒度和置信度也按列批量计算；
+        结果与逐条调用 analyze_emotion 一致
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            List[EmotionAnalysisResult]: 与输入顺序对应的分析结果
+        """
+        if not texts:
+            return []
+
+        emotion_keywords, matcher = self.analyzer.snapshot()
+        emotion_types = list(emotion_keywords)
+        emotion_column = {emotion_type: column for column, emotion_type in enumerate(emotion_types)}
+        entries = matcher.entries
+
+        # 权重矩阵：每个关键词条目在其情绪列上的权重
+        weights = np.zeros((len(entries), len(emotion_types)))
+        for index, entry in enumerate(entries):
+            weights[index, emotion_column[entry.category]] = entry.weight
+
+        # 命中计数矩阵（最左最长匹配，同一关键词出现几次计几次）
+        counts = np.zeros((len(texts), len(entries)))
+        trigger_keywords: List[List[str]] = []
+        for row, text in enumerate(texts):
+            scan = matcher.scan(self.analyzer.normalize(text), longest_match=True)
+            hits_by_emotion = {emotion_type: [] for emotion_type in emotion_types}
+            for hit, index in zip(scan.hits, scan.entry_indexes):
+                counts[row, index] += 1
+                hits_by_emotion[hit.category].append(hit.keyword)
+            trigger_keywords.append([
+                keyword for emotion_type in emotion_types for keyword in hits_by_emotion[emotion_type]
+            ])
+
+        lengths = np.array([len(text) for text in texts], dtype=float)
+        exclamations = np.array([text.count('!') for text in texts], dtype=float)
+        questions = np.array([text.count('?') for text in texts], dtype=float)
+        factors = np.minimum(lengths / 100, 1.5) * (1 + exclamations * 0.2 + questions * 0.1)
+
+        scores = (counts @ weights) * factors[:, None]
+
+        # 主要情绪和强度（并列时取情绪表中靠前的，与max()一致）
+        has_emotion = (scores > 0).any(axis=1)
+        primary_columns = scores.argmax(axis=1)
+        primary_scores = scores[np.arange(len(texts)), primary_columns]
+        intensities = np.where(has_emotion, np.clip(primary_scores, 0.1, 10.0), 0.1)
+
+        # 效价、唤醒度
+        primary_emotions = [
+            emotion_types[column] if found else EmotionType.NEUTRAL
+            for column, found in zip(primary_columns, has_emotion)
+        ]
+        base_valence = np.array([self._calculate_valence(emotion, 10.0) for emotion in primary_emotions])
+        base_arousal = np.array([self._calculate_arousal(emotion, 10.0) for emotion in primary_emotions])
+        intensity_factor = np.minimum(intensities / 10.0, 1.0)
+        valences = base_valence * intensity_factor
+        arousals = np.minimum(base_arousal * (0.5 + intensity_factor * 0.5), 1.0)
+
+        # 置信度
+        ranked = np.sort(scores, axis=1)[:, ::-1]
+        top = ranked[:, 0]
+        second = ranked[:, 1] if ranked.shape[1] > 1 else np.zeros(len(texts))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gap_confidence = np.where(top > 0, np.minimum((top - second) / top, 0.5), 0.0)
+        keyword_confidence = np.minimum(counts.sum(axis=1) * 0.2, 0.8)
+        length_confidence = np.minimum(lengths / 200, 0.3)
+        emoji_counts = np.array([len(_EMOJI_PATTERN.findall(text)) for text in texts], dtype=float)
+        special_confidence = np.minimum(emoji_counts * 0.1, 0.2)
+        confidences = np.minimum(keyword_confidence + gap_confidence + length_confidence + special_confidence, 1.0)
+
+        # 次要情绪：分数第2到第4名中大于0.5的（稳定排序，与sorted()一致）
+        secondary_columns = np.argsort(-scores, axis=1, kind='stable')[:, 1:4]
+
+        results = []
+        for row, primary_emotion in enumerate(primary_emotions):
+            intensity = float(intensities[row])
+            valence = float(valences[row])
+            arousal = float(arousals[row])
+            secondary_emotions = [
+                (emotion_types[column], min(float(scores[row, column]), 10.0))
+                for column in secondary_columns[row] if scores[row, column] > 0.5
+            ]
+            results.append(EmotionAnalysisResult(
+                primary_emotion=primary_emotion,
+                emotion_intensity=intensity,
+                emotion_valence=valence,
+                emotion_arousal=arousal,
+                secondary_emotions=secondary_emotions,
+                confidence_score=float(confidences[row]),
+                trigger_keywords=trigger_keywords[row],
+                empathy_strategy=self._select_empathy_strategy(primary_emotion, intensity, valence),
+                response_tone=self._select_response_tone(primary_emotion, intensity, arousal)
+            ))
+
+        return results
+
+    def build_analysis_record(self, session_id: str, message_id: int, result: EmotionAnalysisResult,
+                              created_at: Optional[datetime] = None) -> Tuple:
+        """把分析结果转换成emotion_analysis表的一行（列顺序见EmotionAnalysisRepository.ANALYSIS_COLUMNS）"""
+        secondary_emotions_json = json.dumps([
+            {"emotion": emotion.value, "intensity": intensity}
+            for emotion, intensity in result.secondary_emotions
+        ])
+        return (
+            session_id, message_id, result.primary_emotion.value,
+            result.emotion_intensity, result.emotion_valence, result.emotion_arousal,
+            secondary_emotions_json, result.confidence_score, json.dumps(result.trigger_keywords),
+            result.empathy_strategy.value, created_at or datetime.now()
+        )
+
     def _calculate_valence(self, emotion: EmotionType, intensity: float) -> float:
         """计算情感效价 (-1.0 负面 到 1.0 正面)"""
         positive_emotions = {
@@ -427,7 +662,7 @@ class EmotionAnalysisService:
         length_confidence = min(len(text) / 200, 0.3)
         
         # 特殊标记：表情符号、标点等
-        emoji_count = len(re.findall(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF]', text))
+        emoji_count = len(_EMOJI_PATTERN.findall(text))
         special_confidence = min(emoji_count * 0.1, 0.2)
         
         total_confidence = keyword_confidence + gap_confidence + length_confidence + special_confidence
@@ -497,40 +732,13 @@ class EmotionAnalysisService:
         return ResponseTone.SUPPORTIVE
     
     def _save_analysis_result(self, session_id: str, message_id: int, result: EmotionAnalysisResult):
-        """保存情感分析结果到数据库"""
-        try:
-            conn = get_db_connection()
-            if not conn:
-                return
-            
-            cursor = conn.cursor()
-            
-            # 序列化复杂数据
-            secondary_emotions_json = json.dumps([
-                {"emotion": emotion.value, "intensity": intensity}
-                for emotion, intensity in result.secondary_emotions
-            ])
-            
-            trigger_keywords_json = json.dumps(result.trigger_keywords)
-            
-            cursor.execute('''
-                INSERT INTO emotion_analysis (
-                    session_id, message_id, primary_emotion, emotion_intensity,
-                    emotion_valence, emotion_arousal, secondary_emotions,
-                    confidence_score, trigger_keywords, empathy_strategy, created_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                session_id, message_id, result.primary_emotion.value,
-                result.emotion_intensity, result.emotion_valence, result.emotion_arousal,
-                secondary_emotions_json, result.confidence_score, trigger_keywords_json,
-                result.empathy_strategy.value, datetime.now()
-            ))
-            
-            conn.commit()
-            conn.close()
-            
-        except Exception as e:
-            print(f"保存情感分析结果失败: {e}")
+        """保存情感分析结果到数据库，并累加到情感趋势桶"""
+        record = self.build_analysis_record(session_id, message_id, result)
+        self.analysis_repo.save_analysis(record)
+        self.analysis_repo.update_trends(
+            session_id, result.primary_emotion.value, result.emotion_intensity,
+            result.emotion_valence, result.emotion_arousal, record[-1]
+        )
     
     def generate_empathy_response(self, analysis_result: EmotionAnalysisResult) -> str:
         """
@@ -598,6 +806,9 @@ class EmotionAnalysisService:
         """
         获取用户的情感变化趋势
         
+        读取emotion_trends中已经增量汇总好的趋势桶（最多24/7/4个）并合并，
+        不再扫描窗口内的全部情感分析记录
+        
         Args:
             session_id: 会话ID
             time_period: 时间周期 ('hourly', 'daily', 'weekly')
@@ -606,60 +817,55 @@ class EmotionAnalysisService:
             Dict: 情感趋势数据
         """
         try:
-            conn = get_db_connection()
-            if not conn:
-                return None
-            
-            cursor = conn.cursor()
-            
-            # 根据时间周期计算起始时间
-            if time_period == "hourly":
-                start_time = datetime.now() - timedelta(hours=24)
-            elif time_period == "daily":
-                start_time = datetime.now() - timedelta(days=7)
-            else:  # weekly
-                start_time = datetime.now() - timedelta(weeks=4)
+            if time_period not in TREND_WINDOW_BUCKETS:
+                time_period = "weekly"
             
-            # 查询情感分析数据
-            cursor.execute('''
-                SELECT primary_emotion, emotion_intensity, emotion_valence, 
-                       emotion_arousal, created_at
-                FROM emotion_analysis
-                WHERE session_id = ? AND created_at >= ?
-                ORDER BY created_at
-            ''', (session_id, start_time))
+            now = datetime.now()
+            start_time = (trend_bucket_start(time_period, now)
+                          - TREND_BUCKETS[time_period] * (TREND_WINDOW_BUCKETS[time_period] - 1))
+            buckets = self.analysis_repo.get_trend_buckets(session_id, time_period, start_time)
             
-            results = cursor.fetchall()
-            conn.close()
-            
-            if not results:
+            if not buckets:
                 return None
             
-            # 分析趋势
-            intensities = [row[1] for row in results]
-            valences = [row[2] for row in results]
-            arousals = [row[3] for row in results]
-            
-            avg_intensity = sum(intensities) / len(intensities)
-            avg_valence = sum(valences) / len(valences)
-            avg_arousal = sum(arousals) / len(arousals)
+            # 合并各桶的累计量（Chan等人的并行方差合并公式）
+            total = 0
+            avg_intensity = 0.0
+            intensity_m2 = 0.0
+            valence_sum = 0.0
+            arousal_sum = 0.0
+            emotion_counts: Dict[str, int] = {}
+            for row in buckets:
+                count = row[2]
+                delta = row[3] - avg_intensity
+                merged = total + count
+                avg_intensity += delta * count / merged
+                intensity_m2 += row[4] + delta * delta * total * count / merged
+                total = merged
+                valence_sum += row[5] * count
+                arousal_sum += row[6] * count
+                for emotion, emotion_count in json.loads(row[7]).items():
+                    emotion_counts[emotion] = emotion_counts.get(emotion, 0) + emotion_count
+            
+            avg_valence = valence_sum / total
+            avg_arousal = arousal_sum / total
             
             # 计算情绪波动性
-            intensity_variance = sum((x - avg_intensity) ** 2 for x in intensities) / len(intensities)
-            emotion_volatility = min(math.sqrt(intensity_variance) / 10.0, 1.0)
-            
-            # 确定主导情绪
-            emotion_counts = {}
-            for row in results:
-                emotion = row[0]
-                emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
+            emotion_volatility = min(math.sqrt(intensity_m2 / total) / 10.0, 1.0)
             
+            # 确定主导情绪（次数相同时取先出现的）
             dominant_emotion = max(emotion_counts.keys(), key=lambda k: emotion_counts[k])
             
-            # 判断趋势方向
-            if len(valences) >= 3:
-                recent_valence = sum(valences[-3:]) / 3
-                earlier_valence = sum(valences[:-3]) / len(valences[:-3]) if len(valences) > 3 else avg_valence
+            # 判断趋势方向：最近3条从最新的桶往前取
+            recent_valences: List[float] = []
+            for row in reversed(buckets):
+                recent_valences = json.loads(row[8])[-(3 - len(recent_valences)):] + recent_valences
+                if len(recent_valences) >= 3:
+                    break
+            
+            if total >= 3:
+                recent_valence = sum(recent_valences) / 3
+                earlier_valence = (valence_sum - sum(recent_valences)) / (total - 3) if total > 3 else avg_valence
                 
                 if recent_valence > earlier_valence + 0.1:
                     trend_direction = "improving"
@@ -673,14 +879,14 @@ class EmotionAnalysisService:
             return {
                 "time_period": time_period,
                 "start_time": start_time.isoformat(),
-                "end_time": datetime.now().isoformat(),
+                "end_time": now.isoformat(),
                 "avg_intensity": round(avg_intensity, 2),
                 "avg_valence": round(avg_valence, 2),
                 "avg_arousal": round(avg_arousal, 2),
                 "dominant_emotion": dominant_emotion,
                 "emotion_volatility": round(emotion_volatility, 2),
                 "trend_direction": trend_direction,
-                "total_emotions": len(results)
+                "total_emotions": total
             }
             
         except Exception as e:
@@ -691,29 +897,54 @@ class EmotionAnalysisService:
                             empathy_type: str, response_tone: str, 
                             key_phrases: List[str]) -> bool:
         """保存共情回应记录"""
+        return self.analysis_repo.save_empathy_response(
+            session_id, analysis_id, empathy_type, response_tone, json.dumps(key_phrases)
+        ) 
+
+_analyzer: Optional[EmotionKeywordAnalyzer] = None
+_analyzer_lock = threading.Lock()
+
+
+def build_emotion_keywords(config: Optional[CompanionConfig] = None) -> Dict[EmotionType, Dict[str, float]]:
+    """内置情绪关键词词典，合并配置文件中 emotion_analysis_keywords 的补充关键词"""
+    emotion_keywords = EmotionAnalysisService._load_emotion_keywords()
+    extra_keywords = getattr(config or get_config(), 'emotion_analysis_keywords', {}) or {}
+    for emotion_value, keywords in extra_keywords.items():
         try:
-            conn = get_db_connection()
-            if not conn:
-                return False
-            
-            cursor = conn.cursor()
-            
-            key_phrases_json = json.dumps(key_phrases)
-            
-            cursor.execute('''
-                INSERT INTO empathy_responses (
-                    session_id, analysis_id, empathy_type, response_tone,
-                    key_phrases, created_at
-                ) VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                session_id, analysis_id, empathy_type, response_tone,
-                key_phrases_json, datetime.now()
-            ))
-            
-            conn.commit()
-            conn.close()
-            return True
-            
-        except Exception as e:
-            print(f"保存共情回应失败: {e}")
-            return False 
\ No newline at end of file
+            emotion_type = EmotionType(emotion_value)
+        except ValueError:
+            print(f"未知的情绪类型，已忽略: {emotion_value}")
+            continue
+        emotion_keywords.setdefault(emotion_type, {}).update(keywords)
+    return emotion_keywords
+
+
+def get_emotion_analyzer() -> EmotionKeywordAnalyzer:
+    """获取进程内共享的情感关键词分析器（单例）"""
+    global _analyzer
+
+    if _analyzer is None:
+        with _analyzer_lock:
+            if _analyzer is None:
+                _analyzer = EmotionKeywordAnalyzer(build_emotion_keywords())
+
+    return _analyzer
+
+
+def reset_emotion_analyzer():
+    """丢弃共享分析器（测试或切换配置时使用）"""
+    global _analyzer
+
+    with _analyzer_lock:
+        _analyzer = None
+
+
+def _reload_emotion_keywords(config: CompanionConfig):
+    """reload_config 之后重新加载关键词词典，旧的分析缓存随之失效"""
+    with _analyzer_lock:
+        analyzer = _analyzer
+    if analyzer is not None:
+        analyzer.load_keywords(build_emotion_keywords(config))
+
+
+on_config_reload(_reload_emotion_keywords)
@@ -7,6 +7,7 @@ import re
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
+from ..utils.keyword_matcher import KeywordMatcher, KeywordScan
 
 
 class EmotionType(Enum):
@@ -122,6 +123,13 @@ class EmotionEmergencyService:
                 }
             }
         }
+        
+        # 关键词和严重程度短语编译进同一个自动机，检测时只扫描一遍文本
+        self.keyword_matcher = KeywordMatcher()
+        for emotion_type, patterns in self.emotion_patterns.items():
+            self.keyword_matcher.add_category((emotion_type, "keywords"), patterns["keywords"])
+            for severity, severity_patterns in patterns["severity_patterns"].items():
+                self.keyword_matcher.add_category((emotion_type, severity), severity_patterns)
     
     def _init_emergency_techniques(self):
         """初始化急救技巧库"""
@@ -217,16 +225,13 @@ class EmotionEmergencyService:
         检测文本中的负面情绪
         返回最匹配的情绪检测结果
         """
-        text_lower = text.lower()
+        scan = self.keyword_matcher.scan(text)
         best_match = None
         highest_confidence = 0.0
         
         for emotion_type, patterns in self.emotion_patterns.items():
             # 计算关键词匹配度
-            matched_keywords = []
-            for keyword in patterns["keywords"]:
-                if keyword in text_lower:
-                    matched_keywords.append(keyword)
+            matched_keywords = scan.keywords((emotion_type, "keywords"))
             
             if not matched_keywords:
                 continue
@@ -239,7 +244,7 @@ class EmotionEmergencyService:
                 confidence += 0.2
             
             # 检测严重程度
-            severity = self._detect_severity(text_lower, patterns["severity_patterns"])
+            severity = self._detect_severity(scan, emotion_type, patterns["severity_patterns"])
             
             # 高危情况直接标记为紧急
             is_emergency = (emotion_type in [EmotionType.SELF_HARM, EmotionType.SUICIDAL] or 
@@ -261,12 +266,12 @@ class EmotionEmergencyService:
         
         return None
     
-    def _detect_severity(self, text: str, severity_patterns: Dict) -> SeverityLevel:
-        """检测情绪严重程度"""
-        for severity, patterns in reversed(list(severity_patterns.items())):
-            for pattern in patterns:
-                if pattern in text:
-                    return severity
+    def _detect_severity(self, scan: KeywordScan, emotion_type: EmotionType,
+                         severity_patterns: Dict) -> SeverityLevel:
+        """检测情绪严重程度（从最严重的等级开始检查）"""
+        for severity in reversed(list(severity_patterns)):
+            if scan.has((emotion_type, severity)):
+                return severity
         
         # 默认为轻度
         return SeverityLevel.MILD
@@ -12,6 +12,39 @@ from enum import Enum
 from dataclasses import dataclass
 from ..config.companion_config import get_config
 from ..utils.logging_config import get_logger, monitor_performance
+from ..utils.keyword_matcher import KeywordMatcher
+
+
+# 用户情绪关键词（按优先级排列，先命中的类别优先）
+USER_MOOD_KEYWORDS = {
+    "开心": ["开心", "高兴", "快乐", "兴奋", "棒", "好", "哈哈", "嘻嘻"],
+    "难过": ["难过", "伤心", "痛苦", "失落", "沮丧", "哭", "呜呜"],
+    "疲惫": ["累", "疲惫", "困", "没劲", "无力", "撑不住"],
+    "焦虑": ["紧张", "焦虑", "担心", "不安", "害怕", "压力"],
+    "平静": ["还好", "一般", "平常", "没事", "还行"]
+}
+
+# 活力关键词及其对活力值的影响
+USER_ENERGY_KEYWORDS = {
+    "high_energy": {keyword: 0.5 for keyword in ["！", "哈哈", "哇", "太棒了", "超级", "非常"]},
+    "low_energy": {keyword: -0.5 for keyword in ["唉", "算了", "不想", "没劲", "累"]}
+}
+
+# 内容类型关键词（按优先级排列）
+USER_CONTENT_KEYWORDS = {
+    "工作学习": ["工作", "学习", "上班", "考试", "项目", "作业", "老板", "同事"],
+    "情感关系": ["男友", "女友", "分手", "恋爱", "喜欢", "爱情", "表白", "约会"],
+    "家庭生活": ["家人", "父母", "妈妈", "爸爸", "家里", "回家", "家庭"],
+    "健康身体": ["累", "病", "感冒", "头痛", "身体", "健康", "医院"],
+    "兴趣爱好": ["游戏", "电影", "音乐", "书", "运动", "旅行", "美食"],
+    "日常分享": ["今天", "刚才", "刚刚", "现在", "正在", "想要"],
+    "情绪表达": ["开心", "难过", "生气", "郁闷", "兴奋", "紧张", "害怕"],
+    "寻求安慰": ["安慰", "陪陪", "聊聊", "听我说", "理解", "支持"]
+}
+
+_mood_matcher = KeywordMatcher(USER_MOOD_KEYWORDS, ignore_case=False)
+_energy_matcher = KeywordMatcher(USER_ENERGY_KEYWORDS, ignore_case=False)
+_content_matcher = KeywordMatcher(USER_CONTENT_KEYWORDS, ignore_case=False)
 
 
 class CompanionMood(Enum):
@@ -188,29 +221,11 @@ class EmotionalCompanionService:
     
     def _detect_user_mood(self, user_input: str) -> str:
         """检测用户情绪"""
-        # 情绪关键词检测
-        mood_keywords = {
-            "开心": ["开心", "高兴", "快乐", "兴奋", "棒", "好", "哈哈", "嘻嘻"],
-            "难过": ["难过", "伤心", "痛苦", "失落", "沮丧", "哭", "呜呜"],
-            "疲惫": ["累", "疲惫", "困", "没劲", "无力", "撑不住"],
-            "焦虑": ["紧张", "焦虑", "担心", "不安", "害怕", "压力"],
-            "平静": ["还好", "一般", "平常", "没事", "还行"]
-        }
-        
-        for mood, keywords in mood_keywords.items():
-            if any(keyword in user_input for keyword in keywords):
-                return mood
-        
-        return "平静"
+        return _mood_matcher.scan(user_input).first_category() or "平静"
     
     def _calculate_user_energy(self, user_input: str, session_history: List) -> float:
         """计算用户活力水平"""
         # 基于文本长度、标点符号、表情等判断
-        energy_indicators = {
-            "high_energy": ["！", "哈哈", "哇", "太棒了", "超级", "非常"],
-            "low_energy": ["唉", "算了", "不想", "没劲", "累"]
-        }
-        
         energy_score = 5.0  # 默认中等活力
         
         # 文本长度影响
@@ -219,14 +234,8 @@ class EmotionalCompanionService:
         elif len(user_input) < 10:
             energy_score -= 1.0
             
-        # 关键词影响
-        for keyword in energy_indicators["high_energy"]:
-            if keyword in user_input:
-                energy_score += 0.5
-                
-        for keyword in energy_indicators["low_energy"]:
-            if keyword in user_input:
-                energy_score -= 0.5
+        # 关键词影响（每个命中的关键词 ±0.5）
+        energy_score += _energy_matcher.scan(user_input).total_weight()
         
         return max(0, min(10, energy_score))
     
@@ -293,22 +302,7 @@ class EmotionalCompanionService:
     
     def _analyze_user_content_type(self, user_input: str) -> str:
         """分析用户输入的内容类型"""
-        content_indicators = {
-            "工作学习": ["工作", "学习", "上班", "考试", "项目", "作业", "老板", "同事"],
-            "情感关系": ["男友", "女友", "分手", "恋爱", "喜欢", "爱情", "表白", "约会"],
-            "家庭生活": ["家人", "父母", "妈妈", "爸爸", "家里", "回家", "家庭"],
-            "健康身体": ["累", "病", "感冒", "头痛", "身体", "健康", "医院"],
-            "兴趣爱好": ["游戏", "电影", "音乐", "书", "运动", "旅行", "美食"],
-            "日常分享": ["今天", "刚才", "刚刚", "现在", "正在", "想要"],
-            "情绪表达": ["开心", "难过", "生气", "郁闷", "兴奋", "紧张", "害怕"],
-            "寻求安慰": ["安慰", "陪陪", "聊聊", "听我说", "理解", "支持"]
-        }
-        
-        for content_type, keywords in content_indicators.items():
-            if any(keyword in user_input for keyword in keywords):
-                return content_type
-        
-        return "日常交流"
+        return _content_matcher.scan(user_input).first_category() or "日常交流"
     
     def _get_emotional_guidance(self, emotional_state: EmotionalState, content_type: str) -> str:
         """获取情绪回应指导方针"""
@@ -5,7 +5,7 @@
 
 import random
 from typing import Dict, List
-from ..data.repositories.user_profile_repository import UserProfileRepository
+from ..data.repositories.user_profile_repository import UserProfileRepository, level_for_total_exp, total_exp
 
 
 class IntimacyService:
@@ -17,61 +17,50 @@ class IntimacyService:
     def add_exp(self, session_id: str, exp_to_add: int = 10) -> Dict:
         """
         添加经验值并处理升级逻辑
+
+        经验值、互动次数和等级由一条UPSERT语句原子更新（同一会话的多个标签页同时加经验不会丢失），
+        是否升级根据语句返回的新档案计算
         
         Args:
             session_id: 会话ID
             exp_to_add: 要添加的经验值，默认10
             
         Returns:
-            Dict: 包含升级状态和相关信息的字典
+            Dict: 包含升级状态和相关信息的字典（写入失败时exp_gained为0且不升级）
         """
-        # 确保用户档案存在
-        profile = self.user_profile_repo.find_or_create_profile(session_id)
-        
-        current_level = profile["intimacy_level"]
-        current_exp = profile["intimacy_exp"]
-        total_interactions = profile["total_interactions"]
-        
-        # 计算当前等级升到下一级所需的总经验值
-        exp_needed = current_level * 50
-        
-        # 添加经验值
-        new_exp = current_exp + exp_to_add
-        new_level = current_level
-        leveled_up = False
-        level_rewards = []
-        
-        # 检查是否升级（可能连续升级）
-        while new_exp >= exp_needed:
-            new_level += 1
-            new_exp -= exp_needed
-            leveled_up = True
-            
-            # 获取升级奖励
-            rewards = self._get_level_rewards(new_level)
-            level_rewards.extend(rewards)
-            
-            # 重新计算下一级所需经验值
-            exp_needed = new_level * 50
-        
-        # 更新数据库
-        self.user_profile_repo.update_profile(
-            session_id, new_level, new_exp, total_interactions + 1
+        profile = self.user_profile_repo.add_exp(session_id, exp_to_add)
+        if profile is None:
+            # 写入失败：不能展示没有保存的经验值和升级，按现有档案返回未获得经验的结果
+            print(f"会话 {session_id} 的经验值没有保存，本次不计入经验")
+            current = self.user_profile_repo.get_profile(session_id) or {
+                "intimacy_level": 1, "intimacy_exp": 0, "total_interactions": 0
+            }
+            level = current["intimacy_level"]
+            return self._exp_result(level, level, current["intimacy_exp"], 0, current["total_interactions"])
+
+        new_level = profile["intimacy_level"]
+        old_level, _ = level_for_total_exp(total_exp(new_level, profile["intimacy_exp"]) - exp_to_add)
+        return self._exp_result(
+            old_level, new_level, profile["intimacy_exp"], exp_to_add, profile["total_interactions"]
         )
-        
-        # 返回结果
-        result = {
-            "leveled_up": leveled_up,
-            "old_level": current_level,
+
+    def _exp_result(self, old_level: int, new_level: int, new_exp: int,
+                    exp_to_add: int, total_interactions: int) -> Dict:
+        """组装加经验的结果，升级时附带每一级的奖励"""
+        level_rewards = []
+        for level in range(old_level + 1, new_level + 1):
+            level_rewards.extend(self._get_level_rewards(level))
+
+        return {
+            "leveled_up": new_level > old_level,
+            "old_level": old_level,
             "new_level": new_level,
             "current_exp": new_exp,
             "exp_needed": new_level * 50,
             "exp_gained": exp_to_add,
             "level_rewards": level_rewards,
-            "total_interactions": total_interactions + 1
+            "total_interactions": total_interactions
         }
-        
-        return result
     
     def get_intimacy_info(self, session_id: str) -> Dict:
         """获取亲密度信息"""
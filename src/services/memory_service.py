@@ -0,0 +1,150 @@
+"""
+记忆服务
+从用户消息中提取核心记忆，写入会话的本地向量索引，
+每轮按与当前消息的相关度检索记忆（不足时用最近的核心记忆补齐）
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+from ..config.settings import settings
+from ..data.memory_index import KIND_CORE_MEMORY, KIND_MESSAGE, MemoryIndex, get_memory_index
+from ..data.repositories.chat_repository import ChatRepository
+from ..utils.keyword_matcher import KeywordMatcher
+
+# 记忆类型 -> 触发词（按优先级排列：同一句话命中多个类型时取靠前的）
+MEMORY_KEYWORDS = {
+    "event": [
+        "考试", "面试", "生日", "毕业", "搬家", "分手", "结婚", "旅行", "旅游", "比赛",
+        "生病", "住院", "手术", "升职", "辞职", "失业", "加班", "论文", "答辩", "出差", "入职"
+    ],
+    "person": [
+        "妈妈", "爸爸", "父母", "男朋友", "女朋友", "老公", "老婆", "朋友", "闺蜜", "同事",
+        "老板", "领导", "老师", "同学", "室友", "孩子", "奶奶", "爷爷", "外婆", "外公",
+        "哥哥", "姐姐", "弟弟", "妹妹"
+    ],
+    "preference": ["喜欢", "讨厌", "最爱", "爱吃", "爱看", "爱听", "害怕", "受不了"],
+    "insight": ["我觉得", "我发现", "我意识到", "我明白", "想通了", "我认为", "原来"],
+}
+
+# 被检索到的历史消息在Prompt中的记忆类型
+MESSAGE_MEMORY_TYPE = "conversation"
+
+# 与已有记忆的相似度超过该值时视为重复，不再保存
+DUPLICATE_SCORE = 0.9
+MAX_MEMORIES_PER_TURN = 3
+MEMORY_MIN_LENGTH = 4
+MEMORY_MAX_LENGTH = 120
+
+_SENTENCE_RE = re.compile(r'[^。！？!?；;\n]+')
+_memory_matcher = KeywordMatcher(MEMORY_KEYWORDS)
+
+
+def extract_memories(text: str) -> List[Tuple[str, str]]:
+    """
+    从用户消息中提取核心记忆
+
+    Returns:
+        List[Tuple[str, str]]: (memory_type, 记忆内容)，内容为命中触发词的整句
+    """
+    memories = []
+    for match in _SENTENCE_RE.finditer(text):
+        sentence = match.group().strip(" ，,。")
+        if not MEMORY_MIN_LENGTH <= len(sentence) <= MEMORY_MAX_LENGTH:
+            continue
+        memory_type = _memory_matcher.scan(sentence).first_category()
+        if memory_type:
+            memories.append((memory_type, sentence))
+            if len(memories) >= MAX_MEMORIES_PER_TURN:
+                break
+    return memories
+
+
+class MemoryService:
+    """记忆提取和检索服务"""
+
+    def __init__(self, chat_repo: Optional[ChatRepository] = None):
+        self.chat_repo = chat_repo or ChatRepository()
+
+    def remember_turn(self, session_id: str, message_id: Optional[int], user_input: str) -> int:
+        """
+        索引本轮的用户消息并保存从中提取的核心记忆（在后台任务中调用）
+
+        Returns:
+            int: 新保存的核心记忆条数
+        """
+        index = self.get_index(session_id)
+        if message_id:
+            index.add(KIND_MESSAGE, message_id, user_input)
+
+        saved = 0
+        for memory_type, content in extract_memories(user_input):
+            duplicates = index.search(content, k=1, min_score=DUPLICATE_SCORE, kind=KIND_CORE_MEMORY)
+            if duplicates:
+                continue
+            memory_id = self.chat_repo.add_core_memory(session_id, memory_type, content)
+            if memory_id:
+                index.add(KIND_CORE_MEMORY, memory_id, content)
+                saved += 1
+        return saved
+
+    def retrieve(self, session_id: str, query: str, limit: Optional[int] = None) -> List[Tuple[str, str, str]]:
+        """
+        检索与当前消息最相关的记忆
+
+        Returns:
+            List[Tuple[str, str, str]]: (memory_type, content, timestamp)，相关的记忆在前，
+                不足 limit 条时用最近的核心记忆补齐
+        """
+        limit = limit or settings.memory_top_k
+        index = self.get_index(session_id)
+        # 最近的几轮对话已经在Prompt里，不作为记忆重复检索（索引中只有用户消息，每轮一条）
+        hits = index.search(
+            query, k=limit, min_score=settings.memory_min_score,
+            max_message_id=index.source_id_before_latest(KIND_MESSAGE, settings.context_history_turns)
+        )
+
+        memories = self.chat_repo.get_core_memories_by_ids(
+            session_id, [hit.source_id for hit in hits if hit.kind == KIND_CORE_MEMORY]
+        )
+        messages = self.chat_repo.get_messages_by_ids(
+            session_id, [hit.source_id for hit in hits if hit.kind == KIND_MESSAGE]
+        )
+
+        results: List[Tuple[str, str, str]] = []
+        for hit in hits:
+            if hit.kind == KIND_CORE_MEMORY and hit.source_id in memories:
+                results.append(memories[hit.source_id])
+            elif hit.kind == KIND_MESSAGE and hit.source_id in messages:
+                content, timestamp = messages[hit.source_id]
+                # 已经作为核心记忆检索到的原话不再重复
+                if not any(memory[1] in content for memory in results):
+                    results.append((MESSAGE_MEMORY_TYPE, content, timestamp))
+
+        if len(results) < limit:
+            seen = {content for _, content, _ in results}
+            for memory in self.chat_repo.get_core_memories(session_id, limit=limit):
+                if memory[1] not in seen:
+                    results.append(memory)
+                    if len(results) >= limit:
+                        break
+        return results
+
+    def get_index(self, session_id: str) -> MemoryIndex:
+        """获取会话的记忆索引，并从数据库补齐尚未索引的核心记忆和用户消息"""
+        index = get_memory_index(session_id)
+
+        memories = self.chat_repo.get_core_memories_after(session_id, index.max_source_id(KIND_CORE_MEMORY))
+        if memories:
+            index.add_many(KIND_CORE_MEMORY, *zip(*memories))
+
+        messages = [
+            (message_id, content)
+            for message_id, role, content in self.chat_repo.get_messages_after(
+                session_id, index.max_source_id(KIND_MESSAGE)
+            )
+            if role == "user"
+        ]
+        if messages:
+            index.add_many(KIND_MESSAGE, *zip(*messages))
+        return index
@@ -0,0 +1,116 @@
+"""
+AI回应缓存服务
+对问候、感谢等短消息复用之前的模型回应，命中时跳过LLM调用
+缓存键由会话ID、归一化输入、Prompt版本、亲密度分段和情绪分段组成，存储在ai_cache表
+回应是根据会话自己的历史、摘要和核心记忆生成的，只能在同一会话内复用
+"""
+
+import hashlib
+import re
+import threading
+import unicodedata
+from typing import Dict, Optional
+
+from ..config.prompts import PROMPT_VERSION
+from ..config.settings import settings
+from ..data.repositories.chat_repository import ChatRepository
+
+
+# 每写入多少条缓存执行一次过期/容量清理
+PRUNE_EVERY_WRITES = 50
+
+# 归一化时去掉的字符：空白、标点、符号和表情
+_NON_WORD_PATTERN = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def normalize_input(user_input: str) -> str:
+    """
+    归一化用户输入
+
+    "谢谢！"、"谢谢~~"、" 谢谢 " 都归一为 "谢谢"
+    """
+    text = unicodedata.normalize('NFKC', user_input or '').lower()
+    return _NON_WORD_PATTERN.sub('', text)
+
+
+def intimacy_bucket(intimacy_level: int) -> str:
+    """亲密度分段：同一分段内的回应语气一致，可以共用缓存"""
+    if intimacy_level <= 2:
+        return "new"
+    if intimacy_level <= 4:
+        return "friend"
+    return "close"
+
+
+class ResponseCacheService:
+    """AI回应缓存服务"""
+
+    def __init__(self, chat_repo: Optional[ChatRepository] = None,
+                 ttl_seconds: Optional[int] = None, max_entries: Optional[int] = None,
+                 max_input_length: Optional[int] = None):
+        self.chat_repo = chat_repo or ChatRepository()
+        self.ttl_seconds = ttl_seconds or settings.response_cache_ttl_seconds
+        self.max_entries = max_entries or settings.response_cache_max_entries
+        self.max_input_length = max_input_length or settings.response_cache_max_input_length
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def is_cacheable(self, user_input: str) -> bool:
+        """只有归一化后足够短的消息才使用缓存（长消息通常依赖具体上下文）"""
+        normalized = normalize_input(user_input)
+        return 0 < len(normalized) <= self.max_input_length
+
+    def build_key(self, session_id: str, user_input: str, variant: str, intimacy_level: int, emotion: str) -> str:
+        """
+        生成缓存键
+
+        Args:
+            session_id: 会话ID（回应可能提到该会话的记忆，不能给其他会话使用）
+            user_input: 用户输入
+            variant: 回应路径（不同路径的Prompt不同）
+            intimacy_level: 亲密度等级
+            emotion: 情绪分段
+        """
+        parts = [
+            session_id,
+            PROMPT_VERSION,
+            variant,
+            intimacy_bucket(intimacy_level),
+            emotion,
+            normalize_input(user_input)
+        ]
+        return hashlib.sha256("|".join(parts).encode('utf-8')).hexdigest()
+
+    def get(self, cache_key: str, model: str) -> Optional[Dict]:
+        """读取缓存，同时统计命中率"""
+        response = self.chat_repo.get_cached_response(cache_key, model, self.ttl_seconds)
+        with self._lock:
+            if response is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return response
+
+    def put(self, cache_key: str, model: str, response: Dict) -> bool:
+        """写入缓存，定期清理过期和超量的记录"""
+        saved = self.chat_repo.save_cached_response(cache_key, model, response)
+        with self._lock:
+            self.writes += 1
+            should_prune = self.writes % PRUNE_EVERY_WRITES == 0
+        if should_prune:
+            self.chat_repo.prune_cached_responses(self.ttl_seconds, self.max_entries)
+        return saved
+
+    def get_stats(self) -> Dict:
+        """缓存命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "hit_rate": self.hits / total if total else 0.0
+            }
@@ -14,6 +14,7 @@ from datetime import datetime, timedelta
 from langchain_community.utilities import SerpAPIWrapper
 import streamlit as st
 from functools import lru_cache
+from ..utils.keyword_matcher import KeywordMatcher
 
 
 class LocalMentalHealthSearchService:
@@ -147,35 +148,39 @@ class LocalMentalHealthSearchService:
         return formatted_text
 
 
+# 搜索意图关键词（类别顺序即优先级）
+SEARCH_INTENT_KEYWORDS = {
+    "local_mental_health": [
+        "找心理咨询师", "找心理医生", "心理咨询", "心理治疗",
+        "咨询师推荐", "心理诊所", "附近的", "当地的",
+        "心理医生推荐", "好的心理医生", "靠谱的咨询师", "心理科医生"
+    ],
+    "mental_health_info": [
+        "最新研究", "新方法", "科学依据", "专家建议",
+        "治疗方法", "缓解技巧"
+    ],
+    "crisis_resources": [
+        "紧急求助", "危机干预", "自杀预防", "急救电话"
+    ]
+}
+
+_search_intent_matcher = KeywordMatcher(SEARCH_INTENT_KEYWORDS)
+
+
 class SearchTriggerDetector:
     """搜索触发检测器"""
     
     @staticmethod
     def detect_search_intent(user_input: str) -> Dict:
         """检测用户输入的搜索意图"""
-        intent_patterns = {
-            "local_mental_health": [
-                "找心理咨询师", "找心理医生", "心理咨询", "心理治疗",
-                "咨询师推荐", "心理诊所", "附近的", "当地的",
-                "心理医生推荐", "好的心理医生", "靠谱的咨询师", "心理科医生"
-            ],
-            "mental_health_info": [
-                "最新研究", "新方法", "科学依据", "专家建议",
-                "治疗方法", "缓解技巧"
-            ],
-            "crisis_resources": [
-                "紧急求助", "危机干预", "自杀预防", "急救电话"
-            ]
-        }
+        scan = _search_intent_matcher.scan(user_input)
+        intent = scan.first_category()
         
-        user_input_lower = user_input.lower()
-        
-        for intent, keywords in intent_patterns.items():
-            if any(keyword in user_input_lower for keyword in keywords):
-                return {
-                    "intent": intent,
-                    "confidence": 0.8,
-                    "matched_keywords": [kw for kw in keywords if kw in user_input_lower]
-                }
+        if intent:
+            return {
+                "intent": intent,
+                "confidence": 0.8,
+                "matched_keywords": scan.keywords(intent)
+            }
         
         return {"intent": "none", "confidence": 0.0, "matched_keywords": []} 
\ No newline at end of file
@@ -0,0 +1,104 @@
+"""
+对话轮次编排器
+调用模型前并发获取上下文（记忆、历史、档案、急救/搜索判断、情感分析），
+调用模型后把写操作交给批量写入队列和后台队列，用户感知的延迟只剩模型调用本身
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from ..core.ai_engine import AIEngine
+from ..core.background_tasks import run_in_background
+from ..data.repositories.chat_repository import ChatRepository
+from ..data.repositories.user_profile_repository import UserProfileRepository
+from ..services.conversation_summary_service import ConversationSummaryService
+from ..services.intimacy_service import IntimacyService
+from ..services.memory_service import MemoryService
+
+
+# 读操作使用的共享线程池（SQLite连接池和正则分析都是阻塞调用）
+_context_executor = ThreadPoolExecutor(max_workers=6, thread_name_prefix="turn-context")
+
+
+class TurnOrchestrator:
+    """对话轮次编排器"""
+
+    def __init__(self, ai_engine: AIEngine, chat_repo: ChatRepository,
+                 intimacy_service: IntimacyService):
+        self.ai_engine = ai_engine
+        self.chat_repo = chat_repo
+        self.intimacy_service = intimacy_service
+        self.summary_service = ConversationSummaryService(
+            chat_repo, summarizer=ai_engine.summarize_conversation
+        )
+        self.memory_service = MemoryService(chat_repo)
+
+    def gather_context(self, session_id: str, sanitized_input: str, message_id: int,
+                       include_routing: bool = False,
+                       include_emotion_analysis: bool = False) -> Dict:
+        """
+        并发获取调用模型前需要的上下文
+
+        Args:
+            session_id: 会话ID
+            sanitized_input: 清理后的用户输入
+            message_id: 消息ID
+            include_routing: 是否同时判断需要走结构化路径（急救/搜索）
+            include_emotion_analysis: 是否同时做深度情感分析
+
+        Returns:
+            Dict: core_memories（与本轮输入最相关的记忆）, conversation_summary, recent_context（摘要之后的消息）, profile
+                以及可选的 requires_structured, emotion_analysis
+        """
+        tasks = {
+            "core_memories": lambda: self.memory_service.retrieve(session_id, sanitized_input),
+            "conversation": lambda: self.summary_service.get_prompt_history(session_id),
+            "profile": lambda: UserProfileRepository().find_or_create_profile(session_id)
+        }
+        if include_routing:
+            tasks["requires_structured"] = lambda: self.ai_engine.requires_structured_response(sanitized_input)
+        if include_emotion_analysis:
+            tasks["emotion_analysis"] = lambda: self.ai_engine.analyze_user_emotion(
+                sanitized_input, session_id, message_id
+            )
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            results = asyncio.run(self._gather_async(tasks))
+        else:
+            # 已经在事件循环中（例如被异步代码调用）时退回顺序执行
+            results = {name: func() for name, func in tasks.items()}
+
+        results["conversation_summary"], results["recent_context"] = results.pop("conversation")
+        return results
+
+    async def _gather_async(self, tasks: Dict[str, Callable]) -> Dict:
+        loop = asyncio.get_running_loop()
+        names = list(tasks)
+        results = await asyncio.gather(
+            *(loop.run_in_executor(_context_executor, tasks[name]) for name in names)
+        )
+        return dict(zip(names, results))
+
+    def schedule_post_turn_writes(self, session_id: str, sanitized_input: str,
+                                  gift_info: Dict, message_id: Optional[int] = None):
+        """
+        把本轮不影响展示的写入移出用户等待的路径（经验值由调用方同步写入，结果用于展示）
+
+        每个写入只经过一个队列：宝藏是普通插入，直接提交到批量写入队列（不阻塞）；
+        关怀任务、记忆和摘要需要先计算，这些交给后台任务队列
+        """
+        if gift_info["type"]:
+            self.chat_repo.add_treasure(session_id, gift_info["type"], gift_info["content"])
+
+        run_in_background(
+            "处理关怀任务", self.ai_engine.process_care_opportunities, sanitized_input, session_id
+        )
+
+        run_in_background(
+            "提取核心记忆", self.memory_service.remember_turn, session_id, message_id, sanitized_input
+        )
+
+        run_in_background("更新对话摘要", self.summary_service.maybe_summarize, session_id)
@@ -0,0 +1,138 @@
+"""
+情感分析回填工具
+关键词词典调整后，用批量分析接口对所有会话的历史用户消息重新打分，
+并替换 emotion_analysis 表中的旧记录，最后重新生成 emotion_trends 趋势桶
+
+用法:
+    python -m src.tools.backfill_emotion_analysis --database mind_sprite.db --workers 4
+    python -m src.tools.backfill_emotion_analysis --trends-only  # 只根据现有记录重建趋势桶
+"""
+
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# 每个工作进程持有一个分析服务（关键词自动机只构建一次）
+_worker_service = None
+
+
+def _init_worker():
+    global _worker_service
+    from ..services.emotion_analysis_service import EmotionAnalysisService
+    _worker_service = EmotionAnalysisService()
+
+
+def score_messages(messages: List[Tuple[int, str, str, str]]) -> List[Tuple]:
+    """
+    对一批消息打分，返回可以直接写入emotion_analysis的记录
+
+    Args:
+        messages: (id, session_id, content, timestamp) 列表
+    """
+    if _worker_service is None:
+        _init_worker()
+    results = _worker_service.analyze_batch([content for _, _, content, _ in messages])
+    return [
+        _worker_service.build_analysis_record(session_id, message_id, result, created_at=timestamp)
+        for (message_id, session_id, _, timestamp), result in zip(messages, results)
+    ]
+
+
+def iter_message_chunks(chunk_size: int) -> Iterator[List[Tuple[int, str, str, str]]]:
+    """按ID顺序分批读取所有用户消息"""
+    from ..data.repositories.chat_repository import ChatRepository
+
+    chat_repo = ChatRepository()
+    last_id = 0
+    while True:
+        messages = chat_repo.get_user_messages_after(last_id, chunk_size)
+        if not messages:
+            return
+        yield messages
+        last_id = messages[-1][0]
+
+
+def backfill(chunk_size: int = 2000, workers: Optional[int] = None) -> Dict:
+    """
+    回填所有会话的情感分析记录
+
+    Args:
+        chunk_size: 每批消息数量
+        workers: 打分进程数，0或1表示在当前进程中打分
+
+    Returns:
+        Dict: messages, chunks, failed_chunks, trends_rebuilt, seconds, messages_per_second
+    """
+    from ..data.database import init_db
+    from ..data.repositories.emotion_analysis_repository import EmotionAnalysisRepository
+
+    init_db()
+    analysis_repo = EmotionAnalysisRepository()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    started = time.perf_counter()
+    stats = {"messages": 0, "chunks": 0, "failed_chunks": 0}
+
+    def write(records: List[Tuple]):
+        stats["chunks"] += 1
+        if analysis_repo.replace_analyses(records):
+            stats["messages"] += len(records)
+        else:
+            stats["failed_chunks"] += 1
+
+    if workers <= 1:
+        for messages in iter_message_chunks(chunk_size):
+            write(score_messages(messages))
+    else:
+        # 读库和写库都在主进程，工作进程只负责打分；最多同时有 2*workers 批在途
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            in_flight = deque()
+            for messages in iter_message_chunks(chunk_size):
+                in_flight.append(executor.submit(score_messages, messages))
+                if len(in_flight) >= workers * 2:
+                    write(in_flight.popleft().result())
+            while in_flight:
+                write(in_flight.popleft().result())
+
+    # 分析记录换过了，趋势桶要按新记录重新累加
+    stats["trends_rebuilt"] = analysis_repo.rebuild_trends()
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = round(elapsed, 3)
+    stats["messages_per_second"] = round(stats["messages"] / elapsed, 1) if elapsed > 0 else 0.0
+    return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="重新计算所有会话的情感分析记录")
+    parser.add_argument("--database", help="SQLite数据库路径（默认使用DATABASE_PATH配置）")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="每批消息数量")
+    parser.add_argument("--workers", type=int, default=None, help="打分进程数（默认CPU核数）")
+    parser.add_argument("--trends-only", action="store_true",
+                        help="不重新打分，只根据现有分析记录重建情感趋势桶")
+    args = parser.parse_args(argv)
+
+    if args.database:
+        os.environ['DATABASE_PATH'] = args.database
+
+    if args.trends_only:
+        from ..data.database import init_db
+        from ..data.repositories.emotion_analysis_repository import EmotionAnalysisRepository
+
+        init_db()
+        rebuilt = EmotionAnalysisRepository().rebuild_trends()
+        print("情感趋势重建完成" if rebuilt else "情感趋势重建失败")
+        return {"trends_rebuilt": rebuilt}
+
+    stats = backfill(chunk_size=args.chunk_size, workers=args.workers)
+    print(f"回填完成: {stats['messages']} 条消息, {stats['chunks']} 批, "
+          f"失败 {stats['failed_chunks']} 批, 耗时 {stats['seconds']}s "
+          f"({stats['messages_per_second']} 条/秒)")
+    return stats
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,8 @@ import streamlit as st
 import os
 from typing import Dict, Any
 
+from src.core.engine_registry import invalidate_ai_engines
+
 
 def render_model_config_panel() -> Dict[str, Any]:
     """
@@ -184,6 +186,9 @@ def apply_model_config(config: Dict[str, Any]) -> bool:
         os.environ['DEEPSEEK_MODEL'] = config['model']
         os.environ['MAX_TOKENS'] = str(config['max_tokens'])
         os.environ['TEMPERATURE'] = str(config['temperature'])
+
+        # 模型配置变化后，已缓存的AI引擎需要重建
+        invalidate_ai_engines()
         
         # 更新session state
         st.session_state.model_config_applied = True
@@ -402,6 +402,7 @@ def render_session_management():
             st.session_state.mood_history = []
             # 清空聊天消息
             st.session_state.messages = []
+            st.session_state.history_cursor = None
 
             st.success("✨ 新对话已开始！")
 
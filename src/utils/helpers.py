@@ -13,6 +13,7 @@ import json
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.data.repositories.chat_repository import ChatRepository
+from src.utils.keyword_matcher import KeywordMatcher
 
 
 def get_environment_context() -> Dict:
@@ -223,28 +224,98 @@ def clean_markdown_text(text: str) -> str:
     return cleaned_text
 
 
+# clean_markdown_text 中会受相邻字符影响的markdown标记
+_MARKDOWN_MARK_CHARS = '*_`~'
+# clean_markdown_text 移除的HTML标签的最大长度
+_MAX_TAG_LENGTH = len('</del>')
+
+
+class IncrementalMarkdownCleaner:
+    """
+    增量Markdown清理器
+    流式输出时只清理新到达的尾部文本，结果与对完整文本调用clean_markdown_text一致
+    """
+
+    def __init__(self):
+        self._cleaned = ""
+        self._pending = ""
+
+    @property
+    def text(self) -> str:
+        """当前可展示的清理后文本（包含尚未定稿的尾部）"""
+        return self._cleaned + clean_markdown_text(self._pending)
+
+    def feed(self, delta: str) -> str:
+        """
+        输入新增的原始文本
+
+        Returns:
+            str: 本次新定稿的清理后文本
+        """
+        if not delta:
+            return ""
+
+        self._pending += delta
+        split_at = self._find_safe_split(self._pending)
+        if split_at <= 0:
+            return ""
+
+        finalized = clean_markdown_text(self._pending[:split_at])
+        self._pending = self._pending[split_at:]
+        self._cleaned += finalized
+        return finalized
+
+    def flush(self) -> str:
+        """流结束时定稿剩余文本"""
+        finalized = clean_markdown_text(self._pending)
+        self._pending = ""
+        self._cleaned += finalized
+        return finalized
+
+    @staticmethod
+    def _find_safe_split(text: str) -> int:
+        """
+        找到最靠后的安全切分位置
+
+        切分点两侧都不能是markdown标记字符（清理规则会看相邻字符），
+        也不能落在尚未闭合的HTML标签中
+        """
+        for index in range(len(text) - 1, 0, -1):
+            if text[index - 1] in _MARKDOWN_MARK_CHARS or text[index] in _MARKDOWN_MARK_CHARS:
+                continue
+            # 切分点前面不能有未闭合的标签（最长的标签是</del>）
+            tag_start = text.rfind('<', max(0, index - _MAX_TAG_LENGTH), index)
+            if tag_start != -1 and text.find('>', tag_start, index) == -1:
+                continue
+            return index
+        return 0
+
+
+# 礼物类型关键词（类别顺序即优先级）
+GIFT_KEYWORDS = {
+    "元气咒语": ["元气", "咒语", "魔法", "祝福"],
+    "温暖拥抱": ["拥抱", "温暖", "抱抱", "怀抱"],
+    "彩虹糖果": ["糖果", "彩虹", "甜蜜", "甜甜"],
+    "星光祝福": ["星光", "星星", "祝福", "闪闪"],
+    "心灵花束": ["花束", "花朵", "鲜花", "花儿"]
+}
+
+_gift_matcher = KeywordMatcher(GIFT_KEYWORDS)
+
+
 def extract_gift_from_response(response_text: str) -> Dict:
     """
     从AI回应中提取礼物信息
     这是一个简化版本，实际应用中可能需要更复杂的解析逻辑
     """
     # 简单的关键词匹配来确定礼物类型
-    gift_keywords = {
-        "元气咒语": ["元气", "咒语", "魔法", "祝福"],
-        "温暖拥抱": ["拥抱", "温暖", "抱抱", "怀抱"],
-        "彩虹糖果": ["糖果", "彩虹", "甜蜜", "甜甜"],
-        "星光祝福": ["星光", "星星", "祝福", "闪闪"],
-        "心灵花束": ["花束", "花朵", "鲜花", "花儿"]
-    }
-    
-    response_lower = response_text.lower()
+    gift_type = _gift_matcher.scan(response_text).first_category()
     
-    for gift_type, keywords in gift_keywords.items():
-        if any(keyword in response_lower for keyword in keywords):
-            return {
-                "type": gift_type,
-                "content": f"小念为你准备的{gift_type}~ ✨"
-            }
+    if gift_type:
+        return {
+            "type": gift_type,
+            "content": f"小念为你准备的{gift_type}~ ✨"
+        }
     
     # 默认礼物
     return {
@@ -0,0 +1,217 @@
+"""
+多模式关键词匹配（Aho-Corasick自动机）
+把各个检测器的关键词表编译成一个自动机，对文本只扫描一遍，
+在 O(len(text) + 命中数) 时间内返回所有命中的关键词、类别和权重
+"""
+
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Hashable, Iterable, List, Mapping, Optional, Tuple, Union
+
+
+@dataclass(frozen=True)
+class KeywordHit:
+    """一次关键词命中"""
+    keyword: str
+    category: Hashable
+    weight: float
+    start: int  # 命中位置（在归一化后的文本中）
+    end: int
+
+
+@dataclass(frozen=True)
+class KeywordEntry:
+    """注册的关键词条目"""
+    keyword: str
+    category: Hashable
+    weight: float
+    order: int  # 注册顺序，用于保持原关键词表的优先级
+
+
+class KeywordScan:
+    """一次扫描的结果，按注册顺序提供各种汇总"""
+
+    def __init__(self, hits: List[KeywordHit], entry_indexes: List[int],
+                 entries: List[KeywordEntry], category_order: Dict[Hashable, int]):
+        self.hits = hits
+        self.entry_indexes = entry_indexes  # 与hits一一对应的条目序号
+        self._entries = entries
+        self._matched = sorted(set(entry_indexes))  # 去重后的命中条目（注册顺序）
+        self._category_order = category_order
+
+    def __bool__(self) -> bool:
+        return bool(self._matched)
+
+    def has(self, category: Hashable) -> bool:
+        """该类别是否有命中"""
+        return any(self._entries[index].category == category for index in self._matched)
+
+    def keywords(self, category: Optional[Hashable] = None) -> List[str]:
+        """命中的关键词（去重，按关键词表中的顺序）"""
+        return [
+            self._entries[index].keyword for index in self._matched
+            if category is None or self._entries[index].category == category
+        ]
+
+    def categories(self) -> List[Hashable]:
+        """有命中的类别（按类别注册顺序）"""
+        found = {self._entries[index].category for index in self._matched}
+        return sorted(found, key=self._category_order.__getitem__)
+
+    def first_category(self) -> Optional[Hashable]:
+        """注册顺序最靠前的命中类别，等价于按关键词表顺序逐类检查"""
+        categories = self.categories()
+        return categories[0] if categories else None
+
+    def total_weight(self, category: Optional[Hashable] = None) -> float:
+        """命中关键词的权重之和（每个关键词只计一次）"""
+        return sum(
+            self._entries[index].weight for index in self._matched
+            if category is None or self._entries[index].category == category
+        )
+
+
+KeywordSpec = Union[Iterable[str], Mapping[str, float]]
+
+
+class KeywordMatcher:
+    """Aho-Corasick多模式关键词匹配器"""
+
+    def __init__(self, keywords: Optional[Mapping[Hashable, KeywordSpec]] = None,
+                 ignore_case: bool = True):
+        """
+        Args:
+            keywords: 类别 -> 关键词列表（权重为1.0）或 关键词 -> 权重 的映射
+            ignore_case: 是否忽略大小写
+        """
+        self.ignore_case = ignore_case
+        self._entries: List[KeywordEntry] = []
+        self._category_order: Dict[Hashable, int] = {}
+        self._build_lock = threading.Lock()
+        self._automaton: Optional[Tuple[List[Dict[str, int]], List[int], List[Tuple[int, ...]]]] = None
+
+        for category, spec in (keywords or {}).items():
+            self.add_category(category, spec)
+
+    @property
+    def entries(self) -> List[KeywordEntry]:
+        """已注册的关键词条目（下标即KeywordScan.entry_indexes中的序号）"""
+        return list(self._entries)
+
+    def add(self, keyword: str, category: Hashable, weight: float = 1.0) -> "KeywordMatcher":
+        """注册一个关键词"""
+        if not keyword:
+            return self
+        if self.ignore_case:
+            keyword = keyword.lower()
+        self._category_order.setdefault(category, len(self._category_order))
+        with self._build_lock:
+            self._entries.append(KeywordEntry(keyword, category, weight, len(self._entries)))
+            self._automaton = None
+        return self
+
+    def add_category(self, category: Hashable, spec: KeywordSpec) -> "KeywordMatcher":
+        """注册一个类别的关键词表"""
+        self._category_order.setdefault(category, len(self._category_order))
+        if isinstance(spec, Mapping):
+            for keyword, weight in spec.items():
+                self.add(keyword, category, weight)
+        else:
+            for keyword in spec:
+                self.add(keyword, category)
+        return self
+
+    def find_all(self, text: str) -> List[KeywordHit]:
+        """返回所有命中（包括重叠和重复出现）"""
+        return self.scan(text).hits
+
+    def scan(self, text: str, longest_match: bool = False) -> KeywordScan:
+        """
+        扫描一遍文本
+
+        Args:
+            text: 文本
+            longest_match: 重叠的命中只保留最左最长的一个（"超级开心"覆盖其中的"开心"），
+                同一段文字属于多个类别时每个类别都保留
+        """
+        goto, fail, output = self._get_automaton()
+        entries = self._entries
+        if self.ignore_case:
+            text = text.lower()
+
+        found: List[Tuple[int, int, int]] = []  # (start, end, 条目序号)
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                for index in output[state]:
+                    found.append((position - len(entries[index].keyword) + 1, position + 1, index))
+
+        if longest_match and found:
+            found = self._select_longest(found)
+
+        hits = [
+            KeywordHit(entries[index].keyword, entries[index].category, entries[index].weight, start, end)
+            for start, end, index in found
+        ]
+        return KeywordScan(hits, [index for _, _, index in found], entries, self._category_order)
+
+    @staticmethod
+    def _select_longest(found: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+        """按最左最长原则选出互不重叠的命中（同一段文字的多个类别一起保留）"""
+        selected = []
+        last_start, last_end = -1, -1
+        for start, end, index in sorted(found, key=lambda item: (item[0], item[0] - item[1], item[2])):
+            if start >= last_end or (start, end) == (last_start, last_end):
+                selected.append((start, end, index))
+                last_start, last_end = start, end
+        return selected
+
+    def _get_automaton(self):
+        automaton = self._automaton
+        if automaton is None:
+            with self._build_lock:
+                if self._automaton is None:
+                    self._automaton = self._build()
+                automaton = self._automaton
+        return automaton
+
+    def _build(self):
+        """构建trie、失败指针和（沿失败链合并后的）输出表"""
+        goto: List[Dict[str, int]] = [{}]
+        node_outputs: List[List[int]] = [[]]
+
+        for index, entry in enumerate(self._entries):
+            state = 0
+            for char in entry.keyword:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    node_outputs.append([])
+                state = next_state
+            node_outputs[state].append(index)
+
+        fail = [0] * len(goto)
+        output: List[Tuple[int, ...]] = [()] * len(goto)
+        queue = deque()
+        for child in goto[0].values():
+            output[child] = tuple(node_outputs[child])
+            queue.append(child)
+
+        while queue:
+            state = queue.popleft()
+            for char, child in goto[state].items():
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[child] = goto[fallback].get(char, 0)
+                # 父节点先出队，失败节点的输出已经合并完毕
+                output[child] = tuple(node_outputs[child]) + output[fail[child]]
+                queue.append(child)
+
+        return goto, fail, output
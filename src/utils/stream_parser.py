@@ -0,0 +1,189 @@
+"""
+流式JSON字段提取器
+在模型逐token输出JSON时，实时取出指定字段（如sprite_reaction）的文本，
+同时收集其他顶层字段，流结束后得到完整的回应字典
+"""
+
+import json
+from typing import Dict, Optional
+
+
+_SIMPLE_ESCAPES = {
+    '"': '"',
+    '\\': '\\',
+    '/': '/',
+    'b': '\b',
+    'f': '\f',
+    'n': '\n',
+    'r': '\r',
+    't': '\t'
+}
+
+# 字符串结束标记
+_END_OF_STRING = object()
+
+
+class IncrementalJSONFieldExtractor:
+    """
+    增量JSON字段提取器
+
+    只关心顶层对象的字符串字段：
+    - stream_field 对应的值在到达时逐段返回
+    - 其他顶层字符串字段完成后收集到 fields 中
+    - finish() 时优先使用完整的 json.loads 结果，失败时退回到已收集的字段
+    """
+
+    def __init__(self, stream_field: str = "sprite_reaction"):
+        self.stream_field = stream_field
+        self.fields: Dict[str, Optional[str]] = {}
+        self._raw_parts = []
+
+        self._depth = 0
+        self._in_string = False
+        self._string_is_key = False
+        self._expecting_key = False
+        self._current_key: Optional[str] = None
+        self._string_chars = []
+        self._pending_escape = ""
+        self._high_surrogate = ""
+        self._literal_chars = []
+
+    @property
+    def raw_text(self) -> str:
+        """已接收的原始文本"""
+        return "".join(self._raw_parts)
+
+    def feed(self, chunk: str) -> str:
+        """
+        输入一段模型输出
+
+        Args:
+            chunk: 新到达的文本片段
+
+        Returns:
+            str: stream_field 在本片段中新增的已解码文本（可能为空）
+        """
+        if not chunk:
+            return ""
+
+        self._raw_parts.append(chunk)
+        emitted = []
+
+        for char in chunk:
+            if self._in_string:
+                decoded = self._consume_string_char(char)
+                if decoded is None:
+                    continue
+                if decoded is _END_OF_STRING:
+                    self._close_string()
+                    continue
+                self._string_chars.append(decoded)
+                if self._is_streaming_value():
+                    emitted.append(decoded)
+                continue
+
+            if char == '"':
+                self._flush_literal()
+                self._in_string = True
+                self._string_chars = []
+                self._string_is_key = self._depth == 1 and self._expecting_key
+            elif char in '{[':
+                self._flush_literal()
+                self._depth += 1
+                self._expecting_key = char == '{' and self._depth == 1
+            elif char in '}]':
+                self._flush_literal()
+                self._depth -= 1
+            elif char == ',':
+                self._flush_literal()
+                if self._depth == 1:
+                    self._expecting_key = True
+                    self._current_key = None
+            elif char == ':':
+                if self._depth == 1:
+                    self._expecting_key = False
+            elif self._depth == 1 and not self._expecting_key and not char.isspace():
+                # null / true / 数字等非字符串字面量
+                self._literal_chars.append(char)
+
+        return "".join(emitted)
+
+    def finish(self) -> Dict:
+        """
+        结束流并返回解析后的字典
+
+        Returns:
+            Dict: 完整JSON解析结果；JSON不完整时返回已收集的顶层字段
+        """
+        self._flush_literal()
+        raw = self.raw_text
+        start = raw.find('{')
+        end = raw.rfind('}')
+        if start != -1 and end > start:
+            try:
+                data = json.loads(raw[start:end + 1])
+                if isinstance(data, dict):
+                    return data
+            except json.JSONDecodeError:
+                pass
+
+        # JSON被截断（例如达到max_tokens），使用增量收集到的字段
+        result = dict(self.fields)
+        if self._in_string and not self._string_is_key and self._depth == 1 and self._current_key:
+            result[self._current_key] = "".join(self._string_chars)
+        return result
+
+    def _is_streaming_value(self) -> bool:
+        return (not self._string_is_key and self._depth == 1
+                and self._current_key == self.stream_field)
+
+    def _consume_string_char(self, char: str):
+        """处理字符串内部的字符，返回解码后的字符、None（需要更多输入）或结束标记"""
+        if self._pending_escape:
+            self._pending_escape += char
+            escape = self._pending_escape
+            if escape[1] == 'u':
+                if len(escape) < 6:
+                    return None
+                self._pending_escape = ""
+                try:
+                    code_point = int(escape[2:], 16)
+                except ValueError:
+                    return ""
+                # 代理对（如 \uD83D\uDE0A）需要拼成一个字符
+                if 0xD800 <= code_point <= 0xDBFF:
+                    self._high_surrogate = chr(code_point)
+                    return None
+                if 0xDC00 <= code_point <= 0xDFFF and self._high_surrogate:
+                    pair = self._high_surrogate + chr(code_point)
+                    self._high_surrogate = ""
+                    return pair.encode('utf-16', 'surrogatepass').decode('utf-16')
+                return chr(code_point)
+            self._pending_escape = ""
+            return _SIMPLE_ESCAPES.get(escape[1], escape[1])
+
+        if char == '\\':
+            self._pending_escape = char
+            return None
+        if char == '"':
+            return _END_OF_STRING
+        return char
+
+    def _close_string(self):
+        self._in_string = False
+        value = "".join(self._string_chars)
+        self._string_chars = []
+        if self._depth != 1:
+            return
+        if self._string_is_key:
+            self._current_key = value
+        elif self._current_key is not None:
+            self.fields[self._current_key] = value
+
+    def _flush_literal(self):
+        if not self._literal_chars:
+            return
+        literal = "".join(self._literal_chars)
+        self._literal_chars = []
+        if self._current_key is not None and literal == "null":
+            self.fields[self._current_key] = None
@@ -0,0 +1,71 @@
+"""
+哈希n-gram文本向量
+把归一化文本的单字和相邻两字（英文按单词）用crc32哈希到固定维度并带符号累加，
+不需要模型文件，CPU上每条短文本只要几十微秒；crc32跨进程稳定，向量可以落盘复用
+
+同一个哈希值同时决定两种维度的下标（低位相同），EMBEDDING_DIM维向量按块相加
+就得到 COARSE_DIM 维的粗向量，用于先粗筛再精排
+"""
+
+import re
+import unicodedata
+import zlib
+from typing import Iterable, List
+
+import numpy as np
+
+EMBEDDING_DIM = 256
+COARSE_DIM = 64
+
+# 常见虚字不作为单字特征（仍参与两字组合）
+_STOP_CHARS = frozenset("我你他她它的了是在有和就都也很吗呢吧啊呀哦嗯着过个这那么还又")
+_WORD_RE = re.compile(r'[a-z0-9]+|[^\sa-z0-9]+')
+_PUNCT_CATEGORIES = ("P", "S", "Z", "C")
+
+
+def normalize_text(text: str) -> str:
+    """NFKC归一化、小写，并把标点符号换成空格"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return "".join(
+        " " if unicodedata.category(char)[0] in _PUNCT_CATEGORIES else char
+        for char in text
+    )
+
+
+def _features(text: str) -> Iterable[str]:
+    # 三字组合在短文本里很少重合，只会稀释相似度，因此只取单字和两字
+    for token in _WORD_RE.findall(normalize_text(text)):
+        if token.isascii():
+            yield token
+            continue
+        for index, char in enumerate(token):
+            if char not in _STOP_CHARS:
+                yield char
+            if index + 1 < len(token):
+                yield token[index:index + 2]
+
+
+def embed_text(text: str) -> np.ndarray:
+    """文本 -> L2归一化的 EMBEDDING_DIM 维float32向量（没有特征时为零向量）"""
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for feature in _features(text):
+        hashed = zlib.crc32(feature.encode("utf-8"))
+        # 低位决定下标，最高位决定符号，减少哈希冲突带来的偏差
+        vector[hashed % EMBEDDING_DIM] += -1.0 if hashed >> 31 else 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """批量计算向量，返回 (len(texts), EMBEDDING_DIM) 数组"""
+    vectors = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        vectors[row] = embed_text(text)
+    return vectors
+
+
+def coarse_vectors(vectors: np.ndarray) -> np.ndarray:
+    """把 EMBEDDING_DIM 维向量折叠成 COARSE_DIM 维并重新归一化（支持单个向量或二维数组）"""
+    folded = vectors.reshape(vectors.shape[:-1] + (-1, COARSE_DIM)).sum(axis=-2)
+    norms = np.linalg.norm(folded, axis=-1, keepdims=True)
+    return np.divide(folded, norms, out=np.zeros_like(folded), where=norms > 0).astype(np.float32)
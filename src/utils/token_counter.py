@@ -0,0 +1,69 @@
+"""
+本地token计数
+按DeepSeek官方给出的换算比例估算：1个中文字符约0.6个token，1个英文字符约0.3个token；
+表情符号等其他字符按1个token计。不需要下载分词表，每轮组装上下文时可以随意调用
+"""
+
+import math
+import re
+
+# 中日韩文字（含假名、谚文）及全角标点
+_CJK_RANGES = (
+    r'\u2e80-\u2fdf\u3000-\u303f\u3040-\u30ff\u3100-\u31ff\u3400-\u4dbf'
+    r'\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef'
+)
+_CJK_RE = re.compile(f'[{_CJK_RANGES}]')
+# 除ASCII和中日韩文字以外的字符（表情符号、颜文字里的特殊符号等）
+_OTHER_RE = re.compile(f'[^\\x00-\\x7f{_CJK_RANGES}]')
+
+CJK_TOKEN_RATIO = 0.6
+ASCII_TOKEN_RATIO = 0.3
+OTHER_TOKEN_RATIO = 1.0
+
+# 对话格式中每条消息的角色标记等额外开销
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def _char_tokens(char: str) -> float:
+    if char.isascii():
+        return ASCII_TOKEN_RATIO
+    if _CJK_RE.match(char):
+        return CJK_TOKEN_RATIO
+    return OTHER_TOKEN_RATIO
+
+
+def count_tokens(text: str) -> int:
+    """估算文本的token数"""
+    if not text:
+        return 0
+    if text.isascii():
+        return math.ceil(len(text) * ASCII_TOKEN_RATIO)
+
+    cjk = len(_CJK_RE.findall(text))
+    other = len(_OTHER_RE.findall(text))
+    ascii_chars = len(text) - cjk - other
+    return math.ceil(cjk * CJK_TOKEN_RATIO + ascii_chars * ASCII_TOKEN_RATIO + other * OTHER_TOKEN_RATIO)
+
+
+def count_message_tokens(text: str) -> int:
+    """估算一条对话消息的token数（包括角色标记开销）"""
+    return count_tokens(text) + MESSAGE_OVERHEAD_TOKENS
+
+
+def truncate_to_tokens(text: str, max_tokens: int, suffix: str = "...") -> str:
+    """
+    把文本截断到不超过 max_tokens 个token（包括省略后缀）
+
+    Returns:
+        str: 原文本（没有超出时）或截断后加上后缀的文本
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    limit = max_tokens - count_tokens(suffix)
+    used = 0.0
+    for index, char in enumerate(text):
+        used += _char_tokens(char)
+        if math.ceil(used) > limit:
+            return text[:index] + suffix
+    return text
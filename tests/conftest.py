@@ -8,7 +8,7 @@ for the Mind Sprite AI Agent test suite.
 import pytest
 import tempfile
 import os
-import sqlite3
+import shutil
 from unittest.mock import Mock, patch, MagicMock
 from datetime import datetime, timedelta
 import streamlit as st
@@ -22,6 +22,10 @@ from src.core.ai_engine import AIEngine
 from src.core.session_manager import SessionManager
 from src.core.security import SecurityManager
 from src.data.database import init_db
+from src.data.connection_pool import reset_connection_pool
+from src.data.write_behind import reset_write_behind_writer
+from src.data.memory_index import reset_memory_indexes
+from src.core.background_tasks import get_background_queue
 from src.services.emotional_companion_service import EmotionalCompanionService
 from src.services.chat_service import ChatService
 from src.data.repositories.chat_repository import ChatRepository
@@ -34,20 +38,24 @@ def temp_db():
     with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
         db_path = tmp.name
     
-    # Patch the database connection to use temp database
-    original_db_path = 'mind_sprite.db'
-    
-    def mock_get_connection():
-        return sqlite3.connect(db_path)
-    
-    with patch('src.data.database.get_db_connection', side_effect=mock_get_connection):
+    # Point settings, the write-behind writer and the connection pool at the temporary database
+    reset_write_behind_writer()
+    reset_connection_pool()
+    with patch.dict(os.environ, {'DATABASE_PATH': db_path}):
         # Initialize the temporary database
-        init_db()
+        init_db(db_path)
         yield db_path
+        # Let background writes finish before the database goes away
+        get_background_queue().join(timeout=5.0)
+        reset_write_behind_writer()
+        reset_connection_pool()
+        reset_memory_indexes()
     
     # Cleanup
-    if os.path.exists(db_path):
-        os.unlink(db_path)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.unlink(db_path + suffix)
+    shutil.rmtree(db_path + '.memory', ignore_errors=True)
 
 
 @pytest.fixture
@@ -0,0 +1,8 @@
+# Performance benchmarks package
+
+import os
+
+# Absolute latency/throughput budgets depend on the machine and on whatever else the
+# suite is running, so they are only asserted on request (BENCHMARK_BUDGETS=1).
+# Relative comparisons between implementations are always asserted.
+ENFORCE_BUDGETS = os.environ.get("BENCHMARK_BUDGETS") == "1"
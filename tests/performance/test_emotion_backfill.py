@@ -0,0 +1,60 @@
+"""
+Benchmark: re-scoring chat history for emotion analysis
+
+Compares scoring messages one at a time (analyze_emotion's per-text path)
+with analyze_batch, and runs the backfill tool end to end with a process
+pool.
+"""
+
+import time
+import pytest
+from unittest.mock import patch
+from src.data.database import get_db_connection, get_db_write_transaction
+from src.services.emotion_analysis_service import EmotionAnalysisService
+from src.tools.backfill_emotion_analysis import backfill
+
+
+TEMPLATES = [
+    "我今天超级开心呀!!",
+    "工作压力太大，每天都睡不着觉，好焦虑",
+    "谢谢你一直陪着我 😊",
+    "分手以后我每天都很伤心，心情很低落",
+    "上课好无聊，一直在发呆",
+    "同事又把锅甩给我，真的很生气",
+]
+# 每条消息都不同，避免命中analyze_emotion的单条缓存
+MESSAGES = [f"{TEMPLATES[index % len(TEMPLATES)]} #{index}" for index in range(3000)]
+
+
+@pytest.mark.slow
+class TestEmotionBackfill:
+    """Per-message vs batch emotion scoring"""
+
+    def test_batch_scoring_and_process_pool_backfill(self, temp_db):
+        service = EmotionAnalysisService()
+
+        with patch.object(service, "_save_analysis_result"):
+            start = time.perf_counter()
+            for index, text in enumerate(MESSAGES):
+                service.analyze_emotion(text, "benchmark_session", index)
+            single_rate = len(MESSAGES) / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        service.analyze_batch(MESSAGES)
+        batch_rate = len(MESSAGES) / (time.perf_counter() - start)
+
+        with get_db_write_transaction() as conn:
+            conn.executemany(
+                "INSERT INTO chat_history (session_id, role, content) VALUES (?, 'user', ?)",
+                [(f"session_{index % 50}", text) for index, text in enumerate(MESSAGES)]
+            )
+
+        stats = backfill(chunk_size=500, workers=2)
+
+        print(f"\n{len(MESSAGES)} messages: analyze_emotion {single_rate:.0f}/s, "
+              f"analyze_batch {batch_rate:.0f}/s, "
+              f"backfill with 2 processes {stats['messages_per_second']:.0f}/s")
+        assert batch_rate > single_rate
+        assert stats["messages"] == len(MESSAGES)
+        with get_db_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM emotion_analysis").fetchone()[0] == len(MESSAGES)
@@ -0,0 +1,69 @@
+"""
+Benchmark: scrolling back through a 100k-message session
+
+The old get_history_paginated used LIMIT/OFFSET, which walks past every
+skipped row, so deep pages get slower the further back you scroll. The
+keyset cursor seeks the (session_id, id) index directly, so every page
+costs the same.
+"""
+
+import time
+import pytest
+from src.data.database import get_db_connection, get_db_write_transaction
+from src.data.repositories.chat_repository import ChatRepository, encode_history_cursor
+
+
+MESSAGES = 100_000
+PAGE_SIZE = 20
+REPEATS = 20
+OFFSET_PAGE = '''
+    SELECT role, content, timestamp FROM chat_history
+    WHERE session_id = ?
+    ORDER BY id DESC
+    LIMIT ? OFFSET ?
+'''
+
+
+def _median_ms(func) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return sorted(timings)[len(timings) // 2] * 1000
+
+
+@pytest.mark.slow
+class TestHistoryPagination:
+    """OFFSET pages vs keyset cursor pages"""
+
+    def test_deep_pages_cost_the_same_as_the_first(self, temp_db):
+        with get_db_write_transaction() as conn:
+            conn.executemany(
+                "INSERT INTO chat_history (session_id, role, content) VALUES (?, ?, ?)",
+                (("long_session", "user" if index % 2 == 0 else "assistant", f"第{index}条消息")
+                 for index in range(MESSAGES))
+            )
+            first_id = conn.execute("SELECT MIN(id) FROM chat_history").fetchone()[0]
+
+        repository = ChatRepository()
+        depth = MESSAGES - 5 * PAGE_SIZE
+        deep_cursor = encode_history_cursor(first_id + 5 * PAGE_SIZE)
+
+        def offset_page(offset):
+            with get_db_connection() as conn:
+                return conn.execute(OFFSET_PAGE, ("long_session", PAGE_SIZE, offset)).fetchall()
+
+        first_keyset = _median_ms(lambda: repository.get_history_page("long_session", PAGE_SIZE))
+        deep_keyset = _median_ms(lambda: repository.get_history_page("long_session", PAGE_SIZE, deep_cursor))
+        first_offset = _median_ms(lambda: offset_page(0))
+        deep_offset = _median_ms(lambda: offset_page(depth))
+
+        page = repository.get_history_page("long_session", PAGE_SIZE, deep_cursor)
+        assert [content for _, content, _ in page.messages] == [
+            f"第{index}条消息" for index in range(5 * PAGE_SIZE - PAGE_SIZE, 5 * PAGE_SIZE)
+        ]
+        print(f"\npage of {PAGE_SIZE} at depth {depth}: OFFSET {first_offset:.2f}ms -> {deep_offset:.2f}ms, "
+              f"keyset {first_keyset:.2f}ms -> {deep_keyset:.2f}ms")
+        assert deep_keyset < deep_offset / 10
+        assert deep_keyset < first_keyset * 3
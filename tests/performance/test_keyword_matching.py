@@ -0,0 +1,85 @@
+"""
+Benchmark: keyword detection with nested loops vs one Aho-Corasick scan
+
+The loop version is the pattern the detectors used before: for every
+category, check every keyword with `keyword in text`. The automaton
+version compiles all the same keyword tables once and scans the text a
+single time.
+"""
+
+import time
+import pytest
+from src.services.care_scheduler_service import CareSchedulerService
+from src.services.emotion_emergency_service import EmotionEmergencyService
+from src.services.emotional_companion_service import USER_CONTENT_KEYWORDS, USER_MOOD_KEYWORDS
+from src.services.search_service import SEARCH_INTENT_KEYWORDS
+from src.utils.helpers import GIFT_KEYWORDS
+from src.utils.keyword_matcher import KeywordMatcher
+
+
+ITERATIONS = 300
+MESSAGES = [
+    "今天考试终于结束了，虽然有点紧张但是感觉还不错，哈哈！",
+    "最近总是睡不着，压力大，工作上的事情让我很焦虑，不知道怎么办",
+    "明天要去面试了，好担心自己表现不好，有没有附近的心理咨询推荐",
+    "和男朋友吵架了，心里很难过，感觉好孤独，想找人聊聊",
+    "周末和家人去旅行了，吃了很多美食，超级开心！",
+] * 4
+
+
+def _keyword_tables():
+    emergency = EmotionEmergencyService()
+    care = CareSchedulerService()
+    tables = {}
+    for emotion_type, patterns in emergency.emotion_patterns.items():
+        tables[("emergency", emotion_type)] = patterns["keywords"]
+        for severity, phrases in patterns["severity_patterns"].items():
+            tables[("severity", emotion_type, severity)] = phrases
+    for name, config in {**care.emotion_keywords, **care.event_keywords}.items():
+        tables[("care", name)] = config["keywords"]
+    for prefix, table in (("mood", USER_MOOD_KEYWORDS), ("content", USER_CONTENT_KEYWORDS),
+                          ("search", SEARCH_INTENT_KEYWORDS), ("gift", GIFT_KEYWORDS)):
+        for name, keywords in table.items():
+            tables[(prefix, name)] = keywords
+    return tables
+
+
+def _loop_detect(tables, text):
+    text = text.lower()
+    return {
+        category: [keyword for keyword in keywords if keyword in text]
+        for category, keywords in tables.items()
+    }
+
+
+@pytest.mark.slow
+class TestKeywordMatching:
+    """Nested keyword loops vs the shared automaton"""
+
+    def test_single_scan_beats_nested_loops(self):
+        tables = _keyword_tables()
+        matcher = KeywordMatcher(tables)
+        keyword_count = sum(len(keywords) for keywords in tables.values())
+
+        # Same answers as the loops
+        for text in MESSAGES:
+            scan = matcher.scan(text)
+            expected = _loop_detect(tables, text)
+            assert {category: scan.keywords(category) for category in tables} == expected
+
+        start = time.perf_counter()
+        for _ in range(ITERATIONS):
+            for text in MESSAGES:
+                _loop_detect(tables, text)
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(ITERATIONS):
+            for text in MESSAGES:
+                matcher.scan(text)
+        scan_time = time.perf_counter() - start
+
+        runs = ITERATIONS * len(MESSAGES)
+        print(f"\n{keyword_count} keywords: loops {loop_time / runs * 1e6:.1f} us/msg, "
+              f"automaton {scan_time / runs * 1e6:.1f} us/msg")
+        assert scan_time < loop_time
@@ -0,0 +1,49 @@
+"""
+Benchmark: relevant-memory search over a large local index
+
+Fills one session's index with 100k random vectors and reports the latency
+of a query (coarse scan of every row plus float16 rerank of the candidates).
+The 5 ms per-turn budget is only asserted with BENCHMARK_BUDGETS=1.
+"""
+
+import time
+import numpy as np
+import pytest
+from src.data.memory_index import KIND_CORE_MEMORY, KIND_MESSAGE, MemoryIndex
+from src.utils.text_embedding import EMBEDDING_DIM
+from tests.performance import ENFORCE_BUDGETS
+
+
+RECORDS = 100_000
+QUERIES = 50
+ROUNDS = 3
+
+
+@pytest.mark.slow
+class TestMemorySearch:
+    """Two-stage search latency at 100k memories"""
+
+    def test_search_100k_memories(self, tmp_path):
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((RECORDS, EMBEDDING_DIM)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        index = MemoryIndex(str(tmp_path))
+        index.add_vectors([KIND_MESSAGE] * (RECORDS - 1), np.arange(1, RECORDS), vectors[:-1])
+        index.add(KIND_CORE_MEMORY, 1, "下周五要去面试，有点紧张")
+
+        assert index.search("面试好紧张", k=5)[0].kind == KIND_CORE_MEMORY
+
+        # Like timeit: the median of the quietest round, so other load on the machine does not count
+        round_medians = []
+        for _ in range(ROUNDS):
+            timings = []
+            for _ in range(QUERIES):
+                started = time.perf_counter()
+                index.search("面试好紧张", k=5, max_message_id=RECORDS - 20)
+                timings.append(time.perf_counter() - started)
+            round_medians.append(sorted(timings)[len(timings) // 2] * 1000)
+
+        print(f"\nmemory search over {RECORDS} records: median {min(round_medians):.2f}ms "
+              f"(rounds: {', '.join(f'{value:.2f}' for value in round_medians)})")
+        if ENFORCE_BUDGETS:
+            assert min(round_medians) < 5.0
@@ -0,0 +1,122 @@
+"""
+Benchmark: mixed read/write load from many simulated sessions
+
+Each session thread loops over one turn: read its recent history, then
+write a user and an assistant message in one transaction. Compares the
+old layout, where any pooled autocommit connection may write and
+concurrent writers collide on SQLITE_BUSY, with query_only readers plus
+the single queued writer.
+
+On one core the two layouts reach similar turns/s; what the split fixes
+is the tail: colliding writers no longer sit in sqlite's busy handler,
+whose back-off sleeps grow to 100ms per retry.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+import pytest
+from src.data.connection_pool import SQLiteConnectionPool, SQLiteWriter
+
+
+SESSIONS = 32
+RUN_SECONDS = 1.0
+READ_RECENT = '''
+    SELECT role, content FROM chat_history
+    WHERE session_id = ? ORDER BY timestamp DESC LIMIT 12
+'''
+INSERT_MESSAGE = 'INSERT INTO chat_history (session_id, role, content) VALUES (?, ?, ?)'
+
+
+def _shared_pool_layout(database_path: str):
+    """Old layout: reads and writes take interchangeable pooled connections"""
+    pool = SQLiteConnectionPool(database_path, max_connections=SESSIONS)
+
+    @contextmanager
+    def write_transaction():
+        with pool.get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    return pool.get_connection, write_transaction, pool.close_all
+
+
+def _split_layout(database_path: str):
+    """New layout: query_only readers, one writer connection"""
+    pool = SQLiteConnectionPool(database_path, max_connections=SESSIONS, query_only=True)
+    writer = SQLiteWriter(database_path)
+
+    def close():
+        pool.close_all()
+        writer.close()
+
+    return pool.get_connection, writer.transaction, close
+
+
+def _run_sessions(read, write_transaction):
+    start_barrier = threading.Barrier(SESSIONS + 1)
+    stop = threading.Event()
+    turns = [0] * SESSIONS
+    write_latencies = [[] for _ in range(SESSIONS)]
+    errors = []
+
+    def session(slot):
+        session_id = f"load_session_{slot}"
+        start_barrier.wait()
+        while not stop.is_set():
+            try:
+                with read() as conn:
+                    conn.execute(READ_RECENT, (session_id,)).fetchall()
+                started = time.perf_counter()
+                with write_transaction() as conn:
+                    conn.execute(INSERT_MESSAGE, (session_id, "user", f"第{turns[slot]}轮"))
+                    conn.execute(INSERT_MESSAGE, (session_id, "assistant", "小念在呢"))
+                write_latencies[slot].append(time.perf_counter() - started)
+                turns[slot] += 1
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=session, args=(slot,)) for slot in range(SESSIONS)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    time.sleep(RUN_SECONDS)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for per_session in write_latencies for latency in per_session)
+    return {
+        "turns_per_second": sum(turns) / elapsed,
+        "p99_write_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else float("inf"),
+        "max_write_ms": latencies[-1] * 1000 if latencies else float("inf"),
+        "errors": len(errors)
+    }
+
+
+@pytest.mark.slow
+class TestMixedLoad:
+    """Mixed read/write throughput with and without the reader/writer split"""
+
+    def test_split_layout_handles_concurrent_sessions(self, temp_db):
+        results = {}
+        for name, layout in (("shared", _shared_pool_layout), ("split", _split_layout)):
+            read, write_transaction, close = layout(temp_db)
+            results[name] = _run_sessions(read, write_transaction)
+            close()
+
+        print(f"\n{SESSIONS} sessions: " + ", ".join(
+            f"{name} {stats['turns_per_second']:.0f} turns/s, p99 write {stats['p99_write_ms']:.1f}ms, "
+            f"max write {stats['max_write_ms']:.1f}ms, {stats['errors']} errors"
+            for name, stats in results.items()
+        ))
+        assert results["split"]["errors"] == 0
+        assert results["split"]["p99_write_ms"] < results["shared"]["p99_write_ms"]
+        assert results["split"]["max_write_ms"] < results["shared"]["max_write_ms"]
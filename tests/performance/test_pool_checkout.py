@@ -0,0 +1,132 @@
+"""
+Benchmark: connection pool checkout cost, and checkouts per second at 1, 8 and 32 threads
+
+Compares the old checkout (three lock acquisitions and a SELECT 1 ping
+per borrow) with the lock-free shared pool and the thread-affinity mode.
+Every checkout runs the same trivial query so only pool overhead differs.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from queue import Empty, Queue
+import pytest
+from src.data.connection_pool import SQLiteConnectionPool
+
+
+RUN_SECONDS = 0.3
+ROUNDS = 3
+CHECKOUTS = 5000
+THREAD_COUNTS = (1, 8, 32)
+
+
+class _PingingPool(SQLiteConnectionPool):
+    """The previous checkout path (lock per step, SELECT 1 per borrow), kept here as the baseline"""
+
+    def __init__(self, database_path: str, max_connections: int = 10):
+        super().__init__(database_path, max_connections)
+        self._queue = Queue(maxsize=max_connections)
+        while self._idle:
+            self._queue.put(self._idle.pop())
+        self._requests = 0
+
+    @contextmanager
+    def get_connection(self):
+        with self._lock:
+            self._requests += 1
+        try:
+            conn = self._queue.get_nowait()
+            with self._lock:
+                pass
+        except Empty:
+            with self._lock:
+                conn = self._create_connection() if self._created_connections < self.max_connections else None
+            if conn is None:
+                # The old code blocked here while holding the lock, which stalls 32 threads outright;
+                # waiting outside it keeps the baseline to the per-checkout lock and ping costs
+                conn = self._queue.get(timeout=10.0)
+        conn.execute("SELECT 1")
+        try:
+            yield conn
+        finally:
+            self._queue.put_nowait(conn)
+            with self._lock:
+                pass
+
+    def close_all(self):
+        while not self._queue.empty():
+            self._queue.get_nowait().close()
+
+
+def _checkouts_per_second(pool, threads: int) -> float:
+    start_barrier = threading.Barrier(threads + 1)
+    stop = threading.Event()
+    counts = [0] * threads
+
+    def work(slot):
+        start_barrier.wait()
+        while not stop.is_set():
+            with pool.get_connection() as conn:
+                conn.execute("SELECT 2")
+            counts[slot] += 1
+
+    workers = [threading.Thread(target=work, args=(slot,)) for slot in range(threads)]
+    for worker in workers:
+        worker.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    time.sleep(RUN_SECONDS)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    return sum(counts) / (time.perf_counter() - started)
+
+
+def _checkout_cost_us(pool) -> float:
+    """Per-checkout cost on one thread, minimum over several repeats (like timeit)"""
+    timings = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        for _ in range(CHECKOUTS):
+            with pool.get_connection() as conn:
+                conn.execute("SELECT 2")
+        timings.append((time.perf_counter() - started) / CHECKOUTS)
+    return min(timings) * 1e6
+
+
+@pytest.mark.slow
+class TestPoolCheckout:
+    """Checkout cost and throughput of the old and new pool designs"""
+
+    def test_checkout_is_cheaper_without_ping(self, temp_db):
+        costs = {}
+        for name, pool in (("pinging", _PingingPool(temp_db)), ("shared", SQLiteConnectionPool(temp_db)),
+                           ("affinity", SQLiteConnectionPool(temp_db, thread_affinity=True))):
+            costs[name] = _checkout_cost_us(pool)
+            pool.close_all()
+
+        print("\ncheckout cost (1 thread): " + ", ".join(f"{name} {cost:.2f}us" for name, cost in costs.items()))
+        assert costs["shared"] < costs["pinging"] * 0.9
+        assert costs["affinity"] < costs["pinging"] * 0.9
+
+    def test_checkout_throughput(self, temp_db):
+        results = {}
+        for name, factory in (
+            ("pinging", lambda: _PingingPool(temp_db, max_connections=10)),
+            ("shared", lambda: SQLiteConnectionPool(temp_db, max_connections=10)),
+            ("affinity", lambda: SQLiteConnectionPool(temp_db, max_connections=40, thread_affinity=True)),
+        ):
+            for threads in THREAD_COUNTS:
+                pool = factory()
+                results[name, threads] = max(_checkouts_per_second(pool, threads) for _ in range(ROUNDS))
+                pool.close_all()
+
+        print("\ncheckouts/sec " + ", ".join(
+            f"{threads} threads: " + " / ".join(
+                f"{name} {results[name, threads]:.0f}" for name in ("pinging", "shared", "affinity")
+            )
+            for threads in THREAD_COUNTS
+        ))
+        # Throughput on a shared single core is too noisy to rank designs; just check nothing collapses
+        for name in ("shared", "affinity"):
+            assert results[name, 32] > results[name, 1] * 0.3
@@ -0,0 +1,38 @@
+"""
+Benchmark: per-rerun AI engine construction cost
+
+Streamlit re-executes the script on every interaction. This compares
+building a fresh AIEngine each rerun (the old behaviour) with fetching
+it from the process-wide registry.
+"""
+
+import time
+import pytest
+from src.core.ai_engine import AIEngine
+from src.core.engine_registry import get_ai_engine, invalidate_ai_engines
+
+
+RERUNS = 20
+
+
+def _average_seconds(func, runs=RERUNS):
+    start = time.perf_counter()
+    for _ in range(runs):
+        func()
+    return (time.perf_counter() - start) / runs
+
+
+@pytest.mark.slow
+class TestRerunLatency:
+    """Rerun latency before and after the engine registry"""
+
+    def test_registry_removes_construction_cost(self):
+        invalidate_ai_engines()
+
+        before = _average_seconds(lambda: AIEngine("sk-benchmark-key"))
+        get_ai_engine("sk-benchmark-key")  # warm up
+        after = _average_seconds(lambda: get_ai_engine("sk-benchmark-key"))
+        invalidate_ai_engines()
+
+        print(f"\nAIEngine per rerun: before {before * 1000:.2f} ms, after {after * 1000:.3f} ms")
+        assert after * 10 < before
@@ -0,0 +1,44 @@
+"""
+Benchmark: chat_history insert throughput
+
+Compares one autocommit transaction per message (the old repository
+behaviour) with the write-behind writer batching messages into shared
+transactions. The absolute rate is only asserted with BENCHMARK_BUDGETS=1;
+the number of transactions is always checked.
+"""
+
+import time
+import pytest
+from src.data.database import get_db_write_connection
+from src.data.write_behind import WriteBehindWriter
+from tests.performance import ENFORCE_BUDGETS
+
+
+MESSAGES = 5000
+INSERT_MESSAGE = 'INSERT INTO chat_history (session_id, role, content) VALUES (?, ?, ?)'
+
+
+@pytest.mark.slow
+class TestWriteThroughput:
+    """Insert throughput before and after write-behind batching"""
+
+    def test_batched_inserts_sustain_thousands_per_second(self, temp_db):
+        start = time.perf_counter()
+        for index in range(MESSAGES // 5):
+            with get_db_write_connection() as conn:
+                conn.execute(INSERT_MESSAGE, ("direct_session", "user", f"消息{index}"))
+        direct_rate = (MESSAGES // 5) / (time.perf_counter() - start)
+
+        writer = WriteBehindWriter(temp_db)
+        start = time.perf_counter()
+        for index in range(MESSAGES):
+            writer.submit(INSERT_MESSAGE, ("batched_session", "user", f"消息{index}"), "batched_session")
+        assert writer.flush(timeout=30.0)
+        batched_rate = MESSAGES / (time.perf_counter() - start)
+        writer.close()
+
+        print(f"\nchat_history inserts: direct {direct_rate:.0f}/s, batched {batched_rate:.0f}/s "
+              f"({writer.get_stats()['batches']} transactions)")
+        if ENFORCE_BUDGETS:
+            assert batched_rate > 1000
+        assert writer.get_stats()["batches"] <= MESSAGES // 50
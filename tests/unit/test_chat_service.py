@@ -5,6 +5,8 @@ Tests the chat service functionality including message processing,
 validation, and AI response handling.
 """
 
+import json
+import uuid
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 from src.services.chat_service import ChatService
@@ -310,3 +312,218 @@ class TestChatServiceIntegration:
         sanitized_input = call_args[1]['user_input']
         assert 'script' not in sanitized_input.lower()
         assert '我需要帮助' in sanitized_input
+
+
+class TestSingleLLMCallTurn:
+    """Each user message must cost exactly one model call"""
+
+    @pytest.fixture
+    def counting_engine(self):
+        """Real AIEngine whose LLM is replaced by a counting fake model"""
+        from langchain_core.language_models.fake_chat_models import FakeListChatModel
+        from src.core.ai_engine import AIEngine
+
+        engine = AIEngine("sk-test-key")
+        response = json.dumps({
+            "mood_category": "温暖",
+            "sprite_reaction": "小念陪你去散步~",
+            "gift_type": "元气咒语",
+            "gift_content": "✨ 散步快乐 ✨"
+        }, ensure_ascii=False)
+        # FakeListChatModel.i counts calls (it wraps around at the end of the list)
+        engine.llm = FakeListChatModel(responses=[response] * 3)
+        return engine
+
+    def test_stream_turn_invokes_llm_once(self, counting_engine, chat_repository, intimacy_service):
+        """Streaming a turn and post-processing it reuses the same TurnResult"""
+        from src.models.turn import TurnResult
+
+        session_id = str(uuid.uuid4())
+        chat_service = ChatService(
+            ai_engine=counting_engine,
+            chat_repo=chat_repository,
+            intimacy_service=intimacy_service
+        )
+
+        turn = TurnResult()
+        chunks = list(chat_service.process_user_message_stream(
+            session_id, "今天天气不错，去公园散步了", 1, turn_result=turn
+        ))
+
+        assert len(chunks) > 1
+        assert "".join(chunks) == turn.display_text
+        assert turn.success
+        assert "小念陪你去散步" in turn.display_text
+        # Post-processing data is available without another model call
+        assert turn.gift_info["type"] == "元气咒语"
+        assert turn.exp_result["exp_gained"] == 15
+        assert counting_engine.llm.i == 1
+
+        # Side effects happened exactly once (written by the background queue)
+        from src.core.background_tasks import get_background_queue
+        assert get_background_queue().join(timeout=5.0)
+        assert len(chat_repository.get_treasures(session_id)) == 1
+        assert intimacy_service.get_intimacy_info(session_id)["total_interactions"] == 1
+
+    def test_run_turn_matches_process_user_message(self, chat_service, sample_session_id, sample_user_input):
+        """run_turn wraps a single process_user_message call"""
+        turn = chat_service.run_turn(sample_session_id, sample_user_input, 1)
+
+        assert turn.success
+        assert turn.display_text
+        assert turn.to_dict()["gift_info"] == turn.gift_info
+        chat_service.ai_engine.get_heart_catcher_response.assert_called_once()
+
+
+class TestTurnExp:
+    """The EXP shown for a turn is the row the upsert actually wrote"""
+
+    def test_concurrent_exp_is_reflected_in_turn(self, chat_service, intimacy_service, sample_session_id):
+        """EXP added by another tab while the model is answering shows up in this turn's level-up"""
+        def other_tab_adds_exp(**kwargs):
+            intimacy_service.add_exp(sample_session_id, 40)
+            return chat_service.ai_engine.get_heart_catcher_response.return_value
+
+        chat_service.ai_engine.get_heart_catcher_response.side_effect = other_tab_adds_exp
+
+        turn = chat_service.run_turn(sample_session_id, "今天去公园散步了", 1)
+
+        assert turn.success
+        assert turn.exp_result["exp_gained"] == 15
+        assert turn.exp_result["leveled_up"]
+        assert (turn.exp_result["new_level"], turn.exp_result["current_exp"]) == (2, 5)
+        assert turn.exp_result["total_interactions"] == 2
+
+    def test_failed_exp_upsert_is_reflected_in_turn(self, chat_service, intimacy_service, sample_session_id):
+        """A failed upsert shows no EXP gain and no level-up"""
+        intimacy_service.user_profile_repo.add_exp = lambda session_id, exp_to_add: None
+
+        turn = chat_service.run_turn(sample_session_id, "今天去公园散步了", 1)
+
+        assert turn.success
+        assert turn.exp_result["exp_gained"] == 0
+        assert not turn.exp_result["leveled_up"]
+        assert turn.exp_result["level_rewards"] == []
+
+
+class TestTokenStreaming:
+    """Token streaming shows sprite_reaction while the model is still generating"""
+
+    @staticmethod
+    def _chunk(text, size=7):
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    @staticmethod
+    def _use_real_completion(engine):
+        """Complete streamed replies with the real AIEngine logic on the mocked engine"""
+        from src.core.ai_engine import AIEngine
+        from src.services.emotional_companion_service import EmotionalCompanionService
+
+        engine.companion_service = EmotionalCompanionService()
+        engine._heart_catcher_state.side_effect = \
+            lambda user_input: AIEngine._heart_catcher_state(engine, user_input)
+        engine._complete_heart_catcher_fields.side_effect = AIEngine._complete_heart_catcher_fields
+        engine._get_fallback_response.side_effect = \
+            lambda user_input: AIEngine._get_fallback_response(engine, user_input)
+        engine.complete_streamed_response.side_effect = \
+            lambda data, user_input, prompt_name="emotion_enhanced": \
+            AIEngine.complete_streamed_response(engine, data, user_input, prompt_name)
+
+    def test_token_stream_yields_reaction_incrementally(self, chat_service, sample_session_id, sample_user_input):
+        """sprite_reaction is streamed and other fields are collected at the end"""
+        from src.models.turn import TurnResult
+
+        raw = json.dumps({
+            "mood_category": "关怀",
+            "memory_association": None,
+            "sprite_reaction": "小念一直在这里陪着你，累了就休息一下吧~",
+            "emotional_resonance": "疲惫也值得被温柔对待",
+            "gift_type": "温暖拥抱",
+            "gift_content": "🤗 抱抱你"
+        }, ensure_ascii=False)
+        engine = chat_service.ai_engine
+        engine.requires_structured_response.return_value = False
+        engine.stream_heart_catcher_response.return_value = iter(self._chunk(raw))
+        self._use_real_completion(engine)
+
+        turn = TurnResult()
+        frames = list(chat_service.process_user_message_token_stream(
+            sample_session_id, sample_user_input, 1, turn_result=turn
+        ))
+
+        # Several deltas arrive before the remaining fields are appended
+        assert len(frames) > 3
+        assert frames[0].startswith("💖 ")
+        assert "".join(frames[:-1]) == "💖 小念一直在这里陪着你，累了就休息一下吧~"
+        assert "".join(frames) == turn.display_text
+        assert turn.success
+        assert turn.gift_info == {"type": "温暖拥抱", "content": "🤗 抱抱你"}
+        assert turn.parsed_response["mood_category"] == "关怀"
+        # The streamed reply is completed as a heart-catcher reply
+        engine.complete_streamed_response.assert_called_once()
+        assert engine.complete_streamed_response.call_args.kwargs["prompt_name"] == "heart_catcher"
+        engine.stream_emotion_enhanced_response.assert_not_called()
+        engine.get_heart_catcher_response.assert_not_called()
+
+    def test_token_stream_falls_back_when_json_is_missing(self, chat_service, sample_session_id, sample_user_input):
+        """Non-JSON output (e.g. network error text) ends with the fallback response"""
+        from src.models.turn import TurnResult
+
+        engine = chat_service.ai_engine
+        engine.requires_structured_response.return_value = False
+        engine.stream_heart_catcher_response.return_value = iter(["💖 小念遇到了网络问题"])
+        self._use_real_completion(engine)
+
+        turn = TurnResult()
+        frames = list(chat_service.process_user_message_token_stream(
+            sample_session_id, sample_user_input, 1, turn_result=turn
+        ))
+
+        assert frames == [turn.display_text]
+        assert turn.success
+        assert "技术困难" in turn.display_text
+
+    def test_token_stream_uses_heart_catcher_prompt(self, chat_repository, intimacy_service):
+        """Token mode sends the same heart-catcher system prompt as the structured path"""
+        from src.config.emotional_prompts import HEART_CATCHER_SYSTEM_PROMPT
+        from src.core.ai_engine import AIEngine
+        from src.models.turn import TurnResult
+
+        engine = AIEngine("sk-test-key")
+        raw = json.dumps({
+            "mood_category": "温暖",
+            "sprite_reaction": "小念陪你去散步~",
+            "gift_type": "元气咒语",
+            "gift_content": "✨ 散步快乐 ✨"
+        }, ensure_ascii=False)
+        stream_client = Mock()
+        stream_client.stream_chat.return_value = iter(self._chunk(raw))
+        engine.get_stream_client = Mock(return_value=stream_client)
+        chat_service = ChatService(
+            ai_engine=engine, chat_repo=chat_repository, intimacy_service=intimacy_service
+        )
+
+        turn = TurnResult()
+        list(chat_service.process_user_message_token_stream(
+            str(uuid.uuid4()), "今天天气不错，去公园散步了", 1, turn_result=turn
+        ))
+
+        messages = stream_client.stream_chat.call_args.args[0]
+        assert messages[0]["role"] == "system"
+        assert messages[0]["content"] == HEART_CATCHER_SYSTEM_PROMPT.replace("{{", "{").replace("}}", "}")
+        assert turn.success
+        assert "小念陪你去散步" in turn.display_text
+
+        completed = engine.complete_streamed_response({"sprite_reaction": "嗨~"}, "你好", prompt_name="heart_catcher")
+        assert completed["emotional_state"]["pet_name"]
+        assert completed["proactive_care"]
+
+    def test_structured_scenarios_skip_token_stream(self, chat_service, sample_session_id, sample_user_input):
+        """Emergency / search turns still use the structured path"""
+        engine = chat_service.ai_engine
+        engine.requires_structured_response.return_value = True
+
+        frames = list(chat_service.process_user_message_token_stream(sample_session_id, sample_user_input, 1))
+
+        assert "心灵捕手测试回应" in "".join(frames)
+        engine.stream_heart_catcher_response.assert_not_called()
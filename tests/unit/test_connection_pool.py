@@ -0,0 +1,180 @@
+"""
+Unit tests for the SQLite connection pool checkout path and the reader/writer split
+"""
+
+import sqlite3
+import threading
+import pytest
+from src.data.connection_pool import SQLiteConnectionPool, SQLiteWriter, get_db_writer
+from src.data.database import get_db_connection
+from src.data.repositories.base_repository import BaseRepository
+
+
+def _checkout(pool):
+    with pool.get_connection() as conn:
+        return conn._connection
+
+
+@pytest.mark.unit
+class TestSQLiteConnectionPool:
+    """Test cases for SQLiteConnectionPool"""
+
+    def test_checkout_reuses_connections_without_ping(self, temp_db):
+        pool = SQLiteConnectionPool(temp_db, max_connections=2)
+        statements = []
+        for conn in pool._idle:
+            conn.set_trace_callback(statements.append)
+
+        for _ in range(10):
+            with pool.get_connection() as conn:
+                conn.execute("SELECT count(*) FROM chat_history")
+
+        assert statements == ["SELECT count(*) FROM chat_history"] * 10
+        stats = pool.get_stats()
+        assert stats["total_requests"] == 10
+        assert stats["pool_hits"] == 10
+        assert stats["active_connections"] == 0
+        pool.close_all()
+
+    def test_broken_connection_is_dropped_after_error(self, temp_db):
+        pool = SQLiteConnectionPool(temp_db, max_connections=2)
+
+        with pytest.raises(Exception):
+            with pool.get_connection() as conn:
+                conn._connection.close()
+                conn.execute("SELECT 1")
+        # A plain SQL error leaves the connection in the pool
+        with pytest.raises(Exception):
+            with pool.get_connection() as conn:
+                conn.execute("SELECT * FROM missing_table")
+
+        stats = pool.get_stats()
+        assert stats["validations"] == 2
+        assert stats["discarded_connections"] == 1
+        assert stats["created_connections"] == 1
+        with pool.get_connection() as conn:
+            assert conn.execute("SELECT 1").fetchone()[0] == 1
+        pool.close_all()
+
+    def test_checkout_waits_when_pool_is_exhausted(self, temp_db):
+        pool = SQLiteConnectionPool(temp_db, max_connections=1)
+        acquired = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with pool.get_connection():
+                acquired.set()
+                release.wait(5)
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        acquired.wait(5)
+        threading.Timer(0.05, release.set).start()
+
+        with pool.get_connection() as conn:
+            assert conn.execute("SELECT 1").fetchone()[0] == 1
+        holder.join()
+        assert pool.get_stats()["created_connections"] == 1
+        pool.close_all()
+
+    def test_thread_affinity_pins_one_connection_per_thread(self, temp_db):
+        pool = SQLiteConnectionPool(temp_db, max_connections=4, thread_affinity=True)
+        seen = {}
+        barrier = threading.Barrier(2)
+
+        def work(name):
+            seen[name] = {id(_checkout(pool)) for _ in range(5)}
+            # Keep both threads (and their pinned connections) alive until both are done
+            barrier.wait(5)
+
+        threads = [threading.Thread(target=work, args=(name,)) for name in ("a", "b")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert all(len(ids) == 1 for ids in seen.values())
+        assert seen["a"] != seen["b"]
+        stats = pool.get_stats()
+        assert stats["total_requests"] == 10
+        assert stats["pinned_checkouts"] == 10
+        # Pinned connections go back to the shared pool when their threads exit
+        assert stats["created_connections"] == 3
+        assert stats["pool_size"] == 3
+        pool.close_all()
+
+    def test_nested_checkout_falls_back_to_shared_pool(self, temp_db):
+        pool = SQLiteConnectionPool(temp_db, max_connections=4, thread_affinity=True)
+
+        with pool.get_connection() as outer:
+            with pool.get_connection() as inner:
+                assert inner._connection is not outer._connection
+        assert _checkout(pool) is _checkout(pool)
+        assert pool.get_stats()["pinned_checkouts"] == 3
+        pool.close_all()
+
+
+@pytest.mark.unit
+class TestReaderWriterSplit:
+    """Test cases for the query_only readers and the single writer"""
+
+    def test_readers_reject_writes(self, temp_db):
+        with pytest.raises(sqlite3.OperationalError):
+            with get_db_connection() as conn:
+                conn.execute("INSERT INTO chat_history (session_id, role, content) VALUES ('s', 'user', 'x')")
+
+    def test_repository_writes_go_through_writer(self, temp_db):
+        repository = BaseRepository()
+
+        assert repository.execute_insert(
+            "INSERT INTO chat_history (session_id, role, content) VALUES (?, ?, ?)", ("s", "user", "你好")
+        )
+        rows = repository.execute_query("SELECT content FROM chat_history WHERE session_id = ?", ("s",))
+        assert [row[0] for row in rows] == ["你好"]
+        assert get_db_writer().get_stats()["checkouts"] >= 1
+
+    def test_transaction_rolls_back_and_nests(self, temp_db):
+        writer = SQLiteWriter(temp_db)
+        insert = "INSERT INTO chat_history (session_id, role, content) VALUES ('tx', 'user', ?)"
+
+        with pytest.raises(ValueError):
+            with writer.transaction() as conn:
+                conn.execute(insert, ("回滚",))
+                raise ValueError("boom")
+        with writer.transaction() as outer:
+            outer.execute(insert, ("外层",))
+            with writer.transaction() as inner:
+                inner.execute(insert, ("内层",))
+            assert outer.in_transaction
+
+        with get_db_connection() as conn:
+            rows = conn.execute("SELECT content FROM chat_history WHERE session_id = 'tx' ORDER BY id").fetchall()
+        assert [row[0] for row in rows] == ["外层", "内层"]
+        stats = writer.get_stats()
+        assert stats["transactions"] == 2
+        assert stats["rollbacks"] == 1
+        writer.close()
+
+    def test_concurrent_writers_do_not_hit_busy(self, temp_db):
+        repository = BaseRepository()
+        results = []
+
+        def write(thread_index):
+            for index in range(25):
+                with repository.write_transaction() as conn:
+                    conn.execute(
+                        "INSERT INTO chat_history (session_id, role, content) VALUES (?, 'user', ?)",
+                        (f"session_{thread_index}", f"消息{index}")
+                    )
+                    conn.execute("UPDATE chat_history SET content = content WHERE session_id = ?",
+                                 (f"session_{thread_index}",))
+            results.append(thread_index)
+
+        threads = [threading.Thread(target=write, args=(index,)) for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(results) == list(range(8))
+        assert repository.execute_query("SELECT COUNT(*) FROM chat_history")[0][0] == 200
@@ -0,0 +1,82 @@
+"""
+Unit tests for the local token counter and the token-budgeted context builder
+"""
+
+import pytest
+from src.core.context_builder import ContextBuilder
+from src.utils.token_counter import count_message_tokens, count_tokens, truncate_to_tokens
+
+
+@pytest.mark.unit
+class TestTokenCounter:
+    """Test cases for the local token estimate"""
+
+    def test_chinese_costs_more_than_english_per_character(self):
+        assert count_tokens("") == 0
+        assert count_tokens("今天好累") == 3  # 4 * 0.6 rounded up
+        assert count_tokens("good") == 2  # 4 * 0.3 rounded up
+        assert count_tokens("开心✨") == 3  # emoji counted as a whole token
+
+    def test_truncate_respects_budget(self):
+        text = "今天发生了很多事情" * 20
+
+        truncated = truncate_to_tokens(text, 20)
+
+        assert truncated.endswith("...")
+        assert count_tokens(truncated) <= 20
+        assert truncate_to_tokens("短消息", 20) == "短消息"
+
+
+@pytest.mark.unit
+class TestContextBuilder:
+    """Test cases for ContextBuilder"""
+
+    SYSTEM = "你是小念"
+
+    def test_everything_fits_under_a_large_budget(self):
+        history = [("user", "你好"), ("assistant", "嗨~"), ("user", "今天好累")]
+        memories = [("event", "下周考试", "2024-01-01")]
+
+        context = ContextBuilder(budget_tokens=1000, message_max_tokens=100).build(
+            self.SYSTEM, "我回来啦", history, memories, "附近的心理咨询中心"
+        )
+
+        assert context.history == history
+        assert context.core_memories == memories
+        assert context.search_context == "附近的心理咨询中心"
+        assert context.dropped_messages == context.dropped_memories == 0
+        assert context.total_tokens <= 1000
+        assert context.to_dict()["sections"]["user_input"] == count_message_tokens("我回来啦")
+
+    def test_long_messages_are_truncated_by_tokens_not_characters(self):
+        long_message = "压力好大" * 100
+        history = [("user", long_message), ("assistant", "抱抱你" * 100)]
+
+        context = ContextBuilder(budget_tokens=1000, message_max_tokens=40).build(self.SYSTEM, "嗯", history)
+
+        (_, user_text), (_, reply_text) = context.history
+        assert count_tokens(user_text) <= 40
+        assert count_tokens(reply_text) <= 20
+        assert context.truncated_messages == 2
+
+    def test_budget_keeps_recent_turns_then_memories_then_older_turns(self):
+        history = [("user", f"第{index}条消息" + "内容" * 10) for index in range(10)]
+        memories = [("event", "重要的回忆" * 5, "2024-01-01")]
+        builder = ContextBuilder(budget_tokens=80, message_max_tokens=100)
+
+        context = builder.build(self.SYSTEM, "现在", history, memories)
+
+        # Newest messages are kept as a contiguous suffix, the memory ranks above older turns
+        assert context.history == history[-len(context.history):]
+        assert 2 <= len(context.history) < len(history)
+        assert context.core_memories == memories
+        assert context.dropped_messages == len(history) - len(context.history)
+        assert context.total_tokens <= 80
+
+    def test_search_context_is_truncated_to_remaining_budget(self):
+        context = ContextBuilder(budget_tokens=60, message_max_tokens=100).build(
+            self.SYSTEM, "帮我找咨询师", [], [], "咨询中心地址" * 100
+        )
+
+        assert context.search_context.endswith("...")
+        assert context.total_tokens <= 60
@@ -0,0 +1,90 @@
+"""
+Unit tests for rolling conversation summaries
+"""
+
+import pytest
+from unittest.mock import patch
+from src.core.context_builder import ContextBuilder
+from src.services.conversation_summary_service import ConversationSummaryService
+from src.utils.token_counter import count_tokens
+
+
+SUMMARY_ENV = {"CONTEXT_HISTORY_TURNS": "2", "SUMMARY_EVERY_TURNS": "3", "SUMMARY_MAX_TOKENS": "60"}
+
+
+def _add_turns(chat_repository, session_id, start, count):
+    for index in range(start, start + count):
+        chat_repository.add_message(session_id, "user", f"第{index}轮的烦恼")
+        chat_repository.add_message(session_id, "assistant", f"小念陪你聊第{index}轮")
+
+
+@pytest.mark.unit
+class TestConversationSummaryService:
+    """Test cases for ConversationSummaryService"""
+
+    def test_older_turns_are_folded_into_summary(self, chat_repository, sample_session_id):
+        calls = []
+
+        def summarizer(previous_summary, messages):
+            calls.append((previous_summary, messages))
+            return f"摘要{len(calls)}"
+
+        service = ConversationSummaryService(chat_repository, summarizer=summarizer)
+        with patch.dict('os.environ', SUMMARY_ENV):
+            _add_turns(chat_repository, sample_session_id, 0, 4)
+            # 4 turns < 2 kept verbatim + 3 to summarize
+            assert not service.maybe_summarize(sample_session_id)
+
+            _add_turns(chat_repository, sample_session_id, 4, 1)
+            assert service.maybe_summarize(sample_session_id)
+            summary, recent = service.get_prompt_history(sample_session_id)
+
+        assert summary == "摘要1"
+        assert calls[0][0] is None
+        assert [content for _, content in calls[0][1]][::2] == ["第0轮的烦恼", "第1轮的烦恼", "第2轮的烦恼"]
+        # Only the turns after the summary are sent verbatim
+        assert recent == [
+            ("user", "第3轮的烦恼"), ("assistant", "小念陪你聊第3轮"),
+            ("user", "第4轮的烦恼"), ("assistant", "小念陪你聊第4轮")
+        ]
+        latest = service.summary_repo.get_latest_summary(sample_session_id)
+        assert latest["message_count"] == 6
+
+    def test_summary_is_incremental_and_prompt_size_stays_bounded(self, chat_repository, sample_session_id):
+        service = ConversationSummaryService(chat_repository, summarizer=lambda previous, messages: None)
+        sizes = []
+
+        with patch.dict('os.environ', SUMMARY_ENV):
+            for turn in range(20):
+                _add_turns(chat_repository, sample_session_id, turn, 1)
+                service.maybe_summarize(sample_session_id)
+                summary, recent = service.get_prompt_history(sample_session_id)
+                sizes.append(count_tokens(summary or "") + sum(count_tokens(content) for _, content in recent))
+
+        # Falls back to an extractive summary capped at SUMMARY_MAX_TOKENS
+        assert "第0轮" not in summary
+        assert count_tokens(summary) <= 60
+        assert len(recent) <= (2 + 3) * 2
+        assert max(sizes[10:]) <= max(sizes[:10]) + 60
+
+    def test_disabled_summaries(self, chat_repository, sample_session_id):
+        service = ConversationSummaryService(chat_repository)
+
+        with patch.dict('os.environ', {**SUMMARY_ENV, "SUMMARY_EVERY_TURNS": "0"}):
+            _add_turns(chat_repository, sample_session_id, 0, 10)
+            assert not service.maybe_summarize(sample_session_id)
+            summary, recent = service.get_prompt_history(sample_session_id)
+
+        assert summary is None
+        assert len(recent) == 4
+
+    def test_context_builder_ranks_summary_after_recent_turns(self):
+        history = [("user", "最近的消息")]
+
+        context = ContextBuilder(budget_tokens=1000, message_max_tokens=100).build(
+            "你是小念", "嗯", history, summary="用户下周要考试"
+        )
+
+        assert context.summary == "用户下周要考试"
+        assert context.section_tokens["summary"] > 0
+        assert context.history == history
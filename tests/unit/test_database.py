@@ -0,0 +1,101 @@
+"""
+Unit tests for database initialisation and schema migrations
+"""
+
+import sqlite3
+import pytest
+from unittest.mock import patch
+from src.data import database
+from src.data.database import init_db, run_migrations, get_schema_version, MIGRATIONS
+
+
+@pytest.fixture
+def fresh_db_path(tmp_path):
+    database.reset_db_init_cache()
+    yield str(tmp_path / "migrations.db")
+    database.reset_db_init_cache()
+
+
+@pytest.mark.unit
+class TestSchemaMigrations:
+    """Test cases for the migration runner"""
+
+    def test_init_db_records_latest_version(self, fresh_db_path):
+        assert init_db(fresh_db_path)
+
+        conn = sqlite3.connect(fresh_db_path)
+        try:
+            assert get_schema_version(conn) == MIGRATIONS[-1][0]
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        finally:
+            conn.close()
+        assert {"chat_history", "user_profiles", "schema_version"} <= tables
+
+    def test_init_db_runs_once_per_process(self, fresh_db_path):
+        assert init_db(fresh_db_path)
+
+        with patch('src.data.database.get_db_connection_direct') as direct:
+            assert init_db(fresh_db_path)
+            direct.assert_not_called()
+
+    def test_only_new_migrations_are_applied(self, fresh_db_path):
+        init_db(fresh_db_path)
+        latest = MIGRATIONS[-1][0]
+        extra = (latest + 1, "测试迁移", ["CREATE TABLE migration_probe (id INTEGER PRIMARY KEY)"])
+
+        conn = sqlite3.connect(fresh_db_path)
+        try:
+            with patch.object(database, 'MIGRATIONS', MIGRATIONS + [extra]):
+                assert run_migrations(conn) == latest + 1
+                # Re-running is a no-op (the CREATE TABLE would fail otherwise)
+                assert run_migrations(conn) == latest + 1
+        finally:
+            conn.close()
+
+    def test_failed_migration_leaves_no_partial_schema(self, fresh_db_path):
+        init_db(fresh_db_path)
+        latest = MIGRATIONS[-1][0]
+        broken = (latest + 1, "失败的迁移", [
+            "CREATE TABLE migration_probe (x INTEGER)",
+            "DROP INDEX IF EXISTS no_such_index",
+            "CREATE TABLE migration_probe (y INTEGER)"
+        ])
+
+        conn = sqlite3.connect(fresh_db_path)
+        try:
+            with patch.object(database, 'MIGRATIONS', MIGRATIONS + [broken]):
+                with pytest.raises(sqlite3.OperationalError):
+                    run_migrations(conn)
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            assert "migration_probe" not in tables
+            assert get_schema_version(conn) == latest
+        finally:
+            conn.close()
+
+    def test_migration_already_applied_by_another_process_is_skipped(self, fresh_db_path):
+        init_db(fresh_db_path)
+        latest = MIGRATIONS[-1][0]
+        extra = (latest + 1, "测试迁移", ["CREATE TABLE migration_probe (id INTEGER PRIMARY KEY)"])
+        real_get_schema_version = get_schema_version
+        reads = []
+
+        def stale_first_read(conn):
+            # The first (unlocked) read happened before the other process applied the migration
+            reads.append(conn)
+            return latest if len(reads) == 1 else real_get_schema_version(conn)
+
+        conn = sqlite3.connect(fresh_db_path)
+        other = sqlite3.connect(fresh_db_path)
+        try:
+            with patch.object(database, 'MIGRATIONS', MIGRATIONS + [extra]):
+                assert run_migrations(other) == latest + 1
+                with patch.object(database, 'get_schema_version', side_effect=stale_first_read):
+                    # The CREATE TABLE would fail if the version were not re-read under the lock
+                    assert run_migrations(conn) == latest + 1
+        finally:
+            conn.close()
+            other.close()
+
+    def test_migration_versions_are_increasing(self):
+        versions = [version for version, _, _ in MIGRATIONS]
+        assert versions == sorted(set(versions))
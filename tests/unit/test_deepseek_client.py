@@ -0,0 +1,140 @@
+"""
+Unit tests for the pooled DeepSeek streaming client
+
+Runs against a local mock SSE server so no network access is needed.
+"""
+
+import json
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.core.deepseek_client import DeepSeekStreamClient, DeepSeekStreamError, prompt_cache_stats
+
+
+class _MockDeepSeekHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length))
+        self.server.requests.append((self.client_address, self.headers.get("Authorization"), payload))
+
+        if payload["messages"][0]["content"] == "fail":
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        events = [{"choices": [{"delta": {"content": piece}}]} for piece in ("你好", "，", "小念")]
+        if payload.get("stream_options", {}).get("include_usage"):
+            events.append({"choices": [], "usage": {
+                "prompt_tokens": 120, "completion_tokens": 3,
+                "prompt_cache_hit_tokens": 100, "prompt_cache_miss_tokens": 20
+            }})
+        body = "".join(f"data: {json.dumps(event, ensure_ascii=False)}\n\n" for event in events)
+        body += ": keep-alive comment\n\ndata: [DONE]\n\n"
+        encoded = body.encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def mock_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _MockDeepSeekHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(mock_server):
+    host, port = mock_server.server_address
+    client = DeepSeekStreamClient("sk-test-key", base_url=f"http://{host}:{port}", timeout=5.0)
+    yield client
+    client.close()
+
+
+@pytest.mark.unit
+class TestDeepSeekStreamClient:
+    """Test cases for DeepSeekStreamClient"""
+
+    def test_streams_sse_content(self, client, mock_server):
+        chunks = list(client.stream_chat([{"role": "user", "content": "hi"}], model="deepseek-chat"))
+
+        assert chunks == ["你好", "，", "小念"]
+        _, auth, payload = mock_server.requests[0]
+        assert auth == "Bearer sk-test-key"
+        assert payload["stream"] is True
+        assert payload["model"] == "deepseek-chat"
+
+    def test_connection_is_reused(self, client, mock_server):
+        recorded = []
+        list(client.stream_chat([{"role": "user", "content": "first"}], on_metrics=recorded.append))
+        list(client.stream_chat([{"role": "user", "content": "second"}], on_metrics=recorded.append))
+        first, second = recorded
+
+        assert not first.reused_connection
+        assert second.reused_connection
+        assert second.connect_time == 0.0
+        # Both requests arrived over the same TCP connection
+        assert mock_server.requests[0][0] == mock_server.requests[1][0]
+
+    def test_metrics_are_recorded(self, client):
+        recorded = []
+        list(client.stream_chat([{"role": "user", "content": "hi"}], on_metrics=recorded.append))
+        metrics, = recorded
+
+        assert metrics.status_code == 200
+        assert metrics.chunks == 3
+        assert 0 < metrics.ttfb <= metrics.total_time
+        assert metrics.connect_time <= metrics.total_time
+        assert metrics.to_dict()["http_version"] == "HTTP/1.1"
+
+    def test_prompt_cache_usage_is_recorded(self, client, mock_server):
+        prompt_cache_stats.reset()
+
+        recorded = []
+        list(client.stream_chat(
+            [{"role": "system", "content": "人设"}, {"role": "user", "content": "hi"}],
+            on_metrics=recorded.append
+        ))
+
+        assert mock_server.requests[0][2]["stream_options"] == {"include_usage": True}
+        metrics = recorded[0].to_dict()
+        assert (metrics["cache_hit_tokens"], metrics["cache_miss_tokens"]) == (100, 20)
+        assert metrics["prompt_tokens"] == 120
+        stats = prompt_cache_stats.get_stats()
+        assert (stats["requests"], stats["hit_tokens"], stats["miss_tokens"]) == (1, 100, 20)
+        assert stats["hit_rate"] == pytest.approx(100 / 120)
+
+    def test_non_200_raises(self, client):
+        recorded = []
+        with pytest.raises(DeepSeekStreamError) as excinfo:
+            list(client.stream_chat([{"role": "user", "content": "fail"}], on_metrics=recorded.append))
+
+        assert excinfo.value.status_code == 500
+        assert recorded[0].status_code == 500
+
+    def test_interleaved_streams_keep_their_own_metrics(self, client):
+        """The client is shared by every session, so metrics are handed to each request"""
+        first_metrics, second_metrics = [], []
+        first = client.stream_chat([{"role": "user", "content": "a"}], on_metrics=first_metrics.append)
+        second = client.stream_chat([{"role": "user", "content": "b"}], on_metrics=second_metrics.append)
+
+        next(first)
+        assert list(second) == ["你好", "，", "小念"]
+        assert list(first) == ["，", "小念"]
+
+        assert first_metrics[0] is not second_metrics[0]
+        assert first_metrics[0].chunks == second_metrics[0].chunks == 3
+        assert not hasattr(client, "last_metrics")
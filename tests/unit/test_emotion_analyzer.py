@@ -0,0 +1,83 @@
+"""
+Unit tests for the shared emotion keyword analyzer and its bounded cache
+"""
+
+import json
+import pytest
+from src.config.companion_config import reload_config
+from src.services.emotion_analysis_service import (
+    EmotionAnalysisService, EmotionKeywordAnalyzer, EmotionType,
+    get_emotion_analyzer, reset_emotion_analyzer
+)
+
+
+@pytest.fixture
+def shared_analyzer():
+    reset_emotion_analyzer()
+    yield get_emotion_analyzer()
+    reload_config()
+    reset_emotion_analyzer()
+
+
+@pytest.mark.unit
+class TestEmotionKeywordAnalyzer:
+    """Test cases for the process-level emotion analyzer"""
+
+    KEYWORDS = {EmotionType.JOY: {"开心": 3.0}, EmotionType.SADNESS: {"难过": 2.0}}
+
+    def test_services_share_one_analyzer(self, shared_analyzer):
+        first, second = EmotionAnalysisService(), EmotionAnalysisService()
+
+        assert first.analyzer is second.analyzer is shared_analyzer
+        first.analyzer.analyze("今天好开心")
+        second.analyzer.analyze("今天好开心")
+
+        stats = shared_analyzer.get_stats()
+        assert (stats["hits"], stats["misses"]) == (1, 1)
+        assert stats["hit_rate"] == 0.5
+
+    def test_cache_is_keyed_on_normalized_text(self):
+        analyzer = EmotionKeywordAnalyzer(self.KEYWORDS, max_entries=10, max_bytes=10_000)
+
+        first = analyzer.analyze("好开心！")
+        second = analyzer.analyze("  好开心! ")
+
+        assert first == second
+        assert analyzer.get_stats()["hits"] == 1
+
+    def test_entry_limit_evicts_least_recently_used(self):
+        analyzer = EmotionKeywordAnalyzer(self.KEYWORDS, max_entries=2, max_bytes=10_000)
+
+        analyzer.analyze("开心")
+        analyzer.analyze("难过")
+        analyzer.analyze("开心")  # "难过" is now the oldest entry
+        analyzer.analyze("平常的一天")
+        analyzer.analyze("开心")
+
+        stats = analyzer.get_stats()
+        assert stats["entries"] == 2
+        assert stats["evictions"] == 1
+        assert stats["hits"] == 2
+
+    def test_memory_limit_bounds_cache(self):
+        analyzer = EmotionKeywordAnalyzer(self.KEYWORDS, max_entries=1000, max_bytes=2_000)
+
+        for index in range(100):
+            analyzer.analyze(f"第{index}次觉得开心")
+
+        stats = analyzer.get_stats()
+        assert 0 < stats["bytes"] <= 2_000
+        assert stats["entries"] < 100
+
+    def test_reload_config_invalidates_cache(self, temp_db, shared_analyzer, tmp_path):
+        service = EmotionAnalysisService()
+        assert service.analyze_emotion("绝绝子", "reload_session", 1).primary_emotion == EmotionType.NEUTRAL
+
+        config_file = tmp_path / "companion.json"
+        config_file.write_text(
+            json.dumps({"emotion_analysis_keywords": {"joy": {"绝绝子": 3.0}}}), encoding="utf-8"
+        )
+        reload_config(str(config_file))
+
+        assert shared_analyzer.get_stats()["entries"] == 0
+        assert service.analyze_emotion("绝绝子", "reload_session", 2).primary_emotion == EmotionType.JOY
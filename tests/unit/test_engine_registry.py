@@ -0,0 +1,81 @@
+"""
+Unit tests for the process-wide AIEngine registry
+"""
+
+import os
+import pytest
+from unittest.mock import patch
+from src.core import engine_registry
+from src.core.engine_registry import (
+    build_engine_key,
+    get_ai_engine,
+    invalidate_ai_engines,
+    get_cached_engine_count
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    invalidate_ai_engines()
+    yield
+    invalidate_ai_engines()
+
+
+@pytest.mark.unit
+class TestEngineRegistry:
+    """Test cases for the engine registry"""
+
+    def test_same_config_reuses_engine(self):
+        first = get_ai_engine("sk-test-key")
+        second = get_ai_engine("sk-test-key")
+
+        assert first is second
+        assert get_cached_engine_count() == 1
+
+    def test_key_depends_on_model_config(self):
+        key = build_engine_key("sk-test-key")
+
+        with patch.dict(os.environ, {"TEMPERATURE": "0.9"}):
+            assert build_engine_key("sk-test-key") != key
+        assert build_engine_key("sk-other-key") != key
+        assert "sk-test-key" not in key
+
+    def test_invalidate_rebuilds_engine(self):
+        first = get_ai_engine("sk-test-key")
+        invalidate_ai_engines()
+
+        assert get_ai_engine("sk-test-key") is not first
+
+    def test_failed_engine_is_not_cached(self):
+        with patch('src.core.engine_registry.AIEngine') as engine_cls:
+            engine_cls.return_value.llm = None
+            get_ai_engine("")
+
+        assert get_cached_engine_count() == 0
+
+    def test_cache_is_bounded(self):
+        for index in range(engine_registry.MAX_CACHED_ENGINES + 2):
+            get_ai_engine(f"sk-test-key-{index}")
+
+        assert get_cached_engine_count() == engine_registry.MAX_CACHED_ENGINES
+
+    def test_evicted_engine_closes_stream_client(self):
+        first = get_ai_engine("sk-test-key-0")
+        stream_client = first.get_stream_client()
+
+        with patch.object(stream_client, "close") as close:
+            for index in range(1, engine_registry.MAX_CACHED_ENGINES + 1):
+                get_ai_engine(f"sk-test-key-{index}")
+
+        close.assert_called_once()
+        assert first.get_stream_client() is not stream_client
+        first.close()
+
+    def test_invalidate_closes_stream_clients(self):
+        engine = get_ai_engine("sk-test-key")
+        stream_client = engine.get_stream_client()
+
+        with patch.object(stream_client, "close") as close:
+            invalidate_ai_engines()
+
+        close.assert_called_once()
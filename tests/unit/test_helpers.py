@@ -0,0 +1,45 @@
+"""
+Unit tests for helper utilities
+"""
+
+import random
+import pytest
+from src.utils.helpers import clean_markdown_text, IncrementalMarkdownCleaner
+
+
+SAMPLES = [
+    "💖 小念觉得你**超级棒**！~~别~~ 不要放弃 ~ 加油 *",
+    "记得 <del>删掉</del> 和 <s>划线</s> 以及 [链接] 都会被清理 _ 哦",
+    "连续标记***___```~~~ 和单独的 ` 符号 * 还有~波浪~号",
+    "普通文本没有任何标记，只是很长很长的一句话。" * 5,
+]
+
+
+@pytest.mark.unit
+class TestIncrementalMarkdownCleaner:
+    """Incremental cleaning must match cleaning the full text"""
+
+    @pytest.mark.parametrize("text", SAMPLES)
+    def test_random_deltas_match_full_clean(self, text):
+        rng = random.Random(7)
+
+        for _ in range(100):
+            cleaner = IncrementalMarkdownCleaner()
+            position = 0
+            while position < len(text):
+                size = rng.randint(1, 5)
+                cleaner.feed(text[position:position + size])
+                # Intermediate previews are always a clean rendering of the prefix
+                assert cleaner.text == clean_markdown_text(text[:position + size])
+                position += size
+            cleaner.flush()
+
+            assert cleaner.text == clean_markdown_text(text)
+
+    def test_pending_tail_stays_small(self):
+        """Only the unsettled tail is re-cleaned on each feed"""
+        cleaner = IncrementalMarkdownCleaner()
+        for char in "小念陪着你" * 40:
+            cleaner.feed(char)
+
+        assert len(cleaner._pending) <= 1
@@ -0,0 +1,108 @@
+"""
+Unit tests for atomic EXP updates in IntimacyService / UserProfileRepository
+"""
+
+import random
+import sqlite3
+import threading
+
+import pytest
+from src.data.connection_pool import register_sql_functions
+from src.data.repositories.user_profile_repository import (
+    UserProfileRepository, _exp_sql, _level_sql, level_for_total_exp, total_exp
+)
+from src.services.intimacy_service import IntimacyService
+
+
+def _legacy_level_up(level, exp, exp_to_add):
+    """The original read-modify-write loop: each level needs level * 50 EXP"""
+    exp += exp_to_add
+    while exp >= level * 50:
+        exp -= level * 50
+        level += 1
+    return level, exp
+
+
+@pytest.mark.unit
+class TestAtomicExp:
+    """Test cases for the single-statement EXP upsert"""
+
+    def test_add_exp_creates_profile_and_levels_up(self, temp_db):
+        service = IntimacyService(UserProfileRepository())
+
+        first = service.add_exp("exp_session", 40)
+        second = service.add_exp("exp_session", 15)
+
+        assert (first["new_level"], first["current_exp"], first["leveled_up"]) == (1, 40, False)
+        assert first["total_interactions"] == 1
+        assert second["leveled_up"]
+        assert (second["old_level"], second["new_level"], second["current_exp"]) == (1, 2, 5)
+        assert second["exp_needed"] == 100
+        assert second["level_rewards"][0]["type"] == "title"
+        profile = UserProfileRepository().get_profile("exp_session")
+        assert (profile["intimacy_level"], profile["intimacy_exp"], profile["total_interactions"]) == (2, 5, 2)
+
+    def test_failed_upsert_reports_no_gain(self, temp_db):
+        """A failed write must not show EXP or level-ups that were never saved"""
+        repo = UserProfileRepository()
+        service = IntimacyService(repo)
+        service.add_exp("exp_session", 45)
+        repo.add_exp = lambda session_id, exp_to_add: None
+
+        result = service.add_exp("exp_session", 50)
+
+        assert not result["leveled_up"]
+        assert result["exp_gained"] == 0
+        assert (result["new_level"], result["current_exp"]) == (1, 45)
+        assert result["level_rewards"] == []
+
+    def test_multi_level_gains_match_legacy_loop(self, temp_db):
+        service = IntimacyService(UserProfileRepository())
+        rng = random.Random(3)
+        level, exp = 1, 0
+
+        for _ in range(40):
+            gain = rng.choice([10, 15, 30, 200, 1000])
+            expected = _legacy_level_up(level, exp, gain)
+            result = service.add_exp("legacy_session", gain)
+
+            assert (result["new_level"], result["current_exp"]) == expected
+            assert result["old_level"] == level
+            assert len([r for r in result["level_rewards"] if r["type"] == "title"]) == expected[0] - level
+            assert level_for_total_exp(total_exp(level, exp) + gain) == expected
+            level, exp = expected
+
+    def test_sql_level_formula_matches_python(self):
+        conn = sqlite3.connect(":memory:")
+        register_sql_functions(conn)
+        sql = f"SELECT {_level_sql(':total')}, {_exp_sql(':total')}"
+
+        # Every level boundary up to level 200 and the values either side of it
+        totals = {total_exp(level, 0) + delta for level in range(1, 200) for delta in (-1, 0, 1)}
+        for total in sorted(t for t in totals if t >= 0) + list(range(0, 5000, 7)):
+            assert conn.execute(sql, {"total": total}).fetchone() == level_for_total_exp(total)
+        conn.close()
+
+    def test_parallel_writers_lose_no_exp(self, temp_db):
+        service = IntimacyService(UserProfileRepository())
+        threads, adds_per_thread, gain = 8, 25, 15
+        barrier = threading.Barrier(threads)
+        results = []
+
+        def writer():
+            barrier.wait()
+            for _ in range(adds_per_thread):
+                results.append(service.add_exp("race_session", gain))
+
+        workers = [threading.Thread(target=writer) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        profile = UserProfileRepository().get_profile("race_session")
+        assert total_exp(profile["intimacy_level"], profile["intimacy_exp"]) == threads * adds_per_thread * gain
+        assert profile["total_interactions"] == threads * adds_per_thread
+        # Every level threshold is reported by exactly one writer
+        assert sum(r["new_level"] - r["old_level"] for r in results) == profile["intimacy_level"] - 1
+        assert sorted(r["total_interactions"] for r in results) == list(range(1, threads * adds_per_thread + 1))
@@ -0,0 +1,104 @@
+"""
+Unit tests for the Aho-Corasick keyword matcher and the detectors built on it
+"""
+
+import pytest
+from src.services.care_scheduler_service import CareSchedulerService
+from src.services.emotion_analysis_service import EmotionAnalysisService, EmotionType as AnalysisEmotion
+from src.services.emotion_emergency_service import EmotionEmergencyService, EmotionType, SeverityLevel
+from src.services.search_service import SearchTriggerDetector
+from src.utils.helpers import extract_gift_from_response
+from src.utils.keyword_matcher import KeywordMatcher
+
+
+@pytest.mark.unit
+class TestKeywordMatcher:
+    """Test cases for KeywordMatcher"""
+
+    def test_finds_overlapping_and_nested_keywords(self):
+        matcher = KeywordMatcher({"mood": ["开心", "超级开心", "心"]})
+
+        hits = matcher.find_all("我超级开心")
+
+        assert sorted((hit.keyword, hit.start, hit.end) for hit in hits) == [
+            ("开心", 3, 5), ("心", 4, 5), ("超级开心", 1, 5)
+        ]
+
+    def test_keywords_follow_registration_order_and_are_deduplicated(self):
+        matcher = KeywordMatcher({"anxiety": ["焦虑", "紧张", "考试"]})
+
+        scan = matcher.scan("考试好紧张，紧张到焦虑")
+
+        assert scan.keywords("anxiety") == ["焦虑", "紧张", "考试"]
+        assert len(scan.hits) == 4
+
+    def test_first_category_uses_registration_order(self):
+        matcher = KeywordMatcher({"元气咒语": ["祝福"], "星光祝福": ["星光", "祝福"]})
+
+        assert matcher.scan("送你星光和祝福").first_category() == "元气咒语"
+        assert matcher.scan("一闪一闪").first_category() is None
+
+    def test_weights_are_summed_once_per_keyword(self):
+        matcher = KeywordMatcher({"high": {"哈哈": 0.5, "！": 0.5}, "low": {"唉": -0.5}})
+
+        assert matcher.scan("哈哈哈哈！！唉").total_weight() == 0.5
+        assert matcher.scan("哈哈！").total_weight("high") == 1.0
+
+    def test_longest_match_drops_overlapped_keywords(self):
+        matcher = KeywordMatcher({"joy": {"开心": 3.0, "超级开心": 5.0}, "excitement": {"超级开心": 1.0}})
+
+        scan = matcher.scan("超级开心，开心", longest_match=True)
+
+        assert [(hit.keyword, hit.category) for hit in scan.hits] == [
+            ("超级开心", "joy"), ("超级开心", "excitement"), ("开心", "joy")
+        ]
+        assert scan.total_weight("joy") == 8.0
+
+    def test_ignore_case(self):
+        matcher = KeywordMatcher({"tool": ["ChatGPT"]})
+
+        assert matcher.scan("我在用chatgpt").has("tool")
+        assert not KeywordMatcher({"tool": ["ChatGPT"]}, ignore_case=False).scan("chatgpt")
+
+    def test_keywords_added_after_scan_are_picked_up(self):
+        matcher = KeywordMatcher({"a": ["你好"]})
+        assert not matcher.scan("早上好")
+
+        matcher.add("早上好", "b")
+
+        assert matcher.scan("早上好").categories() == ["b"]
+
+
+@pytest.mark.unit
+class TestKeywordDetectors:
+    """The detectors keep their behaviour on top of the shared matcher"""
+
+    def test_emergency_detection_with_severity(self):
+        result = EmotionEmergencyService().detect_emotion("我很焦虑，明天考试，紧张得睡不着，完全失控了")
+
+        assert result.emotion_type == EmotionType.ANXIETY
+        assert result.trigger_keywords == ["焦虑", "紧张", "睡不着", "考试"]
+        assert result.severity == SeverityLevel.CRITICAL
+
+    def test_care_detection_requires_future_marker_for_events(self):
+        service = CareSchedulerService()
+
+        tasks = service.detect_care_opportunities("明天要面试了，好紧张", "care_session")
+        assert [task['care_type'] for task in tasks] == ["emotion_followup", "event_followup"]
+
+        assert service.detect_care_opportunities("上次面试很顺利", "care_session") == []
+
+    def test_search_intent_and_gift_extraction(self):
+        intent = SearchTriggerDetector.detect_search_intent("附近的心理咨询和心理治疗")
+        assert intent["intent"] == "local_mental_health"
+        assert intent["matched_keywords"] == ["心理咨询", "心理治疗", "附近的"]
+
+        assert extract_gift_from_response("送你一个大大的拥抱")["type"] == "温暖拥抱"
+
+    def test_emotion_analysis_matches_keywords_inside_cjk_text(self, temp_db):
+        service = EmotionAnalysisService()
+
+        result = service.analyze_emotion("我今天超级开心呀", "analysis_session", 1)
+
+        assert result.primary_emotion == AnalysisEmotion.JOY
+        assert result.trigger_keywords == ["超级开心"]
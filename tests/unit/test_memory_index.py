@@ -0,0 +1,118 @@
+"""
+Unit tests for the local memory vector index and memory retrieval
+"""
+
+import os
+import pytest
+from unittest.mock import patch
+from src.data.memory_index import KIND_CORE_MEMORY, KIND_MESSAGE, MemoryIndex, get_memory_index
+from src.services.memory_service import MESSAGE_MEMORY_TYPE, MemoryService, extract_memories
+from src.utils.text_embedding import EMBEDDING_DIM, embed_text
+
+
+@pytest.mark.unit
+class TestMemoryIndex:
+    """Test cases for MemoryIndex"""
+
+    def test_embedding_is_normalized(self):
+        vector = embed_text("下周要考试了，好紧张")
+
+        assert vector.shape == (EMBEDDING_DIM,)
+        assert abs(float(vector @ vector) - 1.0) < 1e-5
+        assert not embed_text("！？。").any()
+
+    def test_search_ranks_related_text_first(self, tmp_path):
+        index = MemoryIndex(str(tmp_path))
+        index.add_many(KIND_CORE_MEMORY, [1, 2, 3], [
+            "我下周有一场很重要的数学考试", "我最喜欢吃妈妈做的红烧肉", "和室友吵架了心里很难过"
+        ])
+
+        hits = index.search("数学考试快到了", k=2)
+
+        assert hits[0].kind == KIND_CORE_MEMORY
+        assert hits[0].source_id == 1
+        assert hits[0].score > hits[1].score
+        assert index.search("数学考试", k=3, kind=KIND_MESSAGE) == []
+
+    def test_already_indexed_ids_are_skipped(self, tmp_path):
+        index = MemoryIndex(str(tmp_path))
+        index.add(KIND_MESSAGE, 5, "今天好累")
+        index.add(KIND_MESSAGE, 5, "今天好累")
+        index.add_many(KIND_MESSAGE, [3, 6], ["更早的消息", "新的消息"])
+
+        assert len(index) == 2
+        assert index.max_source_id(KIND_MESSAGE) == 6
+        assert index.max_source_id(KIND_CORE_MEMORY) == 0
+
+    def test_recent_messages_can_be_excluded(self, tmp_path):
+        index = MemoryIndex(str(tmp_path))
+        index.add_many(KIND_MESSAGE, [10, 20, 30], ["面试好紧张", "面试结束了", "面试通过了"])
+
+        floor = index.source_id_before_latest(KIND_MESSAGE, 2)
+        hits = index.search("面试", k=3, max_message_id=floor)
+
+        assert floor == 10
+        assert [hit.source_id for hit in hits] == [10]
+        assert index.source_id_before_latest(KIND_MESSAGE, 5) == 0
+
+    def test_index_persists_and_recovers_partial_writes(self, tmp_path):
+        index = MemoryIndex(str(tmp_path))
+        index.add_many(KIND_CORE_MEMORY, [1, 2], ["我养了一只猫", "我在准备考研"])
+        # Simulate a crash after the fine vectors of a third record were written
+        with open(os.path.join(str(tmp_path), "fine.f16"), "ab") as handle:
+            handle.write(b"\0" * 100)
+
+        reopened = MemoryIndex(str(tmp_path))
+
+        assert len(reopened) == 2
+        assert reopened.max_source_id(KIND_CORE_MEMORY) == 2
+        assert reopened.search("考研", k=1)[0].source_id == 2
+        reopened.add(KIND_CORE_MEMORY, 3, "我周末去爬山")
+        assert MemoryIndex(str(tmp_path)).search("爬山", k=1)[0].source_id == 3
+
+
+@pytest.mark.unit
+class TestMemoryService:
+    """Test cases for MemoryService"""
+
+    def test_extract_memories(self):
+        memories = extract_memories("今天天气不错。下周五要面试了，好紧张！我最喜欢吃火锅")
+
+        assert memories == [("event", "下周五要面试了，好紧张"), ("preference", "我最喜欢吃火锅")]
+        assert extract_memories("嗯嗯") == []
+
+    def test_remember_turn_saves_memories_once(self, chat_repository, sample_session_id):
+        service = MemoryService(chat_repository)
+        first = chat_repository.add_message(sample_session_id, "user", "下周五要面试了")
+        second = chat_repository.add_message(sample_session_id, "user", "下周五要面试了！")
+
+        assert service.remember_turn(sample_session_id, first, "下周五要面试了") == 1
+        assert service.remember_turn(sample_session_id, second, "下周五要面试了！") == 0
+        assert len(chat_repository.get_core_memories(sample_session_id)) == 1
+        assert get_memory_index(sample_session_id).max_source_id(KIND_MESSAGE) == second
+
+    def test_retrieve_prefers_relevant_memories(self, chat_repository, sample_session_id):
+        service = MemoryService(chat_repository)
+        chat_repository.add_core_memory(sample_session_id, "event", "下个月要参加钢琴比赛")
+        for index in range(8):
+            chat_repository.add_core_memory(sample_session_id, "preference", f"喜欢第{index}种颜色")
+
+        with patch.dict('os.environ', {"MEMORY_TOP_K": "3"}):
+            memories = service.retrieve(sample_session_id, "钢琴比赛越来越近了")
+
+        assert memories[0][:2] == ("event", "下个月要参加钢琴比赛")
+        assert len(memories) == 3
+
+    def test_retrieve_finds_older_messages(self, chat_repository, sample_session_id):
+        service = MemoryService(chat_repository)
+        chat_repository.add_message(sample_session_id, "user", "我家的小狗叫豆豆，最近它生病了")
+        for index in range(3):
+            chat_repository.add_message(sample_session_id, "user", f"随便聊聊第{index}件小事")
+
+        with patch.dict('os.environ', {"CONTEXT_HISTORY_TURNS": "2"}):
+            memories = service.retrieve(sample_session_id, "豆豆今天好点了吗")
+            recent = service.retrieve(sample_session_id, "第2件小事")
+
+        assert memories[0][:2] == (MESSAGE_MEMORY_TYPE, "我家的小狗叫豆豆，最近它生病了")
+        # Messages already in the recent history are not retrieved again
+        assert all("第2件" not in content for _, content, _ in recent)
@@ -0,0 +1,94 @@
+"""
+Unit tests for the prompt registry
+"""
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from src.config.prompts import EMOTION_CONTEXT_TEMPLATE, PromptRegistry, prompt_registry
+
+
+MEMORY_VALUES = {
+    "user_input": "今天好累 {不是变量}",
+    "core_memories": "[重要事件] 考试",
+    "intimacy_level": 3,
+    "total_interactions": 12,
+    "recent_moods": "最近心情不错",
+}
+
+HEART_CATCHER_VALUES = {
+    "intimacy_level": "朋友", "intimacy_guidance": "亲切", "user_mood": "开心",
+    "user_energy": 7.0, "companion_mood": "甜蜜", "content_type": "日常",
+    "hours_since_last": 2.0, "pet_name": "宝贝", "emotional_guidance": "共情",
+    "affection_guidance": "亲切", "user_input": "我回来啦"
+}
+
+
+@pytest.mark.unit
+class TestPromptRegistry:
+    """Test cases for pre-compiled prompt templates"""
+
+    def test_all_templates_are_registered(self):
+        assert set(prompt_registry.names()) == {
+            "enhanced", "emotion_enhanced", "search_enhanced",
+            "heart_catcher", "thinking", "search_thinking", "conversation_summary"
+        }
+
+    def test_mismatched_variables_are_rejected(self):
+        with pytest.raises(ValueError):
+            PromptRegistry().register("broken", "人设", "你好 {user_input} {missing}", ["user_input"])
+
+    def test_system_prompt_must_not_contain_variables(self):
+        with pytest.raises(ValueError):
+            PromptRegistry().register("broken", "今天是 {date}", "{user_input}", ["user_input"])
+
+    def test_system_prefix_is_byte_stable(self):
+        first = prompt_registry.format_messages(
+            "heart_catcher", history=[HumanMessage(content="在吗")], **HEART_CATCHER_VALUES
+        )
+        second = prompt_registry.format_messages(
+            "heart_catcher", **{**HEART_CATCHER_VALUES, "user_mood": "难过", "pet_name": "小可爱"}
+        )
+
+        assert isinstance(first[0], SystemMessage)
+        assert first[0].content == second[0].content == prompt_registry.system_prompt("heart_catcher")
+        assert "小可爱" not in second[0].content
+        assert "小可爱" in second[-1].content
+
+    def test_history_is_sent_as_ordered_turns(self):
+        history = [HumanMessage(content="你好"), AIMessage(content="嗨~"), HumanMessage(content="好累")]
+
+        messages = prompt_registry.format_messages("enhanced", history=history, **MEMORY_VALUES)
+
+        assert [message.type for message in messages] == ["system", "human", "ai", "human", "human"]
+        assert messages[1:4] == history
+        assert messages[-1].content.endswith("用户的心情分享：今天好累 {不是变量}")
+
+    def test_emotion_context_is_a_template_variable(self):
+        emotion_context = EMOTION_CONTEXT_TEMPLATE.format(
+            primary_emotion="anxiety", emotion_intensity=6.5, emotion_valence=-0.4,
+            emotion_arousal=0.7, empathy_strategy="comfort", response_tone="gentle",
+            trigger_keywords="焦虑, {考试}", confidence_score=0.8
+        )
+
+        messages = prompt_registry.format_messages(
+            "emotion_enhanced", emotion_context=emotion_context, **MEMORY_VALUES
+        )
+
+        # The insight block goes into the current turn, braces in the context are kept verbatim
+        assert messages[0].content == prompt_registry.system_prompt("enhanced")
+        assert emotion_context in messages[-1].content
+        assert "{考试}" in messages[-1].content
+
+    def test_chain_records_build_time(self):
+        registry = PromptRegistry()
+        registry.register("greeting", "你是小念", "你好，{name}", ["name"])
+        llm = FakeListChatModel(responses=["嗨"])
+
+        chains = registry.build_chains(llm)
+        result = chains["greeting"].invoke({"name": "小念"})
+
+        assert result.content == "嗨"
+        stats = registry.get_stats()["greeting"]
+        assert stats["count"] == 1
+        assert stats["avg_ms"] == stats["last_ms"] >= 0.0
@@ -0,0 +1,288 @@
+"""
+Query plan regression tests
+
+Every SQL statement the repositories issue (all SQL lives under src/data; the
+services only call repository methods) is captured with a trace callback while
+a workload exercises each public repository method. Each statement is then run
+through EXPLAIN QUERY PLAN on the seeded database and must neither scan a table
+nor sort a table's rows in a temp b-tree, unless the step is a maintenance or
+statistics query listed in ALLOWED_FULL_SCANS.
+"""
+
+import importlib
+import inspect
+import pkgutil
+import re
+import sqlite3
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+
+import src.data.repositories as repositories_package
+from src.data import connection_pool
+from src.data.connection_pool import reset_connection_pool
+from src.data.repositories.base_repository import BaseRepository
+from src.data.repositories.care_task_repository import CareTaskRepository
+from src.data.repositories.chat_repository import ChatRepository, encode_history_cursor
+from src.data.repositories.conversation_summary_repository import ConversationSummaryRepository
+from src.data.repositories.emotion_analysis_repository import EmotionAnalysisRepository
+from src.data.repositories.search_cache_repository import SearchCacheRepository
+from src.data.repositories.user_profile_repository import UserProfileRepository
+from src.data.write_behind import get_write_behind_writer, reset_write_behind_writer
+
+
+SESSION = "plan_session"
+
+# Steps allowed to read a whole table, with the reason they are off the chat path
+ALLOWED_FULL_SCANS = {
+    "ChatRepository.prune_cached_responses": "periodic cleanup; keeping the newest N rows walks the whole cache",
+    "CareTaskRepository.delete_finished_before": "periodic cleanup across all sessions",
+    "EmotionAnalysisRepository.rebuild_trends[all]": "full rebuild after a backfill, replays every analysis",
+    "SearchCacheRepository.cleanup_expired_cache": "periodic cleanup across all locations",
+    "SearchCacheRepository.get_cache_stats": "admin statistics over the whole cache",
+    "SearchCacheRepository.get_recent_searches": "admin listing across all locations",
+    "UserProfileRepository.get_all_profiles_count": "admin statistics over all users",
+    "UserProfileRepository.get_top_levels": "admin leaderboard over all users",
+}
+
+_SKIPPED_STATEMENT = re.compile(r"^\s*(BEGIN|COMMIT|ROLLBACK|PRAGMA|SAVEPOINT|RELEASE|SELECT 1\s*$)", re.I)
+_TABLE_ACCESS = re.compile(r"^(SCAN|SEARCH) (\w+)")
+
+
+def _analysis(message_id, created_at, emotion="焦虑"):
+    return (SESSION, message_id, emotion, 6.0, -0.5, 0.6, "[]", 0.8, "[]", "validation", created_at)
+
+
+def _workload():
+    """步骤名 -> 调用；步骤名以 "类名.方法名" 开头，同一方法的不同分支用 [...] 区分"""
+    chat = ChatRepository()
+    care = CareTaskRepository()
+    summaries = ConversationSummaryRepository()
+    emotions = EmotionAnalysisRepository()
+    search = SearchCacheRepository()
+    profiles = UserProfileRepository()
+    now = datetime.now()
+
+    return {
+        "ChatRepository.add_message": lambda: chat.add_message(SESSION, "user", "今天考试好紧张"),
+        "ChatRepository.queue_message": lambda: chat.queue_message(SESSION, "assistant", "抱抱你"),
+        "ChatRepository.get_history": lambda: chat.get_history(SESSION, limit=10),
+        "ChatRepository.get_history_page": lambda: chat.get_history_page(SESSION, limit=10),
+        "ChatRepository.get_history_page[cursor]": lambda: chat.get_history_page(
+            SESSION, limit=10, cursor=encode_history_cursor(50)
+        ),
+        "ChatRepository.get_message_count": lambda: chat.get_message_count(SESSION),
+        "ChatRepository.get_recent_context": lambda: chat.get_recent_context(SESSION, 6, after_id=10),
+        "ChatRepository.get_messages_after": lambda: chat.get_messages_after(SESSION, 100),
+        "ChatRepository.get_last_message_timestamp": lambda: chat.get_last_message_timestamp(SESSION),
+        "ChatRepository.get_last_message_id": lambda: chat.get_last_message_id(SESSION),
+        "ChatRepository.get_last_message_id[role]": lambda: chat.get_last_message_id(SESSION, role="user"),
+        "ChatRepository.get_user_messages_after": lambda: chat.get_user_messages_after(100, limit=50),
+        "ChatRepository.add_core_memory": lambda: chat.add_core_memory(SESSION, "event", "下周要考试"),
+        "ChatRepository.get_core_memories_after": lambda: chat.get_core_memories_after(SESSION, 5),
+        "ChatRepository.get_core_memories_by_ids": lambda: chat.get_core_memories_by_ids(SESSION, [1, 2, 3]),
+        "ChatRepository.get_messages_by_ids": lambda: chat.get_messages_by_ids(SESSION, [1, 2, 3]),
+        "ChatRepository.get_core_memories": lambda: chat.get_core_memories(SESSION, limit=5),
+        "ChatRepository.add_treasure": lambda: chat.add_treasure(SESSION, "poem", "一首小诗"),
+        "ChatRepository.get_treasures": lambda: chat.get_treasures(SESSION),
+        "ChatRepository.save_cached_response": lambda: chat.save_cached_response("hash-1", "model", {"ok": 1}),
+        "ChatRepository.get_cached_response": lambda: chat.get_cached_response("hash-1", "model"),
+        "ChatRepository.prune_cached_responses": lambda: chat.prune_cached_responses(3600, 100),
+
+        "CareTaskRepository.add_task": lambda: care.add_task(
+            SESSION, "emotion_followup", "考试", "考得怎么样？", now - timedelta(minutes=1), "high"
+        ),
+        "CareTaskRepository.get_pending_tasks": lambda: care.get_pending_tasks(SESSION, now),
+        "CareTaskRepository.mark_completed": lambda: care.mark_completed(1, now),
+        "CareTaskRepository.delete_finished_before": lambda: care.delete_finished_before(now - timedelta(days=30)),
+        "CareTaskRepository.count_tasks_since": lambda: care.count_tasks_since(
+            SESSION, "regular_care", now - timedelta(days=7)
+        ),
+        "CareTaskRepository.count_messages_since": lambda: care.count_messages_since(
+            SESSION, now - timedelta(days=14)
+        ),
+
+        "ConversationSummaryRepository.add_summary": lambda: summaries.add_summary(SESSION, "摘要", 40, 40),
+        "ConversationSummaryRepository.get_latest_summary": lambda: summaries.get_latest_summary(SESSION),
+
+        "EmotionAnalysisRepository.save_analysis": lambda: emotions.save_analysis(_analysis(200, now)),
+        "EmotionAnalysisRepository.replace_analyses": lambda: emotions.replace_analyses(
+            [_analysis(201, now), _analysis(202, now, "平静")]
+        ),
+        "EmotionAnalysisRepository.update_trends": lambda: emotions.update_trends(SESSION, "焦虑", 6.0, -0.5, 0.6),
+        "EmotionAnalysisRepository.get_trend_buckets": lambda: emotions.get_trend_buckets(
+            SESSION, "daily", now - timedelta(days=7)
+        ),
+        "EmotionAnalysisRepository.get_analyses_since": lambda: emotions.get_analyses_since(
+            SESSION, now - timedelta(days=7)
+        ),
+        "EmotionAnalysisRepository.rebuild_trends": lambda: emotions.rebuild_trends([SESSION]),
+        "EmotionAnalysisRepository.rebuild_trends[all]": lambda: emotions.rebuild_trends(),
+        "EmotionAnalysisRepository.save_empathy_response": lambda: emotions.save_empathy_response(
+            SESSION, 1, "comfort", "gentle", '["我懂你"]'
+        ),
+
+        "SearchCacheRepository.save_search_result": lambda: search.save_search_result("咖啡", "北京", {"a": 1}),
+        "SearchCacheRepository.get_cached_result": lambda: search.get_cached_result("咖啡", "北京"),
+        "SearchCacheRepository.get_cache_by_location": lambda: search.get_cache_by_location("北京"),
+        "SearchCacheRepository.update_cache_expiry": lambda: search.update_cache_expiry(
+            "咖啡_北京", now + timedelta(hours=1)
+        ),
+        "SearchCacheRepository.get_recent_searches": lambda: search.get_recent_searches(),
+        "SearchCacheRepository.get_cache_stats": lambda: search.get_cache_stats(),
+        "SearchCacheRepository.delete_cache_entry": lambda: search.delete_cache_entry("咖啡_北京"),
+        "SearchCacheRepository.cleanup_expired_cache": lambda: search.cleanup_expired_cache(),
+        "SearchCacheRepository.clear_all_cache": lambda: search.clear_all_cache(),
+
+        "UserProfileRepository.find_or_create_profile": lambda: profiles.find_or_create_profile(SESSION),
+        "UserProfileRepository.get_profile": lambda: profiles.get_profile(SESSION),
+        "UserProfileRepository.update_profile": lambda: profiles.update_profile(SESSION, 2, 30),
+        "UserProfileRepository.update_profile[interactions]": lambda: profiles.update_profile(SESSION, 2, 30, 5),
+        "UserProfileRepository.increment_interactions": lambda: profiles.increment_interactions(SESSION),
+        "UserProfileRepository.add_exp": lambda: profiles.add_exp(SESSION, 15),
+        "UserProfileRepository.get_level_stats": lambda: profiles.get_level_stats(SESSION),
+        "UserProfileRepository.get_all_profiles_count": lambda: profiles.get_all_profiles_count(),
+        "UserProfileRepository.get_top_levels": lambda: profiles.get_top_levels(),
+    }
+
+
+def _seed(db_path):
+    """每张表放几个会话的数据，让计划里的查找真正命中记录"""
+    now = datetime.now()
+    conn = sqlite3.connect(db_path)
+    with conn:
+        for index in range(300):
+            session_id = SESSION if index % 3 == 0 else f"other_{index % 3}"
+            timestamp = now - timedelta(minutes=300 - index)
+            conn.execute(
+                "INSERT INTO chat_history (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+                (session_id, "user" if index % 2 == 0 else "assistant", f"消息{index}", timestamp)
+            )
+            conn.execute(
+                "INSERT INTO core_memories (session_id, memory_type, content, timestamp) VALUES (?, ?, ?, ?)",
+                (session_id, "event", f"记忆{index}", timestamp)
+            )
+            conn.execute(
+                f"INSERT INTO emotion_analysis "
+                f"({', '.join(EmotionAnalysisRepository.ANALYSIS_COLUMNS)}) VALUES ({', '.join('?' * 11)})",
+                (session_id, *_analysis(index + 1, timestamp)[1:])
+            )
+            conn.execute(
+                "INSERT INTO scheduled_care (session_id, care_type, trigger_content, care_message, "
+                "scheduled_time, status, priority) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (session_id, "emotion_followup", "考试", "考得怎么样？", timestamp.isoformat(),
+                 "pending" if index % 4 else "completed", ("high", "medium", "low")[index % 3])
+            )
+            conn.execute(
+                "INSERT INTO ai_cache (input_hash, model, response) VALUES (?, ?, ?)",
+                (f"hash{index}", "model", "{}")
+            )
+    conn.close()
+
+
+def _plan_problems(conn, sql):
+    """EXPLAIN QUERY PLAN 中扫描整张表、或对表中的行用临时B树排序的步骤"""
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+    problems = []
+    for node_id, parent, _, detail in rows:
+        access = _TABLE_ACCESS.match(detail)
+        if access and access.group(1) == "SCAN" and access.group(2) in tables:
+            problems.append(detail)
+        elif detail.startswith("USE TEMP B-TREE"):
+            # 只关心排序的是表中的行（同一层的兄弟节点访问了真实的表），json_each等小集合排序不算
+            siblings = [d for _, p, _, d in rows if p == parent and _TABLE_ACCESS.match(d)]
+            if any(_TABLE_ACCESS.match(d).group(2) in tables for d in siblings):
+                problems.append(detail)
+    return problems
+
+
+@pytest.fixture
+def traced_statements(temp_db):
+    """每次新建的池连接和写连接都会把执行的SQL（参数已展开）记录下来"""
+    statements = []
+    real_connect = connection_pool.connect
+
+    def traced_connect(database_path, query_only=False):
+        conn = real_connect(database_path, query_only=query_only)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    _seed(temp_db)
+    reset_write_behind_writer()
+    reset_connection_pool()
+    with patch.object(connection_pool, "connect", traced_connect):
+        yield statements
+        get_write_behind_writer().flush()
+    reset_write_behind_writer()
+    reset_connection_pool()
+
+
+def _run_workload(statements):
+    """依次执行每个步骤，返回 步骤名 -> 该步骤执行的SQL"""
+    issued = {}
+    writer = get_write_behind_writer()
+    for step, call in _workload().items():
+        statements.clear()
+        call()
+        writer.flush()
+        issued[step] = [sql for sql in statements if not _SKIPPED_STATEMENT.match(sql)]
+    return issued
+
+
+@pytest.mark.unit
+class TestQueryPlans:
+    """EXPLAIN QUERY PLAN checks for every repository query"""
+
+    def test_workload_covers_every_repository_method(self):
+        public_methods = set()
+        for module_info in pkgutil.iter_modules(repositories_package.__path__):
+            module = importlib.import_module(f"{repositories_package.__name__}.{module_info.name}")
+            for _, cls in inspect.getmembers(module, inspect.isclass):
+                if not issubclass(cls, BaseRepository) or cls is BaseRepository or cls.__module__ != module.__name__:
+                    continue
+                public_methods.update(
+                    f"{cls.__name__}.{name}" for name, member in vars(cls).items()
+                    if callable(member) and not name.startswith("_")
+                )
+
+        covered = {step.split("[")[0] for step in _workload()}
+        assert public_methods - covered == set()
+        assert covered - public_methods == set()
+        assert {step for step in ALLOWED_FULL_SCANS} <= set(_workload())
+
+    def test_queries_use_indexes(self, temp_db, traced_statements):
+        issued = _run_workload(traced_statements)
+        assert all(issued.values()), [step for step, sqls in issued.items() if not sqls]
+
+        failures, scanning_steps = [], set()
+        conn = sqlite3.connect(temp_db)
+        connection_pool.register_sql_functions(conn)
+        try:
+            for step, sqls in issued.items():
+                for sql in dict.fromkeys(sqls):
+                    problems = _plan_problems(conn, sql)
+                    if problems:
+                        scanning_steps.add(step)
+                        if step not in ALLOWED_FULL_SCANS:
+                            failures.append(f"{step}: {problems}\n    {' '.join(sql.split())}")
+        finally:
+            conn.close()
+
+        assert not failures, "\n".join(failures)
+        # Allowlist entries whose queries became indexed should be removed
+        assert set(ALLOWED_FULL_SCANS) - scanning_steps == set()
+
+    def test_pending_care_tasks_ordered_by_priority(self, temp_db):
+        care = CareTaskRepository()
+        due = datetime.now() - timedelta(minutes=5)
+        for minutes, priority in ((3, "low"), (2, "medium"), (1, "high"), (0, "medium")):
+            assert care.add_task("priority_session", "emotion_followup", "考试", priority,
+                                 due + timedelta(minutes=minutes), priority)
+
+        pending = care.get_pending_tasks("priority_session", datetime.now())
+
+        assert [task["priority"] for task in pending] == ["high", "medium", "medium", "low"]
+        assert pending[1]["scheduled_time"] < pending[2]["scheduled_time"]
@@ -0,0 +1,292 @@
+"""
+Unit tests for pooled connection handles and the chat history/emotion/care repositories
+"""
+
+import math
+import random
+from datetime import datetime, timedelta
+import pytest
+from src.core.background_tasks import get_background_queue
+from src.data.connection_pool import PooledConnectionError
+from src.data.database import get_db_connection, get_db_write_transaction
+from src.data.repositories.care_task_repository import CareTaskRepository
+from src.data.repositories.emotion_analysis_repository import EmotionAnalysisRepository
+from src.services.care_scheduler_service import CareSchedulerService, CareType
+from src.services.emotion_analysis_service import EmotionAnalysisService
+
+
+@pytest.mark.unit
+class TestPooledConnection:
+    """Test cases for pooled connection handles"""
+
+    def test_close_is_rejected(self, temp_db):
+        with get_db_connection() as conn:
+            with pytest.raises(PooledConnectionError):
+                conn.close()
+            # The connection is still usable after the rejected close
+            assert conn.execute("SELECT 1").fetchone()[0] == 1
+
+    def test_handle_is_invalid_after_block(self, temp_db):
+        with get_db_connection() as conn:
+            pass
+
+        with pytest.raises(PooledConnectionError):
+            conn.cursor()
+
+
+@pytest.mark.unit
+class TestChatHistoryPagination:
+    """Test cases for id-ordered history and keyset pagination"""
+
+    def _add_messages_with_same_timestamp(self, session_id, count):
+        with get_db_write_transaction() as conn:
+            conn.executemany(
+                "INSERT INTO chat_history (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+                [(session_id, "user" if index % 2 == 0 else "assistant", f"消息{index}", "2024-01-01 12:00:00")
+                 for index in range(count)]
+            )
+
+    def test_history_is_ordered_by_id_when_timestamps_tie(self, chat_repository):
+        self._add_messages_with_same_timestamp("tie_session", 6)
+
+        assert [content for _, content, _ in chat_repository.get_history("tie_session", limit=3)] == [
+            "消息3", "消息4", "消息5"
+        ]
+        assert [content for _, content in chat_repository.get_recent_context("tie_session", context_turns=1)] == [
+            "消息4", "消息5"
+        ]
+
+    def test_pages_walk_back_through_the_whole_session(self, chat_repository):
+        self._add_messages_with_same_timestamp("page_session", 25)
+        self._add_messages_with_same_timestamp("other_session", 5)
+
+        contents, cursor, pages = [], None, 0
+        while True:
+            page = chat_repository.get_history_page("page_session", limit=10, cursor=cursor)
+            contents[:0] = [content for _, content, _ in page.messages]
+            pages += 1
+            if not page.has_more:
+                break
+            cursor = page.next_cursor
+
+        assert pages == 3
+        assert contents == [f"消息{index}" for index in range(25)]
+        assert chat_repository.get_history_page("empty_session").messages == []
+
+    def test_invalid_cursor_is_rejected(self, chat_repository):
+        for cursor in ("not-a-cursor", "aDE6YWJj", "!!"):
+            with pytest.raises(ValueError):
+                chat_repository.get_history_page("page_session", cursor=cursor)
+
+
+@pytest.mark.unit
+class TestEmotionAnalysisRepository:
+    """Test cases for emotion analysis persistence"""
+
+    def test_analysis_is_persisted(self, temp_db):
+        service = EmotionAnalysisService()
+
+        service.analyze_emotion("今天好开心，考试通过了！", "emotion_session", 1)
+        assert get_background_queue().join(timeout=5.0)
+
+        rows = EmotionAnalysisRepository().get_analyses_since(
+            "emotion_session", datetime.now() - timedelta(hours=1)
+        )
+        assert len(rows) == 1
+        assert service.get_emotion_trends("emotion_session")["total_emotions"] == 1
+
+    def test_empathy_response_is_persisted(self, temp_db):
+        service = EmotionAnalysisService()
+
+        assert service.save_empathy_response("emotion_session", 1, "validation", "warm", ["我懂你"])
+
+        with get_db_connection() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM empathy_responses").fetchone()[0]
+        assert count == 1
+
+
+@pytest.mark.unit
+class TestCareTaskRepository:
+    """Test cases for care task persistence"""
+
+    def _task(self, scheduled_time):
+        return {
+            'session_id': 'care_session',
+            'care_type': CareType.EMOTION_FOLLOWUP,
+            'trigger_content': '考试好紧张',
+            'care_message': '考试怎么样啦？',
+            'scheduled_time': scheduled_time,
+            'priority': 'high'
+        }
+
+    def test_schedule_and_complete_task(self, temp_db):
+        service = CareSchedulerService()
+
+        assert service.schedule_care_task(self._task(datetime.now() - timedelta(minutes=1)))
+        assert service.schedule_care_task(self._task(datetime.now() + timedelta(days=1)))
+
+        pending = service.get_pending_care_tasks('care_session')
+        assert len(pending) == 1
+        assert pending[0]['care_message'] == '考试怎么样啦？'
+
+        assert service.mark_care_task_completed(pending[0]['id'])
+        assert service.get_pending_care_tasks('care_session') == []
+
+    def test_regular_care_only_created_once_per_week(self, temp_db):
+        service = CareSchedulerService()
+
+        assert service.create_regular_care_task('care_session') is not None
+        assert service.create_regular_care_task('care_session') is None
+        assert CareTaskRepository().count_tasks_since(
+            'care_session', CareType.REGULAR_CARE, datetime.now() - timedelta(days=1)
+        ) == 1
+
+
+def _full_scan_trends(rows):
+    """Reference trend computed from raw (emotion, intensity, valence, arousal) rows"""
+    intensities = [row[1] for row in rows]
+    valences = [row[2] for row in rows]
+    avg_intensity = sum(intensities) / len(intensities)
+    variance = sum((x - avg_intensity) ** 2 for x in intensities) / len(intensities)
+    counts = {}
+    for row in rows:
+        counts[row[0]] = counts.get(row[0], 0) + 1
+    if len(valences) >= 3:
+        recent = sum(valences[-3:]) / 3
+        earlier = sum(valences[:-3]) / len(valences[:-3]) if len(valences) > 3 else sum(valences) / len(valences)
+        direction = "improving" if recent > earlier + 0.1 else "declining" if recent < earlier - 0.1 else "stable"
+    else:
+        direction = "stable"
+    return {
+        "avg_intensity": avg_intensity,
+        "avg_valence": sum(valences) / len(valences),
+        "avg_arousal": sum(row[3] for row in rows) / len(rows),
+        "dominant_emotion": max(counts, key=counts.get),
+        "emotion_volatility": min(math.sqrt(variance) / 10.0, 1.0),
+        "trend_direction": direction,
+        "total_emotions": len(rows),
+    }
+
+
+@pytest.mark.unit
+class TestEmotionTrends:
+    """Test cases for incrementally materialized emotion trends"""
+
+    EMOTIONS = ["joy", "sadness", "anxiety", "neutral"]
+
+    def _record_analyses(self, repo, session_id, count, seed=7):
+        rng = random.Random(seed)
+        now = datetime.now()
+        rows = []
+        for offset in sorted((rng.uniform(0, 4 * 24 * 60) for _ in range(count)), reverse=True):
+            row = (
+                rng.choice(self.EMOTIONS), rng.uniform(0, 10), rng.uniform(-1, 1),
+                rng.uniform(0, 1), now - timedelta(minutes=offset)
+            )
+            rows.append(row)
+            repo.update_trends(session_id, *row)
+        return rows
+
+    def test_daily_trend_matches_full_scan(self, temp_db):
+        repo = EmotionAnalysisRepository()
+        rows = self._record_analyses(repo, "trend_session", 200)
+
+        trends = EmotionAnalysisService(repo).get_emotion_trends("trend_session", "daily")
+        expected = _full_scan_trends(rows)
+
+        assert trends["total_emotions"] == expected["total_emotions"]
+        assert trends["dominant_emotion"] == expected["dominant_emotion"]
+        assert trends["trend_direction"] == expected["trend_direction"]
+        for key in ("avg_intensity", "avg_valence", "avg_arousal", "emotion_volatility"):
+            assert trends[key] == pytest.approx(round(expected[key], 2), abs=0.011)
+
+    def test_bucket_rows_are_materialized(self, temp_db):
+        repo = EmotionAnalysisRepository()
+        rows = self._record_analyses(repo, "trend_session", 120)
+
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        expected = _full_scan_trends([row for row in rows if row[4] >= today])
+        buckets = repo.get_trend_buckets("trend_session", "daily", today)
+        assert len(buckets) == 1
+        assert buckets[0][2] == expected["total_emotions"]
+
+        with get_db_connection() as conn:
+            stored = conn.execute('''
+                SELECT dominant_emotion, emotion_volatility, trend_direction, avg_intensity
+                FROM emotion_trends WHERE session_id = ? AND time_period = 'daily' AND start_time = ?
+            ''', ("trend_session", today.strftime("%Y-%m-%d %H:%M:%S"))).fetchone()
+            periods = {row[0] for row in conn.execute("SELECT time_period FROM emotion_trends")}
+        assert stored[0] == expected["dominant_emotion"]
+        assert stored[1] == pytest.approx(expected["emotion_volatility"])
+        assert stored[2] == expected["trend_direction"]
+        assert stored[3] == pytest.approx(expected["avg_intensity"])
+        assert periods == {"hourly", "daily", "weekly"}
+
+    def test_rebuild_matches_incremental(self, temp_db):
+        service = EmotionAnalysisService()
+        for text in ["今天好开心", "有点难过", "好焦虑啊", "还不错", "超级开心!!"]:
+            service.analyze_emotion(text, "trend_session", 1)
+        assert get_background_queue().join(timeout=5.0)
+        incremental = service.get_emotion_trends("trend_session", "hourly")
+
+        assert EmotionAnalysisRepository().rebuild_trends()
+        rebuilt = service.get_emotion_trends("trend_session", "hourly")
+
+        incremental.pop("end_time")
+        rebuilt.pop("end_time")
+        assert rebuilt == incremental
+        assert incremental["total_emotions"] == 5
+
+    def test_no_trend_without_analyses(self, temp_db):
+        assert EmotionAnalysisService().get_emotion_trends("empty_session") is None
+
+
+@pytest.mark.unit
+class TestEmotionBatchAnalysis:
+    """Test cases for vectorized batch analysis and the backfill tool"""
+
+    TEXTS = [
+        "我今天超级开心呀!!",
+        "工作压力太大，每天都睡不着觉，好焦虑",
+        "谢谢你一直陪着我 😊",
+        "今天天气一般",
+        "好开心又有点紧张，明天考试?",
+    ]
+
+    def test_batch_matches_single_analysis(self, temp_db):
+        service = EmotionAnalysisService()
+
+        batch = service.analyze_batch(self.TEXTS)
+
+        for text, batch_result in zip(self.TEXTS, batch):
+            single = service.analyze_emotion(text, "batch_session", 1)
+            assert batch_result.primary_emotion == single.primary_emotion
+            assert batch_result.emotion_intensity == pytest.approx(single.emotion_intensity)
+            assert batch_result.emotion_valence == pytest.approx(single.emotion_valence)
+            assert batch_result.emotion_arousal == pytest.approx(single.emotion_arousal)
+            assert batch_result.confidence_score == pytest.approx(single.confidence_score)
+            assert batch_result.trigger_keywords == single.trigger_keywords
+            assert [e for e, _ in batch_result.secondary_emotions] == [e for e, _ in single.secondary_emotions]
+            assert batch_result.empathy_strategy == single.empathy_strategy
+            assert batch_result.response_tone == single.response_tone
+
+    def test_backfill_replaces_existing_analyses(self, temp_db):
+        from src.data.repositories.chat_repository import ChatRepository
+        from src.tools.backfill_emotion_analysis import backfill
+
+        chat_repo = ChatRepository()
+        message_ids = [chat_repo.add_message("backfill_session", "user", text) for text in self.TEXTS]
+        chat_repo.add_message("backfill_session", "assistant", "小念在呢")
+        EmotionAnalysisService().analyze_emotion(self.TEXTS[0], "backfill_session", message_ids[0])
+        assert get_background_queue().join(timeout=5.0)
+
+        stats = backfill(chunk_size=2, workers=0)
+
+        assert stats["messages"] == len(self.TEXTS)
+        assert stats["chunks"] == 3
+        with get_db_connection() as conn:
+            rows = conn.execute(
+                "SELECT message_id, primary_emotion FROM emotion_analysis ORDER BY message_id"
+            ).fetchall()
+        assert [row[0] for row in rows] == message_ids
+        assert rows[0][1] == "joy"
@@ -0,0 +1,157 @@
+"""
+Unit tests for the AI response cache
+"""
+
+import json
+import sqlite3
+import pytest
+from datetime import datetime
+from src.services.response_cache_service import ResponseCacheService, normalize_input, intimacy_bucket
+
+
+RESPONSE = {
+    "mood_category": "温暖",
+    "sprite_reaction": "不客气呀~ 小念最喜欢帮你啦！",
+    "gift_type": "元气咒语",
+    "gift_content": "✨ 今天也要开心 ✨"
+}
+
+
+@pytest.fixture
+def response_cache(chat_repository):
+    return ResponseCacheService(chat_repo=chat_repository, ttl_seconds=3600,
+                                max_entries=100, max_input_length=12)
+
+
+@pytest.mark.unit
+class TestResponseCacheService:
+    """Test cases for ResponseCacheService"""
+
+    def test_normalize_input(self):
+        assert normalize_input("谢谢！") == "谢谢"
+        assert normalize_input(" 谢谢~~ ") == "谢谢"
+        assert normalize_input("Hi, there!") == "hithere"
+
+    def test_only_short_messages_are_cacheable(self, response_cache):
+        assert response_cache.is_cacheable("早上好呀~")
+        assert not response_cache.is_cacheable("今天和同事吵架了，心情很糟糕，不知道该怎么办")
+        assert not response_cache.is_cacheable("！！！")
+
+    def test_key_components(self, response_cache):
+        key = response_cache.build_key("session", "谢谢！", "heart_catcher", 1, "平静")
+
+        assert response_cache.build_key("session", "谢谢~", "heart_catcher", 2, "平静") == key
+        assert response_cache.build_key("session", "谢谢", "heart_catcher", 5, "平静") != key
+        assert response_cache.build_key("session", "谢谢", "heart_catcher", 1, "开心") != key
+        assert response_cache.build_key("session", "谢谢", "emotion_stream", 1, "平静") != key
+        assert response_cache.build_key("other_session", "谢谢", "heart_catcher", 1, "平静") != key
+        assert intimacy_bucket(1) == intimacy_bucket(2) != intimacy_bucket(3)
+
+    def test_hit_and_miss_stats(self, response_cache):
+        key = response_cache.build_key("session", "谢谢", "heart_catcher", 1, "平静")
+
+        assert response_cache.get(key, "deepseek-chat") is None
+        response_cache.put(key, "deepseek-chat", RESPONSE)
+        assert response_cache.get(key, "deepseek-chat") == RESPONSE
+        # Same key for another model is a separate entry
+        assert response_cache.get(key, "deepseek-reasoner") is None
+
+        stats = response_cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 2
+
+    def test_replace_keeps_single_row(self, response_cache, temp_db):
+        key = response_cache.build_key("session", "谢谢", "heart_catcher", 1, "平静")
+        response_cache.put(key, "deepseek-chat", RESPONSE)
+        response_cache.put(key, "deepseek-chat", dict(RESPONSE, sprite_reaction="新的回应"))
+
+        conn = sqlite3.connect(temp_db)
+        try:
+            count = conn.execute("SELECT COUNT(*) FROM ai_cache").fetchone()[0]
+        finally:
+            conn.close()
+        assert count == 1
+        assert response_cache.get(key, "deepseek-chat")["sprite_reaction"] == "新的回应"
+
+    def test_expired_entries_miss_and_are_pruned(self, response_cache, chat_repository, temp_db):
+        key = response_cache.build_key("session", "晚安", "heart_catcher", 1, "平静")
+        conn = sqlite3.connect(temp_db)
+        try:
+            conn.execute(
+                "INSERT INTO ai_cache (input_hash, model, response, created_at) VALUES (?, ?, ?, datetime('now', '-2 hours'))",
+                (key, "deepseek-chat", json.dumps(RESPONSE))
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+        assert response_cache.get(key, "deepseek-chat") is None
+        assert chat_repository.prune_cached_responses(ttl_seconds=3600, max_entries=100)
+
+        conn = sqlite3.connect(temp_db)
+        try:
+            assert conn.execute("SELECT COUNT(*) FROM ai_cache").fetchone()[0] == 0
+        finally:
+            conn.close()
+
+    def test_prune_enforces_size_cap(self, response_cache, chat_repository, temp_db):
+        for index in range(5):
+            response_cache.put(f"key-{index}", "deepseek-chat", RESPONSE)
+
+        chat_repository.prune_cached_responses(ttl_seconds=3600, max_entries=2)
+
+        conn = sqlite3.connect(temp_db)
+        try:
+            remaining = [row[0] for row in conn.execute("SELECT input_hash FROM ai_cache ORDER BY id")]
+        finally:
+            conn.close()
+        assert remaining == ["key-3", "key-4"]
+
+
+@pytest.mark.unit
+class TestAIEngineResponseCache:
+    """Repeated short messages skip the LLM"""
+
+    def test_repeated_greeting_uses_cache(self, temp_db):
+        from langchain_core.language_models.fake_chat_models import FakeListChatModel
+        from src.core.ai_engine import AIEngine
+
+        engine = AIEngine("sk-test-key")
+        engine.llm = FakeListChatModel(responses=[json.dumps(RESPONSE, ensure_ascii=False)] * 3)
+
+        first = engine.get_heart_catcher_response("谢谢！", [], "session", datetime.now(), intimacy_level=1)
+        second = engine.get_heart_catcher_response("谢谢~", [], "session", datetime.now(), intimacy_level=2)
+
+        assert first["sprite_reaction"] == second["sprite_reaction"]
+        assert engine.llm.i == 1
+        assert engine.get_response_cache_stats()["hits"] == 1
+
+    def test_long_messages_are_not_cached(self, temp_db):
+        from langchain_core.language_models.fake_chat_models import FakeListChatModel
+        from src.core.ai_engine import AIEngine
+
+        engine = AIEngine("sk-test-key")
+        engine.llm = FakeListChatModel(responses=[json.dumps(RESPONSE, ensure_ascii=False)] * 3)
+        message = "今天和同事一起去爬山，风景特别好，回来的路上还看到了彩虹"
+
+        engine.get_heart_catcher_response(message, [], "session", datetime.now())
+        engine.get_heart_catcher_response(message, [], "session", datetime.now())
+
+        assert engine.llm.i == 2
+
+    def test_cached_reply_is_not_shared_across_sessions(self, temp_db):
+        from langchain_core.language_models.fake_chat_models import FakeListChatModel
+        from src.core.ai_engine import AIEngine
+
+        engine = AIEngine("sk-test-key")
+        personal = dict(RESPONSE, memory_association="你上次说下周要考试")
+        engine.llm = FakeListChatModel(responses=[
+            json.dumps(personal, ensure_ascii=False)] + [json.dumps(RESPONSE, ensure_ascii=False)] * 2
+        )
+
+        engine.get_heart_catcher_response("谢谢！", [], "session_a", datetime.now())
+        other = engine.get_heart_catcher_response("谢谢！", [], "session_b", datetime.now())
+
+        assert engine.llm.i == 2
+        assert other["memory_association"] != "你上次说下周要考试"
+        assert engine.get_response_cache_stats()["hits"] == 0
@@ -0,0 +1,81 @@
+"""
+Unit tests for the incremental JSON field extractor
+"""
+
+import json
+import random
+import pytest
+from src.utils.stream_parser import IncrementalJSONFieldExtractor
+
+
+RESPONSE = {
+    "mood_category": "温暖",
+    "memory_association": None,
+    "sprite_reaction": "小念听到啦~ \"慢慢来\" 就好\n换行也没关系 😊",
+    "emotional_resonance": "每一步都算数",
+    "gift_type": "元气咒语",
+    "gift_content": "✨ 加油 ✨"
+}
+
+
+def _feed_all(extractor, text, chunk_sizes):
+    streamed = ""
+    position = 0
+    for size in chunk_sizes:
+        streamed += extractor.feed(text[position:position + size])
+        position += size
+    streamed += extractor.feed(text[position:])
+    return streamed
+
+
+@pytest.mark.unit
+class TestIncrementalJSONFieldExtractor:
+    """Test cases for IncrementalJSONFieldExtractor"""
+
+    @pytest.mark.parametrize("ensure_ascii", [False, True])
+    def test_random_chunking_matches_full_parse(self, ensure_ascii):
+        """Any chunk boundary (including inside escapes) yields the same text"""
+        text = json.dumps(RESPONSE, ensure_ascii=ensure_ascii)
+        rng = random.Random(42)
+
+        for _ in range(50):
+            extractor = IncrementalJSONFieldExtractor()
+            sizes = [rng.randint(1, 6) for _ in range(len(text) // 3)]
+            streamed = _feed_all(extractor, text, sizes)
+
+            assert streamed == RESPONSE["sprite_reaction"]
+            assert extractor.finish() == RESPONSE
+
+    def test_collects_other_fields(self):
+        """Non-streamed fields are collected once their strings close"""
+        extractor = IncrementalJSONFieldExtractor()
+        extractor.feed(json.dumps(RESPONSE, ensure_ascii=False))
+
+        assert extractor.fields["gift_type"] == "元气咒语"
+        assert extractor.fields["memory_association"] is None
+
+    def test_code_fence_is_ignored(self):
+        """Models sometimes wrap JSON in a markdown fence"""
+        text = "```json\n" + json.dumps(RESPONSE, ensure_ascii=False) + "\n```"
+        extractor = IncrementalJSONFieldExtractor()
+
+        assert extractor.feed(text) == RESPONSE["sprite_reaction"]
+        assert extractor.finish()["gift_content"] == "✨ 加油 ✨"
+
+    def test_truncated_stream_keeps_partial_fields(self):
+        """A stream cut off by max_tokens still returns what was received"""
+        text = json.dumps(RESPONSE, ensure_ascii=False)
+        cut = text.index("小念听到啦") + 3
+        extractor = IncrementalJSONFieldExtractor()
+        extractor.feed(text[:cut])
+
+        result = extractor.finish()
+        assert result["mood_category"] == "温暖"
+        assert result["sprite_reaction"] == "小念听"
+
+    def test_non_json_output(self):
+        """Plain text produces no streamed content and no fields"""
+        extractor = IncrementalJSONFieldExtractor()
+
+        assert extractor.feed("💖 小念遇到了网络问题") == ""
+        assert extractor.finish() == {}
@@ -0,0 +1,96 @@
+"""
+Unit tests for concurrent turn orchestration and the background task queue
+"""
+
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from src.core.background_tasks import BackgroundTaskQueue
+from src.services.turn_orchestrator import TurnOrchestrator
+
+
+@pytest.mark.unit
+class TestBackgroundTaskQueue:
+    """Test cases for BackgroundTaskQueue"""
+
+    def test_tasks_run_in_order_off_thread(self):
+        task_queue = BackgroundTaskQueue()
+        calls = []
+
+        for index in range(5):
+            task_queue.submit("record", lambda i=index: calls.append((i, threading.current_thread().name)))
+
+        assert task_queue.join(timeout=5.0)
+        assert [i for i, _ in calls] == list(range(5))
+        assert all(name == "mind-sprite-background" for _, name in calls)
+        assert task_queue.get_stats()["completed"] == 5
+
+    def test_failures_are_counted_and_do_not_stop_worker(self):
+        task_queue = BackgroundTaskQueue()
+        calls = []
+
+        task_queue.submit("boom", lambda: 1 / 0)
+        task_queue.submit("ok", lambda: calls.append("ok"))
+
+        assert task_queue.join(timeout=5.0)
+        assert calls == ["ok"]
+        assert task_queue.get_stats()["failed"] == 1
+
+    def test_disabled_queue_runs_inline(self):
+        task_queue = BackgroundTaskQueue()
+        calls = []
+
+        with patch.dict('os.environ', {'BACKGROUND_TASKS_ENABLED': 'false'}):
+            assert not task_queue.submit("inline", lambda: calls.append(threading.current_thread().name))
+
+        assert calls == [threading.current_thread().name]
+
+
+@pytest.mark.unit
+class TestTurnOrchestrator:
+    """Pre-LLM context is fetched concurrently"""
+
+    def test_gather_context_runs_concurrently(self, mock_ai_engine, chat_repository, intimacy_service, sample_session_id):
+        delay = 0.2
+
+        def slow(value):
+            def inner(*args, **kwargs):
+                time.sleep(delay)
+                return value
+            return inner
+
+        mock_ai_engine.requires_structured_response.side_effect = slow(False)
+        mock_ai_engine.analyze_user_emotion.side_effect = slow({"primary_emotion": "joy"})
+        orchestrator = TurnOrchestrator(mock_ai_engine, chat_repository, intimacy_service)
+
+        with patch.object(chat_repository, 'get_core_memories', side_effect=slow([])), \
+                patch.object(chat_repository, 'get_recent_context', side_effect=slow([])):
+            start = time.perf_counter()
+            context = orchestrator.gather_context(
+                sample_session_id, "你好", 1, include_routing=True, include_emotion_analysis=True
+            )
+            elapsed = time.perf_counter() - start
+
+        assert context["requires_structured"] is False
+        assert context["emotion_analysis"] == {"primary_emotion": "joy"}
+        assert context["profile"]["intimacy_level"] == 1
+        # Four slow calls overlap instead of adding up
+        assert elapsed < delay * 3
+
+    def test_post_turn_writes_use_one_queue_each(self, mock_ai_engine, chat_repository, intimacy_service, sample_session_id):
+        """Plain inserts go straight to the write-behind queue, not through the background queue too"""
+        orchestrator = TurnOrchestrator(mock_ai_engine, chat_repository, intimacy_service)
+        gift_info = {"type": "元气咒语", "content": "✨ 加油 ✨"}
+
+        with patch('src.services.turn_orchestrator.run_in_background') as background, \
+                patch.object(chat_repository, 'add_treasure') as add_treasure, \
+                patch.object(intimacy_service, 'add_exp') as add_exp:
+            orchestrator.schedule_post_turn_writes(sample_session_id, "你好", gift_info, message_id=1)
+
+        add_treasure.assert_called_once_with(sample_session_id, "元气咒语", "✨ 加油 ✨")
+        scheduled = [call.args[0] for call in background.call_args_list]
+        assert "保存宝藏" not in scheduled
+        # EXP is written on the request path by ChatService, not fire-and-forget
+        add_exp.assert_not_called()
+        assert all(call.args[1] is not intimacy_service.add_exp for call in background.call_args_list)
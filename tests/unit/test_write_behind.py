@@ -0,0 +1,160 @@
+"""
+Unit tests for the write-behind batching writer
+"""
+
+import threading
+import pytest
+from unittest.mock import patch
+from src.data.database import get_db_connection
+from src.data.repositories.chat_repository import ChatRepository
+from src.data.repositories.user_profile_repository import UserProfileRepository
+from src.data.write_behind import WriteBehindWriter, get_write_behind_writer
+
+INSERT_MESSAGE = 'INSERT INTO chat_history (session_id, role, content) VALUES (?, ?, ?)'
+
+
+def _count_messages(session_id):
+    with get_db_connection() as conn:
+        return conn.execute(
+            'SELECT COUNT(*) FROM chat_history WHERE session_id = ?', (session_id,)
+        ).fetchone()[0]
+
+
+@pytest.mark.unit
+class TestWriteBehindWriter:
+    """Test cases for WriteBehindWriter"""
+
+    def test_writes_are_batched_into_few_transactions(self, temp_db):
+        writer = WriteBehindWriter(temp_db, batch_size=100, flush_interval=0.05)
+
+        for index in range(300):
+            writer.submit(INSERT_MESSAGE, ("batch_session", "user", f"消息{index}"), "batch_session")
+        assert writer.flush(timeout=5.0)
+        writer.close()
+
+        stats = writer.get_stats()
+        assert stats["committed"] == 300
+        assert stats["batches"] < 30
+        assert _count_messages("batch_session") == 300
+
+    def test_waiting_submit_returns_lastrowid(self, temp_db):
+        writer = WriteBehindWriter(temp_db, flush_interval=5.0)
+
+        ticket = writer.submit(INSERT_MESSAGE, ("id_session", "user", "你好"), "id_session",
+                               wait=True, timeout=2.0)
+        writer.close()
+
+        # A waiting writer is committed immediately rather than after the flush interval
+        assert ticket.done and ticket.error is None
+        assert ticket.lastrowid is not None
+
+    def test_failed_write_does_not_fail_its_batch(self, temp_db):
+        writer = WriteBehindWriter(temp_db, flush_interval=0.05)
+
+        good = writer.submit(INSERT_MESSAGE, ("fail_session", "user", "正常"), "fail_session")
+        bad = writer.submit('INSERT INTO missing_table VALUES (?)', (1,), "fail_session")
+        assert writer.flush(timeout=5.0)
+        writer.close()
+
+        assert good.wait(0) and not bad.wait(0)
+        assert writer.get_stats()["failed"] == 1
+        assert _count_messages("fail_session") == 1
+
+    def test_unavailable_db_writer_fails_batch_and_keeps_worker(self, temp_db):
+        writer = WriteBehindWriter(temp_db, flush_interval=0.05)
+
+        with patch.object(writer, '_db_writer', side_effect=RuntimeError("database is gone")):
+            lost = writer.submit(INSERT_MESSAGE, ("broken_session", "user", "丢失"), "broken_session")
+            # Pending counts are released, so session reads do not stall until the timeout
+            assert writer.flush("broken_session", timeout=2.0)
+        kept = writer.submit(INSERT_MESSAGE, ("broken_session", "user", "正常"), "broken_session",
+                             wait=True, timeout=2.0)
+        writer.close()
+
+        assert isinstance(lost.error, RuntimeError)
+        assert kept.wait(0)
+        assert _count_messages("broken_session") == 1
+
+    def test_backpressure_blocks_instead_of_dropping(self, temp_db):
+        writer = WriteBehindWriter(temp_db, batch_size=5, flush_interval=0.01, max_size=5)
+
+        for index in range(200):
+            writer.submit(INSERT_MESSAGE, ("pressure_session", "user", f"消息{index}"), "pressure_session")
+        assert writer.flush(timeout=10.0)
+        writer.close()
+
+        assert writer.get_stats()["backpressure_waits"] > 0
+        assert _count_messages("pressure_session") == 200
+
+    def test_close_flushes_pending_writes(self, temp_db):
+        writer = WriteBehindWriter(temp_db, flush_interval=10.0)
+
+        for index in range(10):
+            writer.submit(INSERT_MESSAGE, ("close_session", "user", f"消息{index}"), "close_session")
+        writer.close()
+
+        assert _count_messages("close_session") == 10
+
+    def test_disabled_writer_writes_inline(self, temp_db):
+        writer = WriteBehindWriter(temp_db)
+
+        with patch.dict('os.environ', {'WRITE_BEHIND_ENABLED': 'false'}):
+            ticket = writer.submit(INSERT_MESSAGE, ("inline_session", "user", "你好"), "inline_session")
+
+        assert ticket.wait(0)
+        assert writer.get_stats()["inline"] == 1
+        assert _count_messages("inline_session") == 1
+
+
+@pytest.mark.unit
+class TestReadYourWrites:
+    """Repositories see their own session's queued writes"""
+
+    def test_queued_writes_are_visible_to_session_reads(self, temp_db):
+        chat_repo = ChatRepository()
+
+        chat_repo.add_message("ryw_session", "user", "你好")
+        chat_repo.queue_message("ryw_session", "assistant", "你好呀")
+        chat_repo.add_treasure("ryw_session", "元气咒语", "✨")
+
+        assert [role for role, _ in chat_repo.get_recent_context("ryw_session")] == ["user", "assistant"]
+        assert len(chat_repo.get_treasures("ryw_session")) == 1
+
+    def test_concurrent_sessions_share_transactions(self, temp_db):
+        chat_repo = ChatRepository()
+
+        def write(session_id):
+            for index in range(50):
+                chat_repo.queue_message(session_id, "user", f"消息{index}")
+
+        threads = [threading.Thread(target=write, args=(f"session_{n}",)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert all(chat_repo.get_message_count(f"session_{n}") == 50 for n in range(4))
+        stats = get_write_behind_writer().get_stats()
+        assert stats["committed"] == 200
+        assert stats["avg_batch_size"] > 1
+
+
+@pytest.mark.unit
+class TestWriteResults:
+    """Queued writes do not claim success before they are committed"""
+
+    def test_queue_write_returns_ticket_that_reports_failure(self, temp_db):
+        chat_repo = ChatRepository()
+
+        ticket = chat_repo.queue_write("INSERT INTO no_such_table (x) VALUES (?)", (1,), "result_session")
+
+        assert not ticket.wait(5.0)
+        assert ticket.error is not None
+
+    def test_update_profile_reports_missing_row(self, temp_db):
+        profiles = UserProfileRepository()
+
+        assert not profiles.update_profile("missing_session", 2, 10)
+        profiles.find_or_create_profile("result_session")
+        assert profiles.update_profile("result_session", 2, 10)
+        assert profiles.get_profile("result_session")["intimacy_level"] == 2